@@ -0,0 +1,75 @@
+"""
+Utilidades compartidas por los ViewSets de la API (DRF).
+
+Paginación: todos los listados se paginan por cursor (`PaginacionCursor`,
+configurada en REST_FRAMEWORK); `?limite=` elige el tamaño de página hasta
+API_MAX_POR_PAGINA. El cursor no necesita COUNT(*) ni OFFSET, así que pedir la
+página 1000 de la bitácora cuesta lo mismo que pedir la primera.
+
+Campos: con `CamposSeleccionablesMixin` el cliente pide solo lo que muestra,
+`?fields=id,nombres` (los nombres desconocidos se ignoran).
+
+Consultas: cada serializer declara en su Meta las relaciones que lee al serializar:
+
+    class Meta:
+        model = UsuarioRol
+        fields = [...]
+        select_related = ('usuario', 'rol')      # FK y 1 a 1
+        prefetch_related = ()                    # inversas y M2M
+
+y `OptimizarConsultasMixin` las aplica al queryset del ViewSet, así un
+listado hace siempre la misma cantidad de consultas sin importar cuántas filas
+devuelva (sin el mixin, cada fila dispara una consulta por relación).
+"""
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class PaginacionCursor(CursorPagination):
+    """Paginación por cursor sobre la PK, de la más nueva a la más vieja"""
+    ordering = '-pk'
+    page_size_query_param = 'limite'
+
+    def __init__(self):
+        # DRF crea un paginador por solicitud: así se respeta override_settings
+        self.page_size = settings.API_POR_PAGINA
+        self.max_page_size = settings.API_MAX_POR_PAGINA
+
+
+class CamposSeleccionablesMixin:
+    """
+    Para serializers: en las lecturas (GET) con `?fields=a,b` solo se
+    serializan esos campos. Los serializers que completan campos en
+    `to_representation` deben respetar los que ya no están.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method != 'GET':
+            return
+        campos = request.query_params.get('fields')
+        if not campos:
+            return
+        pedidos = {campo.strip() for campo in campos.split(',')}
+        for nombre in set(self.fields) - pedidos:
+            self.fields.pop(nombre)
+
+
+def optimizar_queryset(queryset, serializer_class):
+    """Aplica al queryset el select_related/prefetch_related declarado en el Meta del serializer"""
+    meta = getattr(serializer_class, 'Meta', None)
+    select_related = getattr(meta, 'select_related', ())
+    prefetch_related = getattr(meta, 'prefetch_related', ())
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    if prefetch_related:
+        queryset = queryset.prefetch_related(*prefetch_related)
+    return queryset
+
+
+class OptimizarConsultasMixin:
+    """Para ViewSets: optimiza `get_queryset` según el serializer de la acción"""
+
+    def get_queryset(self):
+        return optimizar_queryset(super().get_queryset(), self.get_serializer_class())
@@ -0,0 +1,83 @@
+"""
+Búsqueda de texto completo (PostgreSQL) compartida por Documento, Caso y Actor.
+
+Cada modelo mantiene una columna generada `search_vector` (tsvector) con índice
+GIN, calculada con la configuración `spanish_unaccent` (diccionario español +
+unaccent) creada en la migración actores/0003.
+"""
+import re
+from functools import reduce
+from operator import add
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity
+from django.db import models
+from django.db.models import F, Q
+from django.db.models.functions import Greatest
+
+FTS_CONFIG = 'spanish_unaccent'
+
+# Términos de la consulta: palabras, números y códigos con guiones (CIV-2024-001)
+TERMINO_RE = re.compile(r'\w+(?:-\w+)*')
+
+
+def vector_busqueda(*campos):
+    """
+    Construye el tsvector ponderado para una columna generada.
+    `campos` son pares (nombre_campo, peso) con peso en 'A'..'D'.
+    """
+    vector = None
+    for campo, peso in campos:
+        parcial = SearchVector(campo, weight=peso, config=FTS_CONFIG)
+        vector = parcial if vector is None else vector + parcial
+    return vector
+
+
+def consulta_busqueda(texto):
+    """
+    Convierte el texto libre del usuario en un tsquery OR de sus términos.
+    Las stopwords las descarta el propio diccionario español.
+    """
+    query = None
+    for termino in TERMINO_RE.findall(texto or ''):
+        parcial = SearchQuery(termino, config=FTS_CONFIG)
+        query = parcial if query is None else query | parcial
+    return query
+
+
+class BusquedaQuerySet(models.QuerySet):
+    """
+    QuerySet para modelos con columna `search_vector`
+    """
+
+    def buscar(self, texto):
+        """
+        Filtra por coincidencia de texto completo (usa el índice GIN) y ordena
+        por relevancia; la relevancia queda anotada en `rango`.
+        """
+        query = consulta_busqueda(texto)
+        if query is None:
+            return self.none()
+        return self.filter(search_vector=query).annotate(
+            rango=SearchRank(F('search_vector'), query)
+        ).order_by('-rango')
+
+    def similares(self, texto, *campos):
+        """
+        Búsqueda difusa (pg_trgm) en `campos`, tolerante a errores de tipeo y a
+        prefijos. Usa los índices GIN gin_trgm_ops de esos campos; la similitud
+        acumulada de los términos queda anotada en `similitud`.
+        """
+        terminos = [termino for termino in TERMINO_RE.findall(texto or '') if len(termino) >= 3]
+        if not terminos:
+            return self.none()
+
+        filtro = Q()
+        similitudes = []
+        for termino in terminos:
+            por_campo = [TrigramWordSimilarity(termino, campo) for campo in campos]
+            for campo in campos:
+                filtro |= Q(**{f'{campo}__trigram_word_similar': termino})
+            similitudes.append(Greatest(*por_campo) if len(por_campo) > 1 else por_campo[0])
+        return self.filter(filtro).annotate(
+            similitud=reduce(add, similitudes)
+        ).order_by('-similitud', 'id')
@@ -35,6 +35,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
 
     
 
@@ -69,6 +70,7 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "seguridad.middleware.AuditoriaMiddleware",  # auditoría de cambios (seguridad/signals.py)
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -107,6 +109,80 @@ DATABASES = {
         "PORT": env("DB_PORT", default="5432"),
     }
 }
+
+# Caché: memoria local por defecto; CACHE_URL en .env para Redis/Memcached
+# Respuestas del chat: la comparten los workers web y el de la cola, no puede ser
+# memoria local (se desactiva); por defecto en la base (manage.py createcachetable)
+CACHES = {
+    "default": env.cache("CACHE_URL", default="locmemcache://"),
+    "respuestas": env.cache("RESPUESTAS_CACHE_URL", default="dbcache://chat_respuestas_cache"),
+}
+# Segundos que se conservan los datos usados para las sugerencias del chat
+SUGERENCIAS_CACHE_TTL = env.int("SUGERENCIAS_CACHE_TTL", default=300)
+# Segundos que se conserva una respuesta del chat (se invalida antes si cambian los datos)
+RESPUESTAS_CACHE_TTL = env.int("RESPUESTAS_CACHE_TTL", default=600)
+
+# --- Cliente OpenAI (uno por proceso, con pool de conexiones keep-alive) ---
+OPENAI_BASE_URL = env("OPENAI_BASE_URL", default=None)          # None = API oficial
+OPENAI_TIMEOUT = env.float("OPENAI_TIMEOUT", default=60.0)       # segundos por solicitud
+OPENAI_CONNECT_TIMEOUT = env.float("OPENAI_CONNECT_TIMEOUT", default=5.0)
+OPENAI_MAX_RETRIES = env.int("OPENAI_MAX_RETRIES", default=2)
+OPENAI_MAX_CONNECTIONS = env.int("OPENAI_MAX_CONNECTIONS", default=20)
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = env.int("OPENAI_MAX_KEEPALIVE_CONNECTIONS", default=10)
+OPENAI_KEEPALIVE_EXPIRY = env.float("OPENAI_KEEPALIVE_EXPIRY", default=30.0)
+# Segundos antes de volver a leer ConfiguracionIA (modelo, temperatura, max_tokens)
+OPENAI_CONFIG_TTL = env.int("OPENAI_CONFIG_TTL", default=60)
+
+# --- Cola de respuestas del chat (chat/cola.py, manage.py procesar_cola_chat) ---
+# Con la cola, enviar_mensaje responde 202 y el cliente consulta api/mensaje/<id>/ hasta que termina.
+# La interfaz usa el streaming (enviar-mensaje/stream/): sin la cola, pero con la misma ranura y reintentos
+CHAT_USAR_COLA = env.bool("CHAT_USAR_COLA", default=False)        # False = responder dentro de la solicitud
+CHAT_MAX_LLM_CONCURRENTES = env.int("CHAT_MAX_LLM_CONCURRENTES", default=4)  # entre todos los workers
+CHAT_COLA_MAX_INTENTOS = env.int("CHAT_COLA_MAX_INTENTOS", default=3)
+CHAT_COLA_REINTENTO_BASE = env.int("CHAT_COLA_REINTENTO_BASE", default=2)    # segundos, se duplica por intento
+CHAT_COLA_TIMEOUT = env.int("CHAT_COLA_TIMEOUT", default=300)    # segundos antes de retomar un trabajo huérfano
+CHAT_ESPERA_RANURA = env.float("CHAT_ESPERA_RANURA", default=30.0)  # segundos que una respuesta sin cola espera una ranura
+
+# --- Listado de conversaciones (api/conversaciones/, paginado por cursor) ---
+CHAT_CONVERSACIONES_POR_PAGINA = env.int("CHAT_CONVERSACIONES_POR_PAGINA", default=20)
+CHAT_CONVERSACIONES_MAX_POR_PAGINA = env.int("CHAT_CONVERSACIONES_MAX_POR_PAGINA", default=100)
+# Mensajes que se cargan al abrir una conversación (el resto se pide al hacer scroll)
+CHAT_MENSAJES_POR_PAGINA = env.int("CHAT_MENSAJES_POR_PAGINA", default=50)
+CHAT_MENSAJES_MAX_POR_PAGINA = env.int("CHAT_MENSAJES_MAX_POR_PAGINA", default=200)
+
+# --- Historial enviado a OpenAI (chat/historial.py) ---
+CHAT_VENTANA_CONTEXTO_TOKENS = env.int("CHAT_VENTANA_CONTEXTO_TOKENS", default=16385)  # del modelo configurado
+CHAT_HISTORIAL_MAX_TOKENS = env.int("CHAT_HISTORIAL_MAX_TOKENS", default=2000)
+CHAT_HISTORIAL_MAX_MENSAJES = env.int("CHAT_HISTORIAL_MAX_MENSAJES", default=20)   # candidatos leídos de la DB
+# Tope de tokens de cada tabla (casos, documentos, actores) del contexto (chat/contexto_prompt.py)
+CHAT_CONTEXTO_MAX_TOKENS_POR_TIPO = env.int("CHAT_CONTEXTO_MAX_TOKENS_POR_TIPO", default=300)
+
+# --- Búsqueda semántica del chat (chat/embeddings.py, manage.py indexar_embeddings) ---
+CHAT_EMBEDDINGS_BACKEND = env("CHAT_EMBEDDINGS_BACKEND", default="chat.embeddings.EmbedderLocal")  # vacío = desactivada
+CHAT_EMBEDDINGS_DIMENSION = env.int("CHAT_EMBEDDINGS_DIMENSION", default=256)      # EmbedderLocal
+CHAT_EMBEDDINGS_MODELO_OPENAI = env("CHAT_EMBEDDINGS_MODELO_OPENAI", default="text-embedding-3-small")  # EmbedderOpenAI
+CHAT_EMBEDDINGS_MIN_SIMILITUD = env.float("CHAT_EMBEDDINGS_MIN_SIMILITUD", default=0.15)  # coseno; depende del embedder
+# Horas que se conservan los cambios de vectores; un índice más viejo que eso se recarga entero
+CHAT_EMBEDDINGS_RETENER_CAMBIOS_HORAS = env.float("CHAT_EMBEDDINGS_RETENER_CAMBIOS_HORAS", default=24.0)
+# Segundos entre lecturas de cambios por proceso: entre una y otra la búsqueda no consulta
+# la base de datos, a cambio de ver los vectores nuevos con hasta ese retraso (0 = en cada búsqueda)
+CHAT_EMBEDDINGS_INTERVALO_CAMBIOS = env.float("CHAT_EMBEDDINGS_INTERVALO_CAMBIOS", default=10.0)
+# Memoria: cada proceso (worker de gunicorn, worker de la cola) guarda su propio índice, una
+# matriz float32 de n x dimensión por tipo (documentos y casos) con hasta el doble de filas
+# de reserva. Ej.: 100.000 documentos con 256 dimensiones ≈ 100 MB (hasta 200 MB) por
+# proceso; con text-embedding-3-small (1536 dimensiones) ≈ 600 MB (hasta 1,2 GB).
+
+# --- Ranking híbrido de documentos y casos (chat/ranking.py, reciprocal rank fusion) ---
+CHAT_RANKING_PESOS = {
+    "texto": env.float("CHAT_RANKING_PESO_TEXTO", default=1.0),
+    "trigrama": env.float("CHAT_RANKING_PESO_TRIGRAMA", default=0.5),
+    "vector": env.float("CHAT_RANKING_PESO_VECTOR", default=0.8),
+    "reciente": env.float("CHAT_RANKING_PESO_RECIENTE", default=0.3),
+}
+CHAT_RANKING_RRF_K = env.int("CHAT_RANKING_RRF_K", default=60)
+CHAT_RANKING_CANDIDATOS = env.int("CHAT_RANKING_CANDIDATOS", default=20)   # ids por fuente
+CHAT_RANKING_RESULTADOS = env.int("CHAT_RANKING_RESULTADOS", default=10)
+
 # --- JWT (JSON Web Token) Configuration ---
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(weeks=5),   # Ejemplo: 5 semanas (considera si es apropiado para tu caso)
@@ -122,7 +198,13 @@ SIMPLE_JWT = {
     # Solo se aceptan AccessTokens para autenticación
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
 }
+# --- Estadísticas del panel (vista materializada, manage.py refrescar_estadisticas --continuo) ---
+ESTADISTICAS_INTERVALO = env.float("ESTADISTICAS_INTERVALO", default=30.0)  # segundos entre revisiones
+
 # --- Django REST Framework Configuration ---
+# Paginación por cursor de todos los listados (GestDocSi2/api.py); ?limite= hasta el máximo
+API_POR_PAGINA = env.int("API_POR_PAGINA", default=50)
+API_MAX_POR_PAGINA = env.int("API_MAX_POR_PAGINA", default=500)
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
@@ -133,8 +215,30 @@ REST_FRAMEWORK = {
     'DEFAULT_FILTER_BACKENDS': (
         'django_filters.rest_framework.DjangoFilterBackend',  # Habilitar filtrado
     ),
+    'DEFAULT_PAGINATION_CLASS': 'GestDocSi2.api.PaginacionCursor',
 }
 
+# --- Auditoría: Bitacora y DetalleBitacora particionadas por mes (seguridad/particiones.py) ---
+# La API de auditoría solo lista una ventana de tiempo (?desde=&hasta=), por defecto los últimos días
+AUDITORIA_VENTANA_DIAS = env.int("AUDITORIA_VENTANA_DIAS", default=30)
+AUDITORIA_MAX_VENTANA_DIAS = env.int("AUDITORIA_MAX_VENTANA_DIAS", default=93)
+# manage.py particionar_bitacora: meses creados por adelantado y meses conservados (0 = todos)
+AUDITORIA_MESES_FUTUROS = env.int("AUDITORIA_MESES_FUTUROS", default=3)
+AUDITORIA_RETENER_MESES = env.int("AUDITORIA_RETENER_MESES", default=0)
+
+# --- Escritura diferida de la auditoría (seguridad/auditoria.py) ---
+AUDITORIA_DIFERIDA = env.bool("AUDITORIA_DIFERIDA", default=True)      # False = INSERT en la misma solicitud
+AUDITORIA_LOTE = env.int("AUDITORIA_LOTE", default=500)                # objetos que disparan un vaciado
+AUDITORIA_INTERVALO = env.float("AUDITORIA_INTERVALO", default=2.0)    # segundos máximos en el búfer
+AUDITORIA_BLOQUE_IDS = env.int("AUDITORIA_BLOQUE_IDS", default=100)    # ids reservados por consulta
+AUDITORIA_RESPALDO_DIR = env("AUDITORIA_RESPALDO_DIR", default=str(BASE_DIR / "auditoria_pendiente"))
+# Tokens sin el claim `bitacora`: usuarios recordados por proceso y segundos hasta volver a buscar su
+# Bitacora (bastante más que AUDITORIA_INTERVALO: la recién abierta debe estar escrita para verla)
+AUDITORIA_SIN_CLAIM_MAX = env.int("AUDITORIA_SIN_CLAIM_MAX", default=1000)
+AUDITORIA_SIN_CLAIM_SEGUNDOS = env.float("AUDITORIA_SIN_CLAIM_SEGUNDOS", default=300.0)
+# Altas, cambios y bajas de los modelos de dominio en DetalleBitacora (seguridad/signals.py)
+AUDITORIA_CAMBIOS = env.bool("AUDITORIA_CAMBIOS", default=True)
+
 
 # Idioma y zona
 LANGUAGE_CODE = env("LANGUAGE_CODE", default="es")
@@ -31,6 +31,7 @@ urlpatterns = [
     path("accounts/", include("accounts.urls", namespace="accounts")),
     path("chat/", include("chat.urls", namespace="chat")),
      path("seguridad/", include("seguridad.urls", namespace="seguridades")),
+    path("actores/", include("actores.urls")),
     
     #GESTION DE CASOS
     
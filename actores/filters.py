@@ -0,0 +1,30 @@
+"""
+Filtros de la API de actores (django-filter), sobre columnas indexadas.
+"""
+import django_filters
+
+from .models import Abogado, Actor, Asistente, Cliente
+
+
+class ActorFilter(django_filters.FilterSet):
+    class Meta:
+        model = Actor
+        fields = ['tipoActor', 'estadoActor', 'ci', 'usuario']
+
+
+class AbogadoFilter(django_filters.FilterSet):
+    class Meta:
+        model = Abogado
+        fields = ['estadoLicencia']
+
+
+class ClienteFilter(django_filters.FilterSet):
+    class Meta:
+        model = Cliente
+        fields = ['tipoCliente']
+
+
+class AsistenteFilter(django_filters.FilterSet):
+    class Meta:
+        model = Asistente
+        fields = ['area', 'cargo']
@@ -1,14 +1,38 @@
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
 from actores.models import Actor, Abogado, Cliente, Asistente
 import random
 
 User = get_user_model()
 
+# Corpus sintético (--sinteticos): CI y usuario llevan este prefijo
+PREFIJO_SINTETICO = 'SIN-'
+NOMBRES = ['Carlos', 'Ana', 'Roberto', 'Patricia', 'Juan', 'María', 'Luis', 'Carmen', 'Pedro', 'Rosa',
+           'Jorge', 'Elena', 'Miguel', 'Lucía', 'Fernando', 'Sofía', 'Diego', 'Valeria', 'Andrés', 'Gabriela']
+APELLIDOS = ['Mendoza', 'García', 'Vargas', 'Fernández', 'Pérez', 'Rodríguez', 'Martínez', 'Jiménez',
+             'López', 'Sánchez', 'Quispe', 'Mamani', 'Flores', 'Rojas', 'Gutiérrez', 'Choque', 'Torrez',
+             'Castro', 'Herrera', 'Morales']
+ESPECIALIDADES = ['Derecho Civil', 'Derecho Penal', 'Derecho Laboral', 'Derecho Comercial',
+                  'Derecho de Familia', 'Derecho Administrativo']
+# Proporción de abogados, clientes y asistentes
+TIPOS_SINTETICOS = (('ABO', 2), ('CLI', 6), ('ASI', 2))
+
 class Command(BaseCommand):
     help = 'Seed data for actores app'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sinteticos', type=int, default=0,
+            help='En lugar de los datos de ejemplo, completa hasta N actores sintéticos (con usuario y subtipo)'
+        )
+        parser.add_argument('--lote', type=int, default=5000, help='Filas por INSERT del corpus sintético')
+        parser.add_argument('--semilla', type=int, default=42)
+
     def handle(self, *args, **options):
+        if options['sinteticos']:
+            return self._sembrar_sinteticos(options['sinteticos'], options['lote'], options['semilla'])
+
         self.stdout.write('Iniciando seed de datos de actores...')
         
         # Obtener usuarios existentes
@@ -139,3 +163,53 @@ class Command(BaseCommand):
         self.stdout.write(
             self.style.SUCCESS('Seed de actores completado exitosamente!')
         )
+
+    def _sembrar_sinteticos(self, cantidad, lote, semilla):
+        """
+        Crea actores sintéticos hasta llegar a `cantidad` (los ya creados se
+        conservan, así se puede volver a ejecutar). Todo con bulk_create.
+        """
+        existentes = Actor.objects.filter(ci__startswith=PREFIJO_SINTETICO).count()
+        if existentes >= cantidad:
+            self.stdout.write(f'Ya existen {existentes} actores sintéticos')
+            return
+
+        aleatorio = random.Random(semilla + existentes)
+        tipos = [tipo for tipo, peso in TIPOS_SINTETICOS for _ in range(peso)]
+        # Una sola contraseña inutilizable: hashear una por usuario tardaría horas
+        password = make_password(None)
+
+        for inicio in range(existentes, cantidad, lote):
+            numeros = range(inicio, min(inicio + lote, cantidad))
+            usuarios = User.objects.bulk_create([
+                User(
+                    username=f'sintetico{n:07d}', email=f'sintetico{n:07d}@ejemplo.com',
+                    password=password, first_name=aleatorio.choice(NOMBRES),
+                    last_name=aleatorio.choice(APELLIDOS),
+                )
+                for n in numeros
+            ])
+            actores = Actor.objects.bulk_create([
+                Actor(
+                    usuario=usuario, tipoActor=aleatorio.choice(tipos),
+                    nombres=usuario.first_name, apellidoPaterno=usuario.last_name,
+                    apellidoMaterno=aleatorio.choice(APELLIDOS), ci=f'{PREFIJO_SINTETICO}{n:07d}',
+                    telefono=f'7{aleatorio.randrange(10 ** 7):07d}', estadoActor='ACTIVO',
+                )
+                for n, usuario in zip(numeros, usuarios)
+            ])
+            Abogado.objects.bulk_create([
+                Abogado(actor=actor, nroCredencial=f'ABG-{actor.ci}', especialidad=aleatorio.choice(ESPECIALIDADES))
+                for actor in actores if actor.tipoActor == 'ABO'
+            ])
+            Cliente.objects.bulk_create([
+                Cliente(actor=actor, tipoCliente=aleatorio.choice(['NATURAL', 'NATURAL', 'JURIDICO']))
+                for actor in actores if actor.tipoActor == 'CLI'
+            ])
+            Asistente.objects.bulk_create([
+                Asistente(actor=actor, area='Gestión Documental', cargo='Asistente')
+                for actor in actores if actor.tipoActor == 'ASI'
+            ])
+            self.stdout.write(f'Actores sintéticos: {numeros.stop}/{cantidad}')
+
+        self.stdout.write(self.style.SUCCESS(f'{cantidad - existentes} actores sintéticos creados'))
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:11
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import UnaccentExtension
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('actores', '0002_alter_actor_estadoactor'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # Configuración de texto completo usada por las columnas search_vector
+        # de Actor, Caso y Documento: español sin acentos.
+        UnaccentExtension(),
+        migrations.RunSQL(
+            sql="""
+                CREATE TEXT SEARCH CONFIGURATION spanish_unaccent (COPY = pg_catalog.spanish);
+                ALTER TEXT SEARCH CONFIGURATION spanish_unaccent
+                    ALTER MAPPING FOR hword, hword_part, word WITH unaccent, spanish_stem;
+            """,
+            reverse_sql="DROP TEXT SEARCH CONFIGURATION IF EXISTS spanish_unaccent;",
+        ),
+        migrations.AddField(
+            model_name='actor',
+            name='search_vector',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.SearchVector('nombres', config='spanish_unaccent', weight='A'), '||', django.contrib.postgres.search.SearchVector('apellidoPaterno', config='spanish_unaccent', weight='A'), django.contrib.postgres.search.SearchConfig('spanish_unaccent')), '||', django.contrib.postgres.search.SearchVector('apellidoMaterno', config='spanish_unaccent', weight='A'), django.contrib.postgres.search.SearchConfig('spanish_unaccent')), '||', django.contrib.postgres.search.SearchVector('ci', config='spanish_unaccent', weight='B'), django.contrib.postgres.search.SearchConfig('spanish_unaccent')), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        migrations.AddIndex(
+            model_name='actor',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='actores_act_search__acf849_gin'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:13
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.conf import settings
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('actores', '0003_actor_search_vector_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='actor',
+            name='nombreCompleto',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.text.Concat('nombres', models.Value(' '), 'apellidoPaterno', models.Value(' '), 'apellidoMaterno'), output_field=models.CharField(max_length=282)),
+        ),
+        migrations.AddIndex(
+            model_name='actor',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['nombreCompleto'], name='actor_nombre_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='actor',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['ci'], name='actor_ci_trgm', opclasses=['gin_trgm_ops']),
+        ),
+    ]
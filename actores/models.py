@@ -1,8 +1,28 @@
 
 from django.db import models
+from django.db.models import Value
+from django.db.models.functions import Concat
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from GestDocSi2.busqueda import BusquedaQuerySet, vector_busqueda
 # Create your models here.
 
+
+class ActorQuerySet(BusquedaQuerySet):
+    """
+    Búsquedas de actores: texto completo (heredada) y difusa por trigramas
+    """
+
+    def buscar_similar(self, texto):
+        """
+        Búsqueda difusa (pg_trgm) por nombre completo y CI, tolerante a errores
+        de tipeo y a prefijos. Usa los índices GIN gin_trgm_ops; la similitud
+        acumulada de los términos queda anotada en `similitud`.
+        """
+        return self.similares(texto, 'nombreCompleto', 'ci')
+
+
 # ==========================
 # ACTOR (1–a–1 con Usuario)
 # ==========================
@@ -36,10 +56,31 @@ class Actor(models.Model):
     creadoEn = models.DateTimeField(auto_now_add=True)
     actualizadoEn = models.DateTimeField(auto_now=True)
 
+    # Búsqueda de texto completo (columna generada, ver GestDocSi2/busqueda.py)
+    search_vector = models.GeneratedField(
+        expression=vector_busqueda(
+            ("nombres", "A"), ("apellidoPaterno", "A"), ("apellidoMaterno", "A"), ("ci", "B"),
+        ),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
+    # Nombre completo para la búsqueda difusa por trigramas
+    nombreCompleto = models.GeneratedField(
+        expression=Concat("nombres", Value(" "), "apellidoPaterno", Value(" "), "apellidoMaterno"),
+        output_field=models.CharField(max_length=282),
+        db_persist=True,
+    )
+
+    objects = ActorQuerySet.as_manager()
+
     class Meta:
         indexes = [
             models.Index(fields=["tipoActor"]),
             models.Index(fields=["estadoActor"]),
+            GinIndex(fields=["search_vector"]),
+            GinIndex(fields=["nombreCompleto"], name="actor_nombre_trgm", opclasses=["gin_trgm_ops"]),
+            GinIndex(fields=["ci"], name="actor_ci_trgm", opclasses=["gin_trgm_ops"]),
         ]
         # Si quieres nombre físico exacto:
         # db_table = "actor"
@@ -1,55 +1,73 @@
 
 from rest_framework import serializers
 
+from GestDocSi2.api import CamposSeleccionablesMixin
 from .models import Actor
 
-class ActorSerializer(serializers.ModelSerializer):
+class ActorSerializer(CamposSeleccionablesMixin, serializers.ModelSerializer):
     class Meta:
         model = Actor
         fields = ['id', 'usuario', 'tipoActor', 'nombres', 'apellidoPaterno', 'apellidoMaterno', 'ci', 'telefono', 'direccion', 'estadoActor', 'creadoEn', 'actualizadoEn']
+        select_related = ('usuario',)  # ver GestDocSi2/api.py
 
     def to_representation(self, instance):
         representation = super().to_representation(instance)
         # Aquí puedes personalizar la representación si es necesario
         # No estamos anidando campos, solo devolvemos la información directamente
-        representation['usuario'] = instance.usuario.username  # Representar solo el nombre de usuario
+        if 'usuario' in representation:
+            representation['usuario'] = instance.usuario.username  # Representar solo el nombre de usuario
         return representation
 
 from .models import Abogado
 
-class AbogadoSerializer(serializers.ModelSerializer):
+class AbogadoSerializer(CamposSeleccionablesMixin, serializers.ModelSerializer):
+    # La PK es el actor: `id` se mantiene en la respuesta con su valor
+    id = serializers.IntegerField(source='actor_id', read_only=True)
+
     class Meta:
         model = Abogado
         fields = ['id', 'actor', 'nroCredencial', 'especialidad', 'estadoLicencia']
+        select_related = ('actor',)
 
     def to_representation(self, instance):
         representation = super().to_representation(instance)
         # Evitamos campos anidados, solo representamos 'actor' con su nombre
-        representation['actor'] = f"{instance.actor.nombres} {instance.actor.apellidoPaterno}"  # Representamos como texto
+        if 'actor' in representation:
+            representation['actor'] = f"{instance.actor.nombres} {instance.actor.apellidoPaterno}"  # Representamos como texto
         return representation
 
 from .models import Cliente
 
-class ClienteSerializer(serializers.ModelSerializer):
+class ClienteSerializer(CamposSeleccionablesMixin, serializers.ModelSerializer):
+    # La PK es el actor: `id` se mantiene en la respuesta con su valor
+    id = serializers.IntegerField(source='actor_id', read_only=True)
+
     class Meta:
         model = Cliente
         fields = ['id', 'actor', 'tipoCliente', 'observaciones']
+        select_related = ('actor',)
 
     def to_representation(self, instance):
         representation = super().to_representation(instance)
         # Evitamos campos anidados, solo representamos 'actor' con su nombre
-        representation['actor'] = f"{instance.actor.nombres} {instance.actor.apellidoPaterno}"  # Representamos como texto
+        if 'actor' in representation:
+            representation['actor'] = f"{instance.actor.nombres} {instance.actor.apellidoPaterno}"  # Representamos como texto
         return representation
 
 from .models import Asistente
 
-class AsistenteSerializer(serializers.ModelSerializer):
+class AsistenteSerializer(CamposSeleccionablesMixin, serializers.ModelSerializer):
+    # La PK es el actor: `id` se mantiene en la respuesta con su valor
+    id = serializers.IntegerField(source='actor_id', read_only=True)
+
     class Meta:
         model = Asistente
         fields = ['id', 'actor', 'area', 'cargo']
+        select_related = ('actor',)
 
     def to_representation(self, instance):
         representation = super().to_representation(instance)
         # Evitamos campos anidados, solo representamos 'actor' con su nombre
-        representation['actor'] = f"{instance.actor.nombres} {instance.actor.apellidoPaterno}"  # Representamos como texto
+        if 'actor' in representation:
+            representation['actor'] = f"{instance.actor.nombres} {instance.actor.apellidoPaterno}"  # Representamos como texto
         return representation
@@ -1,3 +1,145 @@
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from seguridad.models import Usuario
+from .models import Abogado, Actor, Asistente, Cliente
+
+
+def crear_actor(username, nombres, apellidoPaterno, apellidoMaterno, ci, tipoActor='ABO'):
+    usuario = Usuario.objects.create_user(username=username, email=f'{username}@test.com', password=None)
+    return Actor.objects.create(
+        usuario=usuario, tipoActor=tipoActor, nombres=nombres,
+        apellidoPaterno=apellidoPaterno, apellidoMaterno=apellidoMaterno, ci=ci,
+    )
+
+
+class BusquedaSimilarActorTests(TestCase):
+    """
+    Búsqueda difusa por trigramas (Actor.objects.buscar_similar)
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.carlos = crear_actor('cmendoza', 'Carlos', 'Mendoza', 'Rojas', '12345678')
+        cls.roberto = crear_actor('rvargas', 'Roberto', 'Vargas', 'Silva', '11223344')
+        cls.juan = crear_actor('jperez', 'Juan', 'Pérez', 'González', '55667788', 'CLI')
+
+    def test_prefijo_de_apellido(self):
+        actores = list(Actor.objects.buscar_similar('mend'))
+
+        self.assertEqual(actores, [self.carlos])
+
+    def test_error_de_tipeo(self):
+        actores = list(Actor.objects.buscar_similar('Carlos Mendosa'))
+
+        self.assertEqual(actores[0], self.carlos)
+
+    def test_prefijo_de_ci(self):
+        self.assertEqual(list(Actor.objects.buscar_similar('1122')), [self.roberto])
+
+    def test_ordena_por_similitud(self):
+        crear_actor('cvargas', 'Carlos', 'Vargas', 'Mamani', '99001122')
+
+        actores = list(Actor.objects.buscar_similar('carlos mend'))
+
+        self.assertEqual(actores[0], self.carlos)
+        self.assertGreater(actores[0].similitud, actores[1].similitud)
+
+    def test_texto_muy_corto(self):
+        self.assertFalse(Actor.objects.buscar_similar('ca').exists())
+
+
+class ActorTypeaheadTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.carlos = crear_actor('cmendoza', 'Carlos', 'Mendoza', 'Rojas', '12345678')
+        crear_actor('rvargas', 'Roberto', 'Vargas', 'Silva', '11223344')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.carlos.usuario)
+
+    def test_typeahead(self):
+        response = self.client.get('/actores/actors/typeahead/', {'q': 'mendo'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]['id'], self.carlos.id)
+        self.assertEqual(response.data[0]['nombre_completo'], 'Carlos Mendoza Rojas')
+
+    def test_typeahead_una_consulta(self):
+        with self.assertNumQueries(1):
+            self.client.get('/actores/actors/typeahead/', {'q': 'rob'})
+
+    def test_typeahead_limite(self):
+        response = self.client.get('/actores/actors/typeahead/', {'q': 'carlos roberto', 'limit': 1})
+
+        self.assertEqual(len(response.data), 1)
+
+
+class ListadosConsultasConstantesTests(TestCase):
+    """
+    Los listados cargan las relaciones que leen los serializers en la misma
+    consulta (Meta.select_related, ver GestDocSi2/api.py)
+    """
+
+    URLS = ['/actores/actors/', '/actores/abogados/', '/actores/clientes/', '/actores/asistentes/']
+
+    def setUp(self):
+        self.creados = 0
+        self.crear(2)
+        self.client = APIClient()
+        self.client.force_authenticate(Actor.objects.first().usuario)
+
+    def crear(self, cantidad):
+        for _ in range(cantidad):
+            i = self.creados = self.creados + 1
+            Abogado.objects.create(actor=crear_actor(f'abo{i}', 'Ana', f'Abogada{i}', '', f'100{i}'), nroCredencial=f'ABG-{i}')
+            Cliente.objects.create(actor=crear_actor(f'cli{i}', 'Juan', f'Cliente{i}', '', f'200{i}', 'CLI'), tipoCliente='NATURAL')
+            Asistente.objects.create(actor=crear_actor(f'asi{i}', 'Pedro', f'Asistente{i}', '', f'300{i}', 'ASI'))
+
+    def consultas(self, url):
+        with CaptureQueriesContext(connection) as capturadas:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(capturadas), response.data
+
+    def test_consultas_no_dependen_de_la_cantidad_de_filas(self):
+        antes = {url: self.consultas(url)[0] for url in self.URLS}
+        self.crear(4)
+
+        for url in self.URLS:
+            with self.subTest(url=url):
+                consultas, datos = self.consultas(url)
+                self.assertEqual(consultas, antes[url])
+                self.assertEqual(consultas, 1)
+                self.assertGreaterEqual(len(datos['results']), 6)
+
+    def test_filtros_y_campos(self):
+        datos = self.client.get('/actores/actors/', {'tipoActor': 'CLI', 'fields': 'id,nombres,usuario'}).data
+
+        self.assertEqual(len(datos['results']), 2)
+        self.assertEqual(set(datos['results'][0]), {'id', 'nombres', 'usuario'})
+        self.assertTrue(all(fila['nombres'] == 'Juan' for fila in datos['results']))
+        self.assertTrue(datos['results'][0]['usuario'].startswith('cli'))
+
+    def test_subtipos_mantienen_id_y_nombre_del_actor(self):
+        abogado = Abogado.objects.select_related('actor').first()
+
+        datos = self.client.get(f'/actores/abogados/{abogado.pk}/').data
+
+        self.assertEqual(datos['id'], abogado.actor_id)
+        self.assertEqual(datos['actor'], f'{abogado.actor.nombres} {abogado.actor.apellidoPaterno}')
+
+    def test_api_de_solo_lectura(self):
+        actor = Actor.objects.first()
+
+        for url in self.URLS:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.post(url, {}).status_code, 405)
+        self.assertEqual(self.client.patch(f'/actores/actors/{actor.pk}/', {'nombres': 'X'}).status_code, 405)
+        self.assertEqual(self.client.delete(f'/actores/actors/{actor.pk}/').status_code, 405)
+        self.assertTrue(Actor.objects.filter(pk=actor.pk, nombres=actor.nombres).exists())
@@ -4,15 +4,22 @@ from django.shortcuts import render
 from rest_framework import viewsets
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from GestDocSi2.api import OptimizarConsultasMixin
+from .filters import AbogadoFilter, ActorFilter, AsistenteFilter, ClienteFilter
 from .models import Actor, Abogado, Cliente, Asistente
 from .serializers import ActorSerializer, AbogadoSerializer, ClienteSerializer, AsistenteSerializer
 
+# Solo lectura: /actores/ quedó montado para el autocompletado y los listados,
+# y la API no tiene todavía permisos por rol para altas, cambios ni bajas
+# (esas siguen en el admin)
+
 # ==========================
 # Actor ViewSet
 # ==========================
-class ActorViewSet(viewsets.ModelViewSet):
+class ActorViewSet(OptimizarConsultasMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Actor.objects.all()
     serializer_class = ActorSerializer
+    filterset_class = ActorFilter
 
     # Puedes agregar métodos personalizados aquí si es necesario
     # Ejemplo de un endpoint adicional (si lo necesitaras)
@@ -21,23 +28,50 @@ class ActorViewSet(viewsets.ModelViewSet):
         actor = self.get_object()
         return Response({"nombre_completo": f"{actor.nombres} {actor.apellidoPaterno} {actor.apellidoMaterno}"})
 
+    # Autocompletado por nombre o CI (búsqueda difusa por trigramas)
+    # GET .../actors/typeahead/?q=mend&limit=10
+    @action(detail=False, methods=['get'])
+    def typeahead(self, request):
+        texto = request.query_params.get('q', '').strip()
+        try:
+            limite = min(max(int(request.query_params.get('limit', 10)), 1), 20)
+        except ValueError:
+            limite = 10
+
+        actores = Actor.objects.buscar_similar(texto).only(
+            'id', 'tipoActor', 'nombreCompleto', 'ci'
+        )[:limite]
+        return Response([
+            {
+                "id": actor.id,
+                "nombre_completo": actor.nombreCompleto,
+                "ci": actor.ci,
+                "tipoActor": actor.tipoActor,
+                "similitud": round(actor.similitud, 3),
+            }
+            for actor in actores
+        ])
+
 # ==========================
 # Abogado ViewSet
 # ==========================
-class AbogadoViewSet(viewsets.ModelViewSet):
+class AbogadoViewSet(OptimizarConsultasMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Abogado.objects.all()
     serializer_class = AbogadoSerializer
+    filterset_class = AbogadoFilter
 
 # ==========================
 # Cliente ViewSet
 # ==========================
-class ClienteViewSet(viewsets.ModelViewSet):
+class ClienteViewSet(OptimizarConsultasMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Cliente.objects.all()
     serializer_class = ClienteSerializer
+    filterset_class = ClienteFilter
 
 # ==========================
 # Asistente ViewSet
 # ==========================
-class AsistenteViewSet(viewsets.ModelViewSet):
+class AsistenteViewSet(OptimizarConsultasMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Asistente.objects.all()
     serializer_class = AsistenteSerializer
+    filterset_class = AsistenteFilter
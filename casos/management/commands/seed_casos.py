@@ -4,10 +4,36 @@ from actores.models import Actor, Cliente
 from datetime import datetime, timedelta
 import random
 
+# Corpus sintético (--sinteticos): nroCaso lleva este prefijo
+PREFIJO_SINTETICO = 'SIN-'
+TIPOS_CASO = ['Divorcio', 'Robo', 'Despido Injustificado', 'Incumplimiento Contractual', 'Sucesión',
+              'Pensión Alimenticia', 'Recurso de Amparo', 'Sociedad Comercial', 'Daños y Perjuicios', 'Horas Extras']
+DESCRIPCIONES = [
+    'Proceso de {tipo} iniciado por {parte} ante el juzgado de turno',
+    'Demanda de {tipo} con audiencia pendiente y pruebas documentales',
+    'Defensa en proceso de {tipo}; se solicitó la revisión del predio y del local',
+    'Seguimiento de {tipo} con informe del registro y medidas cautelares',
+    'Conciliación en {tipo} entre {parte} y la parte contraria',
+]
+APELLIDOS = ['Mendoza', 'García', 'Vargas', 'Pérez', 'Quispe', 'Mamani', 'Flores', 'Rojas', 'Choque', 'Castro']
+CARPETAS = ['Documentos Iniciales', 'Pruebas', 'Escritos', 'Resoluciones']
+
 class Command(BaseCommand):
     help = 'Seed data for casos app'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sinteticos', type=int, default=0,
+            help='En lugar de los datos de ejemplo, completa hasta N casos sintéticos (con expediente, carpeta, '
+                 'abogado y cliente si hay actores)'
+        )
+        parser.add_argument('--lote', type=int, default=5000, help='Filas por INSERT del corpus sintético')
+        parser.add_argument('--semilla', type=int, default=42)
+
     def handle(self, *args, **options):
+        if options['sinteticos']:
+            return self._sembrar_sinteticos(options['sinteticos'], options['lote'], options['semilla'])
+
         self.stdout.write('Iniciando seed de datos de casos...')
         
         # Verificar que existan actores
@@ -220,3 +246,57 @@ class Command(BaseCommand):
         self.stdout.write(
             self.style.SUCCESS('Seed de casos completado exitosamente!')
         )
+
+    def _sembrar_sinteticos(self, cantidad, lote, semilla):
+        """
+        Crea casos sintéticos hasta llegar a `cantidad` (los ya creados se
+        conservan). Cada caso tiene un expediente y una carpeta; si hay
+        abogados y clientes, uno de cada uno queda asignado al caso.
+        """
+        existentes = Caso.objects.filter(nroCaso__startswith=PREFIJO_SINTETICO).count()
+        if existentes >= cantidad:
+            self.stdout.write(f'Ya existen {existentes} casos sintéticos')
+            return
+
+        aleatorio = random.Random(semilla + existentes)
+        abogados = list(Actor.objects.filter(tipoActor='ABO').values_list('id', flat=True))
+        clientes = list(Cliente.objects.values_list('pk', flat=True))
+        hoy = datetime.now().date()
+
+        for inicio in range(existentes, cantidad, lote):
+            casos = []
+            for n in range(inicio, min(inicio + lote, cantidad)):
+                tipo = aleatorio.choice(TIPOS_CASO)
+                cerrado = aleatorio.random() < 0.3
+                fecha_inicio = hoy - timedelta(days=aleatorio.randrange(1, 3650))
+                casos.append(Caso(
+                    nroCaso=f'{PREFIJO_SINTETICO}{n:07d}', tipoCaso=tipo,
+                    descripcion=aleatorio.choice(DESCRIPCIONES).format(tipo=tipo.lower(), parte=aleatorio.choice(APELLIDOS)),
+                    estado='CERRADO' if cerrado else 'ABIERTO',
+                    prioridad=aleatorio.choice(['BAJA', 'MEDIA', 'ALTA']),
+                    fechaInicio=fecha_inicio,
+                    fechaFin=fecha_inicio + timedelta(days=aleatorio.randrange(30, 365)) if cerrado else None,
+                ))
+            casos = Caso.objects.bulk_create(casos)
+            expedientes = Expediente.objects.bulk_create([
+                Expediente(caso=caso, nroExpediente=f'EXP-{caso.nroCaso}', estado=caso.estado, fechaCreacion=caso.fechaInicio)
+                for caso in casos
+            ])
+            Carpeta.objects.bulk_create([
+                Carpeta(expediente=expediente, nombre=aleatorio.choice(CARPETAS)) for expediente in expedientes
+            ])
+            if abogados:
+                EquipoCaso.objects.bulk_create([
+                    EquipoCaso(actor_id=aleatorio.choice(abogados), caso=caso, rolEnEquipo='RESPONSABLE',
+                               fechaAsignacion=caso.fechaInicio)
+                    for caso in casos
+                ])
+            if clientes:
+                ParteProcesal.objects.bulk_create([
+                    ParteProcesal(cliente_id=aleatorio.choice(clientes), caso=caso,
+                                  rolProcesal=aleatorio.choice(['DEMANDANTE', 'DEMANDADO']), fechaInicio=caso.fechaInicio)
+                    for caso in casos
+                ])
+            self.stdout.write(f'Casos sintéticos: {inicio + len(casos)}/{cantidad}')
+
+        self.stdout.write(self.style.SUCCESS(f'{cantidad - existentes} casos sintéticos creados'))
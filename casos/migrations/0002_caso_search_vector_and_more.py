@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:11
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('actores', '0003_actor_search_vector_and_more'),
+        ('casos', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='caso',
+            name='search_vector',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.SearchVector('nroCaso', config='spanish_unaccent', weight='A'), '||', django.contrib.postgres.search.SearchVector('tipoCaso', config='spanish_unaccent', weight='B'), django.contrib.postgres.search.SearchConfig('spanish_unaccent')), '||', django.contrib.postgres.search.SearchVector('descripcion', config='spanish_unaccent', weight='C'), django.contrib.postgres.search.SearchConfig('spanish_unaccent')), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        migrations.AddIndex(
+            model_name='caso',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='casos_caso_search__def387_gin'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('actores', '0004_actor_nombrecompleto_actor_actor_nombre_trgm_and_more'),
+        ('casos', '0002_caso_search_vector_and_more'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='equipocaso',
+            name='casos_equip_actor_i_1f3820_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='parteprocesal',
+            name='casos_parte_cliente_6ab0f2_idx',
+        ),
+        migrations.AddIndex(
+            model_name='equipocaso',
+            index=models.Index(condition=models.Q(('fechaSalida__isnull', True)), fields=['actor', 'caso'], name='equipo_actor_vigente_idx'),
+        ),
+    ]
@@ -1,5 +1,8 @@
 from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from actores.models import Actor, Cliente
+from GestDocSi2.busqueda import BusquedaQuerySet, vector_busqueda
 from seguridad.models import Usuario
 
 # Create your models here.
@@ -19,10 +22,20 @@ class Caso(models.Model):
     creadoEn = models.DateTimeField(auto_now_add=True)
     actualizadoEn = models.DateTimeField(auto_now=True)
 
+    # Búsqueda de texto completo (columna generada, ver GestDocSi2/busqueda.py)
+    search_vector = models.GeneratedField(
+        expression=vector_busqueda(("nroCaso", "A"), ("tipoCaso", "B"), ("descripcion", "C")),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
+    objects = BusquedaQuerySet.as_manager()
+
     class Meta:
         indexes = [
             models.Index(fields=["estado", "prioridad"]),
             models.Index(fields=["fechaInicio"]),
+            GinIndex(fields=["search_vector"]),
         ]
 
     def __str__(self):
@@ -51,7 +64,12 @@ class EquipoCaso(models.Model):
         unique_together = (("actor", "caso"),)     # PK compuesta (lógica)
         indexes = [
             models.Index(fields=["caso", "rolEnEquipo"]),
-            models.Index(fields=["actor", "caso"]),
+            # "Mis casos": asignaciones vigentes del actor (unique_together ya indexa (actor, caso))
+            models.Index(
+                fields=["actor", "caso"],
+                condition=models.Q(fechaSalida__isnull=True),
+                name="equipo_actor_vigente_idx",
+            ),
         ]
 
     def __str__(self):
@@ -81,7 +99,7 @@ class ParteProcesal(models.Model):
         unique_together = (("cliente", "caso"),)   # PK compuesta (lógica)
         indexes = [
             models.Index(fields=["caso", "rolProcesal"]),
-            models.Index(fields=["cliente", "caso"]),
+            # (cliente, caso) lo cubre el índice único de unique_together
         ]
 
     def __str__(self):
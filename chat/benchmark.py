@@ -0,0 +1,257 @@
+"""
+Benchmark de recuperación y respuesta del chat (`manage.py benchmark_chat`).
+
+El corpus de fondo lo generan los seed_* con `--sinteticos`. Sobre él se
+siembran unas pocas "agujas": documentos y casos que responden a cada una de
+las PREGUNTAS y que son su respuesta etiquetada. Cada pregunta se repite
+contra un servidor OpenAI local (openai_falso.py), así la latencia medida es
+la del sistema y no la de la API, y por cada repetición se mide:
+
+- latencia total de generar_resultado_consulta (sin caché de respuestas)
+- cantidad de consultas SQL
+- duración de cada etapa (Cronometro)
+- recall@k: fracción de las agujas de la pregunta entre los k primeros
+  resultados recuperados
+
+El servidor falso solo imita chat.completions: con EmbedderOpenAI los
+embeddings se pedirían a él y fallarían, por eso conviene medir con
+EmbedderLocal.
+"""
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Set
+from unittest import mock
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+
+from casos.models import Carpeta, Caso, Expediente
+from documentos.models import Documento, TipoDocumento
+from .cronometro import ETAPAS, Cronometro
+from .models import Conversacion
+from .openai_falso import ServidorOpenAIFalso
+from .services import AsistenteIAService
+
+# Las agujas se identifican por estos prefijos (rutaDocumento y nroCaso)
+PREFIJO_DOCUMENTO = '/benchmark/'
+PREFIJO_CASO = 'BENCH-'
+USUARIO = 'benchmark'
+
+# Preguntas con su respuesta: documentos (nombre, palabras clave) o casos
+# (tipo, descripción). Ninguna menciona un tipo de caso conocido, para que
+# pasen por el ranking híbrido y no por el filtro de tipo.
+PREGUNTAS = [
+    {
+        'clave': 'servidumbre',
+        'pregunta': '¿Qué documentos hablan de servidumbre de paso?',
+        'tipo': 'documento',
+        'agujas': [
+            ('Demanda de servidumbre de paso', 'servidumbre paso predio rural'),
+            ('Inspección ocular de la servidumbre', 'servidumbre inspección'),
+            ('Resolución sobre servidumbre de acueducto', 'servidumbre acueducto'),
+        ],
+    },
+    {
+        # Con error de tipeo: lo recupera el ranking por trigramas
+        'clave': 'usucapion',
+        'pregunta': '¿Dónde están los documentos de usucapion extraordinara?',
+        'tipo': 'documento',
+        'agujas': [
+            ('Demanda de usucapión extraordinaria', 'usucapión prescripción adquisitiva'),
+            ('Certificado de posesión para usucapión', 'posesión usucapión'),
+        ],
+    },
+    {
+        # Paráfrasis: "arrendatario" no está en los documentos (embeddings)
+        'clave': 'arrendamiento',
+        'pregunta': '¿Qué documentos tiene el arrendatario del local?',
+        'tipo': 'documento',
+        'agujas': [
+            ('Contrato de arrendamiento del local comercial', 'arrendamiento alquiler local'),
+            ('Carta notariada de desalojo por arrendamiento', 'arrendamiento desalojo'),
+        ],
+    },
+    {
+        'clave': 'hipoteca',
+        'pregunta': '¿Cuáles son los documentos de la hipoteca bancaria?',
+        'tipo': 'documento',
+        'agujas': [
+            ('Escritura de hipoteca del inmueble', 'hipoteca garantía bancaria'),
+            ('Certificado de gravámenes e hipoteca', 'gravamen hipoteca'),
+        ],
+    },
+    {
+        'clave': 'minera',
+        'pregunta': '¿Qué casos tratan sobre contaminación minera?',
+        'tipo': 'caso',
+        'agujas': [
+            ('Daño Ambiental', 'Contaminación minera del río por relaves'),
+            ('Acción Popular', 'Acción popular por contaminación de la cuenca minera'),
+        ],
+    },
+    {
+        'clave': 'marcas',
+        'pregunta': '¿Cuáles casos son de propiedad intelectual sobre marcas?',
+        'tipo': 'caso',
+        'agujas': [
+            ('Propiedad Intelectual', 'Uso indebido de marca registrada'),
+            ('Propiedad Intelectual', 'Oposición al registro de una marca similar'),
+        ],
+    },
+]
+
+
+def sembrar_agujas() -> Dict[str, Set[int]]:
+    """
+    Crea (si faltan) los documentos y casos que responden a cada pregunta.
+    Devuelve los ids de la respuesta etiquetada por clave de pregunta.
+    """
+    hoy = timezone.localdate()
+    caso, _ = Caso.objects.get_or_create(
+        nroCaso=f'{PREFIJO_CASO}AGUJAS',
+        defaults={'tipoCaso': 'Referencia', 'descripcion': 'Carpeta de los documentos del benchmark', 'fechaInicio': hoy},
+    )
+    expediente, _ = Expediente.objects.get_or_create(
+        caso=caso, defaults={'nroExpediente': f'EXP-{caso.nroCaso}', 'fechaCreacion': hoy}
+    )
+    carpeta, _ = Carpeta.objects.get_or_create(expediente=expediente, nombre='Benchmark')
+    tipo_documento, _ = TipoDocumento.objects.get_or_create(nombre='Demanda')
+
+    agujas = {}
+    for pregunta in PREGUNTAS:
+        ids = set()
+        for i, (nombre, texto) in enumerate(pregunta['agujas']):
+            if pregunta['tipo'] == 'documento':
+                objeto, _ = Documento.objects.get_or_create(
+                    rutaDocumento=f"{PREFIJO_DOCUMENTO}{pregunta['clave']}/{i}.pdf",
+                    defaults={
+                        'carpeta': carpeta, 'tipoDocumento': tipo_documento, 'nombreDocumento': nombre,
+                        'palabraClave': texto, 'tamano': 1.0, 'fechaDoc': hoy,
+                    },
+                )
+            else:
+                objeto, _ = Caso.objects.get_or_create(
+                    nroCaso=f"{PREFIJO_CASO}{pregunta['clave']}-{i}",
+                    defaults={'tipoCaso': nombre, 'descripcion': texto, 'fechaInicio': hoy},
+                )
+            ids.add(objeto.id)
+        agujas[pregunta['clave']] = ids
+    return agujas
+
+
+def usuario_benchmark():
+    usuario, creado = get_user_model().objects.get_or_create(
+        username=USUARIO, defaults={'email': f'{USUARIO}@ejemplo.com'}
+    )
+    if creado:
+        usuario.set_unusable_password()
+        usuario.save(update_fields=['password'])
+    return usuario
+
+
+@contextmanager
+def llm_falso(latencia: float = 0.0):
+    """
+    Apunta el cliente de OpenAI a un servidor local que responde con
+    `latencia` segundos de demora; al salir se descarta esa instancia.
+    """
+    with ServidorOpenAIFalso(latencia=latencia) as servidor, \
+            override_settings(OPENAI_BASE_URL=servidor.base_url), \
+            mock.patch.dict(os.environ, {'OPENAI_API_KEY': 'benchmark'}):
+        AsistenteIAService._instancia = None
+        try:
+            yield servidor
+        finally:
+            AsistenteIAService._instancia = None
+
+
+def percentil(valores: List[float], p: float) -> float:
+    return float(np.percentile(valores, p)) if valores else 0.0
+
+
+def recall_en_k(recuperados: List[int], relevantes: Set[int], k: int) -> float:
+    if not relevantes:
+        return 0.0
+    return len(set(recuperados[:k]) & relevantes) / len(relevantes)
+
+
+def medir(usuario, conversacion, pregunta: Dict[str, Any]) -> Dict[str, Any]:
+    """Una ejecución de la pregunta: latencia, consultas SQL, etapas y resultados en orden"""
+    from .views import generar_resultado_consulta
+
+    cronometro = Cronometro()
+    with CaptureQueriesContext(connection) as capturadas:
+        inicio = time.perf_counter()
+        resultado = generar_resultado_consulta(
+            usuario, pregunta['pregunta'], conversacion, consultar_cache=False, cronometro=cronometro
+        )
+        latencia = time.perf_counter() - inicio
+
+    if pregunta['tipo'] == 'documento':
+        recuperados = resultado['documentos_consultados']
+    else:
+        recuperados = [registro['caso'] for registro in resultado['consultas'] if 'caso' in registro]
+    return {
+        'latencia': latencia,
+        'consultas_sql': len(capturadas.captured_queries),
+        'tiempos': cronometro.tiempos,
+        'recuperados': recuperados,
+    }
+
+
+def _ms(segundos: float) -> float:
+    return round(segundos * 1000, 2)
+
+
+def ejecutar(usuario, agujas: Dict[str, Set[int]], repeticiones: int = 5, k: int = 5, calentamiento: int = 1) -> Dict[str, Any]:
+    """
+    Repite cada pregunta `repeticiones` veces (más `calentamiento` ejecuciones
+    sin medir, que cargan el índice vectorial y las conexiones) y resume las
+    mediciones. Hay que llamarla dentro de `llm_falso`.
+    """
+    conversacion, _ = Conversacion.objects.get_or_create(usuario=usuario, titulo='Benchmark')
+    latencias, consultas_sql, recalls = [], [], []
+    etapas = {etapa: [] for etapa in ETAPAS}
+    por_pregunta = []
+
+    for pregunta in PREGUNTAS:
+        for _ in range(calentamiento):
+            medir(usuario, conversacion, pregunta)
+        mediciones = [medir(usuario, conversacion, pregunta) for _ in range(repeticiones)]
+
+        propias = [medicion['latencia'] for medicion in mediciones]
+        recall = recall_en_k(mediciones[-1]['recuperados'], agujas[pregunta['clave']], k)
+        latencias += propias
+        consultas_sql += [medicion['consultas_sql'] for medicion in mediciones]
+        recalls.append(recall)
+        for medicion in mediciones:
+            for etapa, duracion in medicion['tiempos'].items():
+                etapas[etapa].append(duracion)
+        por_pregunta.append({
+            'pregunta': pregunta['pregunta'],
+            'tipo': pregunta['tipo'],
+            'p50_ms': _ms(percentil(propias, 50)),
+            'p95_ms': _ms(percentil(propias, 95)),
+            'consultas_sql': max(medicion['consultas_sql'] for medicion in mediciones),
+            'recall': round(recall, 3),
+        })
+
+    return {
+        'k': k,
+        'mediciones': len(latencias),
+        'latencia': {'p50_ms': _ms(percentil(latencias, 50)), 'p95_ms': _ms(percentil(latencias, 95))},
+        'consultas_sql': {
+            'media': round(sum(consultas_sql) / len(consultas_sql), 1) if consultas_sql else 0,
+            'max': max(consultas_sql, default=0),
+        },
+        'etapas': {
+            etapa: {'p50_ms': _ms(percentil(duraciones, 50)), 'p95_ms': _ms(percentil(duraciones, 95))}
+            for etapa, duraciones in etapas.items() if duraciones
+        },
+        'recall_en_k': round(sum(recalls) / len(recalls), 3) if recalls else 0.0,
+        'preguntas': por_pregunta,
+    }
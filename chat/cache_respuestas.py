@@ -0,0 +1,126 @@
+"""
+Caché de respuestas del chat.
+
+La clave combina la pregunta normalizada (tokens de query_analyzer, sin
+acentos, mayúsculas ni signos, más las entidades: números de caso, CI y
+fechas, que query_analyzer quita de los tokens), el alcance del usuario (las
+preguntas personales se cachean por usuario, el resto es global) y la versión
+de los datos.
+
+Las respuestas las generan tanto los workers web como el worker de la cola
+(chat/cola.py), así que se guardan en la caché `respuestas` (CACHES), que
+debe ser compartida entre procesos: con una caché en memoria del proceso la
+caché de respuestas queda desactivada. La versión de los datos es la
+secuencia chat_respuestas_version de PostgreSQL: cualquier escritura en las
+tablas consultadas la incrementa (chat/signals.py), en todos los procesos a
+la vez, con lo que las respuestas anteriores dejan de usarse y expiran solas
+por TTL.
+
+Los aciertos y fallos se acumulan en la misma caché (ver `metricas`).
+"""
+import hashlib
+import logging
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+ALIAS_CACHE = 'respuestas'
+SECUENCIA_VERSION = 'chat_respuestas_version'
+CACHE_KEY_RESPUESTA = 'chat:respuestas:{version}:{alcance}:{pregunta}'
+CACHE_KEY_ACIERTOS = 'chat:respuestas:aciertos'
+CACHE_KEY_FALLOS = 'chat:respuestas:fallos'
+
+_advertida = False
+
+
+def _cache():
+    return caches[ALIAS_CACHE]
+
+
+def habilitada() -> bool:
+    """False si la caché `respuestas` es local del proceso (cada worker vería datos distintos)"""
+    global _advertida
+    if not isinstance(_cache(), LocMemCache):
+        return True
+    if not _advertida:
+        logger.warning(
+            'Caché de respuestas desactivada: CACHES[%r] es memoria local del proceso; '
+            'configure RESPUESTAS_CACHE_URL con una caché compartida (base de datos o Redis)', ALIAS_CACHE
+        )
+        _advertida = True
+    return False
+
+
+def version_datos() -> int:
+    """Versión actual de los datos (cantidad de cambios marcados)"""
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM {SECUENCIA_VERSION}')
+        return cursor.fetchone()[0]
+
+
+def incrementar_version_datos():
+    """Invalida todas las respuestas cacheadas (nextval no se revierte ni espera bloqueos)"""
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT nextval(%s)', [SECUENCIA_VERSION])
+
+
+def _incrementar(clave):
+    cache = _cache()
+    try:
+        cache.incr(clave)
+    except ValueError:
+        cache.add(clave, 0, None)
+        cache.incr(clave)
+
+
+def clave(analisis: Dict[str, Any], usuario) -> Optional[str]:
+    """
+    Clave de la respuesta con la versión actual de los datos, o None si la
+    caché está desactivada. Se calcula antes de recuperar el contexto y la
+    misma clave se usa para guardar: si los datos cambian mientras se genera
+    la respuesta, queda bajo la versión anterior y no se sirve como vigente.
+    """
+    if not habilitada():
+        return None
+    # Las entidades van aparte: no están en los tokens
+    pregunta = ' '.join(analisis['tokens']) + '|' + ' '.join(analisis['entidades'])
+    alcance = f"u{usuario.pk}" if analisis['es_personal'] else 'global'
+    return CACHE_KEY_RESPUESTA.format(
+        version=version_datos(),
+        alcance=alcance,
+        pregunta=hashlib.sha1(pregunta.encode()).hexdigest(),
+    )
+
+
+def obtener_respuesta(clave_respuesta: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Respuesta cacheada con esa clave, o None (y se cuenta el acierto o fallo)"""
+    if clave_respuesta is None:
+        return None
+    resultado = _cache().get(clave_respuesta)
+    _incrementar(CACHE_KEY_ACIERTOS if resultado is not None else CACHE_KEY_FALLOS)
+    return resultado
+
+
+def guardar_respuesta(clave_respuesta: Optional[str], resultado: Dict[str, Any]):
+    """Guarda la respuesta bajo la clave tomada antes de generarla (ver `clave`)"""
+    if clave_respuesta is not None:
+        _cache().set(clave_respuesta, resultado, settings.RESPUESTAS_CACHE_TTL)
+
+
+def metricas() -> Dict[str, Any]:
+    valores = _cache().get_many([CACHE_KEY_ACIERTOS, CACHE_KEY_FALLOS])
+    aciertos = valores.get(CACHE_KEY_ACIERTOS, 0)
+    fallos = valores.get(CACHE_KEY_FALLOS, 0)
+    total = aciertos + fallos
+    return {
+        'habilitada': habilitada(),
+        'aciertos': aciertos,
+        'fallos': fallos,
+        'tasa_aciertos': round(aciertos / total, 4) if total else 0.0,
+        'version_datos': version_datos(),
+    }
@@ -0,0 +1,256 @@
+"""
+Cola de generación de respuestas del chat sobre la base de datos.
+
+`enviar_mensaje` guarda el mensaje del usuario y un mensaje del asistente en
+estado `pendiente`; el cliente consulta `api/mensaje/<id>/` hasta que pasa a
+`completado` o `error`. Los workers (`manage.py procesar_cola_chat`) toman los
+trabajos con SELECT ... FOR UPDATE SKIP LOCKED, así que pueden correr varios
+procesos e hilos a la vez.
+
+- Concurrencia global: como máximo CHAT_MAX_LLM_CONCURRENTES trabajos en
+  curso entre todos los workers, usando advisory locks de PostgreSQL como
+  ranuras.
+- Reintentos: los errores transitorios de OpenAI (conexión, timeout, rate
+  limit, 5xx) se reprograman con backoff exponencial hasta
+  CHAT_COLA_MAX_INTENTOS.
+- Sin la cola: `enviar_mensaje_stream` (la respuesta va al navegador a
+  medida que llega) usa `generar_stream`, con la misma ranura global, los
+  reintentos con backoff y el límite de intentos; `enviar_mensaje` con
+  CHAT_USAR_COLA = False espera una ranura (CHAT_ESPERA_RANURA).
+- Trabajos huérfanos: al tomarlo, `procesar_despues` pasa a ser el
+  vencimiento del trabajo (CHAT_COLA_TIMEOUT); si el worker muere, otro lo
+  retoma al vencer. Cada toma cuenta como intento: un trabajo que tumba al
+  worker (memoria, segfault) queda en `error` al agotar CHAT_COLA_MAX_INTENTOS.
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager, contextmanager
+from datetime import timedelta
+
+import openai
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.utils import timezone
+
+from .cronometro import Cronometro
+from . import ranking
+from .models import Mensaje
+from .services import PREFIJO_ERROR, AsistenteIAService
+
+# Espacio de claves para pg_try_advisory_lock(int, int)
+ADVISORY_LOCK_COLA = 4201
+# Segundos entre intentos de tomar una ranura ocupada
+ESPERA_RANURA_INTERVALO = 0.5
+MENSAJE_OCUPADO = (
+    f'{PREFIJO_ERROR} El asistente está atendiendo muchas consultas a la vez. '
+    'Por favor, intenta nuevamente en unos momentos.'
+)
+
+ERRORES_TRANSITORIOS = (
+    openai.APIConnectionError,  # incluye APITimeoutError
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+
+def encolar_respuesta(conversacion, mensaje_usuario, tiempos=None):
+    """
+    Crea el mensaje del asistente pendiente de generar. `tiempos` son las
+    etapas ya medidas en la solicitud; el worker acumula las suyas encima.
+    """
+    return Mensaje.objects.create(
+        conversacion=conversacion,
+        tipo='asistente',
+        contenido='',
+        estado=Mensaje.ESTADO_PENDIENTE,
+        respuesta_a=mensaje_usuario,
+        procesar_despues=timezone.now(),
+        tiempos=tiempos or {},
+    )
+
+
+def tomar_siguiente():
+    """
+    Reserva el siguiente trabajo disponible (pendiente, o en proceso con el
+    plazo vencido) y lo marca `procesando`. Devuelve None si no hay.
+    """
+    ahora = timezone.now()
+    while True:
+        with transaction.atomic():
+            mensaje = (
+                Mensaje.objects
+                .select_for_update(skip_locked=True, of=('self',))
+                .select_related('conversacion__usuario', 'respuesta_a')
+                .filter(
+                    estado__in=[Mensaje.ESTADO_PENDIENTE, Mensaje.ESTADO_PROCESANDO],
+                    procesar_despues__lte=ahora,
+                )
+                .order_by('procesar_despues', 'id')
+                .first()
+            )
+            if mensaje is None:
+                return None
+            if mensaje.intentos >= settings.CHAT_COLA_MAX_INTENTOS:
+                # Huérfano que ya agotó los intentos: no se vuelve a tomar
+                _marcar_error(mensaje, RuntimeError(f'no terminó en {mensaje.intentos} intento(s)'))
+                continue
+            mensaje.estado = Mensaje.ESTADO_PROCESANDO
+            mensaje.intentos += 1
+            mensaje.procesar_despues = ahora + timedelta(seconds=settings.CHAT_COLA_TIMEOUT)
+            mensaje.save(update_fields=['estado', 'intentos', 'procesar_despues'])
+        return mensaje
+
+
+def procesar(mensaje):
+    """Genera la respuesta de un trabajo ya reservado"""
+    from .views import generar_resultado_consulta
+
+    inicio_tiempo = time.time()
+    cronometro = Cronometro(mensaje.tiempos)
+    conversacion = mensaje.conversacion
+    try:
+        # La caché ya se consultó al encolar
+        resultado = generar_resultado_consulta(
+            conversacion.usuario, mensaje.respuesta_a.contenido, conversacion,
+            consultar_cache=False, lanzar_errores=True, antes_de=mensaje.respuesta_a_id,
+            cronometro=cronometro
+        )
+    except ERRORES_TRANSITORIOS as e:
+        if mensaje.intentos < settings.CHAT_COLA_MAX_INTENTOS:
+            espera = settings.CHAT_COLA_REINTENTO_BASE * 2 ** (mensaje.intentos - 1)
+            mensaje.estado = Mensaje.ESTADO_PENDIENTE
+            mensaje.procesar_despues = timezone.now() + timedelta(seconds=espera)
+            mensaje.save(update_fields=['estado', 'procesar_despues'])
+            return mensaje
+        return _marcar_error(mensaje, e)
+    except Exception as e:
+        return _marcar_error(mensaje, e)
+
+    mensaje.contenido = resultado['respuesta']
+    mensaje.estado = Mensaje.ESTADO_COMPLETADO
+    mensaje.procesar_despues = None
+    mensaje.tiempo_respuesta = time.time() - inicio_tiempo
+    mensaje.documentos_consultados = resultado.get('documentos_consultados', [])
+    mensaje.entidades_extraidas = resultado.get('entidades_extraidas', [])
+    mensaje.tokens_usados = resultado.get('tokens_usados')
+    mensaje.tiempos = cronometro.resumen()
+    mensaje.save(update_fields=[
+        'contenido', 'estado', 'procesar_despues', 'tiempo_respuesta',
+        'documentos_consultados', 'entidades_extraidas', 'tokens_usados', 'tiempos',
+    ])
+    ranking.registrar(mensaje, resultado.get('consultas', []))
+
+    # Actualizar fecha de conversación (auto_now)
+    conversacion.save(update_fields=['fecha_actualizacion'])
+    return mensaje
+
+
+def _marcar_error(mensaje, error):
+    mensaje.contenido = AsistenteIAService._mensaje_error(error)
+    mensaje.estado = Mensaje.ESTADO_ERROR
+    mensaje.procesar_despues = None
+    mensaje.save(update_fields=['contenido', 'estado', 'procesar_despues'])
+    return mensaje
+
+
+def _tomar_ranura(conexion):
+    with conexion.cursor() as cursor:
+        for i in range(settings.CHAT_MAX_LLM_CONCURRENTES):
+            cursor.execute('SELECT pg_try_advisory_lock(%s, %s)', [ADVISORY_LOCK_COLA, i])
+            if cursor.fetchone()[0]:
+                return i
+    return None
+
+
+def _liberar_ranura(conexion, ranura):
+    with conexion.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_unlock(%s, %s)', [ADVISORY_LOCK_COLA, ranura])
+
+
+@contextmanager
+def ranura_llm(espera: float = 0):
+    """
+    Ocupa una de las CHAT_MAX_LLM_CONCURRENTES ranuras globales (advisory
+    locks de sesión). Entrega False si siguen todas ocupadas tras `espera` segundos.
+    """
+    limite = time.monotonic() + espera
+    ranura = _tomar_ranura(connection)
+    while ranura is None and time.monotonic() < limite:
+        time.sleep(ESPERA_RANURA_INTERVALO)
+        ranura = _tomar_ranura(connection)
+    try:
+        yield ranura is not None
+    finally:
+        if ranura is not None:
+            _liberar_ranura(connection, ranura)
+
+
+@asynccontextmanager
+async def ranura_llm_async():
+    """
+    ranura_llm para las vistas asíncronas; espera hasta CHAT_ESPERA_RANURA
+    segundos a que se libere una. Usa una conexión propia: los advisory locks
+    son de la sesión y las vistas asíncronas comparten la conexión del hilo de
+    sync_to_async, donde una segunda toma de la misma ranura no fallaría.
+    """
+    conexion = connections.create_connection(DEFAULT_DB_ALIAS)
+    conexion.inc_thread_sharing()  # se usa desde los hilos de sync_to_async
+    en_hilo = lambda funcion: sync_to_async(funcion, thread_sensitive=False)
+    ranura = None
+    try:
+        limite = time.monotonic() + settings.CHAT_ESPERA_RANURA
+        while True:
+            ranura = await en_hilo(_tomar_ranura)(conexion)
+            if ranura is not None or time.monotonic() >= limite:
+                break
+            await asyncio.sleep(ESPERA_RANURA_INTERVALO)
+        yield ranura is not None
+    finally:
+        if ranura is not None:
+            await en_hilo(_liberar_ranura)(conexion, ranura)
+        await en_hilo(conexion.close)()
+
+
+async def generar_stream(servicio_ia, *args, **kwargs):
+    """
+    servicio_ia.generar_respuesta_ia_stream con las reglas de la cola: ocupa
+    una ranura global y reintenta los errores transitorios con backoff hasta
+    CHAT_COLA_MAX_INTENTOS, mientras no se haya enviado ningún fragmento. Los
+    errores llegan como fragmento con PREFIJO_ERROR, igual que sin la cola.
+    """
+    async with ranura_llm_async() as disponible:
+        if not disponible:
+            yield MENSAJE_OCUPADO
+            return
+        intentos = 0
+        while True:
+            intentos += 1
+            enviado = False
+            try:
+                async for fragmento in servicio_ia.generar_respuesta_ia_stream(*args, lanzar_errores=True, **kwargs):
+                    enviado = True
+                    yield fragmento
+                return
+            except ERRORES_TRANSITORIOS as e:
+                if enviado or intentos >= settings.CHAT_COLA_MAX_INTENTOS:
+                    yield AsistenteIAService._mensaje_error(e)
+                    return
+                await asyncio.sleep(settings.CHAT_COLA_REINTENTO_BASE * 2 ** (intentos - 1))
+            except Exception as e:
+                yield AsistenteIAService._mensaje_error(e)
+                return
+
+
+def procesar_siguiente():
+    """
+    Toma y procesa un trabajo si hay una ranura libre.
+    Devuelve el mensaje procesado, o None si no había trabajo o ranura.
+    """
+    with ranura_llm() as disponible:
+        if not disponible:
+            return None
+        mensaje = tomar_siguiente()
+        if mensaje is None:
+            return None
+        return procesar(mensaje)
@@ -0,0 +1,135 @@
+"""
+Formato compacto del contexto que se envía a OpenAI.
+
+Cada tipo de entidad se serializa como una tabla: una cabecera con claves
+cortas y una fila por registro, separadas por `|`:
+
+    casos[id|nro|tipo|estado|inicio|docs|desc]
+    12|CIV-2024-001|Divorcio|ABIERTO|2024-01-01|6|Demanda de divorcio por…
+
+Las filas se deduplican por id, las descripciones se recortan y cada tabla
+tiene un tope de tokens (CHAT_CONTEXTO_MAX_TOKENS_POR_TIPO); las filas que no
+entran se resumen como `+N más`. Así el prompt no crece con la cantidad de
+resultados.
+"""
+from typing import Any, Dict, Iterable, List, Sequence
+
+from django.conf import settings
+
+from .historial import contar_tokens
+
+SEPARADOR = '|'
+# Caracteres de descripciones y palabras clave
+LARGO_TEXTO = 80
+
+CAMPOS_CASO = ('id', 'nro', 'tipo', 'estado', 'inicio', 'docs', 'desc')
+CAMPOS_DOCUMENTO = ('id', 'nombre', 'tipo', 'fecha', 'caso', 'claves')
+CAMPOS_ACTOR = ('id', 'nombre', 'tipo', 'ci', 'extra')
+CAMPOS_ESTADISTICA = ('categoria', 'total', 'detalle')
+
+# Explicación del formato para el mensaje de sistema
+DESCRIPCION_FORMATO = (
+    "Los datos de la base de datos llegan como tablas: una cabecera "
+    "`tabla[campo|campo|...]` y una fila por registro con los valores separados por |. "
+    "'-' indica un valor vacío, '…' un texto recortado y '+N más' registros que no se incluyeron."
+)
+
+
+def _valor(valor: Any) -> str:
+    if valor is None or valor == '':
+        return '-'
+    if hasattr(valor, 'isoformat'):
+        return valor.isoformat()
+    return ' '.join(str(valor).split()).replace(SEPARADOR, '/')
+
+
+def _recortar(texto: str, largo: int = LARGO_TEXTO) -> str:
+    texto = ' '.join((texto or '').split())
+    if len(texto) <= largo:
+        return texto
+    return texto[:largo - 1].rstrip() + '…'
+
+
+def tabla(nombre: str, campos: Sequence[str], filas: Iterable[Sequence[Any]], max_tokens: int = None) -> str:
+    """
+    Serializa las filas bajo la cabecera `nombre[campos]`. Se descartan las
+    filas con un id (primer valor) repetido y las que exceden `max_tokens`.
+    Devuelve '' si no hay filas.
+    """
+    if max_tokens is None:
+        max_tokens = settings.CHAT_CONTEXTO_MAX_TOKENS_POR_TIPO
+
+    cabecera = f"{nombre}[{SEPARADOR.join(campos)}]"
+    lineas = [cabecera]
+    disponibles = max_tokens - contar_tokens(cabecera)
+    vistos = set()
+    omitidas = 0
+    for fila in filas:
+        if fila[0] in vistos:
+            continue
+        vistos.add(fila[0])
+
+        linea = SEPARADOR.join(_valor(valor) for valor in fila)
+        tokens = contar_tokens(linea) + 1  # salto de línea
+        # Las filas vienen ordenadas por relevancia: al llenarse el tope se cortan las demás
+        if omitidas or tokens > disponibles:
+            omitidas += 1
+            continue
+        lineas.append(linea)
+        disponibles -= tokens
+
+    if len(lineas) == 1:
+        return ''
+    if omitidas:
+        lineas.append(f"+{omitidas} más")
+    return '\n'.join(lineas)
+
+
+def _unir(tablas: List[str]) -> str:
+    return '\n\n'.join(t for t in tablas if t) or 'Sin resultados en la base de datos.'
+
+
+def _detalle(**conteos) -> str:
+    return ' '.join(f"{clave}={valor}" for clave, valor in conteos.items())
+
+
+def _filas_estadisticas(stats: Dict[str, Any]) -> List[tuple]:
+    filas = []
+    if 'casos' in stats:
+        casos = stats['casos']
+        filas.append(('casos', casos['total'], _detalle(abiertos=casos['abiertos'], cerrados=casos['cerrados'])))
+    if 'documentos' in stats:
+        documentos = stats['documentos']
+        filas.append(('documentos', documentos['total'], _detalle(con_claves=documentos['con_palabras_clave'])))
+    if 'actores' in stats:
+        actores = stats['actores']
+        filas.append(('actores', actores['total'], _detalle(
+            abogados=actores['abogados'], clientes=actores['clientes'], asistentes=actores['asistentes']
+        )))
+    return filas
+
+
+def serializar_resultados(db_resultados: Dict[str, Any]) -> str:
+    """Contexto compacto a partir del resultado de DatabaseQueryService.consultar_informacion"""
+    tablas = [tabla('estadisticas', CAMPOS_ESTADISTICA, _filas_estadisticas(db_resultados.get('estadisticas') or {}))]
+
+    tablas.append(tabla('casos', CAMPOS_CASO, (
+        (c['id'], c['numero'], c['tipo'], c['estado'], c['fecha_inicio'], c['documentos_count'], _recortar(c['descripcion']))
+        for c in db_resultados.get('casos') or []
+    )))
+    tablas.append(tabla('documentos', CAMPOS_DOCUMENTO, (
+        (d['id'], d['nombre'], d['tipo'], d['fecha'], d['caso'], _recortar(d.get('palabras_clave')))
+        for d in db_resultados.get('documentos') or []
+    )))
+    tablas.append(tabla('actores', CAMPOS_ACTOR, (
+        (
+            a['id'],
+            ' '.join(filter(None, [a['nombres'], a['apellido_paterno'], a['apellido_materno']])),
+            a['tipo'],
+            a['ci'],
+            ';'.join(f"{clave}={valor}" for clave, valor in (a['info_adicional'] or {}).items() if valor),
+        )
+        for a in db_resultados.get('actores') or []
+    )))
+    return _unir(tablas)
+
@@ -0,0 +1,39 @@
+"""
+Medición por etapas del procesamiento de un mensaje del chat.
+
+Las duraciones (en segundos) se guardan en `Mensaje.tiempos`:
+
+- analisis: análisis de la consulta (query_analyzer)
+- recuperacion: caché de respuestas, búsqueda en la base de datos y carga
+  del historial de la conversación
+- llm: armado del prompt y llamada a OpenAI
+- persistencia: escrituras previas a guardar la respuesta (el mensaje del
+  usuario); el INSERT/UPDATE de la propia respuesta no se incluye
+
+En la cola (chat/cola.py) las etapas medidas al encolar se guardan en el
+mensaje pendiente y el worker sigue acumulando sobre ellas, así que ambos
+caminos registran las mismas etapas.
+"""
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+ETAPAS = ('analisis', 'recuperacion', 'llm', 'persistencia')
+
+
+class Cronometro:
+    """Acumula la duración de cada etapa"""
+
+    def __init__(self, tiempos: Dict[str, float] = None):
+        self.tiempos: Dict[str, float] = dict(tiempos or {})
+
+    @contextmanager
+    def etapa(self, nombre: str):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.tiempos[nombre] = self.tiempos.get(nombre, 0.0) + time.perf_counter() - inicio
+
+    def resumen(self) -> Dict[str, float]:
+        return {nombre: round(self.tiempos[nombre], 4) for nombre in ETAPAS if nombre in self.tiempos}
@@ -1,13 +1,20 @@
 """
 Servicio especializado para consultas inteligentes a la base de datos
 """
+import logging
+
+from django.core.exceptions import ObjectDoesNotExist
 from django.db.models import Q, Count
-from casos.models import Caso, Expediente, Carpeta
+from casos.models import Caso, Expediente, Carpeta, EquipoCaso, ParteProcesal
 from documentos.models import Documento, TipoDocumento, EtapaProcesal
 from actores.models import Actor, Abogado, Cliente, Asistente
 from seguridad.models import Usuario, Rol, Permiso
 from typing import List, Dict, Any
-import re
+from dashboard.models import Estadistica
+from . import ranking
+from .query_analyzer import analizar_consulta, menciona
+
+logger = logging.getLogger(__name__)
 
 class DatabaseQueryService:
     """
@@ -17,11 +24,13 @@ class DatabaseQueryService:
     def __init__(self):
         pass
     
-    def consultar_informacion(self, consulta: str, usuario=None) -> Dict[str, Any]:
+    def consultar_informacion(self, consulta: str, usuario=None, analisis: Dict[str, Any] = None) -> Dict[str, Any]:
         """
-        Consulta inteligente que analiza la pregunta y busca información específica
+        Consulta inteligente que analiza la pregunta y busca información específica.
+        Si se recibe el `analisis` ya calculado (ver query_analyzer) no se vuelve a analizar.
         """
-        consulta_lower = consulta.lower()
+        if analisis is None:
+            analisis = analizar_consulta(consulta)
         resultados = {
             'casos': [],
             'documentos': [],
@@ -31,25 +40,25 @@ class DatabaseQueryService:
         }
         
         # Análisis de la consulta para determinar qué buscar
-        if self._es_consulta_personal(consulta_lower):
-            resultados.update(self._buscar_informacion_personal(consulta_lower, usuario))
+        if analisis['es_personal']:
+            resultados.update(self._buscar_informacion_personal(analisis, usuario))
         
-        elif self._es_consulta_estadistica(consulta_lower):
-            resultados['estadisticas'] = self._obtener_estadisticas(consulta_lower)
-            resultados['respuesta_directa'] = self._generar_respuesta_estadistica(resultados['estadisticas'], consulta_lower)
+        elif analisis['es_estadistica']:
+            resultados['estadisticas'] = self._obtener_estadisticas(analisis)
+            resultados['respuesta_directa'] = self._generar_respuesta_estadistica(resultados['estadisticas'], analisis)
         
-        elif self._es_consulta_especifica(consulta_lower):
-            resultados.update(self._buscar_informacion_especifica(consulta_lower))
+        elif analisis['es_especifica']:
+            resultados.update(self._buscar_informacion_especifica(analisis))
         
         else:
             # Búsqueda general
-            resultados['casos'] = self._buscar_casos_general(consulta_lower)
-            resultados['documentos'] = self._buscar_documentos_general(consulta_lower)
-            resultados['actores'] = self._buscar_actores_general(consulta_lower)
+            resultados['casos'] = self._buscar_casos_general(analisis)
+            resultados['documentos'] = self._buscar_documentos_general(analisis)
+            resultados['actores'] = self._buscar_actores_general(analisis)
         
         return resultados
     
-    def _buscar_informacion_personal(self, consulta: str, usuario) -> Dict[str, Any]:
+    def _buscar_informacion_personal(self, analisis: Dict[str, Any], usuario) -> Dict[str, Any]:
         """Busca información personal del usuario"""
         resultados = {
             'casos': [],
@@ -63,8 +72,8 @@ class DatabaseQueryService:
             return resultados
         
         # Buscar documentos creados por el usuario
-        if any(palabra in consulta for palabra in ['documento', 'documentos', 'creado', 'creados']):
-            documentos = self._buscar_documentos_personales(usuario, consulta)
+        if menciona(analisis, 'documento', 'creado'):
+            documentos = self._buscar_documentos_personales(usuario, analisis)
             resultados['documentos'] = documentos
             if documentos:
                 resultados['respuesta_directa'] = self._formatear_documentos_personales(documentos, usuario)
@@ -72,8 +81,8 @@ class DatabaseQueryService:
                 resultados['respuesta_directa'] = f"📄 No se encontraron documentos creados por {usuario.username}."
         
         # Buscar casos asignados al usuario
-        elif any(palabra in consulta for palabra in ['caso', 'casos', 'asignado', 'asignados']):
-            casos = self._buscar_casos_personales(usuario, consulta)
+        elif menciona(analisis, 'caso', 'asignado'):
+            casos = self._buscar_casos_personales(usuario, analisis)
             resultados['casos'] = casos
             if casos:
                 resultados['respuesta_directa'] = self._formatear_casos_personales(casos, usuario)
@@ -81,7 +90,7 @@ class DatabaseQueryService:
                 resultados['respuesta_directa'] = f"📁 No se encontraron casos asignados a {usuario.username}."
         
         # Buscar información del actor asociado al usuario
-        elif any(palabra in consulta for palabra in ['actor', 'perfil', 'información', 'datos']):
+        elif menciona(analisis, 'actor', 'perfil', 'informacion', 'dato'):
             actor_info = self._buscar_informacion_actor_usuario(usuario)
             if actor_info:
                 resultados['respuesta_directa'] = self._formatear_informacion_actor(actor_info, usuario)
@@ -90,8 +99,8 @@ class DatabaseQueryService:
         
         else:
             # Búsqueda general personal
-            documentos = self._buscar_documentos_personales(usuario, consulta)
-            casos = self._buscar_casos_personales(usuario, consulta)
+            documentos = self._buscar_documentos_personales(usuario, analisis)
+            casos = self._buscar_casos_personales(usuario, analisis)
             actor_info = self._buscar_informacion_actor_usuario(usuario)
             
             resultados['documentos'] = documentos
@@ -112,80 +121,60 @@ class DatabaseQueryService:
         
         return resultados
     
-    def _es_consulta_personal(self, consulta: str) -> bool:
-        """Determina si la consulta es personal del usuario"""
-        palabras_personales = [
-            'mis', 'mi', 'he creado', 'he hecho', 'he enviado', 'he recibido',
-            'me han asignado', 'me han dado', 'tengo', 'soy', 'estoy',
-            'mi caso', 'mis casos', 'mi documento', 'mis documentos',
-            'mi cliente', 'mis clientes', 'mi abogado', 'mis abogados',
-            'asignado a mí', 'relacionado conmigo', 'que me pertenece'
-        ]
-        return any(palabra in consulta for palabra in palabras_personales)
-    
-    def _es_consulta_estadistica(self, consulta: str) -> bool:
-        """Determina si la consulta es sobre estadísticas"""
-        palabras_estadisticas = [
-            'cuántos', 'cuanto', 'cantidad', 'total', 'número', 'numero',
-            'cuántas', 'cuanta', 'estadística', 'estadistica', 'resumen',
-            'listar', 'mostrar todos', 'todos los', 'todos las'
-        ]
-        return any(palabra in consulta for palabra in palabras_estadisticas)
-    
-    def _es_consulta_especifica(self, consulta: str) -> bool:
-        """Determina si la consulta es sobre información específica"""
-        palabras_especificas = [
-            'cuál', 'cual', 'qué', 'que', 'dónde', 'donde', 'cuando',
-            'especialidad', 'tipo', 'estado', 'fecha', 'nombre'
-        ]
-        return any(palabra in consulta for palabra in palabras_especificas)
-    
-    def _obtener_estadisticas(self, consulta: str) -> Dict[str, Any]:
-        """Obtiene estadísticas de la base de datos"""
+    def _obtener_estadisticas(self, analisis: Dict[str, Any]) -> Dict[str, Any]:
+        """Obtiene estadísticas de la vista materializada (una sola consulta)"""
         stats = {}
+        resumen = Estadistica.objects.resumen()
+        
+        def por_clave(categoria, campo):
+            conteos = sorted(resumen.get(categoria, {}).items(), key=lambda item: -item[1])
+            return [{campo: clave, 'count': total} for clave, total in conteos]
+        
+        def total(categoria, clave=''):
+            return resumen.get(categoria, {}).get(clave, 0)
         
         # Estadísticas de casos
-        if any(palabra in consulta for palabra in ['caso', 'casos']):
+        if menciona(analisis, 'caso'):
             stats['casos'] = {
-                'total': Caso.objects.count(),
-                'por_tipo': list(Caso.objects.values('tipoCaso').annotate(count=Count('id'))),
-                'por_estado': list(Caso.objects.values('estado').annotate(count=Count('id'))),
-                'abiertos': Caso.objects.filter(estado='ABIERTO').count(),
-                'cerrados': Caso.objects.filter(estado='CERRADO').count()
+                'total': total('casos'),
+                'por_tipo': por_clave('casos_tipo', 'tipoCaso'),
+                'por_estado': por_clave('casos_estado', 'estado'),
+                'abiertos': total('casos_estado', 'ABIERTO'),
+                'cerrados': total('casos_estado', 'CERRADO')
             }
         
         # Estadísticas de documentos
-        if any(palabra in consulta for palabra in ['documento', 'documentos']):
+        if menciona(analisis, 'documento'):
             stats['documentos'] = {
-                'total': Documento.objects.count(),
-                'por_tipo': list(Documento.objects.values('tipoDocumento__nombre').annotate(count=Count('id'))),
-                'con_palabras_clave': Documento.objects.exclude(palabraClave='').count(),
-                'sin_palabras_clave': Documento.objects.filter(palabraClave='').count()
+                'total': total('documentos'),
+                'por_tipo': por_clave('documentos_tipo', 'tipoDocumento__nombre'),
+                'con_palabras_clave': total('documentos_palabras_clave', 'con'),
+                'sin_palabras_clave': total('documentos_palabras_clave', 'sin')
             }
         
         # Estadísticas de actores
-        if any(palabra in consulta for palabra in ['actor', 'actores', 'abogado', 'cliente', 'asistente']):
+        if menciona(analisis, 'actor', 'abogado', 'cliente', 'asistente'):
             stats['actores'] = {
-                'total': Actor.objects.count(),
-                'abogados': Abogado.objects.count(),
-                'clientes': Cliente.objects.count(),
-                'asistentes': Asistente.objects.count(),
-                'por_especialidad': list(Abogado.objects.values('especialidad').annotate(count=Count('actor_id'))),
-                'por_tipo_cliente': list(Cliente.objects.values('tipoCliente').annotate(count=Count('actor_id')))
+                'total': total('actores'),
+                'abogados': total('actores_subtipo', 'abogados'),
+                'clientes': total('actores_subtipo', 'clientes'),
+                'asistentes': total('actores_subtipo', 'asistentes'),
+                'por_especialidad': por_clave('abogados_especialidad', 'especialidad'),
+                'por_tipo_cliente': por_clave('clientes_tipo', 'tipoCliente')
             }
         
         # Estadísticas de usuarios
-        if any(palabra in consulta for palabra in ['usuario', 'usuarios', 'rol', 'roles']):
+        if menciona(analisis, 'usuario', 'rol'):
             stats['usuarios'] = {
-                'total': Usuario.objects.count(),
-                'activos': Usuario.objects.filter(is_active=True).count(),
-                'inactivos': Usuario.objects.filter(is_active=False).count(),
-                'por_rol': list(Usuario.objects.values('groups__name').annotate(count=Count('username')))
+                'total': total('usuarios'),
+                'activos': total('usuarios_activo', 'activos'),
+                'inactivos': total('usuarios_activo', 'inactivos'),
+                'por_rol': por_clave('usuarios_rol', 'rol')
             }
         
         return stats
     
-    def _generar_respuesta_estadistica(self, stats: Dict, consulta: str) -> str:
+    def _generar_respuesta_estadistica(self, stats: Dict, analisis: Dict[str, Any]) -> str:
         """Genera una respuesta basada en las estadísticas"""
         respuesta = []
         
@@ -235,7 +224,7 @@ class DatabaseQueryService:
         
         return "\n".join(respuesta) if respuesta else "No se encontraron estadísticas relevantes."
     
-    def _buscar_informacion_especifica(self, consulta: str) -> Dict[str, Any]:
+    def _buscar_informacion_especifica(self, analisis: Dict[str, Any]) -> Dict[str, Any]:
         """Busca información específica basada en la consulta"""
         resultados = {
             'casos': [],
@@ -245,125 +234,112 @@ class DatabaseQueryService:
         }
         
         # Buscar casos específicos
-        if 'caso' in consulta:
-            casos = self._buscar_casos_especificos(consulta)
+        if menciona(analisis, 'caso') or analisis['numeros_caso']:
+            casos = self._buscar_casos_especificos(analisis)
             resultados['casos'] = casos
             if casos:
                 resultados['respuesta_directa'] = self._formatear_casos(casos)
         
         # Buscar documentos específicos
-        if 'documento' in consulta:
-            documentos = self._buscar_documentos_especificos(consulta)
+        if menciona(analisis, 'documento'):
+            documentos = self._buscar_documentos_especificos(analisis)
             resultados['documentos'] = documentos
             if documentos and not resultados['respuesta_directa']:
                 resultados['respuesta_directa'] = self._formatear_documentos(documentos)
         
         # Buscar actores específicos
-        if any(palabra in consulta for palabra in ['abogado', 'cliente', 'asistente', 'actor']):
-            actores = self._buscar_actores_especificos(consulta)
+        if menciona(analisis, 'abogado', 'cliente', 'asistente', 'actor'):
+            actores = self._buscar_actores_especificos(analisis)
             resultados['actores'] = actores
             if actores and not resultados['respuesta_directa']:
                 resultados['respuesta_directa'] = self._formatear_actores(actores)
         
         return resultados
     
-    def _buscar_casos_especificos(self, consulta: str) -> List[Dict]:
-        """Busca casos específicos"""
-        casos = []
-        
-        # Si la consulta es sobre casos abiertos específicamente
-        if 'abiertos' in consulta.lower() or 'abierto' in consulta.lower():
-            casos_db = Caso.objects.filter(estado='ABIERTO').order_by('-fechaInicio')
-        # Si la consulta es sobre casos cerrados específicamente
-        elif 'cerrados' in consulta.lower() or 'cerrado' in consulta.lower():
-            casos_db = Caso.objects.filter(estado='CERRADO').order_by('-fechaInicio')
-        # Buscar por número de caso específico
-        elif re.search(r'[a-z]+-\d{4}-\d+', consulta.lower()):
-            numero_match = re.search(r'[a-z]+-\d{4}-\d+', consulta.lower())
-            numero = numero_match.group()
-            casos_db = Caso.objects.filter(nroCaso__icontains=numero)
-        # Búsqueda por tipo de caso
-        elif any(tipo in consulta.lower() for tipo in ['divorcio', 'robo', 'despido', 'sociedad', 'incumplimiento', 'pensión', 'horas', 'sucesión', 'daños', 'amparo']):
-            # Mapear tipos de consulta a tipos reales
-            tipo_mapping = {
-                'divorcio': 'Divorcio',
-                'robo': 'Robo',
-                'despido': 'Despido Injustificado',
-                'sociedad': 'Sociedad Comercial',
-                'incumplimiento': 'Incumplimiento Contractual',
-                'pensión': 'Pensión Alimenticia',
-                'horas': 'Horas Extras',
-                'sucesión': 'Sucesión',
-                'daños': 'Daños y Perjuicios',
-                'amparo': 'Recurso de Amparo'
-            }
-            
-            casos_db = []
-            for palabra, tipo_real in tipo_mapping.items():
-                if palabra in consulta.lower():
-                    casos_db = Caso.objects.filter(tipoCaso__icontains=tipo_real)
-                    break
+    def _buscar_casos_especificos(self, analisis: Dict[str, Any]) -> List[Dict]:
+        """Busca casos específicos con filtros indexados construidos desde el análisis"""
+        casos_db = self._anotar_documentos_count(Caso.objects.all())
+        
+        # Número de caso exacto (índice único de nroCaso)
+        if analisis['numeros_caso']:
+            casos_db = casos_db.filter(nroCaso__in=analisis['numeros_caso'])
         else:
-            # Búsqueda general limitada
-            casos_db = Caso.objects.all().order_by('-fechaInicio')[:10]
-        
-        for caso in casos_db:
-            # Contar documentos del caso
-            documentos_count = 0
-            expedientes = Expediente.objects.filter(caso=caso)
-            for expediente in expedientes:
-                carpetas = Carpeta.objects.filter(expediente=expediente)
-                for carpeta in carpetas:
-                    documentos_count += Documento.objects.filter(carpeta=carpeta).count()
+            filtrado = False
+            # Casos abiertos o cerrados
+            if analisis['estado_caso']:
+                casos_db = casos_db.filter(estado=analisis['estado_caso'])
+                filtrado = True
+            # Tipo de caso (divorcio, robo, despido...)
+            if analisis['tipos_caso']:
+                casos_db = casos_db.filter(tipoCaso__in=analisis['tipos_caso'])
+                filtrado = True
+            if analisis['fechas']:
+                casos_db = casos_db.filter(fechaInicio__in=analisis['fechas'])
+                filtrado = True
             
-            casos.append({
-                'id': caso.id,
-                'numero': caso.nroCaso,
-                'tipo': caso.tipoCaso,
-                'estado': caso.estado,
-                'fecha_inicio': caso.fechaInicio,
-                'descripcion': caso.descripcion,
-                'documentos_count': documentos_count
-            })
-        
-        return casos
+            if not filtrado and analisis['terminos']:
+                # Texto libre: ranking híbrido (texto completo, embeddings y fecha)
+                return [
+                    self._con_relevancia(self._caso_a_dict(caso), relevancia, posiciones)
+                    for caso, relevancia, posiciones in ranking.rankear(
+                        'caso', ' '.join(analisis['terminos']), queryset=casos_db
+                    )
+                ]
+            casos_db = casos_db.order_by('-fechaInicio')
+        
+        casos_db = casos_db[:10]
+        
+        return [self._caso_a_dict(caso) for caso in casos_db]
     
-    def _buscar_documentos_especificos(self, consulta: str) -> List[Dict]:
-        """Busca documentos específicos"""
-        documentos = []
-        
-        docs_db = Documento.objects.filter(
-            Q(nombreDocumento__icontains=consulta) |
-            Q(palabraClave__icontains=consulta)
-        ).select_related('tipoDocumento', 'carpeta__expediente__caso')[:5]
-        
-        for doc in docs_db:
-            caso_info = None
-            if doc.carpeta and doc.carpeta.expediente:
-                caso_info = doc.carpeta.expediente.caso.nroCaso
-            
-            documentos.append({
-                'id': doc.id,
-                'nombre': doc.nombreDocumento,
-                'tipo': doc.tipoDocumento.nombre,
-                'fecha': doc.fechaDoc,
-                'palabras_clave': doc.palabraClave,
-                'caso': caso_info
-            })
-        
-        return documentos
+    def _buscar_documentos_especificos(self, analisis: Dict[str, Any]) -> List[Dict]:
+        """Busca documentos específicos con filtros indexados construidos desde el análisis"""
+        docs_db = Documento.objects.select_related('tipoDocumento', 'carpeta__expediente__caso')
+        filtro = Q()
+        if analisis['numeros_caso']:
+            filtro &= Q(carpeta__expediente__caso__nroCaso__in=analisis['numeros_caso'])
+        if analisis['fechas']:
+            filtro &= Q(fechaDoc__in=analisis['fechas'])
+        
+        if analisis['terminos']:
+            # Nombre y palabras clave: ranking híbrido (texto completo, trigramas, embeddings y fecha)
+            return [
+                self._con_relevancia(self._documento_a_dict(doc), relevancia, posiciones)
+                for doc, relevancia, posiciones in ranking.rankear(
+                    'documento', ' '.join(analisis['terminos']), queryset=docs_db, filtro=filtro
+                )
+            ]
+        if analisis['tipos_documento']:
+            filtro &= Q(tipoDocumento__nombre__in=analisis['tipos_documento'])
+        elif not filtro:
+            return []
+        
+        docs_db = docs_db.filter(filtro).order_by('-fechaDoc', '-id')[:5]
+        
+        return [self._documento_a_dict(doc) for doc in docs_db]
     
-    def _buscar_actores_especificos(self, consulta: str) -> List[Dict]:
-        """Busca actores específicos"""
+    def _buscar_actores_especificos(self, analisis: Dict[str, Any]) -> List[Dict]:
+        """Busca actores específicos con filtros indexados construidos desde el análisis"""
         actores = []
         
-        # Buscar por nombre
-        actores_db = Actor.objects.filter(
-            Q(nombres__icontains=consulta) |
-            Q(apellidoPaterno__icontains=consulta) |
-            Q(apellidoMaterno__icontains=consulta) |
-            Q(ci__icontains=consulta)
-        )[:5]
+        actores_base = Actor.objects.all()
+        if analisis['tipos_actor']:
+            actores_base = actores_base.filter(tipoActor__in=analisis['tipos_actor'])
+        
+        if analisis['cis']:
+            # CI exacto (índice único)
+            actores_db = actores_base.filter(ci__in=analisis['cis'])[:5]
+        elif analisis['terminos']:
+            # Buscar por nombre (texto completo, o difusa si no hay coincidencias)
+            texto = ' '.join(analisis['terminos'])
+            actores_db = list(actores_base.buscar(texto)[:5])
+            if not actores_db:
+                actores_db = actores_base.buscar_similar(texto)[:5]
+        elif analisis['tipos_actor']:
+            if menciona(analisis, 'activo'):
+                actores_base = actores_base.filter(estadoActor='ACTIVO')
+            actores_db = actores_base.order_by('apellidoPaterno', 'nombres')[:5]
+        else:
+            actores_db = []
         
         for actor in actores_db:
             info_adicional = {}
@@ -374,26 +350,26 @@ class DatabaseQueryService:
                     abogado = actor.abogado
                     info_adicional = {
                         'especialidad': abogado.especialidad,
-                        'numero_colegiado': abogado.numeroColegiado
+                        'numero_colegiado': abogado.nroCredencial
                     }
-                except:
-                    pass
+                except ObjectDoesNotExist:
+                    logger.warning('Actor %s sin registro de %s', actor.id, actor.get_tipoActor_display())
             elif actor.tipoActor == 'CLI':
                 try:
                     cliente = actor.cliente
                     info_adicional = {
                         'tipo_cliente': cliente.tipoCliente
                     }
-                except:
-                    pass
+                except ObjectDoesNotExist:
+                    logger.warning('Actor %s sin registro de %s', actor.id, actor.get_tipoActor_display())
             elif actor.tipoActor == 'ASI':
                 try:
                     asistente = actor.asistente
                     info_adicional = {
                         'area': asistente.area
                     }
-                except:
-                    pass
+                except ObjectDoesNotExist:
+                    logger.warning('Actor %s sin registro de %s', actor.id, actor.get_tipoActor_display())
             
             actores.append({
                 'id': actor.id,
@@ -407,17 +383,17 @@ class DatabaseQueryService:
         
         return actores
     
-    def _buscar_casos_general(self, consulta: str) -> List[Dict]:
+    def _buscar_casos_general(self, analisis: Dict[str, Any]) -> List[Dict]:
         """Búsqueda general de casos"""
-        return self._buscar_casos_especificos(consulta)
+        return self._buscar_casos_especificos(analisis)
     
-    def _buscar_documentos_general(self, consulta: str) -> List[Dict]:
+    def _buscar_documentos_general(self, analisis: Dict[str, Any]) -> List[Dict]:
         """Búsqueda general de documentos"""
-        return self._buscar_documentos_especificos(consulta)
+        return self._buscar_documentos_especificos(analisis)
     
-    def _buscar_actores_general(self, consulta: str) -> List[Dict]:
+    def _buscar_actores_general(self, analisis: Dict[str, Any]) -> List[Dict]:
         """Búsqueda general de actores"""
-        return self._buscar_actores_especificos(consulta)
+        return self._buscar_actores_especificos(analisis)
     
     def _formatear_casos(self, casos: List[Dict]) -> str:
         """Formatea la información de casos para la respuesta"""
@@ -480,101 +456,84 @@ class DatabaseQueryService:
         
         return "\n".join(respuesta)
     
-    def _buscar_documentos_personales(self, usuario, consulta: str) -> List[Dict]:
-        """Busca documentos relacionados con el usuario"""
-        documentos = []
-        
-        # Buscar por usuario creador (si existe el campo)
-        # Como no tenemos un campo de usuario creador directo, buscaremos por actor asociado
-        try:
-            actor_usuario = usuario.actor
-            if actor_usuario:
-                # Buscar documentos en casos donde el actor está involucrado
-                casos_actor = Caso.objects.filter(
-                    Q(expedientes__carpetas__documentos__isnull=False)
-                ).distinct()
-                
-                for caso in casos_actor:
-                    expedientes = Expediente.objects.filter(caso=caso)
-                    for expediente in expedientes:
-                        carpetas = Carpeta.objects.filter(expediente=expediente)
-                        for carpeta in carpetas:
-                            documentos = Documento.objects.filter(carpeta=carpeta)
-                            for doc in documentos:
-                                documentos.append({
-                                    'id': doc.id,
-                                    'nombre': doc.nombreDocumento,
-                                    'tipo': doc.tipoDocumento.nombre,
-                                    'fecha': doc.fechaDoc,
-                                    'caso': caso.nroCaso,
-                                    'palabras_clave': doc.palabraClave
-                                })
-        except:
-            # Si no hay actor asociado, buscar documentos recientes
-            docs_recientes = Documento.objects.all().order_by('-fechaDoc')[:5]
-            for doc in docs_recientes:
-                documentos.append({
-                    'id': doc.id,
-                    'nombre': doc.nombreDocumento,
-                    'tipo': doc.tipoDocumento.nombre,
-                    'fecha': doc.fechaDoc,
-                    'caso': doc.carpeta.expediente.caso.nroCaso if doc.carpeta and doc.carpeta.expediente else None,
-                    'palabras_clave': doc.palabraClave
-                })
-        
-        return documentos[:10]  # Limitar a 10 documentos
+    def _casos_del_usuario(self, usuario):
+        """
+        Subconsulta con los ids de los casos del usuario: en los que su actor
+        integra el equipo (EquipoCaso sin fecha de salida) o es parte procesal
+        como cliente (ParteProcesal). Cada rama recorre el índice compuesto
+        que empieza por el actor, así que el costo depende de las asignaciones
+        del usuario y no del total de casos.
+        """
+        equipo = EquipoCaso.objects.filter(actor__usuario=usuario, fechaSalida__isnull=True).values('caso_id')
+        partes = ParteProcesal.objects.filter(cliente__actor__usuario=usuario).values('caso_id')
+        return equipo.union(partes)
+    
+    def _buscar_documentos_personales(self, usuario, analisis: Dict[str, Any], limite: int = 10) -> List[Dict]:
+        """Documentos más recientes de los casos del usuario (una sola consulta)"""
+        documentos_db = Documento.objects.filter(
+            carpeta__expediente__caso__in=self._casos_del_usuario(usuario)
+        ).select_related('tipoDocumento', 'carpeta__expediente__caso').order_by('-fechaDoc', '-id')[:limite]
+        
+        return [
+            {
+                'id': doc.id,
+                'nombre': doc.nombreDocumento,
+                'tipo': doc.tipoDocumento.nombre,
+                'fecha': doc.fechaDoc,
+                'caso': doc.carpeta.expediente.caso.nroCaso,
+                'palabras_clave': doc.palabraClave
+            }
+            for doc in documentos_db
+        ]
     
-    def _buscar_casos_personales(self, usuario, consulta: str) -> List[Dict]:
-        """Busca casos relacionados con el usuario"""
-        casos = []
+    def _buscar_casos_personales(self, usuario, analisis: Dict[str, Any], limite: int = 10) -> List[Dict]:
+        """Casos del usuario, los más recientes primero (una sola consulta)"""
+        casos_db = self._anotar_documentos_count(
+            Caso.objects.filter(id__in=self._casos_del_usuario(usuario))
+        ).order_by('-fechaInicio', '-id')[:limite]
         
-        try:
-            actor_usuario = usuario.actor
-            if actor_usuario:
-                # Buscar casos donde el actor está involucrado
-                casos_db = Caso.objects.filter(
-                    Q(expedientes__carpetas__documentos__isnull=False)
-                ).distinct()
-                
-                for caso in casos_db:
-                    documentos_count = 0
-                    expedientes = Expediente.objects.filter(caso=caso)
-                    for expediente in expedientes:
-                        carpetas = Carpeta.objects.filter(expediente=expediente)
-                        for carpeta in carpetas:
-                            documentos_count += Documento.objects.filter(carpeta=carpeta).count()
-                    
-                    casos.append({
-                        'id': caso.id,
-                        'numero': caso.nroCaso,
-                        'tipo': caso.tipoCaso,
-                        'estado': caso.estado,
-                        'fecha_inicio': caso.fechaInicio,
-                        'descripcion': caso.descripcion,
-                        'documentos_count': documentos_count
-                    })
-        except:
-            # Si no hay actor asociado, buscar casos recientes
-            casos_recientes = Caso.objects.all().order_by('-fechaInicio')[:5]
-            for caso in casos_recientes:
-                documentos_count = 0
-                expedientes = Expediente.objects.filter(caso=caso)
-                for expediente in expedientes:
-                    carpetas = Carpeta.objects.filter(expediente=expediente)
-                    for carpeta in carpetas:
-                        documentos_count += Documento.objects.filter(carpeta=carpeta).count()
-                
-                casos.append({
-                    'id': caso.id,
-                    'numero': caso.nroCaso,
-                    'tipo': caso.tipoCaso,
-                    'estado': caso.estado,
-                    'fecha_inicio': caso.fechaInicio,
-                    'descripcion': caso.descripcion,
-                    'documentos_count': documentos_count
-                })
-        
-        return casos[:10]  # Limitar a 10 casos
+        return [self._caso_a_dict(caso) for caso in casos_db]
+    
+    def _anotar_documentos_count(self, casos_qs):
+        """
+        Anota `documentos_count` (Caso → Expediente → Carpeta → Documento) en una
+        sola consulta agregada, en lugar de un COUNT por carpeta.
+        """
+        return casos_qs.annotate(documentos_count=Count('expediente__carpetas__documentos'))
+    
+    def _caso_a_dict(self, caso) -> Dict:
+        """Convierte un caso anotado con `documentos_count` al formato de respuesta"""
+        return {
+            'id': caso.id,
+            'numero': caso.nroCaso,
+            'tipo': caso.tipoCaso,
+            'estado': caso.estado,
+            'fecha_inicio': caso.fechaInicio,
+            'descripcion': caso.descripcion,
+            'documentos_count': caso.documentos_count
+        }
+    
+    def _documento_a_dict(self, doc) -> Dict:
+        """Convierte un documento (con tipo y carpeta → expediente → caso) al formato de respuesta"""
+        caso_info = None
+        if doc.carpeta and doc.carpeta.expediente:
+            caso_info = doc.carpeta.expediente.caso.nroCaso
+        
+        return {
+            'id': doc.id,
+            'nombre': doc.nombreDocumento,
+            'tipo': doc.tipoDocumento.nombre,
+            'fecha': doc.fechaDoc,
+            'palabras_clave': doc.palabraClave,
+            'caso': caso_info
+        }
+    
+    @staticmethod
+    def _con_relevancia(item: Dict, relevancia: float, posiciones: Dict[str, int]) -> Dict:
+        """Agrega la relevancia del ranking híbrido y la posición en cada fuente"""
+        item['relevancia'] = round(relevancia, 4)
+        item['posiciones'] = posiciones
+        return item
     
     def _buscar_informacion_actor_usuario(self, usuario) -> Dict:
         """Busca información del actor asociado al usuario"""
@@ -591,27 +550,27 @@ class DatabaseQueryService:
                     abogado = actor.abogado
                     info_adicional = {
                         'especialidad': abogado.especialidad,
-                        'numero_colegiado': abogado.numeroColegiado,
+                        'numero_colegiado': abogado.nroCredencial,
                         'estado_licencia': abogado.estadoLicencia
                     }
-                except:
-                    pass
+                except ObjectDoesNotExist:
+                    logger.warning('Actor %s sin registro de %s', actor.id, actor.get_tipoActor_display())
             elif actor.tipoActor == 'CLI':
                 try:
                     cliente = actor.cliente
                     info_adicional = {
                         'tipo_cliente': cliente.tipoCliente
                     }
-                except:
-                    pass
+                except ObjectDoesNotExist:
+                    logger.warning('Actor %s sin registro de %s', actor.id, actor.get_tipoActor_display())
             elif actor.tipoActor == 'ASI':
                 try:
                     asistente = actor.asistente
                     info_adicional = {
                         'area': asistente.area
                     }
-                except:
-                    pass
+                except ObjectDoesNotExist:
+                    logger.warning('Actor %s sin registro de %s', actor.id, actor.get_tipoActor_display())
             
             return {
                 'id': actor.id,
@@ -621,10 +580,11 @@ class DatabaseQueryService:
                 'ci': actor.ci,
                 'tipo': actor.get_tipoActor_display(),
                 'telefono': actor.telefono,
-                'email': actor.email,
+                'email': usuario.email,
                 'info_adicional': info_adicional
             }
-        except:
+        except ObjectDoesNotExist:
+            # Usuario sin actor (p. ej. administradores)
             return None
     
     def _formatear_documentos_personales(self, documentos: List[Dict], usuario) -> str:
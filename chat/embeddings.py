@@ -0,0 +1,381 @@
+"""
+Búsqueda semántica de documentos y casos con embeddings.
+
+Cada Documento (nombre, palabras clave, tipo y etapa) y cada Caso (tipo y
+descripción) se convierte en un vector con el embedder configurado en
+CHAT_EMBEDDINGS_BACKEND y se guarda en `Embedding` como float32. Para buscar,
+cada proceso mantiene en memoria una matriz NumPy por tipo con los vectores
+normalizados: la similitud coseno es un producto matriz-vector y el top-K se
+obtiene con argpartition, sin ordenar todo el índice.
+
+- Carga inicial y cambios masivos: `manage.py indexar_embeddings` (por lotes;
+  solo recalcula los textos que cambiaron, según la huella).
+- Incremental: al guardar o borrar un documento o caso (chat/signals.py).
+- Cada escritura agrega a CambioEmbedding los objetos que cambiaron. Antes de
+  buscar, cada proceso lee los cambios con id mayor al último que aplicó (a lo
+  sumo cada CHAT_EMBEDDINGS_INTERVALO_CAMBIOS segundos) y pone o quita solo
+  esas filas de su matriz; la tabla Embedding se carga
+  entera solo la primera vez, al cambiar de embedder o si el índice quedó
+  más viejo que los cambios que se conservan.
+
+El embedder es intercambiable: cualquier clase con `nombre` y
+`embeber(textos) -> ndarray` normalizado. `EmbedderLocal` es determinista y no
+usa red (pruebas y uso sin conexión); `EmbedderOpenAI` usa la API de embeddings.
+Los vectores de un embedder no se mezclan con los de otro.
+"""
+import hashlib
+import threading
+import time
+from datetime import timedelta
+from functools import lru_cache
+from typing import Iterable, List, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Q
+from django.db.models.functions import Now
+from django.utils.module_loading import import_string
+
+from casos.models import Caso
+from documentos.models import Documento
+from .models import CambioEmbedding, Embedding
+from .query_analyzer import PATRON_TERMINO, STOPWORDS, normalizar
+
+# Los ids de CambioEmbedding se asignan antes del commit: uno menor puede confirmarse
+# después de que otro proceso vio uno mayor, así que se vuelven a leer los recientes
+MARGEN_CAMBIOS = timedelta(seconds=30)
+# Cada cuántos cambios se borran los que vencieron
+PODA_CAMBIOS = 1000
+# N-gramas de caracteres de EmbedderLocal (largo y peso respecto de la palabra entera)
+LARGO_NGRAMA = 4
+PESO_NGRAMA = 1.0
+
+
+def _normalizar_filas(matriz: np.ndarray) -> np.ndarray:
+    normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+    normas[normas == 0] = 1
+    return (matriz / normas).astype(np.float32)
+
+
+class EmbedderLocal:
+    """
+    Embedder determinista sin red (feature hashing): cada palabra sin acentos
+    ni stopwords y cada uno de sus n-gramas de caracteres suma ±peso en una
+    dimensión elegida por hash. Los n-gramas acercan las variantes de una
+    palabra (divorcio, divorciarse; arrendamiento, arrendatario).
+    """
+
+    def __init__(self, dimension: int = None):
+        self.dimension = dimension or settings.CHAT_EMBEDDINGS_DIMENSION
+        self.nombre = f'local-{self.dimension}'
+
+    @staticmethod
+    def _rasgos(texto: str) -> Iterable[Tuple[str, float]]:
+        for palabra in PATRON_TERMINO.findall(normalizar(texto)):
+            if palabra in STOPWORDS:
+                continue
+            # Singular simple (documentos -> documento), como en query_analyzer
+            if len(palabra) > 3 and palabra.endswith('s'):
+                palabra = palabra[:-1]
+            yield palabra, 1.0
+            marcada = f'<{palabra}>'
+            for i in range(len(marcada) - LARGO_NGRAMA + 1):
+                yield marcada[i:i + LARGO_NGRAMA], PESO_NGRAMA
+
+    def embeber(self, textos: List[str]) -> np.ndarray:
+        matriz = np.zeros((len(textos), self.dimension), dtype=np.float32)
+        for fila, texto in enumerate(textos):
+            for rasgo, peso in self._rasgos(texto):
+                valor = int.from_bytes(hashlib.blake2b(rasgo.encode(), digest_size=8).digest(), 'little')
+                signo = 1.0 if valor & 1 else -1.0
+                matriz[fila, (valor >> 1) % self.dimension] += signo * peso
+        return _normalizar_filas(matriz)
+
+
+class EmbedderOpenAI:
+    """Embeddings de la API de OpenAI con el cliente compartido del asistente"""
+
+    def __init__(self, modelo: str = None):
+        self.modelo = modelo or settings.CHAT_EMBEDDINGS_MODELO_OPENAI
+        self.nombre = f'openai-{self.modelo}'
+
+    def embeber(self, textos: List[str]) -> np.ndarray:
+        from .services import AsistenteIAService  # services depende de este módulo
+
+        respuesta = AsistenteIAService.instancia().client.embeddings.create(model=self.modelo, input=textos)
+        vectores = [dato.embedding for dato in sorted(respuesta.data, key=lambda dato: dato.index)]
+        return _normalizar_filas(np.array(vectores, dtype=np.float32))
+
+
+@lru_cache(maxsize=1)
+def obtener_embedder():
+    """Embedder configurado (CHAT_EMBEDDINGS_BACKEND), o None si está desactivado"""
+    if not settings.CHAT_EMBEDDINGS_BACKEND:
+        return None
+    return import_string(settings.CHAT_EMBEDDINGS_BACKEND)()
+
+
+# ---- Textos que se embeben ----
+
+def texto_documento(documento: Documento) -> str:
+    partes = [documento.nombreDocumento, documento.palabraClave, documento.tipoDocumento.nombre]
+    if documento.etapaProcesal_id:
+        partes.append(documento.etapaProcesal.nombre)
+    return '. '.join(parte for parte in partes if parte)
+
+
+def texto_caso(caso: Caso) -> str:
+    return '. '.join(parte for parte in [caso.tipoCaso, caso.descripcion] if parte)
+
+
+FUENTES = {
+    Embedding.TIPO_DOCUMENTO: (
+        lambda: Documento.objects.select_related('tipoDocumento', 'etapaProcesal').only(
+            'id', 'nombreDocumento', 'palabraClave', 'tipoDocumento__nombre', 'etapaProcesal__nombre'
+        ),
+        texto_documento,
+    ),
+    Embedding.TIPO_CASO: (
+        lambda: Caso.objects.only('id', 'tipoCaso', 'descripcion'),
+        texto_caso,
+    ),
+}
+
+
+def objetos(tipo: str):
+    """Queryset con los campos necesarios para embeber los objetos del tipo"""
+    return FUENTES[tipo][0]()
+
+
+# ---- Registro de cambios ----
+
+def registrar_cambios(tipo: str, ids: Iterable[int]):
+    """Avisa a los índices de todos los procesos que cambiaron los vectores de esos objetos"""
+    cambios = CambioEmbedding.objects.bulk_create(
+        [CambioEmbedding(tipo=tipo, objeto_id=objeto_id) for objeto_id in ids]
+    )
+    if any(cambio.id % PODA_CAMBIOS == 0 for cambio in cambios):
+        podar_cambios()
+
+
+def podar_cambios() -> int:
+    """Borra los cambios más viejos que CHAT_EMBEDDINGS_RETENER_CAMBIOS_HORAS"""
+    retener = timedelta(hours=settings.CHAT_EMBEDDINGS_RETENER_CAMBIOS_HORAS)
+    borrados, _ = CambioEmbedding.objects.filter(fecha__lt=Now() - retener).delete()
+    return borrados
+
+
+# ---- Escritura ----
+
+def actualizar(tipo: str, lote: Iterable, embedder=None) -> int:
+    """
+    Calcula y guarda los vectores de los objetos del lote cuyo texto cambió
+    (o que no tienen vector del embedder actual). Devuelve cuántos se guardaron.
+    """
+    embedder = embedder or obtener_embedder()
+    if embedder is None:
+        return 0
+    texto = FUENTES[tipo][1]
+    textos = {objeto.id: texto(objeto) for objeto in lote}
+    huellas = {objeto_id: hashlib.sha1(t.encode()).hexdigest() for objeto_id, t in textos.items()}
+
+    existentes = dict(
+        Embedding.objects.filter(tipo=tipo, modelo=embedder.nombre, objeto_id__in=list(textos))
+        .values_list('objeto_id', 'huella')
+    )
+    pendientes = [objeto_id for objeto_id in textos if existentes.get(objeto_id) != huellas[objeto_id]]
+    if not pendientes:
+        return 0
+
+    vectores = embedder.embeber([textos[objeto_id] for objeto_id in pendientes])
+    with transaction.atomic():
+        Embedding.objects.bulk_create(
+            [
+                Embedding(
+                    tipo=tipo, objeto_id=objeto_id, modelo=embedder.nombre,
+                    huella=huellas[objeto_id], vector=vector.tobytes(),
+                )
+                for objeto_id, vector in zip(pendientes, vectores)
+            ],
+            update_conflicts=True,
+            unique_fields=['tipo', 'objeto_id'],
+            update_fields=['modelo', 'huella', 'vector', 'fecha_actualizacion'],
+        )
+        registrar_cambios(tipo, pendientes)
+    return len(pendientes)
+
+
+def actualizar_ids(tipo: str, ids: List[int]) -> int:
+    return actualizar(tipo, objetos(tipo).filter(id__in=ids))
+
+
+def _eliminar(tipo: str, embeddings) -> int:
+    with transaction.atomic():
+        ids = list(embeddings.values_list('objeto_id', flat=True))
+        if ids:
+            Embedding.objects.filter(tipo=tipo, objeto_id__in=ids).delete()
+            registrar_cambios(tipo, ids)
+    return len(ids)
+
+
+def eliminar(tipo: str, ids: List[int]) -> int:
+    return _eliminar(tipo, Embedding.objects.filter(tipo=tipo, objeto_id__in=ids))
+
+
+def eliminar_huerfanos(tipo: str) -> int:
+    """Borra los vectores de objetos que ya no existen"""
+    return _eliminar(tipo, Embedding.objects.filter(tipo=tipo).exclude(
+        objeto_id__in=objetos(tipo).model.objects.values('id')
+    ))
+
+
+# ---- Búsqueda ----
+
+class IndiceVectorial:
+    """
+    Vectores de un tipo y un embedder en memoria: ids + matriz float32 n x d,
+    con capacidad de sobra para agregar filas sin copiar todo en cada alta.
+    `_filas` ubica la fila de cada id para ponerla o quitarla.
+    """
+
+    def __init__(self, tipo: str):
+        self.tipo = tipo
+        self.modelo = None
+        self.visto = 0  # último CambioEmbedding aplicado
+        self.sincronizado = None  # time.monotonic() de la última lectura de cambios
+        self._ids = np.empty(0, dtype=np.int64)
+        self._vectores = np.empty((0, 0), dtype=np.float32)
+        self._filas = {}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._filas)
+
+    @property
+    def ids(self) -> np.ndarray:
+        return self._ids[:len(self)]
+
+    @property
+    def matriz(self) -> np.ndarray:
+        return self._vectores[:len(self)]
+
+    def actualizado(self, embedder) -> 'IndiceVectorial':
+        """
+        Aplica los cambios pendientes; recarga todo si cambió el embedder o el
+        índice es muy viejo. Los cambios se leen a lo sumo cada
+        CHAT_EMBEDDINGS_INTERVALO_CAMBIOS segundos: entre lecturas la búsqueda
+        no consulta la base de datos.
+        """
+        retener = settings.CHAT_EMBEDDINGS_RETENER_CAMBIOS_HORAS * 3600
+        with self.lock:
+            ahora = time.monotonic()
+            if (self.modelo != embedder.nombre or self.sincronizado is None
+                    or ahora - self.sincronizado > retener - MARGEN_CAMBIOS.total_seconds()):
+                self._cargar(embedder.nombre)
+                self.modelo = embedder.nombre
+            elif ahora - self.sincronizado >= settings.CHAT_EMBEDDINGS_INTERVALO_CAMBIOS:
+                self._aplicar_cambios()
+            else:
+                return self
+            self.sincronizado = ahora
+        return self
+
+    def _cargar(self, modelo: str):
+        # El último cambio se lee antes que los vectores: lo que cambie mientras se cargan se vuelve a aplicar
+        self.visto = CambioEmbedding.objects.filter(tipo=self.tipo).aggregate(ultimo=Max('id'))['ultimo'] or 0
+        ids, vectores = [], []
+        filas = Embedding.objects.filter(tipo=self.tipo, modelo=modelo).values_list('objeto_id', 'vector')
+        for objeto_id, vector in filas.iterator(chunk_size=2000):
+            ids.append(objeto_id)
+            vectores.append(bytes(vector))
+        self._ids = np.array(ids, dtype=np.int64)
+        if ids:
+            # Copia escribible (frombuffer es de solo lectura) para poner filas en su lugar
+            self._vectores = np.frombuffer(b''.join(vectores), dtype=np.float32).reshape(len(ids), -1).copy()
+        else:
+            self._vectores = np.empty((0, 0), dtype=np.float32)
+        self._filas = {objeto_id: fila for fila, objeto_id in enumerate(ids)}
+
+    def _aplicar_cambios(self):
+        cambios = list(
+            CambioEmbedding.objects.filter(tipo=self.tipo)
+            .filter(Q(id__gt=self.visto) | Q(fecha__gte=Now() - MARGEN_CAMBIOS))
+            .values_list('id', 'objeto_id')
+        )
+        if not cambios:
+            return
+        self.visto = max(self.visto, max(cambio_id for cambio_id, _ in cambios))
+        ids = {objeto_id for _, objeto_id in cambios}
+        vectores = dict(
+            Embedding.objects.filter(tipo=self.tipo, modelo=self.modelo, objeto_id__in=ids)
+            .values_list('objeto_id', 'vector')
+        )
+        for objeto_id in ids:
+            if objeto_id in vectores:
+                self._poner(objeto_id, np.frombuffer(bytes(vectores[objeto_id]), dtype=np.float32))
+            else:
+                self._quitar(objeto_id)
+
+    def _poner(self, objeto_id: int, vector: np.ndarray):
+        fila = self._filas.get(objeto_id)
+        if fila is None:
+            fila = len(self)
+            if fila == len(self._ids):
+                self._ampliar(len(vector))
+            self._ids[fila] = objeto_id
+            self._filas[objeto_id] = fila
+        self._vectores[fila] = vector
+
+    def _quitar(self, objeto_id: int):
+        # La última fila ocupa el lugar de la quitada
+        fila = self._filas.pop(objeto_id, None)
+        if fila is None:
+            return
+        ultima = len(self)
+        if fila != ultima:
+            self._ids[fila] = self._ids[ultima]
+            self._vectores[fila] = self._vectores[ultima]
+            self._filas[int(self._ids[fila])] = fila
+
+    def _ampliar(self, dimension: int):
+        capacidad = max(16, 2 * len(self._ids))
+        ids = np.empty(capacidad, dtype=np.int64)
+        vectores = np.empty((capacidad, dimension), dtype=np.float32)
+        n = len(self)
+        ids[:n] = self._ids[:n]
+        if n:
+            vectores[:n] = self._vectores[:n]
+        self._ids, self._vectores = ids, vectores
+
+    def buscar(self, vector: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        """Los `k` ids más similares al vector (normalizado), con su similitud coseno"""
+        # Con el lock: _aplicar_cambios modifica las filas en su lugar
+        with self.lock:
+            k = min(k, len(self))
+            if k <= 0:
+                return []
+            similitudes = self.matriz @ vector
+            mejores = np.argpartition(-similitudes, k - 1)[:k]
+            mejores = mejores[np.argsort(-similitudes[mejores], kind='stable')]
+            return [(int(self.ids[i]), float(similitudes[i])) for i in mejores]
+
+
+_indices = {tipo: IndiceVectorial(tipo) for tipo in FUENTES}
+
+
+def buscar(tipo: str, texto: str, k: int, min_similitud: float = None) -> List[Tuple[int, float]]:
+    """
+    Top-K (id, similitud) de los objetos del tipo más parecidos al texto.
+    Vacío si la búsqueda semántica está desactivada o no hay vectores.
+    """
+    embedder = obtener_embedder()
+    if embedder is None or not texto.strip():
+        return []
+    indice = _indices[tipo].actualizado(embedder)
+    if not len(indice):
+        return []
+    if min_similitud is None:
+        min_similitud = settings.CHAT_EMBEDDINGS_MIN_SIMILITUD
+    vector = embedder.embeber([texto])[0]
+    return [(objeto_id, similitud) for objeto_id, similitud in indice.buscar(vector, k) if similitud >= min_similitud]
@@ -0,0 +1,118 @@
+"""
+Historial de conversación para OpenAI con presupuesto de tokens.
+
+En lugar de enviar siempre los últimos N mensajes, se cargan los mensajes
+completados anteriores a la pregunta y se empaquetan del más reciente al más
+antiguo mientras entren en el presupuesto; el primero que no entra se recorta
+y los anteriores se descartan. El rol de cada mensaje sale de `Mensaje.tipo`.
+
+Los tokens se cuentan con tiktoken si está instalado (y su vocabulario
+disponible); si no, con una aproximación local.
+"""
+import re
+from functools import lru_cache
+from typing import Dict, List
+
+from django.conf import settings
+
+from .models import Mensaje
+
+try:
+    import tiktoken
+except ImportError:  # dependencia opcional
+    tiktoken = None
+
+ROLES = {
+    'usuario': 'user',
+    'asistente': 'assistant',
+    'sistema': 'system',
+}
+
+# Tokens que agrega el formato de chat por mensaje (rol y separadores) y al final
+TOKENS_POR_MENSAJE = 4
+TOKENS_RESPUESTA = 3
+# No vale la pena enviar un mensaje recortado a menos de esto
+MIN_TOKENS_RECORTE = 32
+MARCA_RECORTE = ' […]'
+
+PATRON_TOKEN = re.compile(r'\w+|[^\w\s]')
+
+
+@lru_cache(maxsize=1)
+def _codificador():
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding('cl100k_base')
+    except Exception:
+        # Sin acceso para descargar el vocabulario
+        return None
+
+
+def _tokens_aproximados(palabra: str) -> int:
+    # Las palabras largas se parten en varios tokens (~4 caracteres cada uno)
+    return 1 + (len(palabra) - 1) // 4
+
+
+def contar_tokens(texto: str) -> int:
+    codificador = _codificador()
+    if codificador is not None:
+        return len(codificador.encode(texto))
+    return sum(_tokens_aproximados(palabra) for palabra in PATRON_TOKEN.findall(texto))
+
+
+def contar_tokens_mensajes(mensajes: List[Dict[str, str]]) -> int:
+    """Tokens de entrada de una lista de mensajes de chat.completions"""
+    return sum(contar_tokens(m['content']) + TOKENS_POR_MENSAJE for m in mensajes) + TOKENS_RESPUESTA
+
+
+def recortar(texto: str, maximo: int) -> str:
+    """Primeros `maximo` tokens del texto"""
+    codificador = _codificador()
+    if codificador is not None:
+        tokens = codificador.encode(texto)
+        if len(tokens) <= maximo:
+            return texto
+        return codificador.decode(tokens[:maximo]) + MARCA_RECORTE
+
+    usados = 0
+    for coincidencia in PATRON_TOKEN.finditer(texto):
+        usados += _tokens_aproximados(coincidencia.group())
+        if usados > maximo:
+            return texto[:coincidencia.start()].rstrip() + MARCA_RECORTE
+    return texto
+
+
+def cargar_historial(conversacion, antes_de: int = None) -> List[Dict[str, str]]:
+    """
+    Mensajes completados de la conversación (anteriores al mensaje `antes_de`)
+    en orden cronológico y con el rol según su tipo. Se cargan como mucho
+    CHAT_HISTORIAL_MAX_MENSAJES; el presupuesto se aplica en `ajustar_historial`.
+    """
+    mensajes = conversacion.mensajes.filter(
+        estado=Mensaje.ESTADO_COMPLETADO, tipo__in=ROLES
+    ).only('id', 'tipo', 'contenido')
+    if antes_de is not None:
+        mensajes = mensajes.filter(id__lt=antes_de)
+    mensajes = mensajes.order_by('-id')[:settings.CHAT_HISTORIAL_MAX_MENSAJES]
+    return [{'role': ROLES[m.tipo], 'content': m.contenido} for m in reversed(mensajes)]
+
+
+def ajustar_historial(historial: List[Dict[str, str]], presupuesto: int) -> List[Dict[str, str]]:
+    """
+    Los mensajes más recientes del historial que entran en `presupuesto`
+    tokens. El primero que no entra se recorta si queda lugar suficiente.
+    """
+    seleccionados = []
+    disponible = presupuesto
+    for mensaje in reversed(historial):
+        tokens = contar_tokens(mensaje['content']) + TOKENS_POR_MENSAJE
+        if tokens <= disponible:
+            seleccionados.append(mensaje)
+            disponible -= tokens
+            continue
+        if disponible - TOKENS_POR_MENSAJE >= MIN_TOKENS_RECORTE:
+            contenido = recortar(mensaje['content'], disponible - TOKENS_POR_MENSAJE - contar_tokens(MARCA_RECORTE))
+            seleccionados.append({'role': mensaje['role'], 'content': contenido})
+        break
+    return seleccionados[::-1]
@@ -0,0 +1,69 @@
+import json
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from chat import benchmark, embeddings
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark del chat (chat/benchmark.py): siembra un corpus sintético, repite un juego fijo de preguntas '
+        'contra un LLM falso y reporta latencia p50/p95, consultas SQL, tiempo por etapa y recall@k'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--actores', type=int, default=10000, help='Actores sintéticos')
+        parser.add_argument('--casos', type=int, default=10000, help='Casos sintéticos')
+        parser.add_argument('--documentos', type=int, default=10000, help='Documentos sintéticos')
+        parser.add_argument('--lote', type=int, default=5000, help='Filas por INSERT al sembrar')
+        parser.add_argument('--sin-seed', action='store_true', help='Usa los datos actuales sin sembrar el corpus')
+        parser.add_argument('--repeticiones', type=int, default=5, help='Ejecuciones medidas de cada pregunta')
+        parser.add_argument('--k', type=int, default=5, help='Resultados considerados para recall@k')
+        parser.add_argument('--latencia-llm', type=float, default=0.0, help='Segundos de demora del LLM falso')
+        parser.add_argument('--json', action='store_true', help='Imprime el reporte como JSON')
+
+    def handle(self, *args, **options):
+        # Con --json la salida estándar queda solo para el reporte
+        progreso = self.stderr if options['json'] else self.stdout
+
+        if not options['sin_seed']:
+            for comando, cantidad in (
+                ('seed_actores', options['actores']),
+                ('seed_casos', options['casos']),
+                ('seed_documentos', options['documentos']),
+            ):
+                call_command(comando, sinteticos=cantidad, lote=options['lote'], stdout=progreso)
+        agujas = benchmark.sembrar_agujas()
+        # bulk_create no dispara las señales que mantienen los embeddings
+        if embeddings.obtener_embedder() is not None:
+            call_command('indexar_embeddings', stdout=progreso)
+
+        usuario = benchmark.usuario_benchmark()
+        with benchmark.llm_falso(options['latencia_llm']) as servidor:
+            reporte = benchmark.ejecutar(usuario, agujas, options['repeticiones'], options['k'])
+        # Las preguntas con respuesta directa de la base de datos no llaman al LLM
+        reporte['solicitudes_llm'] = servidor.solicitudes
+
+        if options['json']:
+            self.stdout.write(json.dumps(reporte, ensure_ascii=False, indent=2))
+        else:
+            self.imprimir(reporte)
+
+    def imprimir(self, reporte):
+        k = reporte['k']
+        self.stdout.write(f"\n{'Pregunta':<60} {'p50 ms':>8} {'p95 ms':>8} {'SQL':>5} {f'recall@{k}':>9}")
+        for fila in reporte['preguntas']:
+            self.stdout.write(
+                f"{fila['pregunta'][:60]:<60} {fila['p50_ms']:>8} {fila['p95_ms']:>8} "
+                f"{fila['consultas_sql']:>5} {fila['recall']:>9}"
+            )
+        self.stdout.write('\nEtapas (p50 / p95 ms):')
+        for etapa, tiempos in reporte['etapas'].items():
+            self.stdout.write(f"  {etapa:<13} {tiempos['p50_ms']:>8} / {tiempos['p95_ms']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"\n{reporte['mediciones']} mediciones: latencia p50 {reporte['latencia']['p50_ms']} ms, "
+            f"p95 {reporte['latencia']['p95_ms']} ms; SQL media {reporte['consultas_sql']['media']} "
+            f"(máx {reporte['consultas_sql']['max']}); recall@{k} {reporte['recall_en_k']}; "
+            f"{reporte['solicitudes_llm']} solicitud(es) al LLM"
+        ))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from chat import embeddings
+from chat.models import Embedding
+
+
+class Command(BaseCommand):
+    help = 'Calcula los embeddings de documentos y casos para la búsqueda semántica del chat (chat/embeddings.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tipo', choices=[tipo for tipo, _ in Embedding.TIPO_CHOICES], action='append',
+            help='Solo este tipo (se puede repetir); por defecto todos',
+        )
+        parser.add_argument('--lote', type=int, default=256, help='Objetos por llamada al embedder')
+
+    def handle(self, *args, **options):
+        embedder = embeddings.obtener_embedder()
+        if embedder is None:
+            raise CommandError('La búsqueda semántica está desactivada (CHAT_EMBEDDINGS_BACKEND vacío)')
+
+        self.stdout.write(f'Embedder: {embedder.nombre}')
+        for tipo in options['tipo'] or [tipo for tipo, _ in Embedding.TIPO_CHOICES]:
+            revisados = actualizados = 0
+            ultimo_id = 0
+            # Lotes por id (keyset): memoria constante con cualquier cantidad de objetos
+            while True:
+                lote = list(embeddings.objetos(tipo).filter(id__gt=ultimo_id).order_by('id')[:options['lote']])
+                if not lote:
+                    break
+                actualizados += embeddings.actualizar(tipo, lote, embedder)
+                revisados += len(lote)
+                ultimo_id = lote[-1].id
+
+            borrados = embeddings.eliminar_huerfanos(tipo)
+            self.stdout.write(self.style.SUCCESS(
+                f'{tipo}: {revisados} revisado(s), {actualizados} actualizado(s), {borrados} borrado(s)'
+            ))
+
+        podados = embeddings.podar_cambios()
+        self.stdout.write(f'{podados} cambio(s) vencido(s) borrado(s)')
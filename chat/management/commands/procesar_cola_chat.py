@@ -0,0 +1,54 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from chat import cola
+
+
+class Command(BaseCommand):
+    help = 'Worker de la cola de respuestas del chat (chat/cola.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hilos', type=int, default=2, help='Trabajos en paralelo en este proceso')
+        parser.add_argument('--intervalo', type=float, default=1.0, help='Segundos de espera cuando no hay trabajo')
+        parser.add_argument('--una-vez', action='store_true', help='Procesa lo pendiente y termina')
+
+    def handle(self, *args, **options):
+        self.detener = threading.Event()
+        self.procesados = 0
+        self.lock = threading.Lock()
+
+        hilos = [
+            threading.Thread(target=self.trabajar, args=(options['intervalo'], options['una_vez']), daemon=True)
+            for _ in range(options['hilos'])
+        ]
+        self.stdout.write(f'Procesando cola del chat con {len(hilos)} hilo(s)...')
+        for hilo in hilos:
+            hilo.start()
+        try:
+            for hilo in hilos:
+                while hilo.is_alive():
+                    hilo.join(0.5)
+        except KeyboardInterrupt:
+            self.detener.set()
+            for hilo in hilos:
+                hilo.join()
+
+        self.stdout.write(self.style.SUCCESS(f'{self.procesados} respuesta(s) procesada(s)'))
+
+    def trabajar(self, intervalo, una_vez):
+        try:
+            while not self.detener.is_set():
+                close_old_connections()
+                mensaje = cola.procesar_siguiente()
+                if mensaje is not None:
+                    with self.lock:
+                        self.procesados += 1
+                elif una_vez:
+                    break
+                else:
+                    time.sleep(intervalo)
+        finally:
+            connection.close()
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mensaje',
+            name='estado',
+            field=models.CharField(choices=[('pendiente', 'Pendiente'), ('procesando', 'Procesando'), ('completado', 'Completado'), ('error', 'Error')], default='completado', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='mensaje',
+            name='intentos',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='mensaje',
+            name='procesar_despues',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='mensaje',
+            name='respuesta_a',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='respuestas', to='chat.mensaje'),
+        ),
+        migrations.AddIndex(
+            model_name='mensaje',
+            index=models.Index(condition=models.Q(('estado__in', ['pendiente', 'procesando'])), fields=['procesar_despues'], name='mensaje_cola_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0002_mensaje_cola'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='conversacion',
+            index=models.Index(condition=models.Q(('activa', True)), fields=['usuario', '-fecha_actualizacion', '-id'], name='conversacion_listado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mensaje',
+            index=models.Index(fields=['conversacion', '-fecha_envio', '-id'], name='mensaje_conversacion_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0005_mensaje_tiempos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Embedding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('documento', 'Documento'), ('caso', 'Caso')], max_length=20)),
+                ('objeto_id', models.BigIntegerField()),
+                ('modelo', models.CharField(max_length=100)),
+                ('huella', models.CharField(max_length=40)),
+                ('vector', models.BinaryField()),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Embedding',
+                'verbose_name_plural': 'Embeddings',
+                'indexes': [models.Index(fields=['tipo', 'modelo'], name='embedding_tipo_modelo_idx')],
+                'constraints': [models.UniqueConstraint(fields=('tipo', 'objeto_id'), name='embedding_objeto_unico')],
+            },
+        ),
+    ]
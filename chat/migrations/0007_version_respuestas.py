@@ -0,0 +1,16 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0006_embeddings'),
+    ]
+
+    operations = [
+        # Versión de los datos de las respuestas cacheadas (ver chat/cache_respuestas.py)
+        migrations.RunSQL(
+            'CREATE SEQUENCE chat_respuestas_version;',
+            reverse_sql='DROP SEQUENCE IF EXISTS chat_respuestas_version;',
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:28
+
+import django.db.models.functions.datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0007_version_respuestas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CambioEmbedding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('documento', 'Documento'), ('caso', 'Caso')], max_length=20)),
+                ('objeto_id', models.BigIntegerField()),
+                ('fecha', models.DateTimeField(db_default=django.db.models.functions.datetime.Now())),
+            ],
+            options={
+                'verbose_name': 'Cambio de embedding',
+                'verbose_name_plural': 'Cambios de embeddings',
+                'indexes': [models.Index(fields=['fecha'], name='cambio_embedding_fecha_idx')],
+            },
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.conf import settings
+from django.db.models.functions import Now
 
 User = get_user_model()
 
@@ -22,6 +23,14 @@ class Conversacion(models.Model):
         ordering = ['-fecha_actualizacion']
         verbose_name = 'Conversación'
         verbose_name_plural = 'Conversaciones'
+        indexes = [
+            # Listado paginado por cursor (fecha_actualizacion, id) de api/conversaciones/
+            models.Index(
+                fields=['usuario', '-fecha_actualizacion', '-id'],
+                name='conversacion_listado_idx',
+                condition=models.Q(activa=True),
+            ),
+        ]
     
     def __str__(self):
         return f"Conversación {self.id} - {self.usuario.username}"
@@ -37,6 +46,18 @@ class Mensaje(models.Model):
         ('sistema', 'Sistema'),
     ]
     
+    # Estado de las respuestas generadas en segundo plano (chat/cola.py)
+    ESTADO_PENDIENTE = 'pendiente'
+    ESTADO_PROCESANDO = 'procesando'
+    ESTADO_COMPLETADO = 'completado'
+    ESTADO_ERROR = 'error'
+    ESTADO_CHOICES = [
+        (ESTADO_PENDIENTE, 'Pendiente'),
+        (ESTADO_PROCESANDO, 'Procesando'),
+        (ESTADO_COMPLETADO, 'Completado'),
+        (ESTADO_ERROR, 'Error'),
+    ]
+    
     conversacion = models.ForeignKey(
         Conversacion,
         on_delete=models.CASCADE,
@@ -46,16 +67,42 @@ class Mensaje(models.Model):
     contenido = models.TextField()
     fecha_envio = models.DateTimeField(auto_now_add=True)
     
+    # Cola de respuestas: mensaje del usuario que se responde, intentos y
+    # momento a partir del cual se puede (re)tomar el trabajo
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default=ESTADO_COMPLETADO)
+    respuesta_a = models.ForeignKey(
+        'self',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='respuestas'
+    )
+    intentos = models.PositiveSmallIntegerField(default=0)
+    procesar_despues = models.DateTimeField(null=True, blank=True)
+    
     # Metadatos para análisis
     tokens_usados = models.IntegerField(null=True, blank=True)
     tiempo_respuesta = models.FloatField(null=True, blank=True)  # en segundos
     documentos_consultados = models.JSONField(default=list, blank=True)
     entidades_extraidas = models.JSONField(default=list, blank=True)
+    tiempos = models.JSONField(default=dict, blank=True)  # segundos por etapa (chat/cronometro.py)
     
     class Meta:
         ordering = ['fecha_envio']
         verbose_name = 'Mensaje'
         verbose_name_plural = 'Mensajes'
+        indexes = [
+            # Último mensaje de cada conversación
+            models.Index(fields=['conversacion', '-fecha_envio', '-id'], name='mensaje_conversacion_idx'),
+            # Ventanas de mensajes por id (antes_de / despues_de) de api/conversacion/<id>/
+            models.Index(fields=['conversacion', 'id'], name='mensaje_ventana_idx'),
+            # Solo los trabajos en cola; los mensajes completados no entran al índice
+            models.Index(
+                fields=['procesar_despues'],
+                name='mensaje_cola_idx',
+                condition=models.Q(estado__in=['pendiente', 'procesando']),
+            ),
+        ]
     
     def __str__(self):
         return f"{self.get_tipo_display()} - {self.contenido[:50]}..."
@@ -100,6 +147,60 @@ class ConsultaDocumento(models.Model):
         return f"Consulta {self.tipo_consulta} - {self.mensaje.contenido[:30]}..."
 
 
+class Embedding(models.Model):
+    """
+    Vector de un documento o caso para la búsqueda semántica (chat/embeddings.py).
+    El vector se guarda como bytes float32 normalizados.
+    """
+    TIPO_DOCUMENTO = 'documento'
+    TIPO_CASO = 'caso'
+    TIPO_CHOICES = [
+        (TIPO_DOCUMENTO, 'Documento'),
+        (TIPO_CASO, 'Caso'),
+    ]
+    
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
+    objeto_id = models.BigIntegerField()
+    modelo = models.CharField(max_length=100)  # embedder que generó el vector
+    huella = models.CharField(max_length=40)  # sha1 del texto embebido
+    vector = models.BinaryField()
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Embedding'
+        verbose_name_plural = 'Embeddings'
+        constraints = [
+            models.UniqueConstraint(fields=['tipo', 'objeto_id'], name='embedding_objeto_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['tipo', 'modelo'], name='embedding_tipo_modelo_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_tipo_display()} {self.objeto_id} ({self.modelo})"
+
+
+class CambioEmbedding(models.Model):
+    """
+    Alta, cambio o baja del vector de un objeto en Embedding. Cada proceso
+    aplica a su índice en memoria solo los cambios que aún no vio
+    (chat/embeddings.py); se conservan CHAT_EMBEDDINGS_RETENER_CAMBIOS_HORAS.
+    """
+    tipo = models.CharField(max_length=20, choices=Embedding.TIPO_CHOICES)
+    objeto_id = models.BigIntegerField()
+    fecha = models.DateTimeField(db_default=Now())  # reloj de la base, igual para todos los procesos
+    
+    class Meta:
+        verbose_name = 'Cambio de embedding'
+        verbose_name_plural = 'Cambios de embeddings'
+        indexes = [
+            models.Index(fields=['fecha'], name='cambio_embedding_fecha_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_tipo_display()} {self.objeto_id} ({self.fecha})"
+
+
 class ConfiguracionIA(models.Model):
     """
     Modelo para configuraciones del asistente IA
@@ -0,0 +1,129 @@
+"""
+Servidor local que imita la API de chat.completions de OpenAI.
+
+Sirve para probar y medir el cliente (pool de conexiones, streaming) sin red
+ni API key:
+
+    with ServidorOpenAIFalso(latencia=0.05) as servidor:
+        settings.OPENAI_BASE_URL = servidor.base_url
+        ...
+        servidor.conexiones   # conexiones TCP abiertas por los clientes
+        servidor.solicitudes  # solicitudes atendidas
+
+Responde siempre con `respuesta`, partida en palabras cuando se pide stream=True.
+El uso informado es de 10 tokens de entrada y uno de salida por palabra.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _ManejadorOpenAI(BaseHTTPRequestHandler):
+    # HTTP/1.1 para que el cliente pueda reutilizar la conexión (keep-alive)
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        self.server.registrar('conexiones')
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        cuerpo = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        self.server.registrar('solicitudes')
+        if self.server.latencia:
+            time.sleep(self.server.latencia)
+
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._enviar(404, 'application/json', b'{"error": {"message": "not found"}}')
+        elif cuerpo.get('stream'):
+            self._responder_stream(cuerpo)
+        else:
+            self._responder(cuerpo)
+
+    def _enviar(self, estado, tipo, contenido):
+        self.send_response(estado)
+        self.send_header('Content-Type', tipo)
+        self.send_header('Content-Length', str(len(contenido)))
+        self.end_headers()
+        self.wfile.write(contenido)
+
+    def _responder(self, cuerpo):
+        respuesta = self.server.respuesta
+        self._enviar(200, 'application/json', json.dumps({
+            'id': 'chatcmpl-falso',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': cuerpo.get('model', 'gpt-falso'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': respuesta},
+                'finish_reason': 'stop',
+            }],
+            'usage': self._uso(),
+        }).encode())
+
+    def _uso(self):
+        palabras = len(self.server.respuesta.split())
+        return {'prompt_tokens': 10, 'completion_tokens': palabras, 'total_tokens': 10 + palabras}
+
+    def _responder_stream(self, cuerpo):
+        palabras = self.server.respuesta.split(' ')
+        fragmentos = [palabra if i == 0 else f' {palabra}' for i, palabra in enumerate(palabras)]
+        eventos = []
+        for i, fragmento in enumerate(fragmentos + [None]):
+            eventos.append(json.dumps({
+                'id': 'chatcmpl-falso',
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': cuerpo.get('model', 'gpt-falso'),
+                'choices': [{
+                    'index': 0,
+                    'delta': {'content': fragmento} if fragmento is not None else {},
+                    'finish_reason': None if fragmento is not None else 'stop',
+                }],
+            }))
+        if (cuerpo.get('stream_options') or {}).get('include_usage'):
+            eventos.append(json.dumps({
+                'id': 'chatcmpl-falso',
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': cuerpo.get('model', 'gpt-falso'),
+                'choices': [],
+                'usage': self._uso(),
+            }))
+        eventos.append('[DONE]')
+        self._enviar(200, 'text/event-stream', ''.join(f'data: {e}\n\n' for e in eventos).encode())
+
+
+class ServidorOpenAIFalso(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, respuesta='Respuesta de prueba del asistente.', latencia=0.0):
+        super().__init__(('127.0.0.1', 0), _ManejadorOpenAI)
+        self.respuesta = respuesta
+        self.latencia = latencia
+        self.conexiones = 0
+        self.solicitudes = 0
+        self._lock = threading.Lock()
+        self._hilo = None
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}/v1'
+
+    def registrar(self, contador):
+        with self._lock:
+            setattr(self, contador, getattr(self, contador) + 1)
+
+    def __enter__(self):
+        self._hilo = threading.Thread(target=self.serve_forever, daemon=True)
+        self._hilo.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+        self._hilo.join()
@@ -0,0 +1,211 @@
+"""
+Análisis de la consulta del chat.
+
+Se ejecuta una sola vez por mensaje: normaliza el texto, lo separa en términos,
+descarta stopwords y extrae las entidades estructuradas (números de caso, CI,
+fechas, tipos de documento y de caso, tipos de actor) con las que
+DatabaseQueryService y AsistenteIAService construyen filtros indexados en
+lugar de `icontains` sobre la oración completa.
+"""
+import re
+import unicodedata
+from datetime import date
+from typing import Any, Dict, List
+
+PATRON_NRO_CASO = re.compile(r'\b[a-z]{2,5}-\d{4}-\d+\b')
+PATRON_CI = re.compile(r'\b\d{6,10}\b')
+PATRON_FECHA_DMA = re.compile(r'\b(\d{1,2})[/-](\d{1,2})[/-](\d{4})\b')
+PATRON_FECHA_AMD = re.compile(r'\b(\d{4})-(\d{1,2})-(\d{1,2})\b')
+PATRON_TERMINO = re.compile(r'\w+(?:-\w+)*')
+
+STOPWORDS = {
+    'a', 'al', 'algo', 'algun', 'alguna', 'algunas', 'alguno', 'algunos', 'ante', 'con', 'como',
+    'cual', 'cuales', 'cuando', 'cuanta', 'cuantas', 'cuanto', 'cuantos', 'de', 'del', 'desde',
+    'donde', 'dame', 'e', 'el', 'ella', 'ellos', 'en', 'entre', 'era', 'es', 'esa', 'ese', 'eso',
+    'esta', 'estan', 'estas', 'este', 'esto', 'estoy', 'fue', 'ha', 'han', 'hay', 'he', 'la',
+    'las', 'le', 'les', 'lo', 'los', 'me', 'mi', 'mis', 'mostrar', 'muestra', 'muestrame', 'muy',
+    'necesito', 'ni', 'no', 'nos', 'o', 'para', 'pero', 'por', 'puedes', 'que', 'quien',
+    'quienes', 'se', 'ser', 'si', 'sin', 'sobre', 'son', 'soy', 'su', 'sus', 'tengo', 'tiene',
+    'tienen', 'todo', 'todos', 'todas', 'tu', 'tus', 'un', 'una', 'unas', 'uno', 'unos', 'y',
+    'ya', 'yo',
+}
+
+# Palabras que indican la intención de la consulta pero no deben usarse como
+# términos de búsqueda (no aparecen en los nombres ni descripciones buscadas).
+VOCABULARIO_INTENCION = {
+    'caso', 'casos', 'documento', 'documentos', 'expediente', 'expedientes', 'actor', 'actores',
+    'abogado', 'abogados', 'cliente', 'clientes', 'asistente', 'asistentes', 'persona', 'personas',
+    'usuario', 'usuarios', 'rol', 'roles', 'tipo', 'tipos', 'estado', 'estados', 'fecha', 'fechas',
+    'nombre', 'nombres', 'especialidad', 'abierto', 'abiertos', 'abierta', 'abiertas', 'cerrado',
+    'cerrados', 'cerrada', 'cerradas', 'activo', 'activos', 'inactivo', 'inactivos', 'sistema',
+    'cantidad', 'total', 'numero', 'estadistica', 'estadisticas', 'resumen', 'listar', 'lista',
+    'informacion', 'datos', 'perfil', 'creado', 'creados', 'asignado', 'asignados', 'proceso',
+    'ci', 'carnet',
+}
+
+PALABRAS_PERSONALES = {'mi', 'mis', 'tengo', 'soy', 'estoy', 'conmigo'}
+FRASES_PERSONALES = [
+    'he creado', 'he hecho', 'he enviado', 'he recibido', 'me han asignado', 'me han dado',
+    'asignado a mi', 'relacionado conmigo', 'que me pertenece',
+]
+PALABRAS_ESTADISTICAS = {
+    'cuanto', 'cuantos', 'cuanta', 'cuantas', 'cantidad', 'total', 'numero', 'estadistica',
+    'estadisticas', 'resumen', 'listar',
+}
+FRASES_ESTADISTICAS = ['mostrar todos', 'todos los', 'todas las']
+PALABRAS_ESPECIFICAS = {
+    'cual', 'cuales', 'que', 'donde', 'cuando', 'especialidad', 'tipo', 'estado', 'fecha', 'nombre',
+}
+
+# Tipos de caso: palabra clave normalizada -> valor real de Caso.tipoCaso
+TIPOS_CASO = {
+    'divorcio': 'Divorcio',
+    'robo': 'Robo',
+    'despido': 'Despido Injustificado',
+    'sociedad': 'Sociedad Comercial',
+    'incumplimiento': 'Incumplimiento Contractual',
+    'pension': 'Pensión Alimenticia',
+    'horas': 'Horas Extras',
+    'sucesion': 'Sucesión',
+    'danos': 'Daños y Perjuicios',
+    'amparo': 'Recurso de Amparo',
+}
+
+# Tipos de documento: palabra clave normalizada -> TipoDocumento.nombre
+TIPOS_DOCUMENTO = {
+    'demanda': 'Demanda',
+    'contestacion': 'Contestación',
+    'escrito': 'Escrito de Pruebas',
+    'testimonio': 'Testimonio',
+    'peritaje': 'Peritaje',
+    'resolucion': 'Resolución',
+    'contrato': 'Contrato',
+    'poder': 'Poder',
+    'escritura': 'Escritura',
+    'certificado': 'Certificado',
+    'factura': 'Factura',
+}
+
+TIPOS_ACTOR = {
+    'abogado': 'ABO',
+    'cliente': 'CLI',
+    'asistente': 'ASI',
+}
+
+ESTADOS_CASO = {
+    'abierto': 'ABIERTO',
+    'abierta': 'ABIERTO',
+    'cerrado': 'CERRADO',
+    'cerrada': 'CERRADO',
+}
+
+
+def normalizar(texto: str) -> str:
+    """Minúsculas y sin acentos"""
+    texto = unicodedata.normalize('NFKD', (texto or '').lower())
+    return ''.join(c for c in texto if not unicodedata.combining(c))
+
+
+def _raices(tokens: List[str]) -> set:
+    """Tokens más sus formas singulares simples (casos -> caso, actores -> actor)"""
+    raices = set(tokens)
+    for token in tokens:
+        if len(token) > 3 and token.endswith('s'):
+            raices.add(token[:-1])
+            if token.endswith('es'):
+                raices.add(token[:-2])
+    return raices
+
+
+def _fechas(texto: str) -> List[date]:
+    fechas = []
+    for dia, mes, anio in PATRON_FECHA_DMA.findall(texto):
+        fechas.append((int(anio), int(mes), int(dia)))
+    for anio, mes, dia in PATRON_FECHA_AMD.findall(texto):
+        fechas.append((int(anio), int(mes), int(dia)))
+
+    validas = []
+    for anio, mes, dia in fechas:
+        try:
+            validas.append(date(anio, mes, dia))
+        except ValueError:
+            continue
+    return validas
+
+
+def _menciona(raices: set, *palabras: str) -> bool:
+    return any(palabra in raices for palabra in palabras)
+
+
+def _contiene_frase(texto: str, frases: List[str]) -> bool:
+    return any(re.search(rf'\b{re.escape(frase)}\b', texto) for frase in frases)
+
+
+def analizar_consulta(consulta: str) -> Dict[str, Any]:
+    """
+    Analiza la consulta una sola vez y devuelve un diccionario con el texto
+    normalizado, los términos de búsqueda, las entidades y la intención.
+    """
+    texto = normalizar(consulta)
+
+    numeros_caso = [numero.upper() for numero in PATRON_NRO_CASO.findall(texto)]
+    fechas = _fechas(texto)
+
+    # Quitar números de caso y fechas antes de extraer CI y términos
+    resto = PATRON_NRO_CASO.sub(' ', texto)
+    resto = PATRON_FECHA_AMD.sub(' ', PATRON_FECHA_DMA.sub(' ', resto))
+    cis = PATRON_CI.findall(resto)
+
+    tokens = PATRON_TERMINO.findall(resto)
+    raices = _raices(tokens)
+
+    terminos = [
+        token for token in tokens
+        if token not in STOPWORDS
+        and token not in VOCABULARIO_INTENCION
+        and token not in cis
+        and len(token) > 1
+    ]
+
+    tipos_caso = [valor for clave, valor in TIPOS_CASO.items() if clave in raices]
+    tipos_documento = [valor for clave, valor in TIPOS_DOCUMENTO.items() if clave in raices]
+    tipos_actor = [valor for clave, valor in TIPOS_ACTOR.items() if clave in raices]
+    estados_caso = {valor for clave, valor in ESTADOS_CASO.items() if clave in raices}
+
+    if _menciona(raices, 'documento', 'contrato', 'factura', 'escritura', 'certificado'):
+        tipo = 'documento'
+    elif _menciona(raices, 'abogado', 'cliente', 'asistente', 'persona'):
+        tipo = 'actor'
+    elif numeros_caso or _menciona(raices, 'caso', 'expediente', 'proceso', 'demanda'):
+        tipo = 'caso'
+    else:
+        tipo = 'general'
+
+    entidades = numeros_caso + cis + [fecha.isoformat() for fecha in fechas]
+    entidades += [valor.lower() for valor in tipos_documento]
+    entidades += [clave for clave in TIPOS_ACTOR if clave in raices]
+
+    return {
+        'consulta_original': consulta,
+        'texto': texto,
+        'tokens': tokens,
+        'raices': raices,
+        'terminos': terminos,
+        'numeros_caso': numeros_caso,
+        'cis': cis,
+        'fechas': fechas,
+        'tipos_caso': tipos_caso,
+        'tipos_documento': tipos_documento,
+        'tipos_actor': tipos_actor,
+        'estado_caso': estados_caso.pop() if len(estados_caso) == 1 else None,
+        'es_personal': bool(PALABRAS_PERSONALES & raices) or _contiene_frase(texto, FRASES_PERSONALES),
+        'es_estadistica': bool(PALABRAS_ESTADISTICAS & raices) or _contiene_frase(texto, FRASES_ESTADISTICAS),
+        'es_especifica': bool(PALABRAS_ESPECIFICAS & raices),
+        'tipo': tipo,
+        'entidades': entidades,
+    }
+
+
+def menciona(analisis: Dict[str, Any], *palabras: str) -> bool:
+    """Indica si la consulta menciona alguna de las palabras (singular o plural)"""
+    return _menciona(analisis['raices'], *palabras)
@@ -0,0 +1,171 @@
+"""
+Ranking híbrido de documentos y casos para el chat (reciprocal rank fusion).
+
+Cada fuente devuelve solo ids ordenados, con un tope de CHAT_RANKING_CANDIDATOS:
+
+- texto:    texto completo (tsvector + GIN), por `rango`
+- trigrama: similitud de trigramas del nombre (pg_trgm), tolera errores de tipeo
+- vector:   similitud coseno en el índice de embeddings (chat/embeddings.py)
+- reciente: los candidatos de las demás fuentes, del más nuevo al más viejo
+
+El puntaje de cada objeto es la suma de peso / (k + posición) en las fuentes en
+que aparece (pesos en CHAT_RANKING_PESOS, k en CHAT_RANKING_RRF_K), dividida por
+el máximo posible para que quede entre 0 y 1; los valores empatados en una
+fuente comparten posición. Solo se cargan los `limite` mejores.
+
+Los objetos recuperados se registran en ConsultaDocumento con su relevancia y
+la posición en cada fuente, para poder ajustar los pesos a partir del uso real.
+"""
+import json
+from typing import Any, Dict, List, Tuple
+
+from django.conf import settings
+from django.db.models import Q
+
+from casos.models import Caso
+from documentos.models import Documento
+from . import embeddings
+from .models import ConsultaDocumento, Embedding
+
+# Por tipo: modelo, campo de fecha (reciente), campos de trigramas y tipo de embedding
+RANKEABLES = {
+    'documento': {
+        'modelo': Documento,
+        'fecha': 'fechaDoc',
+        'trigramas': ('nombreDocumento',),
+        'embedding': Embedding.TIPO_DOCUMENTO,
+    },
+    'caso': {
+        'modelo': Caso,
+        'fecha': 'fechaInicio',
+        'trigramas': (),  # nroCaso y tipoCaso ya los cubre el texto completo
+        'embedding': Embedding.TIPO_CASO,
+    },
+}
+
+
+def posiciones(pares) -> Dict[int, int]:
+    """
+    Posición (desde 1) de cada id en una lista de (id, valor) ordenada de mejor
+    a peor. Los valores empatados comparten la posición (1, 1, 3...), así un
+    empate no se decide por el orden arbitrario en que llegan las filas.
+    """
+    resultado = {}
+    anterior = object()
+    posicion = 0
+    for indice, (objeto_id, valor) in enumerate(pares, 1):
+        if valor != anterior:
+            posicion, anterior = indice, valor
+        resultado[objeto_id] = posicion
+    return resultado
+
+
+def fusionar(rankings: Dict[str, Dict[int, int]], pesos: Dict[str, float] = None, k: int = None) -> List[Tuple[int, float]]:
+    """
+    Reciprocal rank fusion de las posiciones de cada fuente ({id: posición}).
+    Devuelve (id, puntaje 0-1) de mayor a menor puntaje; los empates se
+    resuelven por id.
+    """
+    pesos = pesos or settings.CHAT_RANKING_PESOS
+    k = k or settings.CHAT_RANKING_RRF_K
+
+    puntajes = {}
+    for fuente, por_id in rankings.items():
+        peso = pesos.get(fuente, 0)
+        for objeto_id, posicion in por_id.items():
+            puntajes[objeto_id] = puntajes.get(objeto_id, 0) + peso / (k + posicion)
+
+    maximo = sum(pesos.get(fuente, 0) for fuente in rankings) / (k + 1)
+    if not maximo:
+        return []
+    ordenados = sorted(puntajes.items(), key=lambda item: (-item[1], item[0]))
+    return [(objeto_id, puntaje / maximo) for objeto_id, puntaje in ordenados]
+
+
+def _rankings(tipo: str, texto: str, filtro: Q) -> Dict[str, Dict[int, int]]:
+    config = RANKEABLES[tipo]
+    base = config['modelo'].objects.filter(filtro)
+    candidatos = settings.CHAT_RANKING_CANDIDATOS
+
+    rankings = {'texto': posiciones(base.buscar(texto).values_list('id', 'rango')[:candidatos])}
+    if config['trigramas']:
+        rankings['trigrama'] = posiciones(
+            base.similares(texto, *config['trigramas']).values_list('id', 'similitud')[:candidatos]
+        )
+    rankings['vector'] = posiciones(embeddings.buscar(config['embedding'], texto, candidatos))
+
+    ids = set().union(*rankings.values())
+    if ids:
+        # También descarta los candidatos del índice vectorial que no cumplen el filtro
+        fecha = config['fecha']
+        rankings['reciente'] = posiciones(
+            base.filter(id__in=ids).order_by(f'-{fecha}', '-id').values_list('id', fecha)
+        )
+        rankings['vector'] = {
+            objeto_id: posicion for objeto_id, posicion in rankings['vector'].items()
+            if objeto_id in rankings['reciente']
+        }
+    return {fuente: por_id for fuente, por_id in rankings.items() if por_id}
+
+
+def rankear(tipo: str, texto: str, queryset=None, filtro: Q = None, limite: int = None) -> List[Tuple[Any, float, Dict[str, int]]]:
+    """
+    Los `limite` objetos del tipo ('documento' o 'caso') más relevantes para
+    el texto, que cumplen `filtro`. Cada resultado es (objeto, relevancia,
+    posición por fuente). Los objetos se cargan de `queryset` (para
+    select_related y anotaciones) en una sola consulta.
+    """
+    limite = limite or settings.CHAT_RANKING_RESULTADOS
+    filtro = filtro or Q()
+    rankings = _rankings(tipo, texto, filtro)
+    mejores = fusionar(rankings)[:limite]
+    if not mejores:
+        return []
+
+    queryset = queryset if queryset is not None else RANKEABLES[tipo]['modelo'].objects.all()
+    objetos = queryset.in_bulk([objeto_id for objeto_id, _ in mejores])
+    return [
+        (
+            objetos[objeto_id],
+            relevancia,
+            {fuente: por_id[objeto_id] for fuente, por_id in rankings.items() if objeto_id in por_id},
+        )
+        for objeto_id, relevancia in mejores
+        if objeto_id in objetos
+    ]
+
+
+# ---- Registro para ajuste offline ----
+
+def consultas(contexto: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Documentos y casos rankeados del contexto, con su relevancia y posiciones"""
+    registros = []
+    for clave, campo in (('documentos', 'documento'), ('casos', 'caso')):
+        for item in contexto.get(clave) or []:
+            if 'relevancia' in item:
+                registros.append({
+                    campo: item['id'],
+                    'relevancia': item['relevancia'],
+                    'posiciones': item.get('posiciones', {}),
+                })
+    return registros
+
+
+def registrar(mensaje, registros: List[Dict[str, Any]]):
+    """Guarda en ConsultaDocumento lo recuperado para responder `mensaje`"""
+    ConsultaDocumento.objects.bulk_create([_consulta(mensaje, registro) for registro in registros])
+
+
+async def aregistrar(mensaje, registros: List[Dict[str, Any]]):
+    await ConsultaDocumento.objects.abulk_create([_consulta(mensaje, registro) for registro in registros])
+
+
+def _consulta(mensaje, registro: Dict[str, Any]) -> ConsultaDocumento:
+    return ConsultaDocumento(
+        mensaje=mensaje,
+        documento_id=registro.get('documento'),
+        caso_id=registro.get('caso'),
+        tipo_consulta='buscar',
+        resultado=json.dumps(registro['posiciones']),
+        relevancia=registro['relevancia'],
+    )
@@ -1,213 +1,289 @@
+import asyncio
 import openai
+import httpx
 import os
 import json
+import threading
 import time
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.db.models import Q
 from casos.models import Caso, Expediente, Carpeta
 from documentos.models import Documento, TipoDocumento, EtapaProcesal
 from actores.models import Actor, Abogado, Cliente, Asistente
 from seguridad.models import Usuario
+from . import contexto_prompt
+from . import historial as historial_chat
 from .database_service import DatabaseQueryService
+from .models import ConfiguracionIA
+from .query_analyzer import analizar_consulta
+
+# Prefijo de los mensajes de error que se devuelven como respuesta
+PREFIJO_ERROR = "⚠️"
 
 
 class AsistenteIAService:
     """
-    Servicio para manejar la integración con OpenAI y búsquedas inteligentes
+    Servicio para manejar la integración con OpenAI y búsquedas inteligentes.
+
+    Usar `AsistenteIAService.instancia()`: una sola instancia por proceso
+    comparte el cliente de OpenAI y su pool de conexiones keep-alive, de modo
+    que cada mensaje no paga un nuevo handshake TLS.
     """
     
+    _instancia = None
+    _lock_instancia = threading.Lock()
+    
     def __init__(self):
+        self.api_key = os.getenv('OPENAI_API_KEY')
         self.client = openai.OpenAI(
-            api_key=os.getenv('OPENAI_API_KEY')
+            api_key=self.api_key,
+            base_url=settings.OPENAI_BASE_URL,
+            timeout=self._timeout(),
+            max_retries=settings.OPENAI_MAX_RETRIES,
+            http_client=httpx.Client(limits=self._limites(), timeout=self._timeout()),
         )
-        self.modelo = os.getenv('OPENAI_MODEL', 'gpt-3.5-turbo')
-        self.temperatura = float(os.getenv('OPENAI_TEMPERATURE', '0.7'))
-        self.max_tokens = int(os.getenv('OPENAI_MAX_TOKENS', '1000'))
+        self._async_client = None
+        self._async_loop = None
+        self._configuracion_ia = None
+        self._configuracion_cargada = 0.0
+        self._lock_configuracion = threading.Lock()
         self.db_service = DatabaseQueryService()
     
-    def buscar_documentos(self, consulta: str, usuario: Usuario) -> List[Dict[str, Any]]:
+    @classmethod
+    def instancia(cls) -> 'AsistenteIAService':
+        """Instancia compartida del proceso (thread-safe)"""
+        if cls._instancia is None:
+            with cls._lock_instancia:
+                if cls._instancia is None:
+                    cls._instancia = cls()
+        return cls._instancia
+    
+    @classmethod
+    def recargar_configuracion(cls):
+        """Fuerza a releer ConfiguracionIA en la próxima consulta (ver chat/signals.py)"""
+        if cls._instancia is not None:
+            cls._instancia._configuracion_ia = None
+    
+    @staticmethod
+    def _timeout() -> httpx.Timeout:
+        return httpx.Timeout(settings.OPENAI_TIMEOUT, connect=settings.OPENAI_CONNECT_TIMEOUT)
+    
+    @staticmethod
+    def _limites() -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=settings.OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.OPENAI_KEEPALIVE_EXPIRY,
+        )
+    
+    @property
+    def async_client(self) -> openai.AsyncOpenAI:
         """
-        Busca documentos relevantes basándose en la consulta del usuario
+        Cliente asíncrono. El pool de httpx.AsyncClient queda ligado al event
+        loop que lo creó, así que se crea uno por loop (uno por worker ASGI).
         """
-        resultados = []
-        
-        # Búsqueda por nombre de documento
-        documentos_nombre = Documento.objects.filter(
-            Q(nombreDocumento__icontains=consulta) |
-            Q(palabraClave__icontains=consulta)
-        ).select_related('carpeta__expediente__caso', 'tipoDocumento', 'etapaProcesal')
-        
-        for doc in documentos_nombre:
-            resultados.append({
-                'tipo': 'documento',
-                'objeto': doc,
-                'relevancia': 0.9,
-                'razon': f"Documento encontrado por nombre: {doc.nombreDocumento}"
-            })
-        
-        # Búsqueda por tipo de documento
-        tipos_doc = TipoDocumento.objects.filter(
-            nombre__icontains=consulta
-        )
-        for tipo in tipos_doc:
-            docs_tipo = Documento.objects.filter(tipoDocumento=tipo)
-            for doc in docs_tipo:
-                resultados.append({
-                    'tipo': 'documento',
-                    'objeto': doc,
-                    'relevancia': 0.7,
-                    'razon': f"Documento de tipo: {tipo.nombre}"
-                })
-        
-        # Búsqueda por casos
-        casos = Caso.objects.filter(
-            Q(nroCaso__icontains=consulta) |
-            Q(tipoCaso__icontains=consulta) |
-            Q(descripcion__icontains=consulta)
-        )
-        
-        for caso in casos:
-            # Buscar documentos del caso
-            expedientes = Expediente.objects.filter(caso=caso)
-            for exp in expedientes:
-                carpetas = Carpeta.objects.filter(expediente=exp)
-                for carpeta in carpetas:
-                    docs = Documento.objects.filter(carpeta=carpeta)
-                    for doc in docs:
-                        resultados.append({
-                            'tipo': 'documento',
-                            'objeto': doc,
-                            'relevancia': 0.8,
-                            'razon': f"Documento del caso {caso.nroCaso}: {caso.tipoCaso}"
-                        })
-        
-        # Eliminar duplicados y ordenar por relevancia
-        resultados_unicos = {}
-        for resultado in resultados:
-            doc_id = resultado['objeto'].id
-            if doc_id not in resultados_unicos or resultados_unicos[doc_id]['relevancia'] < resultado['relevancia']:
-                resultados_unicos[doc_id] = resultado
-        
-        return sorted(resultados_unicos.values(), key=lambda x: x['relevancia'], reverse=True)[:10]
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or (self._async_loop is not None and self._async_loop is not loop):
+            self._async_client = openai.AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=settings.OPENAI_BASE_URL,
+                timeout=self._timeout(),
+                max_retries=settings.OPENAI_MAX_RETRIES,
+                http_client=httpx.AsyncClient(limits=self._limites(), timeout=self._timeout()),
+            )
+            self._async_loop = loop
+        return self._async_client
     
-    def buscar_actores(self, consulta: str) -> List[Dict[str, Any]]:
+    @async_client.setter
+    def async_client(self, cliente):
+        self._async_client = cliente
+        self._async_loop = None
+    
+    def configuracion(self) -> Dict[str, Any]:
         """
-        Busca actores relevantes basándose en la consulta
+        Modelo, temperatura y max_tokens de la ConfiguracionIA activa (o de las
+        variables de entorno si no hay ninguna). Se cargan una vez y se releen
+        cada OPENAI_CONFIG_TTL segundos o al modificar ConfiguracionIA.
         """
-        resultados = []
-        
-        # Búsqueda por nombre
-        actores = Actor.objects.filter(
-            Q(nombres__icontains=consulta) |
-            Q(apellidoPaterno__icontains=consulta) |
-            Q(apellidoMaterno__icontains=consulta) |
-            Q(ci__icontains=consulta)
-        ).select_related('usuario')
-        
-        for actor in actores:
-            resultados.append({
-                'tipo': 'actor',
-                'objeto': actor,
-                'relevancia': 0.9,
-                'razon': f"Actor encontrado: {actor.nombres} {actor.apellidoPaterno}"
-            })
-        
-        # Búsqueda por tipo de actor
-        if 'abogado' in consulta.lower():
-            abogados = Abogado.objects.select_related('actor').all()
-            for abogado in abogados:
-                resultados.append({
-                    'tipo': 'actor',
-                    'objeto': abogado.actor,
-                    'relevancia': 0.8,
-                    'razon': f"Abogado: {abogado.actor.nombres} {abogado.actor.apellidoPaterno}"
-                })
-        
-        if 'cliente' in consulta.lower():
-            clientes = Cliente.objects.select_related('actor').all()
-            for cliente in clientes:
-                resultados.append({
-                    'tipo': 'actor',
-                    'objeto': cliente.actor,
-                    'relevancia': 0.8,
-                    'razon': f"Cliente: {cliente.actor.nombres} {cliente.actor.apellidoPaterno}"
-                })
-        
-        return sorted(resultados, key=lambda x: x['relevancia'], reverse=True)[:5]
+        with self._lock_configuracion:
+            vencida = time.monotonic() - self._configuracion_cargada > settings.OPENAI_CONFIG_TTL
+            if self._configuracion_ia is None or vencida:
+                self._configuracion_ia = self._cargar_configuracion()
+                self._configuracion_cargada = time.monotonic()
+            return self._configuracion_ia
+    
+    def _cargar_configuracion(self) -> Dict[str, Any]:
+        configuracion = ConfiguracionIA.objects.filter(activo=True).order_by('-fecha_actualizacion').first()
+        if configuracion:
+            return {
+                'modelo': configuracion.modelo_openai,
+                'temperatura': configuracion.temperatura,
+                'max_tokens': configuracion.max_tokens,
+            }
+        return {
+            'modelo': os.getenv('OPENAI_MODEL', 'gpt-3.5-turbo'),
+            'temperatura': float(os.getenv('OPENAI_TEMPERATURE', '0.7')),
+            'max_tokens': int(os.getenv('OPENAI_MAX_TOKENS', '1000')),
+        }
     
-    def buscar_casos(self, consulta: str) -> List[Dict[str, Any]]:
+    def recuperar_contexto(self, consulta: str, usuario=None, analisis: Dict[str, Any] = None) -> Dict[str, Any]:
         """
-        Busca casos relevantes basándose en la consulta
+        Etapa única de recuperación: consulta la base de datos una sola vez por
+        mensaje. El resultado alimenta el prompt (se pasa como `contexto` a
+        generar_respuesta_ia) y los documentos consultados.
         """
-        resultados = []
-        
-        casos = Caso.objects.filter(
-            Q(nroCaso__icontains=consulta) |
-            Q(tipoCaso__icontains=consulta) |
-            Q(descripcion__icontains=consulta)
-        )
-        
-        for caso in casos:
-            resultados.append({
-                'tipo': 'caso',
-                'objeto': caso,
-                'relevancia': 0.9,
-                'razon': f"Caso encontrado: {caso.nroCaso} - {caso.tipoCaso}"
-            })
-        
-        return sorted(resultados, key=lambda x: x['relevancia'], reverse=True)[:5]
+        return self.db_service.consultar_informacion(consulta, usuario, analisis)
+    
+    @staticmethod
+    def documentos_consultados(contexto: Dict[str, Any]) -> List[int]:
+        """Ids de los documentos recuperados"""
+        return [documento['id'] for documento in contexto.get('documentos') or []]
     
-    def generar_respuesta_ia(self, consulta: str, contexto: List[Dict[str, Any]], conversacion_historial: List[str] = None, usuario=None) -> str:
+    def generar_respuesta_ia(self, consulta: str, contexto: Dict[str, Any] = None, conversacion_historial: List[Dict[str, str]] = None, usuario=None, analisis: Dict[str, Any] = None, lanzar_errores: bool = False, uso: Dict[str, int] = None) -> str:
         """
-        Genera una respuesta usando OpenAI basándose en la consulta y el contexto encontrado
+        Genera una respuesta usando OpenAI basándose en la consulta y el contexto
+        de recuperar_contexto (si no se pasa, se recupera aquí).
+        Con `lanzar_errores` las excepciones se propagan (la cola decide si reintentar).
+        Si se pasa `uso`, se completa con los tokens consumidos (ver `_registrar_uso`).
         """
         try:
-            # Usar el nuevo servicio de base de datos para obtener información específica
-            db_resultados = self.db_service.consultar_informacion(consulta, usuario)
+            respuesta_directa, mensajes = self._preparar_mensajes(consulta, conversacion_historial, usuario, analisis, contexto)
             
             # Si hay una respuesta directa de la base de datos, usarla
-            if db_resultados.get('respuesta_directa'):
-                return db_resultados['respuesta_directa']
-            
-            # Construir el contexto del sistema
-            contexto_sistema = self._construir_contexto_sistema()
-            
-            # Construir el contexto de la consulta con los resultados de la DB
-            contexto_consulta = self._construir_contexto_mejorado(db_resultados)
-            
-            # Construir el historial de conversación
-            historial = self._construir_historial(conversacion_historial) if conversacion_historial else []
-            
-            # Preparar mensajes para OpenAI
-            mensajes = [
-                {"role": "system", "content": contexto_sistema}
-            ] + historial + [
-                {"role": "user", "content": f"{consulta}\n\nInformación encontrada en la base de datos:\n{contexto_consulta}"}
-            ]
+            if respuesta_directa:
+                self._registrar_uso(uso)
+                return respuesta_directa
             
             # Llamar a OpenAI
+            configuracion = self.configuracion()
             response = self.client.chat.completions.create(
-                model=self.modelo,
+                model=configuracion['modelo'],
                 messages=mensajes,
-                temperature=self.temperatura,
-                max_tokens=self.max_tokens
+                temperature=configuracion['temperatura'],
+                max_tokens=configuracion['max_tokens']
             )
             
-            return response.choices[0].message.content
+            respuesta = response.choices[0].message.content
+            self._registrar_uso(uso, mensajes, respuesta, response.usage)
+            return respuesta
             
         except Exception as e:
-            error_msg = str(e)
+            if lanzar_errores:
+                raise
+            return self._mensaje_error(e)
+    
+    async def generar_respuesta_ia_stream(self, consulta: str, contexto: Dict[str, Any] = None, conversacion_historial: List[Dict[str, str]] = None, usuario=None, analisis: Dict[str, Any] = None, uso: Dict[str, int] = None, lanzar_errores: bool = False) -> AsyncIterator[str]:
+        """
+        Variante asíncrona de generar_respuesta_ia: entrega la respuesta de
+        OpenAI por fragmentos a medida que llegan (stream=True).
+        Con `lanzar_errores` las excepciones se propagan (ver cola.generar_stream).
+        """
+        try:
+            respuesta_directa, mensajes = await sync_to_async(self._preparar_mensajes)(
+                consulta, conversacion_historial, usuario, analisis, contexto
+            )
             
-            # Mensajes de error más específicos
-            if "API key" in error_msg or "authentication" in error_msg:
-                return "⚠️ Error de configuración: No se ha configurado la API key de OpenAI. Por favor, revisa el archivo .env y agrega OPENAI_API_KEY=tu-api-key-aqui"
-            elif "quota" in error_msg or "billing" in error_msg:
-                return "⚠️ Error de crédito: Tu cuenta de OpenAI no tiene crédito suficiente. Ve a https://platform.openai.com/account/billing para agregar crédito."
-            elif "rate limit" in error_msg:
-                return "⚠️ Límite de velocidad: Has excedido el límite de solicitudes. Espera unos momentos antes de intentar nuevamente."
-            else:
-                return f"⚠️ Error al procesar tu consulta: {error_msg}"
+            if respuesta_directa:
+                self._registrar_uso(uso)
+                yield respuesta_directa
+                return
+            
+            configuracion = await sync_to_async(self.configuracion)()
+            stream = await self.async_client.chat.completions.create(
+                model=configuracion['modelo'],
+                messages=mensajes,
+                temperature=configuracion['temperatura'],
+                max_tokens=configuracion['max_tokens'],
+                stream=True,
+                stream_options={'include_usage': True}
+            )
+            
+            fragmentos = []
+            uso_openai = None
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    fragmentos.append(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+                # El último chunk trae el uso de tokens (sin choices)
+                if getattr(chunk, 'usage', None):
+                    uso_openai = chunk.usage
+            self._registrar_uso(uso, mensajes, ''.join(fragmentos), uso_openai)
+                    
+        except Exception as e:
+            if lanzar_errores:
+                raise
+            yield self._mensaje_error(e)
+    
+    def _preparar_mensajes(self, consulta: str, conversacion_historial: List[Dict[str, str]] = None, usuario=None, analisis: Dict[str, Any] = None, db_resultados: Dict[str, Any] = None) -> Tuple[Optional[str], List[Dict[str, str]]]:
+        """
+        Arma los mensajes para OpenAI a partir de lo recuperado de la base de
+        datos (solo se consulta si no se recibió `db_resultados`).
+        Devuelve (respuesta_directa, mensajes); si hay respuesta directa no hace falta llamar a OpenAI.
+        """
+        if not db_resultados:
+            db_resultados = self.recuperar_contexto(consulta, usuario, analisis)
+        
+        if db_resultados.get('respuesta_directa'):
+            return db_resultados['respuesta_directa'], []
+        
+        # Construir el contexto del sistema
+        contexto_sistema = self._construir_contexto_sistema()
+        
+        # Construir el contexto de la consulta con los resultados de la DB
+        contexto_consulta = self._construir_contexto_mejorado(db_resultados)
+        
+        mensaje_sistema = {"role": "system", "content": contexto_sistema}
+        mensaje_usuario = {"role": "user", "content": f"{consulta}\n\nInformación encontrada en la base de datos:\n{contexto_consulta}"}
+        
+        # El historial ocupa lo que quede de la ventana de contexto después del
+        # prompt y de los tokens reservados para la respuesta
+        presupuesto = min(
+            settings.CHAT_HISTORIAL_MAX_TOKENS,
+            settings.CHAT_VENTANA_CONTEXTO_TOKENS
+            - self.configuracion()['max_tokens']
+            - historial_chat.contar_tokens_mensajes([mensaje_sistema, mensaje_usuario])
+        )
+        historial = historial_chat.ajustar_historial(conversacion_historial or [], presupuesto)
+        
+        # Preparar mensajes para OpenAI
+        mensajes = [mensaje_sistema] + historial + [mensaje_usuario]
+        return None, mensajes
+    
+    @staticmethod
+    def _registrar_uso(uso: Optional[Dict[str, int]], mensajes: List[Dict[str, str]] = None, respuesta: str = '', uso_openai=None):
+        """
+        Completa `uso` con los tokens de entrada, de salida y el total. Se usa
+        lo que informa OpenAI; si no lo informa, se cuentan localmente. Las
+        respuestas directas de la base de datos no consumen tokens.
+        """
+        if uso is None:
+            return
+        if uso_openai is not None:
+            uso['tokens_prompt'] = uso_openai.prompt_tokens
+            uso['tokens_respuesta'] = uso_openai.completion_tokens
+        elif mensajes:
+            uso['tokens_prompt'] = historial_chat.contar_tokens_mensajes(mensajes)
+            uso['tokens_respuesta'] = historial_chat.contar_tokens(respuesta)
+        else:
+            uso['tokens_prompt'] = uso['tokens_respuesta'] = 0
+        uso['tokens_usados'] = uso['tokens_prompt'] + uso['tokens_respuesta']
+    
+    @staticmethod
+    def _mensaje_error(error: Exception) -> str:
+        """Traduce los errores de OpenAI a un mensaje para el usuario"""
+        error_msg = str(error)
+        
+        # Mensajes de error más específicos
+        if "API key" in error_msg or "authentication" in error_msg:
+            return f"{PREFIJO_ERROR} Error de configuración: No se ha configurado la API key de OpenAI. Por favor, revisa el archivo .env y agrega OPENAI_API_KEY=tu-api-key-aqui"
+        elif "quota" in error_msg or "billing" in error_msg:
+            return f"{PREFIJO_ERROR} Error de crédito: Tu cuenta de OpenAI no tiene crédito suficiente. Ve a https://platform.openai.com/account/billing para agregar crédito."
+        elif "rate limit" in error_msg:
+            return f"{PREFIJO_ERROR} Límite de velocidad: Has excedido el límite de solicitudes. Espera unos momentos antes de intentar nuevamente."
+        else:
+            return f"{PREFIJO_ERROR} Error al procesar tu consulta: {error_msg}"
     
     def _construir_contexto_sistema(self) -> str:
         """
@@ -239,162 +315,24 @@ INSTRUCCIONES:
 FORMATO DE RESPUESTA:
 - Usa viñetas para organizar información
 - Incluye números de caso, nombres de documentos y fechas SOLO cuando estén en el contexto
-- Proporciona referencias específicas SOLO cuando estén disponibles en los datos reales"""
-    
-    def _construir_contexto_consulta(self, contexto: List[Dict[str, Any]]) -> str:
-        """
-        Construye el contexto de la consulta basándose en los resultados encontrados
-        """
-        if not contexto:
-            return "No se encontró información relevante en la base de datos."
-        
-        contexto_texto = "Información encontrada:\n\n"
-        
-        for item in contexto:
-            if item['tipo'] == 'documento':
-                doc = item['objeto']
-                contexto_texto += f"📄 DOCUMENTO: {doc.nombreDocumento}\n"
-                contexto_texto += f"   - Tipo: {doc.tipoDocumento.nombre}\n"
-                contexto_texto += f"   - Caso: {doc.carpeta.expediente.caso.nroCaso}\n"
-                contexto_texto += f"   - Fecha: {doc.fechaDoc}\n"
-                contexto_texto += f"   - Estado: {doc.estado}\n"
-                if doc.palabraClave:
-                    contexto_texto += f"   - Palabras clave: {doc.palabraClave}\n"
-                contexto_texto += "\n"
-            
-            elif item['tipo'] == 'actor':
-                actor = item['objeto']
-                contexto_texto += f"👤 ACTOR: {actor.nombres} {actor.apellidoPaterno}\n"
-                contexto_texto += f"   - Tipo: {actor.get_tipoActor_display()}\n"
-                contexto_texto += f"   - CI: {actor.ci}\n"
-                contexto_texto += f"   - Estado: {actor.estadoActor}\n"
-                if actor.telefono:
-                    contexto_texto += f"   - Teléfono: {actor.telefono}\n"
-                contexto_texto += "\n"
-            
-            elif item['tipo'] == 'caso':
-                caso = item['objeto']
-                contexto_texto += f"⚖️ CASO: {caso.nroCaso}\n"
-                contexto_texto += f"   - Tipo: {caso.tipoCaso}\n"
-                contexto_texto += f"   - Estado: {caso.estado}\n"
-                contexto_texto += f"   - Prioridad: {caso.prioridad}\n"
-                contexto_texto += f"   - Fecha inicio: {caso.fechaInicio}\n"
-                if caso.descripcion:
-                    contexto_texto += f"   - Descripción: {caso.descripcion}\n"
-                contexto_texto += "\n"
-        
-        return contexto_texto
+- Proporciona referencias específicas SOLO cuando estén disponibles en los datos reales
+
+FORMATO DEL CONTEXTO:
+""" + contexto_prompt.DESCRIPCION_FORMATO
     
     def _construir_contexto_mejorado(self, db_resultados: Dict[str, Any]) -> str:
         """
         Construye el contexto mejorado con los resultados de la base de datos
+        (formato compacto de chat/contexto_prompt.py)
         """
         # Si hay una respuesta directa de la base de datos, usarla como contexto principal
         if db_resultados.get('respuesta_directa'):
-            return f"**Información encontrada en la base de datos:**\n{db_resultados['respuesta_directa']}"
-        
-        contexto_texto = ""
-        
-        # Agregar estadísticas si existen
-        if db_resultados.get('estadisticas'):
-            stats = db_resultados['estadisticas']
-            contexto_texto += "📊 ESTADÍSTICAS DEL SISTEMA:\n"
-            
-            if 'casos' in stats:
-                casos_stats = stats['casos']
-                contexto_texto += f"• Total de casos: {casos_stats['total']}\n"
-                contexto_texto += f"• Casos abiertos: {casos_stats['abiertos']}\n"
-                contexto_texto += f"• Casos cerrados: {casos_stats['cerrados']}\n"
-            
-            if 'documentos' in stats:
-                docs_stats = stats['documentos']
-                contexto_texto += f"• Total de documentos: {docs_stats['total']}\n"
-                contexto_texto += f"• Con palabras clave: {docs_stats['con_palabras_clave']}\n"
-            
-            if 'actores' in stats:
-                actores_stats = stats['actores']
-                contexto_texto += f"• Total de actores: {actores_stats['total']}\n"
-                contexto_texto += f"• Abogados: {actores_stats['abogados']}\n"
-                contexto_texto += f"• Clientes: {actores_stats['clientes']}\n"
-                contexto_texto += f"• Asistentes: {actores_stats['asistentes']}\n"
-            
-            contexto_texto += "\n"
-        
-        # Agregar casos encontrados
-        if db_resultados.get('casos'):
-            contexto_texto += "📁 CASOS ENCONTRADOS:\n"
-            for caso in db_resultados['casos']:
-                contexto_texto += f"• {caso['numero']} - {caso['tipo']}\n"
-                contexto_texto += f"  - Estado: {caso['estado']}\n"
-                contexto_texto += f"  - Fecha: {caso['fecha_inicio'].strftime('%d/%m/%Y') if caso['fecha_inicio'] else 'N/A'}\n"
-                contexto_texto += f"  - Documentos: {caso['documentos_count']}\n"
-            contexto_texto += "\n"
-        
-        # Agregar documentos encontrados
-        if db_resultados.get('documentos'):
-            contexto_texto += "📄 DOCUMENTOS ENCONTRADOS:\n"
-            for doc in db_resultados['documentos']:
-                contexto_texto += f"• {doc['nombre']}\n"
-                contexto_texto += f"  - Tipo: {doc['tipo']}\n"
-                contexto_texto += f"  - Fecha: {doc['fecha'].strftime('%d/%m/%Y') if doc['fecha'] else 'N/A'}\n"
-                if doc['caso']:
-                    contexto_texto += f"  - Caso: {doc['caso']}\n"
-            contexto_texto += "\n"
-        
-        # Agregar actores encontrados
-        if db_resultados.get('actores'):
-            contexto_texto += "👥 ACTORES ENCONTRADOS:\n"
-            for actor in db_resultados['actores']:
-                nombre_completo = f"{actor['nombres']} {actor['apellido_paterno']} {actor['apellido_materno']}"
-                contexto_texto += f"• {nombre_completo}\n"
-                contexto_texto += f"  - Tipo: {actor['tipo']}\n"
-                contexto_texto += f"  - CI: {actor['ci']}\n"
-                if actor['info_adicional']:
-                    for key, value in actor['info_adicional'].items():
-                        contexto_texto += f"  - {key.replace('_', ' ').title()}: {value}\n"
-            contexto_texto += "\n"
-        
-        return contexto_texto
-    
-    def _construir_historial(self, historial: List[str]) -> List[Dict[str, str]]:
-        """
-        Construye el historial de conversación para OpenAI
-        """
-        mensajes = []
-        for i, mensaje in enumerate(historial):
-            role = "user" if i % 2 == 0 else "assistant"
-            mensajes.append({"role": role, "content": mensaje})
-        return mensajes
+            return db_resultados['respuesta_directa']
+        return contexto_prompt.serializar_resultados(db_resultados)
     
     def analizar_consulta(self, consulta: str) -> Dict[str, Any]:
         """
-        Analiza la consulta del usuario para determinar el tipo de búsqueda
+        Analiza la consulta del usuario para determinar el tipo de búsqueda.
+        El resultado se reutiliza en todas las búsquedas del mismo mensaje.
         """
-        consulta_lower = consulta.lower()
-        
-        # Detectar tipo de consulta
-        if any(palabra in consulta_lower for palabra in ['documento', 'contrato', 'factura', 'escritura', 'certificado']):
-            tipo = 'documento'
-        elif any(palabra in consulta_lower for palabra in ['abogado', 'cliente', 'asistente', 'persona']):
-            tipo = 'actor'
-        elif any(palabra in consulta_lower for palabra in ['caso', 'expediente', 'proceso', 'demanda']):
-            tipo = 'caso'
-        else:
-            tipo = 'general'
-        
-        # Extraer entidades
-        entidades = []
-        if 'contrato' in consulta_lower:
-            entidades.append('contrato')
-        if 'factura' in consulta_lower:
-            entidades.append('factura')
-        if 'abogado' in consulta_lower:
-            entidades.append('abogado')
-        if 'cliente' in consulta_lower:
-            entidades.append('cliente')
-        
-        return {
-            'tipo': tipo,
-            'entidades': entidades,
-            'consulta_original': consulta
-        }
+        return analizar_consulta(consulta)
@@ -0,0 +1,89 @@
+"""
+Invalidación de las cachés del chat (sugerencias y respuestas) y de la
+configuración del asistente IA.
+
+Los datos de SuggestionService y las respuestas se cachean con TTL; cualquier
+alta, cambio o baja de los modelos que los alimentan los descarta. Las
+operaciones masivas (update/bulk_create) no emiten señales y se refrescan al
+vencer el TTL.
+
+También mantiene al día los embeddings de documentos y casos (chat/embeddings.py);
+lo que no emite señales lo recalcula `manage.py indexar_embeddings`.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from actores.models import Abogado, Actor, Asistente, Cliente
+from casos.models import Carpeta, Caso, EquipoCaso, Expediente, ParteProcesal
+from documentos.models import Documento, TipoDocumento
+from seguridad.models import Rol, Usuario, UsuarioRol
+from . import cache_respuestas, embeddings
+from .models import ConfiguracionIA, Embedding
+from .services import AsistenteIAService
+from .suggestion_service import invalidar_datos_sugerencias, invalidar_tipo_actor
+
+
+@receiver([post_save, post_delete], sender=Caso)
+@receiver([post_save, post_delete], sender=Documento)
+@receiver([post_save, post_delete], sender=TipoDocumento)
+@receiver([post_save, post_delete], sender=Abogado)
+@receiver([post_save, post_delete], sender=Cliente)
+@receiver([post_save, post_delete], sender=Asistente)
+def invalidar_sugerencias(sender, **kwargs):
+    invalidar_datos_sugerencias()
+
+
+@receiver([post_save, post_delete], sender=Actor)
+def invalidar_sugerencias_actor(sender, instance, **kwargs):
+    invalidar_datos_sugerencias()
+    invalidar_tipo_actor(instance.usuario_id)
+
+
+TIPOS_EMBEDDING = {
+    Documento: Embedding.TIPO_DOCUMENTO,
+    Caso: Embedding.TIPO_CASO,
+}
+
+
+@receiver(post_save, sender=Documento)
+@receiver(post_save, sender=Caso)
+def actualizar_embedding(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # Después del commit: el vector se calcula con los datos confirmados
+    transaction.on_commit(lambda: embeddings.actualizar_ids(TIPOS_EMBEDDING[sender], [instance.pk]))
+
+
+@receiver(post_delete, sender=Documento)
+@receiver(post_delete, sender=Caso)
+def eliminar_embedding(sender, instance, **kwargs):
+    # delete() deja el pk en None antes del commit
+    objeto_id = instance.pk
+    transaction.on_commit(lambda: embeddings.eliminar(TIPOS_EMBEDDING[sender], [objeto_id]))
+
+
+@receiver([post_save, post_delete], sender=ConfiguracionIA)
+def recargar_configuracion_ia(sender, **kwargs):
+    AsistenteIAService.recargar_configuracion()
+
+
+# Tablas que consultan las respuestas del chat (DatabaseQueryService)
+MODELOS_CONSULTADOS = (
+    Caso, Expediente, Carpeta, EquipoCaso, ParteProcesal,
+    Documento, TipoDocumento,
+    Actor, Abogado, Cliente, Asistente,
+    Usuario, Rol, UsuarioRol,
+)
+
+
+def invalidar_respuestas(sender, update_fields=None, **kwargs):
+    # El inicio de sesión solo actualiza last_login, que no se consulta
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    cache_respuestas.incrementar_version_datos()
+
+
+for modelo in MODELOS_CONSULTADOS:
+    post_save.connect(invalidar_respuestas, sender=modelo, dispatch_uid=f'respuestas_{modelo._meta.label}_save')
+    post_delete.connect(invalidar_respuestas, sender=modelo, dispatch_uid=f'respuestas_{modelo._meta.label}_delete')
@@ -1,4 +1,6 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from casos.models import Caso, Expediente, Carpeta
 from documentos.models import Documento, TipoDocumento, EtapaProcesal
 from actores.models import Actor, Abogado, Cliente, Asistente
@@ -8,6 +10,20 @@ import random
 
 User = get_user_model()
 
+CACHE_KEY_DATOS = 'chat:sugerencias:datos'
+CACHE_KEY_TIPO_ACTOR = 'chat:sugerencias:tipo_actor:{}'
+
+
+def invalidar_datos_sugerencias():
+    """Descarta los datos cacheados de sugerencias (ver chat/signals.py)"""
+    cache.delete(CACHE_KEY_DATOS)
+
+
+def invalidar_tipo_actor(usuario_id):
+    """Descarta el tipo de actor cacheado de un usuario"""
+    cache.delete(CACHE_KEY_TIPO_ACTOR.format(usuario_id))
+
+
 class SuggestionService:
     """
     Servicio para generar sugerencias inteligentes basadas en datos reales de la DB
@@ -22,21 +38,44 @@ class SuggestionService:
         """
         suggestions = []
         
-        # Obtener datos reales de la base de datos
-        casos_data = self._get_casos_data()
-        documentos_data = self._get_documentos_data()
-        actores_data = self._get_actores_data()
+        # Obtener datos reales de la base de datos (o de la caché)
+        datos = self._get_datos()
         
         # Generar sugerencias basadas en datos reales
-        suggestions.extend(self._generate_casos_suggestions(casos_data))
-        suggestions.extend(self._generate_documentos_suggestions(documentos_data))
-        suggestions.extend(self._generate_actores_suggestions(actores_data))
+        suggestions.extend(self._generate_casos_suggestions(datos['casos']))
+        suggestions.extend(self._generate_documentos_suggestions(datos['documentos']))
+        suggestions.extend(self._generate_actores_suggestions(datos['actores']))
         suggestions.extend(self._generate_general_suggestions())
         
         # Mezclar y limitar sugerencias
         random.shuffle(suggestions)
         return suggestions[:8]  # Máximo 8 sugerencias
     
+    def _get_datos(self):
+        """
+        Datos usados para las sugerencias. Se guardan en caché durante
+        SUGERENCIAS_CACHE_TTL segundos y se invalidan al guardar o eliminar
+        casos, documentos, tipos de documento o actores.
+        """
+        datos = cache.get(CACHE_KEY_DATOS)
+        if datos is None:
+            datos = {
+                'casos': self._get_casos_data(),
+                'documentos': self._get_documentos_data(),
+                'actores': self._get_actores_data(),
+            }
+            cache.set(CACHE_KEY_DATOS, datos, settings.SUGERENCIAS_CACHE_TTL)
+        return datos
+    
+    def _get_tipo_actor(self, user):
+        """Tipo de actor del usuario ('' si no tiene actor asociado), en caché"""
+        clave = CACHE_KEY_TIPO_ACTOR.format(user.pk)
+        tipo_actor = cache.get(clave)
+        if tipo_actor is None:
+            tipo_actor = Actor.objects.filter(usuario=user).values_list('tipoActor', flat=True).first() or ''
+            cache.set(clave, tipo_actor, settings.SUGERENCIAS_CACHE_TTL)
+        return tipo_actor
+    
     def _get_casos_data(self):
         """Obtiene datos reales de casos"""
         casos = Caso.objects.all()
@@ -214,37 +253,34 @@ class SuggestionService:
         suggestions = []
         
         # Si el usuario tiene un actor asociado
-        try:
-            actor = user.actor
-            if actor.tipoActor == 'ABO':  # Abogado
-                suggestions.extend([
-                    {
-                        'text': f"¿Cuáles son mis casos asignados?",
-                        'category': 'personal',
-                        'icon': '👨‍💼'
-                    },
-                    {
-                        'text': f"¿Qué documentos he creado recientemente?",
-                        'category': 'personal',
-                        'icon': '📝'
-                    }
-                ])
-            elif actor.tipoActor == 'CLI':  # Cliente
-                suggestions.extend([
-                    {
-                        'text': f"¿Cuáles son mis casos?",
-                        'category': 'personal',
-                        'icon': '👤'
-                    },
-                    {
-                        'text': f"¿Qué documentos están relacionados conmigo?",
-                        'category': 'personal',
-                        'icon': '📄'
-                    }
-                ])
-        except:
-            pass
-        
+        tipo_actor = self._get_tipo_actor(user)
+        if tipo_actor == 'ABO':  # Abogado
+            suggestions.extend([
+                {
+                    'text': f"¿Cuáles son mis casos asignados?",
+                    'category': 'personal',
+                    'icon': '👨‍💼'
+                },
+                {
+                    'text': f"¿Qué documentos he creado recientemente?",
+                    'category': 'personal',
+                    'icon': '📝'
+                }
+            ])
+        elif tipo_actor == 'CLI':  # Cliente
+            suggestions.extend([
+                {
+                    'text': f"¿Cuáles son mis casos?",
+                    'category': 'personal',
+                    'icon': '👤'
+                },
+                {
+                    'text': f"¿Qué documentos están relacionados conmigo?",
+                    'category': 'personal',
+                    'icon': '📄'
+                }
+            ])
+    
         # Agregar sugerencias generales
         suggestions.extend(self.get_smart_suggestions(user))
         
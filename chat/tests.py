@@ -1,3 +1,1384 @@
-from django.test import TestCase
+import io
+import json
+import os
+from datetime import date, timedelta
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import httpx
+import numpy as np
+import openai
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.db.models import Q
+from django.utils import timezone
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from actores.models import Abogado, Actor, Cliente
+from casos.models import Caso, Expediente, Carpeta, EquipoCaso, ParteProcesal
+from dashboard.models import Estadistica
+from documentos.models import Documento, TipoDocumento
+from seguridad.models import Usuario
+from .database_service import DatabaseQueryService
+from .models import CambioEmbedding, ConfiguracionIA, ConsultaDocumento, Conversacion, Embedding, Mensaje
+from .openai_falso import ServidorOpenAIFalso
+from . import benchmark, cache_respuestas, cola, contexto_prompt, embeddings, ranking
+from . import historial as historial_chat
+from .views import procesar_consulta_ia
+from .query_analyzer import analizar_consulta
+from .services import AsistenteIAService
+from .suggestion_service import SuggestionService
+
+
+def crear_casos(cantidad, carpetas_por_caso=3, documentos_por_carpeta=2):
+    """Crea `cantidad` casos con expediente, carpetas y documentos"""
+    tipo = TipoDocumento.objects.get_or_create(nombre='Demanda')[0]
+    casos = []
+    for i in range(cantidad):
+        caso = Caso.objects.create(
+            nroCaso=f'CIV-2024-{i:03d}',
+            tipoCaso='Divorcio',
+            descripcion=f'Caso de prueba {i}',
+            estado='ABIERTO',
+            fechaInicio=date(2024, 1, 1 + i % 28),
+        )
+        expediente = Expediente.objects.create(
+            caso=caso, nroExpediente=f'EXP-{caso.nroCaso}', fechaCreacion=caso.fechaInicio
+        )
+        for j in range(carpetas_por_caso):
+            carpeta = Carpeta.objects.create(expediente=expediente, nombre=f'Carpeta {j}')
+            Documento.objects.bulk_create([
+                Documento(
+                    carpeta=carpeta,
+                    tipoDocumento=tipo,
+                    nombreDocumento=f'Documento {i}-{j}-{k}',
+                    rutaDocumento=f'/docs/{i}/{j}/{k}.pdf',
+                    tamano=1.0,
+                    fechaDoc=caso.fechaInicio,
+                )
+                for k in range(documentos_por_carpeta)
+            ])
+        casos.append(caso)
+    return casos
+
+
+class ConteoDocumentosCasosTests(TestCase):
+    """
+    Regresión de cantidad de consultas SQL: el conteo de documentos por caso
+    no debe crecer con la cantidad de casos, expedientes o carpetas.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.casos = crear_casos(10)
+
+    def setUp(self):
+        self.service = DatabaseQueryService()
+
+    def test_documentos_count_en_una_consulta(self):
+        with self.assertNumQueries(1):
+            casos = self.service._buscar_casos_especificos(analizar_consulta('casos abiertos'))
+
+        self.assertEqual(len(casos), 10)
+        self.assertTrue(all(caso['documentos_count'] == 6 for caso in casos))
+
+    def test_documentos_count_caso_sin_documentos(self):
+        Caso.objects.create(nroCaso='PEN-2024-999', tipoCaso='Robo', fechaInicio=date(2024, 2, 1))
+
+        casos = self.service._buscar_casos_especificos(analizar_consulta('pen-2024-999'))
+
+        self.assertEqual(len(casos), 1)
+        self.assertEqual(casos[0]['documentos_count'], 0)
+
+    def test_consultas_por_respuesta_de_chat(self):
+        with self.assertNumQueries(1):
+            resultados = self.service.consultar_informacion('¿Qué casos abiertos hay?')
+
+        self.assertEqual(len(resultados['casos']), 10)
+        self.assertIsNotNone(resultados['respuesta_directa'])
+
+    def test_documentos_de_un_caso_sin_terminos(self):
+        # Filtro por número de caso, los más recientes primero, en una sola consulta
+        with self.assertNumQueries(1):
+            resultados = self.service._buscar_documentos_especificos(analizar_consulta('CIV-2024-003'))
+
+        self.assertEqual(len(resultados), 5)
+        self.assertEqual({d['caso'] for d in resultados}, {'CIV-2024-003'})
+
+    @override_settings(CHAT_RANKING_RESULTADOS=5)
+    def test_documentos_solo_instancia_los_devueltos(self):
+        Documento.objects.filter(carpeta__expediente__caso__nroCaso__in=['CIV-2024-000', 'CIV-2024-001']) \
+            .update(nombreDocumento='Contrato de arrendamiento')
+
+        # Cada fuente del ranking se ordena y limita en SQL; solo se cargan los elegidos
+        with mock.patch.object(Documento, 'from_db', wraps=Documento.from_db) as from_db:
+            resultados = self.service._buscar_documentos_especificos(analizar_consulta('contrato de arrendamiento'))
+
+        self.assertEqual(len(resultados), 5)
+        self.assertEqual(from_db.call_count, 5)
+        self.assertEqual(len({d['id'] for d in resultados}), 5)
+        relevancias = [d['relevancia'] for d in resultados]
+        self.assertEqual(relevancias, sorted(relevancias, reverse=True))
+
+    def test_documentos_sin_terminos_ni_filtros(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(self.service._buscar_documentos_especificos(analizar_consulta('¿?')), [])
+
+
+class BusquedaTextoCompletoTests(TestCase):
+    """
+    Búsqueda rankeada (tsvector + GIN) usada por el chat en lugar de icontains
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        crear_casos(2)
+        Documento.objects.filter(nombreDocumento='Documento 0-0-0').update(
+            nombreDocumento='Contrato de arrendamiento', palabraClave='alquiler inmueble'
+        )
+        usuario = Usuario.objects.create_user(username='agarcia', email='agarcia@test.com', password='x')
+        Actor.objects.create(
+            usuario=usuario, tipoActor='ABO', nombres='Ana', apellidoPaterno='García',
+            apellidoMaterno='López', ci='87654321',
+        )
+
+    def test_pregunta_de_varias_palabras(self):
+        documentos = Documento.objects.buscar('¿Dónde está el contrato de alquiler?')
+
+        self.assertEqual([d.nombreDocumento for d in documentos], ['Contrato de arrendamiento'])
+
+    def test_ignora_acentos_y_mayusculas(self):
+        self.assertEqual(Actor.objects.buscar('garcia').count(), 1)
+        self.assertEqual(Actor.objects.buscar('GARCÍA lópez').count(), 1)
+        self.assertEqual(Actor.objects.buscar('87654321').count(), 1)
+
+    def test_ordena_por_relevancia(self):
+        casos = list(Caso.objects.buscar('caso CIV-2024-001 divorcio'))
+
+        self.assertEqual(casos[0].nroCaso, 'CIV-2024-001')
+        self.assertGreater(casos[0].rango, casos[1].rango)
+
+    def test_consulta_vacia(self):
+        self.assertFalse(Caso.objects.buscar('¿?').exists())
+
+
+class AnalisisConsultaTests(TestCase):
+    """
+    Análisis único de la consulta (tokens, stopwords y entidades)
+    """
+
+    def test_extrae_entidades(self):
+        analisis = analizar_consulta('¿Qué documentos tiene el caso civ-2024-001 del 15/03/2024?')
+
+        self.assertEqual(analisis['numeros_caso'], ['CIV-2024-001'])
+        self.assertEqual(analisis['fechas'], [date(2024, 3, 15)])
+        self.assertEqual(analisis['terminos'], [])
+        self.assertEqual(analisis['tipo'], 'documento')
+        self.assertTrue(analisis['es_especifica'])
+
+    def test_descarta_stopwords_y_vocabulario(self):
+        analisis = analizar_consulta('Muéstrame los contratos de alquiler del abogado Mendoza, CI 12345678')
+
+        self.assertEqual(analisis['terminos'], ['contratos', 'alquiler', 'mendoza'])
+        self.assertEqual(analisis['cis'], ['12345678'])
+        self.assertEqual(analisis['tipos_documento'], ['Contrato'])
+        self.assertEqual(analisis['tipos_actor'], ['ABO'])
+
+    def test_estado_y_tipo_de_caso(self):
+        analisis = analizar_consulta('¿Cuántos casos de divorcio están abiertos?')
+
+        self.assertEqual(analisis['estado_caso'], 'ABIERTO')
+        self.assertEqual(analisis['tipos_caso'], ['Divorcio'])
+        self.assertTrue(analisis['es_estadistica'])
+
+    def test_entidades_serializables(self):
+        analisis = analizar_consulta('facturas del cliente 7654321 del 2024-01-31')
+
+        self.assertEqual(analisis['entidades'], ['7654321', '2024-01-31', 'factura', 'cliente'])
+
+
+class ConsultaIndexadaTests(TestCase):
+    """
+    Los filtros se construyen con las entidades extraídas y no con la oración completa
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        crear_casos(3)
+
+    def setUp(self):
+        self.service = DatabaseQueryService()
+
+    def test_documentos_del_caso_por_numero(self):
+        # caso por nroCaso + documentos por nroCaso del caso
+        with self.assertNumQueries(2):
+            resultados = self.service.consultar_informacion('¿Qué documentos tiene el caso CIV-2024-001?')
+
+        self.assertEqual(len(resultados['casos']), 1)
+        self.assertEqual(resultados['casos'][0]['numero'], 'CIV-2024-001')
+        self.assertEqual(len(resultados['documentos']), 5)
+
+    def test_documentos_por_numero_de_caso(self):
+        documentos = self.service._buscar_documentos_especificos(analizar_consulta('documentos CIV-2024-002'))
+
+        self.assertEqual(len(documentos), 5)
+        self.assertTrue(all(doc['caso'] == 'CIV-2024-002' for doc in documentos))
+
+    def test_sin_predicados_no_consulta(self):
+        with self.assertNumQueries(0):
+            documentos = self.service._buscar_documentos_especificos(analizar_consulta('¿qué documentos hay?'))
+
+        self.assertEqual(documentos, [])
+
+
+class CasosDelUsuarioTests(TestCase):
+    """
+    "Mis casos" y "mis documentos" se limitan a los casos del actor del
+    usuario (EquipoCaso vigente o ParteProcesal) en una sola consulta
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.casos = crear_casos(6, carpetas_por_caso=1, documentos_por_carpeta=2)
+        cls.abogado = Usuario.objects.create_user(username='abogado', email='abogado@test.com', password='x')
+        actor = Actor.objects.create(
+            usuario=cls.abogado, tipoActor='ABO', nombres='Ana', apellidoPaterno='García', ci='111',
+        )
+        EquipoCaso.objects.create(actor=actor, caso=cls.casos[0], rolEnEquipo='RESPONSABLE', fechaAsignacion=date(2024, 1, 1))
+        EquipoCaso.objects.create(actor=actor, caso=cls.casos[1], rolEnEquipo='ASOCIADO', fechaAsignacion=date(2024, 1, 1))
+        # Ya no integra el equipo de este caso
+        EquipoCaso.objects.create(
+            actor=actor, caso=cls.casos[2], rolEnEquipo='ASOCIADO',
+            fechaAsignacion=date(2024, 1, 1), fechaSalida=date(2024, 6, 1),
+        )
+
+        cls.cliente = Usuario.objects.create_user(username='cliente', email='cliente@test.com', password='x')
+        actor = Actor.objects.create(
+            usuario=cls.cliente, tipoActor='CLI', nombres='Luis', apellidoPaterno='Pérez', ci='222',
+        )
+        cliente = Cliente.objects.create(actor=actor, tipoCliente='NATURAL')
+        ParteProcesal.objects.create(cliente=cliente, caso=cls.casos[3], rolProcesal='DEMANDANTE', fechaInicio=date(2024, 1, 1))
+
+        cls.sin_actor = Usuario.objects.create_user(username='visitante', email='visitante@test.com', password='x')
+
+    def setUp(self):
+        self.service = DatabaseQueryService()
+
+    def test_mis_casos_por_equipo(self):
+        with self.assertNumQueries(1):
+            resultados = self.service.consultar_informacion('¿Cuáles son mis casos asignados?', self.abogado)
+
+        self.assertEqual(
+            [caso['numero'] for caso in resultados['casos']],
+            [self.casos[1].nroCaso, self.casos[0].nroCaso],
+        )
+        self.assertTrue(all(caso['documentos_count'] == 2 for caso in resultados['casos']))
+
+    def test_mis_casos_como_parte_procesal(self):
+        casos = self.service._buscar_casos_personales(self.cliente, {})
+
+        self.assertEqual([caso['numero'] for caso in casos], [self.casos[3].nroCaso])
+
+    def test_mis_documentos(self):
+        with self.assertNumQueries(1):
+            resultados = self.service.consultar_informacion('¿Qué documentos he creado?', self.abogado)
+
+        self.assertEqual(len(resultados['documentos']), 4)
+        self.assertEqual(
+            {doc['caso'] for doc in resultados['documentos']},
+            {self.casos[0].nroCaso, self.casos[1].nroCaso},
+        )
+
+    def test_limite(self):
+        documentos = self.service._buscar_documentos_personales(self.abogado, {}, limite=3)
+
+        self.assertEqual(len(documentos), 3)
+
+    def test_usuario_sin_actor(self):
+        self.assertEqual(self.service._buscar_casos_personales(self.sin_actor, {}), [])
+        self.assertEqual(self.service._buscar_documentos_personales(self.sin_actor, {}), [])
+
+    def test_informacion_del_actor(self):
+        with self.assertLogs('chat.database_service', 'WARNING'):
+            info = self.service._buscar_informacion_actor_usuario(self.abogado)
+        self.assertEqual((info['email'], info['info_adicional']), ('abogado@test.com', {}))
+
+        Abogado.objects.create(actor=self.abogado.actor, nroCredencial='LP-123', especialidad='Civil')
+        self.abogado.actor.refresh_from_db()
+        info = self.service._buscar_informacion_actor_usuario(self.abogado)
+        self.assertEqual(info['info_adicional']['numero_colegiado'], 'LP-123')
+        self.assertEqual(
+            self.service._buscar_informacion_actor_usuario(self.cliente)['info_adicional'], {'tipo_cliente': 'NATURAL'}
+        )
+        self.assertIsNone(self.service._buscar_informacion_actor_usuario(self.sin_actor))
+
+
+class SugerenciasCacheTests(TestCase):
+    """
+    Los datos de las sugerencias se leen de la caché y se invalidan con señales
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        crear_casos(2)
+        cls.usuario = Usuario.objects.create_user(username='abogado', email='abogado@test.com', password='x')
+        Actor.objects.create(
+            usuario=cls.usuario, tipoActor='ABO', nombres='Ana', apellidoPaterno='García',
+            apellidoMaterno='López', ci='87654321',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.service = SuggestionService()
+
+    def test_sin_consultas_con_cache_caliente(self):
+        self.service.get_contextual_suggestions(self.usuario)
+
+        with self.assertNumQueries(0):
+            sugerencias = SuggestionService().get_contextual_suggestions(self.usuario)
+
+        self.assertEqual(sugerencias[0]['category'], 'personal')
+
+    def test_invalida_al_crear_caso(self):
+        self.assertEqual(self.service._get_datos()['casos']['total'], 2)
+
+        Caso.objects.create(nroCaso='PEN-2024-999', tipoCaso='Robo', fechaInicio=date(2024, 2, 1))
+
+        self.assertEqual(self.service._get_datos()['casos']['total'], 3)
+
+    def test_invalida_al_eliminar_documento(self):
+        self.assertEqual(self.service._get_datos()['documentos']['total'], 12)
+
+        Documento.objects.first().delete()
+
+        self.assertEqual(self.service._get_datos()['documentos']['total'], 11)
+
+    def test_invalida_tipo_actor(self):
+        self.assertEqual(self.service._get_tipo_actor(self.usuario), 'ABO')
+
+        actor = self.usuario.actor
+        actor.tipoActor = 'CLI'
+        actor.save()
+
+        self.assertEqual(self.service._get_tipo_actor(self.usuario), 'CLI')
+
+
+class EstadisticasChatTests(TestCase):
+    """
+    Las preguntas "cuántos" se responden desde la vista materializada
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        crear_casos(3)
+        Estadistica.refrescar()
+
+    def test_estadisticas_en_una_consulta(self):
+        with self.assertNumQueries(1):
+            resultados = DatabaseQueryService().consultar_informacion(
+                '¿Cuántos casos, documentos, abogados y usuarios hay?'
+            )
+
+        estadisticas = resultados['estadisticas']
+        self.assertEqual(estadisticas['casos']['total'], 3)
+        self.assertEqual(estadisticas['casos']['abiertos'], 3)
+        self.assertEqual(estadisticas['casos']['por_tipo'], [{'tipoCaso': 'Divorcio', 'count': 3}])
+        self.assertEqual(estadisticas['documentos']['total'], 18)
+        self.assertEqual(estadisticas['actores']['abogados'], 0)
+        self.assertIn('Total de casos: **3**', resultados['respuesta_directa'])
+
+
+def chunk_openai(contenido):
+    """Fragmento con la forma de un chunk de chat.completions con stream=True"""
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=contenido))])
+
+
+async def stream_openai(*fragmentos):
+    for fragmento in fragmentos:
+        yield chunk_openai(fragmento)
+
+
+def leer_eventos_sse(contenido):
+    eventos = []
+    for bloque in contenido.decode().strip().split('\n\n'):
+        evento, datos = bloque.split('\n')
+        eventos.append((evento[len('event: '):], json.loads(datos[len('data: '):])))
+    return eventos
+
+
+@mock.patch.dict(os.environ, {'OPENAI_API_KEY': 'test'})
+class ChatStreamTests(TestCase):
+    """
+    Endpoint asíncrono que envía la respuesta de la IA como Server-Sent Events
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create_user(username='stream', email='stream@test.com', password='x')
+
+    def setUp(self):
+        cache.clear()
+
+    async def test_stream_de_openai(self):
+        servicio = AsistenteIAService()
+        servicio.async_client = mock.Mock()
+        servicio.async_client.chat.completions.create = mock.AsyncMock(
+            return_value=stream_openai('Hola', None, ', ¿en qué', ' ayudo?')
+        )
+
+        fragmentos = [f async for f in servicio.generar_respuesta_ia_stream('hola', [])]
+
+        self.assertEqual(fragmentos, ['Hola', ', ¿en qué', ' ayudo?'])
+        self.assertTrue(servicio.async_client.chat.completions.create.call_args.kwargs['stream'])
+
+    async def test_envia_tokens_y_guarda_mensaje(self):
+        async def respuesta(self, *args, **kwargs):
+            for fragmento in ['No se encontró ', 'información.']:
+                yield fragmento
+
+        await self.async_client.aforce_login(self.usuario)
+        with mock.patch.object(AsistenteIAService, 'generar_respuesta_ia_stream', respuesta):
+            response = await self.async_client.post(
+                '/chat/api/enviar-mensaje/stream/', {'mensaje': 'hola'}, content_type='application/json'
+            )
+            contenido = b''.join([parte async for parte in response.streaming_content])
+
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        eventos = leer_eventos_sse(contenido)
+        self.assertEqual([evento for evento, _ in eventos], ['inicio', 'token', 'token', 'fin'])
+        self.assertEqual(eventos[-1][1]['mensaje_ia']['contenido'], 'No se encontró información.')
+
+        conversacion = await Conversacion.objects.aget(usuario=self.usuario)
+        tipos = [m.tipo async for m in Mensaje.objects.filter(conversacion=conversacion)]
+        self.assertEqual(tipos, ['usuario', 'asistente'])
+
+    async def stream(self, mensaje='hola'):
+        await self.async_client.aforce_login(self.usuario)
+        response = await self.async_client.post(
+            '/chat/api/enviar-mensaje/stream/', {'mensaje': mensaje}, content_type='application/json'
+        )
+        return leer_eventos_sse(b''.join([parte async for parte in response.streaming_content]))
+
+    @override_settings(CHAT_MAX_LLM_CONCURRENTES=1, CHAT_ESPERA_RANURA=0)
+    async def test_respeta_el_limite_global(self):
+        llamadas = []
+
+        async def respuesta(self, *args, **kwargs):
+            llamadas.append(args)
+            yield 'Hola'
+
+        # Otro proceso ocupa la única ranura
+        otra = connections.create_connection('default')
+        otra.inc_thread_sharing()
+        await sync_to_async(cola._tomar_ranura, thread_sensitive=False)(otra)
+        try:
+            with mock.patch.object(AsistenteIAService, 'generar_respuesta_ia_stream', respuesta):
+                eventos = await self.stream()
+        finally:
+            await sync_to_async(otra.close, thread_sensitive=False)()
+
+        self.assertEqual(llamadas, [])
+        self.assertEqual(eventos[-1][1]['mensaje_ia']['contenido'], cola.MENSAJE_OCUPADO)
+
+    @override_settings(CHAT_COLA_REINTENTO_BASE=0)
+    async def test_reintenta_errores_transitorios(self):
+        error = openai.APIConnectionError(request=httpx.Request('POST', 'http://openai.test'))
+        intentos = []
+
+        async def respuesta(self, *args, lanzar_errores=False, **kwargs):
+            intentos.append(lanzar_errores)
+            if len(intentos) < 3:
+                raise error
+            yield 'Hola'
+
+        with mock.patch.object(AsistenteIAService, 'generar_respuesta_ia_stream', respuesta):
+            eventos = await self.stream()
+
+        self.assertEqual(intentos, [True] * 3)
+        self.assertEqual(eventos[-1][1]['mensaje_ia']['contenido'], 'Hola')
+
+    @override_settings(CHAT_COLA_REINTENTO_BASE=0, CHAT_COLA_MAX_INTENTOS=2)
+    async def test_agota_los_intentos(self):
+        error = openai.APIConnectionError(request=httpx.Request('POST', 'http://openai.test'))
+        intentos = []
+
+        async def respuesta(self, *args, **kwargs):
+            intentos.append(1)
+            raise error
+            yield
+
+        with mock.patch.object(AsistenteIAService, 'generar_respuesta_ia_stream', respuesta):
+            eventos = await self.stream()
+
+        self.assertEqual(len(intentos), 2)
+        self.assertTrue(eventos[-1][1]['mensaje_ia']['contenido'].startswith('⚠️'))
+
+    async def test_mensaje_vacio(self):
+        await self.async_client.aforce_login(self.usuario)
+
+        response = await self.async_client.post(
+            '/chat/api/enviar-mensaje/stream/', {'mensaje': ' '}, content_type='application/json'
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+
+@mock.patch.dict(os.environ, {'OPENAI_API_KEY': 'test'})
+class ClienteOpenAICompartidoTests(TestCase):
+    """
+    Un solo cliente de OpenAI por proceso, con conexiones keep-alive reutilizadas
+    """
+
+    def setUp(self):
+        AsistenteIAService._instancia = None
+        self.addCleanup(setattr, AsistenteIAService, '_instancia', None)
+
+    def test_instancia_unica(self):
+        self.assertIs(AsistenteIAService.instancia(), AsistenteIAService.instancia())
+
+    def test_reutiliza_la_conexion(self):
+        with ServidorOpenAIFalso() as servidor, override_settings(OPENAI_BASE_URL=servidor.base_url):
+            servicio = AsistenteIAService.instancia()
+            for _ in range(5):
+                respuesta = servicio.generar_respuesta_ia('hola', [])
+
+        self.assertEqual(respuesta, 'Respuesta de prueba del asistente.')
+        self.assertEqual(servidor.solicitudes, 5)
+        self.assertEqual(servidor.conexiones, 1)
+
+    async def test_stream_contra_servidor_falso(self):
+        with ServidorOpenAIFalso(respuesta='Uno dos tres') as servidor, \
+                override_settings(OPENAI_BASE_URL=servidor.base_url):
+            servicio = AsistenteIAService()
+            fragmentos = [f async for f in servicio.generar_respuesta_ia_stream('hola', [])]
+
+        self.assertEqual(fragmentos, ['Uno', ' dos', ' tres'])
+
+    def test_configuracion_desde_base_de_datos(self):
+        servicio = AsistenteIAService.instancia()
+        self.assertEqual(servicio.configuracion()['modelo'], 'gpt-3.5-turbo')
+
+        configuracion = ConfiguracionIA.objects.create(nombre='default', modelo_openai='gpt-4o-mini', max_tokens=500)
+        self.assertEqual(servicio.configuracion()['modelo'], 'gpt-4o-mini')
+
+        # Cargada una vez: no vuelve a consultar hasta que cambie o venza el TTL
+        with self.assertNumQueries(0):
+            servicio.configuracion()
+
+        configuracion.temperatura = 0.2
+        configuracion.save()
+        self.assertEqual(servicio.configuracion()['temperatura'], 0.2)
+
+
+@mock.patch.dict(os.environ, {'OPENAI_API_KEY': 'test'})
+class CacheRespuestasTests(TestCase):
+    """
+    Respuestas repetidas se sirven desde la caché sin consultar la DB ni OpenAI
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        crear_casos(2)
+        cls.usuario = Usuario.objects.create_user(username='cache', email='cache@test.com', password='x')
+        cls.otro = Usuario.objects.create_user(username='otro', email='otro@test.com', password='x')
+
+    def setUp(self):
+        cache.clear()
+
+    def preguntar(self, consulta, usuario=None, conversacion=None):
+        usuario = usuario or self.usuario
+        conversacion = conversacion or Conversacion.objects.create(usuario=usuario)
+        mensaje = Mensaje.objects.create(conversacion=conversacion, tipo='usuario', contenido=consulta)
+        return procesar_consulta_ia(usuario, consulta, conversacion, antes_de=mensaje.id)
+
+    def test_pregunta_repetida_sin_consultas(self):
+        primera = self.preguntar('¿Qué casos de divorcio están abiertos?')
+        conversacion = Conversacion.objects.create(usuario=self.otro)
+
+        with CaptureQueriesContext(connection) as capturadas:
+            segunda = procesar_consulta_ia(self.otro, '¿que casos de DIVORCIO estan abiertos', conversacion)
+
+        # Solo la versión de los datos y la caché compartida (con sus savepoints)
+        tablas = (cache_respuestas.SECUENCIA_VERSION, 'chat_respuestas_cache', 'SAVEPOINT')
+        for consulta in capturadas:
+            self.assertTrue(any(tabla in consulta['sql'] for tabla in tablas), consulta['sql'])
+        self.assertEqual(segunda, primera)
+        self.assertEqual(cache_respuestas.metricas()['aciertos'], 1)
+        self.assertEqual(cache_respuestas.metricas()['fallos'], 1)
+
+    def test_invalida_al_cambiar_los_datos(self):
+        self.preguntar('¿Qué casos de divorcio están abiertos?')
+
+        Caso.objects.filter(nroCaso='CIV-2024-000').first().delete()
+        respuesta = self.preguntar('¿Qué casos de divorcio están abiertos?')
+
+        self.assertNotIn('CIV-2024-000', respuesta['respuesta'])
+        self.assertEqual(cache_respuestas.metricas()['aciertos'], 0)
+
+    def test_preguntas_personales_por_usuario(self):
+        self.preguntar('¿Cuáles son mis casos?')
+        self.preguntar('¿Cuáles son mis casos?', usuario=self.otro)
+
+        self.assertEqual(cache_respuestas.metricas()['aciertos'], 0)
+        self.preguntar('¿Cuáles son mis casos?')
+        self.assertEqual(cache_respuestas.metricas()['aciertos'], 1)
+
+    def test_clave_incluye_numero_de_caso_y_fecha(self):
+        claves = {
+            cache_respuestas.clave(analizar_consulta(pregunta), self.usuario)
+            for pregunta in (
+                '¿Qué documentos tiene el caso CIV-2024-001?',
+                '¿Qué documentos tiene el caso PEN-2023-005?',
+                '¿Qué documentos tiene el caso PEN-2023-005 del 01/02/2024?',
+                '¿Qué documentos tiene el caso PEN-2023-005 del 01/03/2024?',
+            )
+        }
+
+        self.assertEqual(len(claves), 4)
+
+    def test_cambio_durante_la_generacion_no_queda_vigente(self):
+        original = DatabaseQueryService.consultar_informacion
+
+        def consultar_y_cambiar(servicio, *args, **kwargs):
+            resultado = original(servicio, *args, **kwargs)
+            # Otro proceso cambia los datos después de la recuperación
+            Caso.objects.filter(nroCaso='CIV-2024-000').first().delete()
+            return resultado
+
+        with mock.patch.object(DatabaseQueryService, 'consultar_informacion', consultar_y_cambiar):
+            self.preguntar('¿Qué casos de divorcio están abiertos?')
+        respuesta = self.preguntar('¿Qué casos de divorcio están abiertos?')
+
+        self.assertNotIn('CIV-2024-000', respuesta['respuesta'])
+        self.assertEqual(cache_respuestas.metricas()['aciertos'], 0)
+
+    def test_caso_distinto_no_usa_la_respuesta_cacheada(self):
+        self.preguntar('¿Qué documentos tiene el caso CIV-2024-000?')
+
+        respuesta = self.preguntar('¿Qué documentos tiene el caso CIV-2024-001?')
+
+        self.assertIn('CIV-2024-001', respuesta['respuesta'])
+        self.assertEqual(cache_respuestas.metricas()['aciertos'], 0)
+
+    @override_settings(CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'respuestas': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    })
+    def test_desactivada_con_cache_local_del_proceso(self):
+        self.preguntar('¿Qué casos de divorcio están abiertos?')
+        self.preguntar('¿Qué casos de divorcio están abiertos?')
+
+        metricas = cache_respuestas.metricas()
+        self.assertFalse(metricas['habilitada'])
+        self.assertEqual((metricas['aciertos'], metricas['fallos']), (0, 0))
+
+    def test_no_cachea_respuestas_con_historial(self):
+        conversacion = Conversacion.objects.create(usuario=self.usuario)
+        Mensaje.objects.create(conversacion=conversacion, tipo='asistente', contenido='Hola')
+        self.preguntar('¿Qué casos de divorcio están abiertos?', conversacion=conversacion)
+
+        self.preguntar('¿Qué casos de divorcio están abiertos?')
+
+        self.assertEqual(cache_respuestas.metricas()['aciertos'], 0)
+
+    def test_metricas_solo_staff(self):
+        self.client.force_login(self.usuario)
+        self.assertEqual(self.client.get('/chat/api/metricas-cache/').status_code, 403)
+
+        self.usuario.is_staff = True
+        self.usuario.save()
+        response = self.client.get('/chat/api/metricas-cache/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('tasa_aciertos', response.json()['metricas'])
+
+
+@mock.patch.dict(os.environ, {'OPENAI_API_KEY': 'test'})
+@override_settings(CHAT_USAR_COLA=True)
+class ColaRespuestasTests(TestCase):
+    """
+    enviar_mensaje encola la respuesta y un worker la genera en segundo plano
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        crear_casos(2)
+        cls.usuario = Usuario.objects.create_user(username='cola', email='cola@test.com', password='x')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.usuario)
+
+    def enviar(self, mensaje):
+        return self.client.post('/chat/api/enviar-mensaje/', {'mensaje': mensaje}, content_type='application/json')
+
+    def test_encola_y_procesa(self):
+        response = self.enviar('¿Qué casos de divorcio están abiertos?')
+
+        self.assertEqual(response.status_code, 202)
+        mensaje_id = response.json()['mensaje_ia']['id']
+        self.assertEqual(response.json()['mensaje_ia']['estado'], 'pendiente')
+
+        procesado = cola.procesar_siguiente()
+
+        self.assertEqual(procesado.id, mensaje_id)
+        datos = self.client.get(f'/chat/api/mensaje/{mensaje_id}/').json()['mensaje']
+        self.assertEqual(datos['estado'], 'completado')
+        self.assertIn('CIV-2024-000', datos['contenido'])
+        self.assertIsNone(cola.procesar_siguiente())
+
+    def test_respuesta_cacheada_no_se_encola(self):
+        self.enviar('¿Qué casos de divorcio están abiertos?')
+        cola.procesar_siguiente()
+
+        response = self.enviar('¿Qué casos de divorcio están abiertos?')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['mensaje_ia']['estado'], 'completado')
+
+    def test_reintenta_errores_transitorios(self):
+        error = openai.APIConnectionError(request=httpx.Request('POST', 'http://openai.test'))
+        self.enviar('hola')
+
+        with mock.patch.object(AsistenteIAService, 'generar_respuesta_ia', side_effect=error):
+            mensaje = cola.procesar_siguiente()
+            self.assertEqual((mensaje.estado, mensaje.intentos), ('pendiente', 1))
+            self.assertGreater(mensaje.procesar_despues, timezone.now())
+
+            # Agotar los intentos
+            for intento in range(2):
+                Mensaje.objects.filter(id=mensaje.id).update(procesar_despues=timezone.now() - timedelta(seconds=1))
+                mensaje = cola.procesar_siguiente()
+
+        self.assertEqual((mensaje.estado, mensaje.intentos), ('error', 3))
+        self.assertTrue(mensaje.contenido.startswith('⚠️'))
+
+    def test_retoma_trabajos_huerfanos(self):
+        mensaje_id = self.enviar('¿Qué casos de divorcio están abiertos?').json()['mensaje_ia']['id']
+        cola.tomar_siguiente()
+        self.assertIsNone(cola.tomar_siguiente())
+
+        Mensaje.objects.filter(id=mensaje_id).update(procesar_despues=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(cola.tomar_siguiente().id, mensaje_id)
+
+    @override_settings(CHAT_COLA_MAX_INTENTOS=2)
+    def test_huerfano_sin_intentos_queda_en_error(self):
+        # Un trabajo que tumba al worker cada vez que se toma
+        mensaje_id = self.enviar('¿Qué casos de divorcio están abiertos?').json()['mensaje_ia']['id']
+        for intento in range(2):
+            self.assertEqual(cola.tomar_siguiente().id, mensaje_id)
+            Mensaje.objects.filter(id=mensaje_id).update(procesar_despues=timezone.now() - timedelta(seconds=1))
+        siguiente_id = self.enviar('hola').json()['mensaje_ia']['id']
+
+        self.assertEqual(cola.tomar_siguiente().id, siguiente_id)
+        mensaje = Mensaje.objects.get(id=mensaje_id)
+        self.assertEqual((mensaje.estado, mensaje.intentos), ('error', 2))
+        self.assertIsNone(mensaje.procesar_despues)
+        self.assertTrue(mensaje.contenido.startswith('⚠️'))
+
+    @override_settings(CHAT_MAX_LLM_CONCURRENTES=1)
+    def test_limite_global_de_concurrencia(self):
+        self.enviar('¿Qué casos de divorcio están abiertos?')
+        # Otro worker ocupando la única ranura
+        otra_conexion = connections.create_connection('default')
+        try:
+            with otra_conexion.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_lock(%s, 0)', [cola.ADVISORY_LOCK_COLA])
+                self.assertIsNone(cola.procesar_siguiente())
+                cursor.execute('SELECT pg_advisory_unlock(%s, 0)', [cola.ADVISORY_LOCK_COLA])
+        finally:
+            otra_conexion.close()
+
+        self.assertIsNotNone(cola.procesar_siguiente())
+
+
+class ListadoConversacionesTests(TestCase):
+    """
+    api/conversaciones/ pagina por cursor y no consulta mensajes por conversación
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create_user(username='listado', email='listado@test.com', password='x')
+        otro = Usuario.objects.create_user(username='otro', email='otro@test.com', password='x')
+        Conversacion.objects.create(usuario=otro, titulo='Ajena')
+        Conversacion.objects.create(usuario=cls.usuario, titulo='Eliminada', activa=False)
+
+        for i in range(5):
+            conversacion = Conversacion.objects.create(usuario=cls.usuario, titulo=f'Conversación {i}')
+            for j in range(i + 1):
+                Mensaje.objects.create(conversacion=conversacion, tipo='usuario', contenido=f'Mensaje {i}.{j}')
+        # Misma fecha para todas: el id desempata el orden
+        Conversacion.objects.filter(usuario=cls.usuario).update(fecha_actualizacion=timezone.now())
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def test_pagina_sin_repetir_ni_saltar(self):
+        titulos = []
+        cursor = None
+        while True:
+            parametros = {'limite': 2}
+            if cursor:
+                parametros['cursor'] = cursor
+            with self.assertNumQueries(3):  # sesión, usuario, página
+                datos = self.client.get('/chat/api/conversaciones/', parametros).json()
+            titulos += [conversacion['titulo'] for conversacion in datos['conversaciones']]
+            cursor = datos['siguiente_cursor']
+            if cursor is None:
+                break
+
+        self.assertEqual(titulos, [f'Conversación {i}' for i in range(4, -1, -1)])
+
+    def test_cantidad_y_ultimo_mensaje(self):
+        conversacion = self.client.get('/chat/api/conversaciones/').json()['conversaciones'][0]
+
+        self.assertEqual(conversacion['cantidad_mensajes'], 5)
+        self.assertEqual(conversacion['ultimo_mensaje'], 'Mensaje 4.4')
+
+    @override_settings(CHAT_CONVERSACIONES_MAX_POR_PAGINA=3)
+    def test_limite_acotado(self):
+        datos = self.client.get('/chat/api/conversaciones/', {'limite': 1000}).json()
+
+        self.assertEqual(len(datos['conversaciones']), 3)
+        self.assertIsNotNone(datos['siguiente_cursor'])
+
+    def test_cursor_invalido(self):
+        response = self.client.get('/chat/api/conversaciones/', {'cursor': 'no-es-un-cursor'})
+
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(CHAT_MENSAJES_POR_PAGINA=3)
+class VentanaMensajesTests(TestCase):
+    """
+    api/conversacion/<id>/ devuelve solo una ventana de mensajes
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create_user(username='ventana', email='ventana@test.com', password='x')
+        cls.conversacion = Conversacion.objects.create(usuario=cls.usuario, titulo='Larga')
+        cls.mensajes = [
+            Mensaje.objects.create(
+                conversacion=cls.conversacion, tipo='usuario', contenido=f'Mensaje {i}',
+                entidades_extraidas=['x'] * 100
+            )
+            for i in range(8)
+        ]
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def obtener(self, **parametros):
+        return self.client.get(f'/chat/api/conversacion/{self.conversacion.id}/', parametros).json()
+
+    def contenidos(self, datos):
+        return [mensaje['contenido'] for mensaje in datos['mensajes']]
+
+    def test_ultimos_mensajes(self):
+        datos = self.obtener()
+
+        self.assertEqual(self.contenidos(datos), ['Mensaje 5', 'Mensaje 6', 'Mensaje 7'])
+        self.assertTrue(datos['hay_anteriores'])
+
+    def test_historial_anterior(self):
+        datos = self.obtener(antes_de=self.mensajes[2].id)
+
+        self.assertEqual(self.contenidos(datos), ['Mensaje 0', 'Mensaje 1'])
+        self.assertFalse(datos['hay_anteriores'])
+
+    def test_solo_mensajes_nuevos(self):
+        datos = self.obtener(despues_de=self.mensajes[6].id)
+
+        self.assertEqual(self.contenidos(datos), ['Mensaje 7'])
+        self.assertFalse(datos['hay_posteriores'])
+
+    def test_columnas_y_consultas_acotadas(self):
+        with CaptureQueriesContext(connection) as consultas:
+            self.obtener()
+
+        sql = consultas.captured_queries[-1]['sql']
+        self.assertIn('LIMIT 4', sql)
+        self.assertNotIn('entidades_extraidas', sql)
+        self.assertEqual(len(consultas), 4)  # sesión, usuario, conversación, mensajes
+
+    def test_parametro_invalido(self):
+        response = self.client.get(f'/chat/api/conversacion/{self.conversacion.id}/', {'antes_de': 'x'})
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_conversacion_ajena(self):
+        otro = Usuario.objects.create_user(username='ajeno', email='ajeno@test.com', password='x')
+        self.client.force_login(otro)
+
+        response = self.client.get(f'/chat/api/conversacion/{self.conversacion.id}/')
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_vista_chat_carga_ultimos(self):
+        response = self.client.get('/chat/', {'conversacion_id': self.conversacion.id})
+
+        self.assertEqual([m.contenido for m in response.context['mensajes']], ['Mensaje 5', 'Mensaje 6', 'Mensaje 7'])
+        self.assertTrue(response.context['hay_anteriores'])
+
+
+@mock.patch.dict(os.environ, {'OPENAI_API_KEY': 'test'})
+class HistorialTokensTests(TestCase):
+    """
+    El historial enviado a OpenAI respeta un presupuesto de tokens y se registra el consumo
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create_user(username='historial', email='historial@test.com', password='x')
+
+    def setUp(self):
+        cache.clear()
+        AsistenteIAService._instancia = None
+        self.addCleanup(setattr, AsistenteIAService, '_instancia', None)
+
+    def test_roles_segun_tipo(self):
+        conversacion = Conversacion.objects.create(usuario=self.usuario)
+        for tipo, contenido in [('usuario', 'Pregunta'), ('sistema', 'Aviso'), ('asistente', 'Respuesta')]:
+            Mensaje.objects.create(conversacion=conversacion, tipo=tipo, contenido=contenido)
+        Mensaje.objects.create(conversacion=conversacion, tipo='asistente', contenido='', estado='pendiente')
+        actual = Mensaje.objects.create(conversacion=conversacion, tipo='usuario', contenido='Pregunta actual')
+
+        historial = historial_chat.cargar_historial(conversacion, antes_de=actual.id)
+
+        self.assertEqual(historial, [
+            {'role': 'user', 'content': 'Pregunta'},
+            {'role': 'system', 'content': 'Aviso'},
+            {'role': 'assistant', 'content': 'Respuesta'},
+        ])
+
+    def test_prioriza_los_mensajes_recientes(self):
+        largo = ' '.join(['palabra'] * 200)
+        historial = [
+            {'role': 'user', 'content': 'El más antiguo'},
+            {'role': 'assistant', 'content': largo},
+            {'role': 'user', 'content': 'Reciente'},
+        ]
+
+        ajustado = historial_chat.ajustar_historial(historial, 100)
+
+        self.assertEqual(len(ajustado), 2)
+        self.assertTrue(ajustado[0]['content'].endswith(historial_chat.MARCA_RECORTE))
+        self.assertEqual(ajustado[1]['content'], 'Reciente')
+        self.assertLessEqual(historial_chat.contar_tokens_mensajes(ajustado), 100 + historial_chat.TOKENS_RESPUESTA)
+
+    @override_settings(CHAT_HISTORIAL_MAX_TOKENS=60)
+    def test_mensajes_a_openai_dentro_del_presupuesto(self):
+        historial = [
+            {'role': 'user' if i % 2 == 0 else 'assistant', 'content': f'Mensaje {i} ' + 'texto ' * 20}
+            for i in range(10)
+        ]
+
+        _, mensajes = AsistenteIAService.instancia()._preparar_mensajes('hola', historial)
+
+        enviados = mensajes[1:-1]
+        self.assertEqual(enviados[-1], historial[-1])
+        self.assertLessEqual(historial_chat.contar_tokens_mensajes(enviados), 60 + historial_chat.TOKENS_RESPUESTA)
+        self.assertEqual(mensajes[0]['role'], 'system')
+        self.assertTrue(mensajes[-1]['content'].startswith('hola'))
+
+    @override_settings(CHAT_USAR_COLA=False)
+    def test_registra_tokens_usados(self):
+        self.client.force_login(self.usuario)
+        with ServidorOpenAIFalso() as servidor, override_settings(OPENAI_BASE_URL=servidor.base_url):
+            self.client.post('/chat/api/enviar-mensaje/', {'mensaje': 'hola'}, content_type='application/json')
+
+        # 10 de entrada + 5 palabras de respuesta (ver ServidorOpenAIFalso)
+        self.assertEqual(Mensaje.objects.get(tipo='asistente').tokens_usados, 15)
+
+    async def test_registra_tokens_usados_en_stream(self):
+        await self.async_client.aforce_login(self.usuario)
+        with ServidorOpenAIFalso() as servidor, override_settings(OPENAI_BASE_URL=servidor.base_url):
+            response = await self.async_client.post(
+                '/chat/api/enviar-mensaje/stream/', {'mensaje': 'hola'}, content_type='application/json'
+            )
+            b''.join([parte async for parte in response.streaming_content])
+
+        mensaje = await Mensaje.objects.aget(tipo='asistente')
+        self.assertEqual(mensaje.tokens_usados, 15)
+
+
+class ContextoCompactoTests(TestCase):
+    """
+    El contexto para OpenAI se envía como tablas compactas con tope de tokens por tipo
+    """
+
+    def caso(self, i, descripcion='Descripción corta'):
+        return {
+            'id': i, 'numero': f'CIV-2024-{i:03d}', 'tipo': 'Divorcio', 'estado': 'ABIERTO',
+            'fecha_inicio': date(2024, 1, 1), 'documentos_count': 2, 'descripcion': descripcion,
+        }
+
+    def test_filas_compactas_y_sin_duplicados(self):
+        texto = contexto_prompt.serializar_resultados({
+            'casos': [self.caso(1, 'x' * 500), self.caso(1), self.caso(2)],
+            'documentos': [{
+                'id': 7, 'nombre': 'Demanda | inicial', 'tipo': 'Demanda', 'fecha': None,
+                'caso': 'CIV-2024-001', 'palabras_clave': '',
+            }],
+        })
+
+        lineas = texto.split('\n')
+        self.assertEqual(lineas[0], 'casos[id|nro|tipo|estado|inicio|docs|desc]')
+        self.assertTrue(lineas[1].startswith('1|CIV-2024-001|Divorcio|ABIERTO|2024-01-01|2|xxx'))
+        self.assertLessEqual(len(lineas[1].split('|')[-1]), contexto_prompt.LARGO_TEXTO)
+        self.assertTrue(lineas[2].startswith('2|'))
+        self.assertIn('7|Demanda / inicial|Demanda|-|CIV-2024-001|-', texto)
+        self.assertNotIn('actores[', texto)
+
+    @override_settings(CHAT_CONTEXTO_MAX_TOKENS_POR_TIPO=100)
+    def test_tope_de_tokens_por_tipo(self):
+        pocos = contexto_prompt.serializar_resultados({'casos': [self.caso(i) for i in range(2)]})
+        muchos = contexto_prompt.serializar_resultados({'casos': [self.caso(i) for i in range(200)]})
+
+        self.assertNotIn('más', pocos)
+        self.assertTrue(muchos.endswith('más'))
+        self.assertLessEqual(historial_chat.contar_tokens(muchos), 100 + 5)
+
+    def test_sin_resultados(self):
+        self.assertEqual(contexto_prompt.serializar_resultados({}), 'Sin resultados en la base de datos.')
+
+
+@mock.patch.dict(os.environ, {'OPENAI_API_KEY': 'test'})
+class RecuperacionUnicaTests(TestCase):
+    """
+    Cada mensaje consulta la base de datos una sola vez y registra el tiempo de cada etapa
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        crear_casos(2)
+        cls.usuario = Usuario.objects.create_user(username='etapas', email='etapas@test.com', password='x')
+
+    def setUp(self):
+        cache.clear()
+        AsistenteIAService._instancia = None
+        self.addCleanup(setattr, AsistenteIAService, '_instancia', None)
+
+    def test_una_sola_busqueda_alimenta_prompt_y_documentos(self):
+        conversacion = Conversacion.objects.create(usuario=self.usuario)
+        consultar = mock.Mock(wraps=DatabaseQueryService().consultar_informacion)
+
+        with ServidorOpenAIFalso() as servidor, override_settings(OPENAI_BASE_URL=servidor.base_url), \
+                mock.patch.object(DatabaseQueryService, 'consultar_informacion', consultar):
+            resultado = procesar_consulta_ia(self.usuario, 'Documento 0-1-1 divorcio', conversacion)
+
+        self.assertEqual(consultar.call_count, 1)
+        self.assertEqual(servidor.solicitudes, 1)
+        recuperado = DatabaseQueryService().consultar_informacion('Documento 0-1-1 divorcio', self.usuario)
+        self.assertTrue(resultado['documentos_consultados'])
+        self.assertEqual(resultado['documentos_consultados'], [d['id'] for d in recuperado['documentos']])
+
+    @override_settings(CHAT_USAR_COLA=False)
+    def test_tiempos_por_etapa(self):
+        self.client.force_login(self.usuario)
+        with ServidorOpenAIFalso() as servidor, override_settings(OPENAI_BASE_URL=servidor.base_url):
+            self.client.post('/chat/api/enviar-mensaje/', {'mensaje': 'hola'}, content_type='application/json')
+
+        tiempos = Mensaje.objects.get(tipo='asistente').tiempos
+        self.assertEqual(set(tiempos), {'analisis', 'recuperacion', 'llm', 'persistencia'})
+        self.assertTrue(all(segundos >= 0 for segundos in tiempos.values()))
+
+    @override_settings(CHAT_USAR_COLA=True)
+    def test_tiempos_en_la_cola(self):
+        self.client.force_login(self.usuario)
+        with ServidorOpenAIFalso() as servidor, override_settings(OPENAI_BASE_URL=servidor.base_url):
+            self.client.post('/chat/api/enviar-mensaje/', {'mensaje': 'hola'}, content_type='application/json')
+            mensaje = cola.procesar_siguiente()
+
+        self.assertEqual(mensaje.estado, 'completado')
+        self.assertEqual(set(mensaje.tiempos), {'analisis', 'recuperacion', 'llm', 'persistencia'})
+
+
+@override_settings(CHAT_EMBEDDINGS_INTERVALO_CAMBIOS=0)
+class BusquedaSemanticaTests(TestCase):
+    """
+    Índice vectorial de documentos y casos (chat/embeddings.py) con el embedder local
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        crear_casos(3, carpetas_por_caso=1, documentos_por_carpeta=2)
+        cls.contrato = Documento.objects.get(nombreDocumento='Documento 1-0-0')
+        cls.contrato.nombreDocumento = 'Contrato de arrendamiento'
+        cls.contrato.palabraClave = 'alquiler inmueble'
+        cls.contrato.save()
+
+    def setUp(self):
+        cache.clear()
+        embeddings.obtener_embedder.cache_clear()
+        self.addCleanup(embeddings.obtener_embedder.cache_clear)
+        # Índices nuevos: los de otras pruebas tienen filas de transacciones revertidas
+        indices = mock.patch.dict(embeddings._indices, {tipo: embeddings.IndiceVectorial(tipo) for tipo in embeddings.FUENTES})
+        indices.start()
+        self.addCleanup(indices.stop)
+        call_command('indexar_embeddings', stdout=io.StringIO())
+
+    def test_embedder_local_determinista_y_normalizado(self):
+        embedder = embeddings.EmbedderLocal(dimension=64)
+        vectores = embedder.embeber(['Divorcio', 'divorciarse', 'arrendamiento'])
+
+        self.assertEqual(vectores.dtype, np.float32)
+        self.assertEqual(vectores.shape, (3, 64))
+        np.testing.assert_allclose(np.linalg.norm(vectores, axis=1), 1, rtol=1e-5)
+        np.testing.assert_array_equal(vectores, embedder.embeber(['Divorcio', 'divorciarse', 'arrendamiento']))
+        self.assertGreater(vectores[0] @ vectores[1], vectores[0] @ vectores[2])
+
+    def test_top_k_ordenado(self):
+        similares = embeddings.buscar(Embedding.TIPO_DOCUMENTO, 'arrendatario', 2, min_similitud=-1)
+
+        self.assertEqual(len(similares), 2)
+        self.assertEqual(similares[0][0], self.contrato.id)
+        self.assertGreater(similares[0][1], similares[1][1])
+
+    def test_chat_encuentra_documentos_parafraseados(self):
+        # "arrendatario" no coincide por texto completo con "arrendamiento"
+        self.assertFalse(Documento.objects.buscar('arrendatario').exists())
+
+        for consulta in ['arrendatario', '¿Qué documentos hay del arrendatario?']:
+            resultados = DatabaseQueryService().consultar_informacion(consulta)
+
+            self.assertIn(self.contrato.id, [doc['id'] for doc in resultados['documentos']])
+            self.assertLessEqual(len(resultados['documentos']), settings.CHAT_RANKING_RESULTADOS)
+
+    def test_indexado_por_lotes_solo_recalcula_cambios(self):
+        self.assertEqual(Embedding.objects.filter(tipo=Embedding.TIPO_DOCUMENTO).count(), 6)
+        self.assertEqual(Embedding.objects.filter(tipo=Embedding.TIPO_CASO).count(), 3)
+
+        Caso.objects.filter(nroCaso='CIV-2024-000').update(descripcion='Reclamo por despido')
+        salida = io.StringIO()
+        call_command('indexar_embeddings', '--lote', '2', stdout=salida)
+
+        self.assertIn('documento: 6 revisado(s), 0 actualizado(s)', salida.getvalue())
+        self.assertIn('caso: 3 revisado(s), 1 actualizado(s)', salida.getvalue())
+
+    def test_actualizacion_incremental(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.contrato.palabraClave = 'desalojo'
+            self.contrato.save()
+        self.assertEqual(
+            embeddings.buscar(Embedding.TIPO_DOCUMENTO, 'desalojos', 1)[0][0], self.contrato.id
+        )
+
+        contrato_id = self.contrato.id
+        with self.captureOnCommitCallbacks(execute=True):
+            self.contrato.delete()
+        self.assertFalse(Embedding.objects.filter(tipo=Embedding.TIPO_DOCUMENTO, objeto_id=contrato_id).exists())
+        self.assertNotIn(
+            contrato_id, [i for i, _ in embeddings.buscar(Embedding.TIPO_DOCUMENTO, 'desalojos', 10)]
+        )
+
+    def test_indice_aplica_solo_los_cambios(self):
+        # Índice de otro proceso (p. ej. el worker de la cola), cargado antes de los cambios
+        embedder = embeddings.obtener_embedder()
+        indice = embeddings.IndiceVectorial(Embedding.TIPO_DOCUMENTO).actualizado(embedder)
+        borrado = Documento.objects.exclude(id=self.contrato.id).first()
+        borrado_id = borrado.id
+        with self.captureOnCommitCallbacks(execute=True):
+            self.contrato.palabraClave = 'desalojo'
+            self.contrato.save()
+            borrado.delete()
+            nuevo = Documento.objects.create(
+                carpeta=self.contrato.carpeta, tipoDocumento=self.contrato.tipoDocumento,
+                nombreDocumento='Sentencia de desalojo', rutaDocumento='/docs/sentencia.pdf',
+                tamano=1.0, fechaDoc=date(2024, 3, 1),
+            )
+
+        # Lee los cambios y los vectores que cambiaron, sin recargar la tabla
+        with mock.patch.object(indice, '_cargar', side_effect=AssertionError), self.assertNumQueries(2):
+            indice.actualizado(embedder)
+
+        self.assertEqual(len(indice), 6)
+        self.assertNotIn(borrado_id, indice.ids)
+        self.assertEqual(set(indice.ids), set(
+            Embedding.objects.filter(tipo=Embedding.TIPO_DOCUMENTO).values_list('objeto_id', flat=True)
+        ))
+        vector = bytes(Embedding.objects.get(tipo=Embedding.TIPO_DOCUMENTO, objeto_id=self.contrato.id).vector)
+        np.testing.assert_array_equal(
+            indice.matriz[list(indice.ids).index(self.contrato.id)], np.frombuffer(vector, dtype=np.float32)
+        )
+        encontrados = [objeto_id for objeto_id, _ in indice.buscar(embedder.embeber(['desalojo'])[0], 2)]
+        self.assertEqual(set(encontrados), {self.contrato.id, nuevo.id})
+
+    @override_settings(CHAT_EMBEDDINGS_INTERVALO_CAMBIOS=60)
+    def test_lee_los_cambios_a_lo_sumo_una_vez_por_intervalo(self):
+        embedder = embeddings.obtener_embedder()
+        with mock.patch('chat.embeddings.time.monotonic', return_value=1000.0):
+            indice = embeddings.IndiceVectorial(Embedding.TIPO_DOCUMENTO).actualizado(embedder)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.contrato.palabraClave = 'desalojo'
+            self.contrato.save()
+
+        with mock.patch('chat.embeddings.time.monotonic', return_value=1059.0), self.assertNumQueries(0):
+            indice.actualizado(embedder)
+        with mock.patch('chat.embeddings.time.monotonic', return_value=1060.0), self.assertNumQueries(2):
+            indice.actualizado(embedder)
+
+    def test_poda_de_cambios(self):
+        self.assertGreater(CambioEmbedding.objects.count(), 0)
+        CambioEmbedding.objects.update(fecha=timezone.now() - timedelta(hours=25))
+
+        self.assertEqual(embeddings.podar_cambios(), 9)
+        self.assertFalse(CambioEmbedding.objects.exists())
+
+    @override_settings(CHAT_EMBEDDINGS_BACKEND='')
+    def test_desactivada(self):
+        embeddings.obtener_embedder.cache_clear()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(embeddings.buscar(Embedding.TIPO_DOCUMENTO, 'arrendatario', 5), [])
+
+
+@override_settings(CHAT_EMBEDDINGS_BACKEND='')
+class RankingHibridoTests(TestCase):
+    """
+    Reciprocal rank fusion de texto completo, trigramas, embeddings y fecha (chat/ranking.py)
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        crear_casos(2, carpetas_por_caso=2, documentos_por_carpeta=3)
+        documentos = list(Documento.objects.order_by('id'))
+        cls.viejo, cls.nuevo = documentos[0], documentos[7]
+        Documento.objects.filter(id=cls.viejo.id).update(nombreDocumento='Contrato de arrendamiento', fechaDoc=date(2020, 1, 1))
+        Documento.objects.filter(id=cls.nuevo.id).update(nombreDocumento='Contrato de arrendamiento', fechaDoc=date(2024, 6, 1))
+        cls.usuario = Usuario.objects.create_user(username='ranking', email='ranking@test.com', password='x')
+
+    def setUp(self):
+        embeddings.obtener_embedder.cache_clear()
+        self.addCleanup(embeddings.obtener_embedder.cache_clear)
+
+    def test_fusionar(self):
+        fusion = ranking.fusionar(
+            {
+                'texto': ranking.posiciones([(1, 0.9), (2, 0.5), (3, 0.1)]),
+                'vector': ranking.posiciones([(3, 0.8), (4, 0.7)]),
+                'reciente': ranking.posiciones([(9, 1)]),
+            },
+            pesos={'texto': 1.0, 'vector': 1.0, 'reciente': 0.0}, k=60,
+        )
+
+        self.assertEqual([objeto_id for objeto_id, _ in fusion][:2], [3, 1])
+        self.assertEqual(dict(fusion)[9], 0)
+        self.assertTrue(all(0 <= puntaje <= 1 for _, puntaje in fusion))
+        self.assertEqual(ranking.fusionar({'texto': {1: 1}}, pesos={'texto': 1.0}, k=60), [(1, 1.0)])
+
+    def test_empates_comparten_posicion(self):
+        self.assertEqual(ranking.posiciones([(5, 0.9), (7, 0.9), (2, 0.4)]), {5: 1, 7: 1, 2: 3})
+
+    def test_solo_carga_los_mejores(self):
+        # texto completo, trigramas, fecha de los candidatos y carga de los elegidos
+        with self.assertNumQueries(4), \
+                mock.patch.object(Documento, 'from_db', wraps=Documento.from_db) as from_db:
+            resultados = ranking.rankear('documento', 'documento', limite=3)
+
+        self.assertEqual(len(resultados), 3)
+        self.assertEqual(from_db.call_count, 3)
+        relevancias = [relevancia for _, relevancia, _ in resultados]
+        self.assertEqual(relevancias, sorted(relevancias, reverse=True))
+
+    def test_desempata_por_fecha(self):
+        resultados = ranking.rankear('documento', 'arrendamiento')
+
+        self.assertEqual([doc.id for doc, _, _ in resultados], [self.nuevo.id, self.viejo.id])
+        self.assertEqual(resultados[0][2]['reciente'], 1)
+        self.assertGreater(resultados[0][1], resultados[1][1])
+
+    def test_tolera_errores_de_tipeo(self):
+        self.assertFalse(Documento.objects.buscar('arendamiento').exists())
+
+        resultados = ranking.rankear('documento', 'arendamiento')
+
+        self.assertEqual({doc.id for doc, _, _ in resultados}, {self.viejo.id, self.nuevo.id})
+        self.assertIn('trigrama', resultados[0][2])
+
+    def test_pesos_configurables(self):
+        pesos = {'texto': 0.0, 'trigrama': 0.0, 'vector': 0.0, 'reciente': 1.0}
+        with override_settings(CHAT_RANKING_PESOS=pesos):
+            resultados = ranking.rankear('documento', 'documento 0')
+
+        fechas = [doc.fechaDoc for doc, _, _ in resultados]
+        self.assertEqual(fechas, sorted(fechas, reverse=True))
+
+    def test_filtro(self):
+        resultados = ranking.rankear(
+            'documento', 'arrendamiento', filtro=Q(carpeta__expediente__caso__nroCaso='CIV-2024-000')
+        )
+
+        self.assertEqual([doc.id for doc, _, _ in resultados], [self.viejo.id])
+
+    @override_settings(CHAT_USAR_COLA=False)
+    @mock.patch.dict(os.environ, {'OPENAI_API_KEY': 'test'})
+    def test_registra_relevancia_en_consulta_documento(self):
+        AsistenteIAService._instancia = None
+        self.addCleanup(setattr, AsistenteIAService, '_instancia', None)
+        cache.clear()
+        self.client.force_login(self.usuario)
+        with ServidorOpenAIFalso() as servidor, override_settings(OPENAI_BASE_URL=servidor.base_url):
+            self.client.post('/chat/api/enviar-mensaje/', {'mensaje': 'arrendamiento'}, content_type='application/json')
+
+        mensaje = Mensaje.objects.get(tipo='asistente')
+        consultas = list(ConsultaDocumento.objects.filter(mensaje=mensaje).order_by('-relevancia'))
+        self.assertEqual([c.documento_id for c in consultas if c.documento_id], [self.nuevo.id, self.viejo.id])
+        self.assertTrue(all(0 < c.relevancia <= 1 for c in consultas))
+        self.assertEqual(json.loads(consultas[0].resultado)['texto'], 1)
+
+
+class BenchmarkChatTests(TestCase):
+    """
+    Corpus sintético (seed_* --sinteticos) y benchmark del chat (chat/benchmark.py)
+    """
+
+    def setUp(self):
+        cache.clear()
+        embeddings.obtener_embedder.cache_clear()
+        self.addCleanup(embeddings.obtener_embedder.cache_clear)
+
+    def test_corpus_sintetico_se_completa_sin_duplicar(self):
+        for _ in range(2):
+            call_command('seed_actores', sinteticos=30, lote=7, stdout=io.StringIO())
+            call_command('seed_casos', sinteticos=12, lote=5, stdout=io.StringIO())
+            call_command('seed_documentos', sinteticos=25, lote=10, stdout=io.StringIO())
+
+        self.assertEqual(Actor.objects.filter(ci__startswith='SIN-').count(), 30)
+        self.assertEqual(Caso.objects.filter(nroCaso__startswith='SIN-').count(), 12)
+        self.assertEqual(Carpeta.objects.count(), 12)
+        self.assertEqual(Documento.objects.filter(rutaDocumento__startswith='/sinteticos/').count(), 25)
+        # Cada caso queda asignado a un abogado y a un cliente
+        self.assertEqual(EquipoCaso.objects.count(), 12)
+        self.assertEqual(ParteProcesal.objects.count(), 12)
+
+    def test_reporte(self):
+        salida = io.StringIO()
+        call_command(
+            'benchmark_chat', actores=20, casos=10, documentos=40, repeticiones=2, k=5, json=True,
+            stdout=salida, stderr=io.StringIO(),
+        )
+        reporte = json.loads(salida.getvalue())
+
+        self.assertEqual(reporte['mediciones'], 2 * len(benchmark.PREGUNTAS))
+        self.assertLessEqual(reporte['latencia']['p50_ms'], reporte['latencia']['p95_ms'])
+        self.assertGreater(reporte['consultas_sql']['media'], 0)
+        self.assertIn('recuperacion', reporte['etapas'])
+        # En un corpus chico las agujas de las preguntas exactas quedan entre las primeras
+        recall = {fila['pregunta']: fila['recall'] for fila in reporte['preguntas']}
+        self.assertEqual(recall[benchmark.PREGUNTAS[0]['pregunta']], 1.0)
+        self.assertGreater(reporte['recall_en_k'], 0.5)
+        # El singleton que apuntaba al servidor falso se descarta
+        self.assertIsNone(AsistenteIAService._instancia)
+
+    def test_recall_en_k(self):
+        self.assertEqual(benchmark.recall_en_k([4, 1, 9, 2], {1, 2}, k=2), 0.5)
+        self.assertEqual(benchmark.recall_en_k([4, 1, 9, 2], {1, 2}, k=4), 1.0)
+        self.assertEqual(benchmark.recall_en_k([4], set(), k=4), 0.0)
@@ -11,9 +11,12 @@ urlpatterns = [
     
     # API endpoints
     path('api/enviar-mensaje/', views.enviar_mensaje, name='enviar_mensaje'),
+    path('api/enviar-mensaje/stream/', views.enviar_mensaje_stream, name='enviar_mensaje_stream'),
+    path('api/mensaje/<int:mensaje_id>/', views.obtener_mensaje, name='obtener_mensaje'),
     path('api/conversacion/<int:conversacion_id>/', views.obtener_conversacion, name='obtener_conversacion'),
     path('api/conversaciones/', views.obtener_conversaciones, name='obtener_conversaciones'),
     path('api/crear-conversacion/', views.crear_conversacion, name='crear_conversacion'),
     path('api/eliminar-conversacion/<int:conversacion_id>/', views.eliminar_conversacion, name='eliminar_conversacion'),
     path('api/sugerencias/', views.obtener_sugerencias, name='obtener_sugerencias'),
+    path('api/metricas-cache/', views.metricas_cache_respuestas, name='metricas_cache_respuestas'),
 ]
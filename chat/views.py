@@ -1,18 +1,29 @@
-from django.shortcuts import render, get_object_or_404
+from django.shortcuts import render, get_object_or_404, aget_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import TemplateView
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.utils.decorators import method_decorator
 from django.db import transaction
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Substr
+from django.utils.dateparse import parse_datetime
+from django.conf import settings
+from asgiref.sync import sync_to_async
+import asyncio
+import base64
+import binascii
 import json
 import time
 from datetime import datetime
 
 from .models import Conversacion, Mensaje, ConsultaDocumento, ConfiguracionIA
-from .services import AsistenteIAService
+from .services import AsistenteIAService, PREFIJO_ERROR
+from . import cache_respuestas, cola, ranking
+from . import historial as historial_chat
+from .cronometro import Cronometro
 from .suggestion_service import SuggestionService
 
 
@@ -44,7 +55,8 @@ class ChatView(LoginRequiredMixin, TemplateView):
                     usuario=self.request.user
                 )
                 context['conversacion_activa'] = conversacion
-                context['mensajes'] = conversacion.mensajes.all().order_by('fecha_envio')
+                # Solo los últimos mensajes; los anteriores se cargan al hacer scroll
+                context['mensajes'], context['hay_anteriores'] = ventana_mensajes(conversacion)
             except:
                 pass
         
@@ -84,15 +96,39 @@ def enviar_mensaje(request):
             )
         
         # Guardar mensaje del usuario
-        mensaje_usuario_obj = Mensaje.objects.create(
-            conversacion=conversacion,
-            tipo='usuario',
-            contenido=mensaje_usuario
-        )
+        cronometro = Cronometro()
+        with cronometro.etapa('persistencia'):
+            mensaje_usuario_obj = Mensaje.objects.create(
+                conversacion=conversacion,
+                tipo='usuario',
+                contenido=mensaje_usuario
+            )
         
-        # Procesar con IA
         inicio_tiempo = time.time()
-        respuesta_ia = procesar_consulta_ia(request.user, mensaje_usuario, conversacion)
+        if settings.CHAT_USAR_COLA:
+            # Una respuesta cacheada se devuelve al instante, sin pasar por la cola
+            with cronometro.etapa('analisis'):
+                analisis = AsistenteIAService.instancia().analizar_consulta(mensaje_usuario)
+            with cronometro.etapa('recuperacion'):
+                respuesta_ia = cache_respuestas.obtener_respuesta(cache_respuestas.clave(analisis, request.user))
+            if respuesta_ia is None:
+                # La respuesta la genera un worker (chat/cola.py); el cliente consulta api/mensaje/<id>/
+                mensaje_ia_obj = cola.encolar_respuesta(conversacion, mensaje_usuario_obj, cronometro.resumen())
+                return JsonResponse({
+                    'success': True,
+                    'mensaje_usuario': _mensaje_a_dict(mensaje_usuario_obj),
+                    'mensaje_ia': _mensaje_a_dict(mensaje_ia_obj),
+                    'conversacion_id': conversacion.id
+                }, status=202)
+        else:
+            # Procesar con IA, dentro del límite global de llamadas a OpenAI
+            with cola.ranura_llm(espera=settings.CHAT_ESPERA_RANURA) as disponible:
+                if disponible:
+                    respuesta_ia = procesar_consulta_ia(
+                        request.user, mensaje_usuario, conversacion, antes_de=mensaje_usuario_obj.id, cronometro=cronometro
+                    )
+                else:
+                    respuesta_ia = {'respuesta': cola.MENSAJE_OCUPADO}
         tiempo_respuesta = time.time() - inicio_tiempo
         
         # Guardar respuesta de la IA
@@ -102,8 +138,12 @@ def enviar_mensaje(request):
             contenido=respuesta_ia['respuesta'],
             tiempo_respuesta=tiempo_respuesta,
             documentos_consultados=respuesta_ia.get('documentos_consultados', []),
-            entidades_extraidas=respuesta_ia.get('entidades_extraidas', [])
+            entidades_extraidas=respuesta_ia.get('entidades_extraidas', []),
+            tokens_usados=respuesta_ia.get('tokens_usados', 0),
+            tiempos=cronometro.resumen(),
+            respuesta_a=mensaje_usuario_obj
         )
+        ranking.registrar(mensaje_ia_obj, respuesta_ia.get('consultas', []))
         
         # Actualizar fecha de conversación
         conversacion.fecha_actualizacion = datetime.now()
@@ -117,14 +157,7 @@ def enviar_mensaje(request):
                 'fecha': mensaje_usuario_obj.fecha_envio.isoformat(),
                 'tipo': mensaje_usuario_obj.tipo
             },
-            'mensaje_ia': {
-                'id': mensaje_ia_obj.id,
-                'contenido': mensaje_ia_obj.contenido,
-                'fecha': mensaje_ia_obj.fecha_envio.isoformat(),
-                'tipo': mensaje_ia_obj.tipo,
-                'tiempo_respuesta': mensaje_ia_obj.tiempo_respuesta,
-                'documentos_consultados': mensaje_ia_obj.documentos_consultados
-            },
+            'mensaje_ia': _mensaje_a_dict(mensaje_ia_obj),
             'conversacion_id': conversacion.id
         })
         
@@ -132,62 +165,284 @@ def enviar_mensaje(request):
         return JsonResponse({'error': f'Error interno: {str(e)}'}, status=500)
 
 
-def procesar_consulta_ia(usuario, consulta, conversacion):
+def _mensaje_a_dict(mensaje):
+    return {
+        'id': mensaje.id,
+        'contenido': mensaje.contenido,
+        'fecha': mensaje.fecha_envio.isoformat(),
+        'tipo': mensaje.tipo,
+        'estado': mensaje.estado,
+        'tiempo_respuesta': mensaje.tiempo_respuesta,
+        'documentos_consultados': mensaje.documentos_consultados
+    }
+
+
+@login_required
+@require_http_methods(["GET"])
+def obtener_mensaje(request, mensaje_id):
     """
-    Procesa la consulta del usuario usando IA
+    Estado de un mensaje; el cliente lo consulta hasta que la respuesta
+    encolada pasa a `completado` o `error`
+    """
+    mensaje = get_object_or_404(
+        Mensaje,
+        id=mensaje_id,
+        conversacion__usuario=request.user
+    )
+    
+    return JsonResponse({
+        'success': True,
+        'mensaje': _mensaje_a_dict(mensaje),
+        'conversacion_id': mensaje.conversacion_id
+    })
+
+
+def _evento_sse(evento, datos):
+    """Serializa un evento Server-Sent Events"""
+    return f"event: {evento}\ndata: {json.dumps(datos, ensure_ascii=False)}\n\n"
+
+
+@login_required
+@csrf_exempt
+@require_http_methods(["POST"])
+async def enviar_mensaje_stream(request):
     """
+    Variante asíncrona de enviar_mensaje: la respuesta de la IA se envía al
+    navegador como Server-Sent Events a medida que OpenAI la genera, sin
+    ocupar un worker durante toda la llamada.
+
+    Eventos: `inicio` (conversación y mensaje del usuario), `token` (fragmento
+    de la respuesta) y `fin` (mensaje de la IA ya guardado).
+    """
+    usuario = await request.auser()
+    
     try:
-        # Inicializar servicio de IA
-        servicio_ia = AsistenteIAService()
+        data = json.loads(request.body)
+        mensaje_usuario = data.get('mensaje', '').strip()
+        conversacion_id = data.get('conversacion_id')
         
-        # Analizar la consulta
-        analisis = servicio_ia.analizar_consulta(consulta)
+        if not mensaje_usuario:
+            return JsonResponse({'error': 'Mensaje vacío'}, status=400)
         
-        # Buscar información relevante
-        contexto = []
-        documentos_consultados = []
+        # Obtener o crear conversación
+        if conversacion_id:
+            conversacion = await aget_object_or_404(
+                Conversacion,
+                id=conversacion_id,
+                usuario=usuario
+            )
+        else:
+            conversacion = await Conversacion.objects.acreate(
+                usuario=usuario,
+                titulo=mensaje_usuario[:50] + "..." if len(mensaje_usuario) > 50 else mensaje_usuario
+            )
         
-        if analisis['tipo'] == 'documento':
-            resultados = servicio_ia.buscar_documentos(consulta, usuario)
-            contexto.extend(resultados)
-            documentos_consultados = [r['objeto'].id for r in resultados if r['tipo'] == 'documento']
+        # Guardar mensaje del usuario
+        cronometro = Cronometro()
+        with cronometro.etapa('persistencia'):
+            mensaje_usuario_obj = await Mensaje.objects.acreate(
+                conversacion=conversacion,
+                tipo='usuario',
+                contenido=mensaje_usuario
+            )
         
-        elif analisis['tipo'] == 'actor':
-            resultados = servicio_ia.buscar_actores(consulta)
-            contexto.extend(resultados)
+        inicio_tiempo = time.time()
+        servicio_ia = AsistenteIAService.instancia()
+        with cronometro.etapa('analisis'):
+            analisis = servicio_ia.analizar_consulta(mensaje_usuario)
+        
+        # Respuesta cacheada: evita la búsqueda en la DB y la llamada a OpenAI
+        with cronometro.etapa('recuperacion'):
+            # La clave (con la versión de los datos) se toma antes de recuperar y se usa para guardar
+            clave_cache = await sync_to_async(cache_respuestas.clave)(analisis, usuario)
+            cacheada = await sync_to_async(cache_respuestas.obtener_respuesta)(clave_cache)
+        if cacheada is None:
+            analisis, contexto, documentos_consultados, historial = await sync_to_async(buscar_contexto_consulta)(
+                servicio_ia, usuario, mensaje_usuario, conversacion, analisis,
+                antes_de=mensaje_usuario_obj.id, cronometro=cronometro
+            )
+            consultas = ranking.consultas(contexto)
+        else:
+            documentos_consultados = cacheada['documentos_consultados']
+            consultas = cacheada.get('consultas', [])
         
-        elif analisis['tipo'] == 'caso':
-            resultados = servicio_ia.buscar_casos(consulta)
-            contexto.extend(resultados)
+    except Http404:
+        raise
+    except Exception as e:
+        return JsonResponse({'error': f'Error interno: {str(e)}'}, status=500)
+    
+    async def eventos():
+        yield _evento_sse('inicio', {
+            'conversacion_id': conversacion.id,
+            'mensaje_usuario': {
+                'id': mensaje_usuario_obj.id,
+                'contenido': mensaje_usuario_obj.contenido,
+                'fecha': mensaje_usuario_obj.fecha_envio.isoformat(),
+                'tipo': mensaje_usuario_obj.tipo
+            }
+        })
         
+        fragmentos = []
+        uso = {}
+        if cacheada is not None:
+            fragmentos.append(cacheada['respuesta'])
+            yield _evento_sse('token', {'contenido': cacheada['respuesta']})
         else:
-            # Búsqueda general
-            resultados_docs = servicio_ia.buscar_documentos(consulta, usuario)
-            resultados_actores = servicio_ia.buscar_actores(consulta)
-            resultados_casos = servicio_ia.buscar_casos(consulta)
-            
-            contexto.extend(resultados_docs[:3])
-            contexto.extend(resultados_actores[:2])
-            contexto.extend(resultados_casos[:2])
+            try:
+                # Misma ranura global, reintentos y límite de intentos que la cola
+                with cronometro.etapa('llm'):
+                    async for fragmento in cola.generar_stream(
+                        servicio_ia, mensaje_usuario, contexto, historial, usuario, analisis, uso=uso
+                    ):
+                        fragmentos.append(fragmento)
+                        yield _evento_sse('token', {'contenido': fragmento})
+            except asyncio.CancelledError:
+                # El navegador cerró la conexión: se guarda lo recibido hasta ahora
+                if fragmentos:
+                    await _guardar_respuesta_stream(
+                        conversacion, mensaje_usuario_obj, fragmentos, inicio_tiempo, documentos_consultados, analisis,
+                        tiempos=cronometro.resumen(), consultas=consultas
+                    )
+                raise
             
-            documentos_consultados = [r['objeto'].id for r in resultados_docs if r['tipo'] == 'documento']
-        
-        # Obtener historial de conversación
-        mensajes_anteriores = conversacion.mensajes.all().order_by('-fecha_envio')[:6]
-        historial = []
-        for msg in reversed(mensajes_anteriores):
-            if msg.tipo in ['usuario', 'asistente']:
-                historial.append(msg.contenido)
-        
-        # Generar respuesta con IA
-        respuesta = servicio_ia.generar_respuesta_ia(consulta, contexto, historial, usuario)
-        
-        return {
-            'respuesta': respuesta,
-            'documentos_consultados': documentos_consultados,
-            'entidades_extraidas': analisis['entidades'],
-            'tipo_consulta': analisis['tipo']
-        }
+            respuesta = ''.join(fragmentos)
+            if _es_cacheable(respuesta, historial):
+                await sync_to_async(cache_respuestas.guardar_respuesta)(clave_cache, {
+                    'respuesta': respuesta,
+                    'documentos_consultados': documentos_consultados,
+                    'consultas': consultas,
+                    'entidades_extraidas': analisis['entidades'],
+                    'tipo_consulta': analisis['tipo']
+                })
+        
+        mensaje_ia_obj = await _guardar_respuesta_stream(
+            conversacion, mensaje_usuario_obj, fragmentos, inicio_tiempo, documentos_consultados, analisis,
+            uso.get('tokens_usados', 0), cronometro.resumen(), consultas
+        )
+        yield _evento_sse('fin', {
+            'conversacion_id': conversacion.id,
+            'mensaje_ia': {
+                'id': mensaje_ia_obj.id,
+                'contenido': mensaje_ia_obj.contenido,
+                'fecha': mensaje_ia_obj.fecha_envio.isoformat(),
+                'tipo': mensaje_ia_obj.tipo,
+                'tiempo_respuesta': mensaje_ia_obj.tiempo_respuesta,
+                'documentos_consultados': mensaje_ia_obj.documentos_consultados
+            }
+        })
+    
+    response = StreamingHttpResponse(eventos(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # evita el buffer de nginx
+    return response
+
+
+async def _guardar_respuesta_stream(conversacion, mensaje_usuario_obj, fragmentos, inicio_tiempo, documentos_consultados, analisis, tokens_usados=None, tiempos=None, consultas=None):
+    """
+    Guarda el mensaje de la IA una vez terminado el stream
+    (tokens_usados queda en None si el stream se cortó antes de terminar)
+    y lo recuperado para responderlo (ver ranking.registrar)
+    """
+    mensaje_ia_obj = await Mensaje.objects.acreate(
+        conversacion=conversacion,
+        tipo='asistente',
+        contenido=''.join(fragmentos),
+        tiempo_respuesta=time.time() - inicio_tiempo,
+        documentos_consultados=documentos_consultados,
+        entidades_extraidas=analisis['entidades'],
+        tokens_usados=tokens_usados,
+        tiempos=tiempos or {},
+        respuesta_a=mensaje_usuario_obj
+    )
+    await ranking.aregistrar(mensaje_ia_obj, consultas or [])
+    
+    # Actualizar fecha de conversación (auto_now)
+    await conversacion.asave(update_fields=['fecha_actualizacion'])
+    return mensaje_ia_obj
+
+def buscar_contexto_consulta(servicio_ia, usuario, consulta, conversacion, analisis=None, antes_de=None, cronometro=None):
+    """
+    Analiza la consulta, recupera la información relevante (una sola búsqueda
+    en la base de datos, que sirve para el prompt y para los documentos
+    consultados) y arma el historial (los mensajes anteriores al mensaje
+    `antes_de`, que es la propia pregunta).
+    Devuelve (analisis, contexto, documentos_consultados, historial).
+    """
+    cronometro = cronometro or Cronometro()
+    
+    # Analizar la consulta
+    if analisis is None:
+        with cronometro.etapa('analisis'):
+            analisis = servicio_ia.analizar_consulta(consulta)
+    
+    with cronometro.etapa('recuperacion'):
+        contexto = servicio_ia.recuperar_contexto(consulta, usuario, analisis)
+        # Historial de conversación (sin respuestas pendientes ni fallidas); el
+        # presupuesto de tokens se aplica al armar los mensajes para OpenAI
+        historial = historial_chat.cargar_historial(conversacion, antes_de)
+    
+    return analisis, contexto, servicio_ia.documentos_consultados(contexto), historial
+
+
+def _es_cacheable(respuesta, historial):
+    """
+    Solo se cachean respuestas que no dependen de mensajes anteriores y que
+    no son errores de OpenAI.
+    """
+    return not historial and not respuesta.startswith(PREFIJO_ERROR)
+
+
+def generar_resultado_consulta(usuario, consulta, conversacion, consultar_cache=True, lanzar_errores=False, antes_de=None, cronometro=None):
+    """
+    Busca el contexto y genera la respuesta (o la toma de la caché).
+    Con `lanzar_errores` los errores de OpenAI se propagan para que la cola pueda reintentar.
+    `antes_de` es el id del mensaje de la pregunta: el historial termina antes de él.
+    Las duraciones de cada etapa se acumulan en `cronometro`.
+    """
+    cronometro = cronometro or Cronometro()
+    servicio_ia = AsistenteIAService.instancia()
+    with cronometro.etapa('analisis'):
+        analisis = servicio_ia.analizar_consulta(consulta)
+    
+    # Respuesta cacheada: evita la búsqueda en la DB y la llamada a OpenAI. La clave
+    # (con la versión de los datos) se toma antes de recuperar y se usa para guardar
+    with cronometro.etapa('recuperacion'):
+        clave_cache = cache_respuestas.clave(analisis, usuario)
+        resultado = cache_respuestas.obtener_respuesta(clave_cache) if consultar_cache else None
+    if resultado is not None:
+        return {**resultado, 'tokens_usados': 0}
+    
+    analisis, contexto, documentos_consultados, historial = buscar_contexto_consulta(
+        servicio_ia, usuario, consulta, conversacion, analisis, antes_de, cronometro
+    )
+    
+    # Generar respuesta con IA
+    uso = {}
+    with cronometro.etapa('llm'):
+        respuesta = servicio_ia.generar_respuesta_ia(
+            consulta, contexto, historial, usuario, analisis, lanzar_errores=lanzar_errores, uso=uso
+        )
+    
+    resultado = {
+        'respuesta': respuesta,
+        'documentos_consultados': documentos_consultados,
+        'consultas': ranking.consultas(contexto),
+        'entidades_extraidas': analisis['entidades'],
+        'tipo_consulta': analisis['tipo']
+    }
+    if _es_cacheable(respuesta, historial):
+        cache_respuestas.guardar_respuesta(clave_cache, resultado)
+    # Los tokens no se guardan en la caché: un acierto no consume tokens
+    resultado['tokens_usados'] = uso.get('tokens_usados')
+    return resultado
+
+
+def procesar_consulta_ia(usuario, consulta, conversacion, antes_de=None, cronometro=None):
+    """
+    Procesa la consulta del usuario usando IA
+    """
+    try:
+        return generar_resultado_consulta(usuario, consulta, conversacion, antes_de=antes_de, cronometro=cronometro)
         
     except Exception as e:
         return {
@@ -198,11 +453,52 @@ def procesar_consulta_ia(usuario, consulta, conversacion):
         }
 
 
+# Columnas que necesita el chat para mostrar un mensaje
+CAMPOS_MENSAJE = ('id', 'contenido', 'tipo', 'estado', 'fecha_envio', 'tiempo_respuesta', 'documentos_consultados')
+
+
+def _entero_o_none(valor):
+    try:
+        return int(valor) if valor else None
+    except ValueError:
+        raise ValueError(f'Valor inválido: {valor}')
+
+
+def ventana_mensajes(conversacion, antes_de=None, despues_de=None, limite=None):
+    """
+    Ventana de mensajes de una conversación, en orden cronológico.
+
+    - Sin parámetros: los `limite` mensajes más recientes.
+    - antes_de: los `limite` mensajes anteriores a ese id (historial al hacer scroll).
+    - despues_de: los mensajes posteriores a ese id (lo nuevo desde la última carga).
+
+    Devuelve (mensajes, hay_mas); hay_mas indica si quedan mensajes más allá
+    de la ventana en la dirección pedida.
+    """
+    if limite is None:
+        limite = settings.CHAT_MENSAJES_POR_PAGINA
+    limite = max(1, min(limite, settings.CHAT_MENSAJES_MAX_POR_PAGINA))
+
+    mensajes = Mensaje.objects.filter(conversacion=conversacion).only(*CAMPOS_MENSAJE)
+    if despues_de is not None:
+        mensajes = list(mensajes.filter(id__gt=despues_de).order_by('id')[:limite + 1])
+        return mensajes[:limite], len(mensajes) > limite
+
+    if antes_de is not None:
+        mensajes = mensajes.filter(id__lt=antes_de)
+    mensajes = list(mensajes.order_by('-id')[:limite + 1])
+    hay_mas = len(mensajes) > limite
+    return mensajes[:limite][::-1], hay_mas
+
+
 @login_required
 @require_http_methods(["GET"])
 def obtener_conversacion(request, conversacion_id):
     """
-    Obtiene los mensajes de una conversación específica
+    Obtiene los mensajes de una conversación específica.
+
+    Devuelve los últimos mensajes; ?antes_de=<id> pide el historial anterior y
+    ?despues_de=<id> solo los mensajes nuevos. ?limite= acota la cantidad.
     """
     if not request.user.is_authenticated:
         return JsonResponse({'error': 'No autenticado'}, status=401)
@@ -213,20 +509,22 @@ def obtener_conversacion(request, conversacion_id):
             id=conversacion_id,
             usuario=request.user
         )
-        
-        mensajes = conversacion.mensajes.all().order_by('fecha_envio')
+
+        try:
+            antes_de = _entero_o_none(request.GET.get('antes_de'))
+            despues_de = _entero_o_none(request.GET.get('despues_de'))
+            limite = _entero_o_none(request.GET.get('limite'))
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        mensajes, hay_mas = ventana_mensajes(conversacion, antes_de, despues_de, limite)
         
         mensajes_data = []
         for mensaje in mensajes:
-            mensajes_data.append({
-                'id': mensaje.id,
-                'contenido': mensaje.contenido,
-                'tipo': mensaje.tipo,
-                'fecha': mensaje.fecha_envio.isoformat(),
-                'tiempo_respuesta': mensaje.tiempo_respuesta,
-                'documentos_consultados': mensaje.documentos_consultados
-            })
+            mensajes_data.append(_mensaje_a_dict(mensaje))
         
+        # Con despues_de la ventana avanza hacia lo nuevo; si no, hacia el historial
+        clave_hay_mas = 'hay_posteriores' if despues_de is not None else 'hay_anteriores'
         return JsonResponse({
             'success': True,
             'conversacion': {
@@ -235,9 +533,12 @@ def obtener_conversacion(request, conversacion_id):
                 'fecha_creacion': conversacion.fecha_creacion.isoformat(),
                 'fecha_actualizacion': conversacion.fecha_actualizacion.isoformat()
             },
-            'mensajes': mensajes_data
+            'mensajes': mensajes_data,
+            clave_hay_mas: hay_mas
         })
         
+    except Http404:
+        raise
     except Exception as e:
         return JsonResponse({'error': f'Error interno: {str(e)}'}, status=500)
 
@@ -295,36 +596,94 @@ def eliminar_conversacion(request, conversacion_id):
         return JsonResponse({'error': f'Error interno: {str(e)}'}, status=500)
 
 
+# Caracteres del último mensaje que se muestran en el listado
+LARGO_VISTA_PREVIA = 120
+
+
+def _codificar_cursor(conversacion):
+    valor = f"{conversacion.fecha_actualizacion.isoformat()}|{conversacion.id}"
+    return base64.urlsafe_b64encode(valor.encode()).decode()
+
+
+def _decodificar_cursor(cursor):
+    """(fecha_actualizacion, id) del último elemento de la página anterior"""
+    try:
+        fecha, conversacion_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        fecha = parse_datetime(fecha)
+        conversacion_id = int(conversacion_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError('Cursor inválido')
+    if fecha is None:
+        raise ValueError('Cursor inválido')
+    return fecha, conversacion_id
+
+
+def _tamano_pagina(valor):
+    try:
+        limite = int(valor) if valor else settings.CHAT_CONVERSACIONES_POR_PAGINA
+    except ValueError:
+        limite = settings.CHAT_CONVERSACIONES_POR_PAGINA
+    return max(1, min(limite, settings.CHAT_CONVERSACIONES_MAX_POR_PAGINA))
+
+
 @login_required
 @require_http_methods(["GET"])
 def obtener_conversaciones(request):
     """
-    Obtiene las conversaciones del usuario
+    Obtiene las conversaciones del usuario, de la más reciente a la más
+    antigua, paginadas por cursor (?cursor=...&limite=...).
+
+    La cantidad de mensajes y la vista previa del último mensaje se calculan
+    en la misma consulta.
     """
     if not request.user.is_authenticated:
         return JsonResponse({'error': 'No autenticado'}, status=401)
     
     try:
+        limite = _tamano_pagina(request.GET.get('limite'))
+
+        ultimo_mensaje = Mensaje.objects.filter(
+            conversacion=OuterRef('pk')
+        ).order_by('-fecha_envio', '-id').values('contenido')[:1]
+
         conversaciones = Conversacion.objects.filter(
             usuario=request.user,
             activa=True
-        ).order_by('-fecha_actualizacion')
-        
+        ).annotate(
+            cantidad_mensajes=Count('mensajes'),
+            ultimo_mensaje=Substr(Subquery(ultimo_mensaje), 1, LARGO_VISTA_PREVIA)
+        ).order_by('-fecha_actualizacion', '-id')
+
+        cursor = request.GET.get('cursor')
+        if cursor:
+            try:
+                fecha, conversacion_id = _decodificar_cursor(cursor)
+            except ValueError as e:
+                return JsonResponse({'error': str(e)}, status=400)
+            conversaciones = conversaciones.filter(
+                Q(fecha_actualizacion__lt=fecha) | Q(fecha_actualizacion=fecha, id__lt=conversacion_id)
+            )
+
+        # Un elemento de más indica si hay otra página
+        pagina = list(conversaciones[:limite + 1])
+        hay_mas = len(pagina) > limite
+        pagina = pagina[:limite]
+
         conversaciones_data = []
-        for conv in conversaciones:
-            ultimo_mensaje = conv.mensajes.last()
+        for conv in pagina:
             conversaciones_data.append({
                 'id': conv.id,
                 'titulo': conv.titulo,
                 'fecha_creacion': conv.fecha_creacion.isoformat(),
                 'fecha_actualizacion': conv.fecha_actualizacion.isoformat(),
-                'ultimo_mensaje': ultimo_mensaje.contenido if ultimo_mensaje else None,
-                'cantidad_mensajes': conv.mensajes.count()
+                'ultimo_mensaje': conv.ultimo_mensaje,
+                'cantidad_mensajes': conv.cantidad_mensajes
             })
         
         return JsonResponse({
             'success': True,
-            'conversaciones': conversaciones_data
+            'conversaciones': conversaciones_data,
+            'siguiente_cursor': _codificar_cursor(pagina[-1]) if hay_mas else None
         })
         
     except Exception as e:
@@ -357,3 +716,18 @@ def obtener_sugerencias(request):
         
     except Exception as e:
         return JsonResponse({'error': f'Error interno: {str(e)}'}, status=500)
+
+
+@login_required
+@require_http_methods(["GET"])
+def metricas_cache_respuestas(request):
+    """
+    Aciertos y fallos de la caché de respuestas del chat (solo staff)
+    """
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'No autorizado'}, status=403)
+    
+    return JsonResponse({
+        'success': True,
+        'metricas': cache_respuestas.metricas()
+    })
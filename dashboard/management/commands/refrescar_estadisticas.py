@@ -0,0 +1,37 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from dashboard.models import Estadistica
+
+
+class Command(BaseCommand):
+    help = (
+        'Refresca la vista materializada de estadísticas (útil tras cargas masivas); con --continuo la '
+        'refresca periódicamente solo cuando hubo cambios (ver dashboard/models.py)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--continuo', action='store_true', help='Queda revisando si hubo cambios')
+        parser.add_argument(
+            '--intervalo', type=float, default=settings.ESTADISTICAS_INTERVALO,
+            help='Segundos entre revisiones con --continuo',
+        )
+
+    def handle(self, *args, **options):
+        if not options['continuo']:
+            Estadistica.refrescar()
+            self.stdout.write(self.style.SUCCESS('Estadísticas actualizadas'))
+            return
+
+        self.stdout.write(f"Refrescando estadísticas cada {options['intervalo']} s si hay cambios...")
+        vista = None
+        try:
+            while True:
+                close_old_connections()
+                vista = Estadistica.refrescar_si_cambio(vista)
+                time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            pass
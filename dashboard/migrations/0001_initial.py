@@ -0,0 +1,95 @@
+from django.db import migrations, models
+
+
+VISTA_ESTADISTICAS = """
+CREATE MATERIALIZED VIEW dashboard_estadistica AS
+SELECT 'casos' AS categoria, '' AS clave, count(*)::integer AS total FROM casos_caso
+UNION ALL
+SELECT 'casos_estado', coalesce(estado, ''), count(*) FROM casos_caso GROUP BY coalesce(estado, '')
+UNION ALL
+SELECT 'casos_tipo', coalesce("tipoCaso", ''), count(*) FROM casos_caso GROUP BY coalesce("tipoCaso", '')
+UNION ALL
+(
+    SELECT 'casos_top_documentos', c."nroCaso", count(d.id)
+    FROM casos_caso c
+    LEFT JOIN casos_expediente e ON e.caso_id = c.id
+    LEFT JOIN casos_carpeta ca ON ca.expediente_id = e.id
+    LEFT JOIN documentos_documento d ON d.carpeta_id = ca.id
+    GROUP BY c.id, c."nroCaso"
+    ORDER BY count(d.id) DESC, c.id
+    LIMIT 5
+)
+UNION ALL
+SELECT 'documentos', '', count(*) FROM documentos_documento
+UNION ALL
+SELECT 'documentos_tipo', coalesce(t.nombre, ''), count(*)
+FROM documentos_documento d
+LEFT JOIN documentos_tipodocumento t ON t.id = d."tipoDocumento_id"
+GROUP BY coalesce(t.nombre, '')
+UNION ALL
+SELECT 'documentos_palabras_clave',
+       CASE WHEN coalesce("palabraClave", '') = '' THEN 'sin' ELSE 'con' END,
+       count(*)
+FROM documentos_documento
+GROUP BY 2
+UNION ALL
+SELECT 'versiones', '', count(*) FROM documentos_versiondocumento
+UNION ALL
+SELECT 'actores', '', count(*) FROM actores_actor
+UNION ALL
+SELECT 'actores_subtipo', 'abogados', count(*) FROM actores_abogado
+UNION ALL
+SELECT 'actores_subtipo', 'clientes', count(*) FROM actores_cliente
+UNION ALL
+SELECT 'actores_subtipo', 'asistentes', count(*) FROM actores_asistente
+UNION ALL
+SELECT 'abogados_especialidad', coalesce(especialidad, ''), count(*) FROM actores_abogado GROUP BY coalesce(especialidad, '')
+UNION ALL
+SELECT 'clientes_tipo', coalesce("tipoCliente", ''), count(*) FROM actores_cliente GROUP BY coalesce("tipoCliente", '')
+UNION ALL
+SELECT 'usuarios', '', count(*) FROM seguridad_usuario
+UNION ALL
+SELECT 'usuarios_activo', CASE WHEN is_active THEN 'activos' ELSE 'inactivos' END, count(*)
+FROM seguridad_usuario
+GROUP BY 2
+UNION ALL
+SELECT 'usuarios_rol', r.nombre, count(*)
+FROM seguridad_usuariorol ur
+JOIN seguridad_rol r ON r.id = ur.rol_id
+GROUP BY r.nombre;
+
+-- Requerido por REFRESH MATERIALIZED VIEW CONCURRENTLY
+CREATE UNIQUE INDEX dashboard_estadistica_pk ON dashboard_estadistica (categoria, clave);
+"""
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('actores', '0004_actor_nombrecompleto_actor_actor_nombre_trgm_and_more'),
+        ('casos', '0002_caso_search_vector_and_more'),
+        ('documentos', '0002_documento_search_vector_and_more'),
+        ('seguridad', '0003_alter_bitacora_fecha_alter_bitacora_login_at_and_more'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            VISTA_ESTADISTICAS,
+            reverse_sql='DROP MATERIALIZED VIEW IF EXISTS dashboard_estadistica;',
+        ),
+        migrations.CreateModel(
+            name='Estadistica',
+            fields=[
+                ('pk', models.CompositePrimaryKey('categoria', 'clave', blank=True, editable=False, primary_key=True, serialize=False)),
+                ('categoria', models.CharField(max_length=50)),
+                ('clave', models.CharField(max_length=150)),
+                ('total', models.IntegerField()),
+            ],
+            options={
+                'db_table': 'dashboard_estadistica',
+                'managed': False,
+            },
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0001_initial'),
+    ]
+
+    operations = [
+        # Marca de cambios en los datos contados (ver Estadistica.marcar_cambios)
+        migrations.RunSQL(
+            'CREATE SEQUENCE dashboard_estadistica_cambios;',
+            reverse_sql='DROP SEQUENCE IF EXISTS dashboard_estadistica_cambios;',
+        ),
+    ]
@@ -1,3 +1,89 @@
-from django.db import models
+from collections import defaultdict
 
-# Create your models here.
+from django.db import connection, models
+
+SECUENCIA_CAMBIOS = 'dashboard_estadistica_cambios'
+# Clave de pg_try_advisory_lock(bigint) del refresco
+ADVISORY_LOCK_REFRESCO = 4301
+
+
+class EstadisticaQuerySet(models.QuerySet):
+
+    def resumen(self):
+        """
+        Devuelve todas las estadísticas en una sola consulta, agrupadas como
+        {categoria: {clave: total}}.
+        """
+        resumen = defaultdict(dict)
+        for categoria, clave, total in self.values_list('categoria', 'clave', 'total'):
+            resumen[categoria][clave] = total
+        return resumen
+
+
+class Estadistica(models.Model):
+    """
+    Vista materializada `dashboard_estadistica` (ver migración 0001) con los
+    conteos que usan el panel y las preguntas estadísticas del chat.
+
+    Cada fila es (categoria, clave, total); p. ej. ('casos_estado', 'ABIERTO', 12).
+
+    Refresco diferido: cada transacción que guarda o elimina modelos contados
+    marca una vez que hubo cambios (dashboard/signals.py), avanzando la
+    secuencia `dashboard_estadistica_cambios` (sin bloqueos, visible para
+    todos los procesos). `manage.py refrescar_estadisticas --continuo` refresca
+    la vista cada ESTADISTICAS_INTERVALO segundos solo si la secuencia avanzó,
+    así una ráfaga de escrituras cuesta un refresco y ninguna solicitud lo espera.
+    """
+    pk = models.CompositePrimaryKey('categoria', 'clave')
+    categoria = models.CharField(max_length=50)
+    clave = models.CharField(max_length=150)
+    total = models.IntegerField()
+
+    objects = EstadisticaQuerySet.as_manager()
+
+    class Meta:
+        managed = False
+        db_table = 'dashboard_estadistica'
+
+    def __str__(self):
+        return f"{self.categoria}[{self.clave}] = {self.total}"
+
+    @classmethod
+    def refrescar(cls):
+        """Recalcula la vista sin bloquear las lecturas"""
+        with connection.cursor() as cursor:
+            cursor.execute(f'REFRESH MATERIALIZED VIEW CONCURRENTLY {cls._meta.db_table}')
+
+    @classmethod
+    def marcar_cambios(cls):
+        """Registra que cambiaron los datos contados (nextval no se revierte ni espera bloqueos)"""
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT nextval(%s)', [SECUENCIA_CAMBIOS])
+
+    @classmethod
+    def version_cambios(cls) -> int:
+        """Cantidad de cambios marcados hasta ahora"""
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM {SECUENCIA_CAMBIOS}')
+            return cursor.fetchone()[0]
+
+    @classmethod
+    def refrescar_si_cambio(cls, vista: int = None) -> int:
+        """
+        Refresca si hubo cambios desde la versión `vista` (con None, siempre) y
+        devuelve la versión que quedó reflejada. Un solo proceso refresca a la
+        vez: si otro lo está haciendo, no hace nada y devuelve `vista`.
+        """
+        version = cls.version_cambios()
+        if version == vista:
+            return vista
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_try_advisory_lock(%s)', [ADVISORY_LOCK_REFRESCO])
+            if not cursor.fetchone()[0]:
+                return vista
+            try:
+                # La versión se lee antes: lo que cambie durante el refresco dispara el siguiente
+                cls.refrescar()
+            finally:
+                cursor.execute('SELECT pg_advisory_unlock(%s)', [ADVISORY_LOCK_REFRESCO])
+        return version
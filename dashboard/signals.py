@@ -0,0 +1,53 @@
+"""
+Marca de cambios para la vista materializada de estadísticas.
+
+Al guardar o eliminar un modelo contado en `dashboard_estadistica` se marca,
+una sola vez por transacción y cuando confirma, que hubo cambios
+(Estadistica.marcar_cambios); el refresco lo hace después
+`manage.py refrescar_estadisticas --continuo`, fuera de la solicitud. Las
+operaciones masivas (update/bulk_create) no emiten señales: usar
+`manage.py refrescar_estadisticas`.
+"""
+import weakref
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from actores.models import Abogado, Actor, Asistente, Cliente
+from casos.models import Carpeta, Caso, Expediente
+from documentos.models import Documento, TipoDocumento, VersionDocumento
+from seguridad.models import Rol, Usuario, UsuarioRol
+from .models import Estadistica
+
+MODELOS_CONTADOS = (
+    Caso, Expediente, Carpeta,
+    Documento, TipoDocumento, VersionDocumento,
+    Actor, Abogado, Cliente, Asistente,
+    Usuario, Rol, UsuarioRol,
+)
+
+
+def programar_refresco(sender, update_fields=None, **kwargs):
+    # El inicio de sesión solo actualiza last_login, que no se cuenta
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    # Una marca por transacción: la conexión guarda una referencia débil a la
+    # marca programada y el callback la limpia al ejecutarse. Si la transacción
+    # (o el savepoint) se revierte, Django descarta el callback, la referencia
+    # queda muerta y la siguiente escritura vuelve a programarla.
+    conexion = transaction.get_connection()
+    pendiente = getattr(conexion, '_marca_estadisticas', None)
+    if pendiente is not None and pendiente() is not None:
+        return
+
+    def marcar_cambios():
+        conexion._marca_estadisticas = None
+        Estadistica.marcar_cambios()
+
+    conexion._marca_estadisticas = weakref.ref(marcar_cambios)
+    transaction.on_commit(marcar_cambios)
+
+
+for modelo in MODELOS_CONTADOS:
+    post_save.connect(programar_refresco, sender=modelo, dispatch_uid=f'estadisticas_{modelo._meta.label}_save')
+    post_delete.connect(programar_refresco, sender=modelo, dispatch_uid=f'estadisticas_{modelo._meta.label}_delete')
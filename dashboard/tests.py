@@ -1,3 +1,98 @@
+from datetime import date
+
+from django.db import transaction
 from django.test import TestCase
 
-# Create your tests here.
+from casos.models import Caso, Carpeta, Expediente
+from documentos.models import Documento, TipoDocumento
+from seguridad.models import Usuario
+from .models import Estadistica
+
+
+def marcas(callbacks):
+    return [callback for callback in callbacks if getattr(callback, '__name__', '') == 'marcar_cambios']
+
+
+class EstadisticaTests(TestCase):
+    """
+    Vista materializada de estadísticas, marcada al confirmar cada transacción y refrescada después
+    """
+
+    def crear_caso(self, nroCaso, documentos, estado='ABIERTO'):
+        caso = Caso.objects.create(nroCaso=nroCaso, tipoCaso='Divorcio', estado=estado, fechaInicio=date(2024, 1, 1))
+        expediente = Expediente.objects.create(caso=caso, nroExpediente=f'EXP-{nroCaso}', fechaCreacion=date(2024, 1, 1))
+        carpeta = Carpeta.objects.create(expediente=expediente, nombre='Principal')
+        tipo = TipoDocumento.objects.get_or_create(nombre='Demanda')[0]
+        for i in range(documentos):
+            Documento.objects.create(
+                carpeta=carpeta, tipoDocumento=tipo, nombreDocumento=f'{nroCaso} doc {i}',
+                rutaDocumento=f'/docs/{nroCaso}/{i}.pdf', tamano=1.0, fechaDoc=date(2024, 1, 1),
+            )
+        return caso
+
+    def test_marca_una_vez_por_transaccion_y_refresca_despues(self):
+        antes = Estadistica.version_cambios()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.crear_caso('CIV-2024-001', 3)
+            self.crear_caso('PEN-2024-002', 1, estado='CERRADO')
+
+        # 8 escrituras, una sola marca y ningún refresco en la solicitud
+        self.assertEqual(len(marcas(callbacks)), 1)
+        self.assertEqual(Estadistica.version_cambios(), antes + 1)
+        self.assertEqual(Estadistica.objects.resumen()['casos'][''], 0)
+
+        vista = Estadistica.refrescar_si_cambio(antes)
+
+        self.assertEqual(vista, antes + 1)
+        resumen = Estadistica.objects.resumen()
+        self.assertEqual(resumen['casos'][''], 2)
+        self.assertEqual(resumen['casos_estado'], {'ABIERTO': 1, 'CERRADO': 1})
+        self.assertEqual(resumen['documentos_tipo'], {'Demanda': 4})
+        self.assertEqual(resumen['casos_top_documentos'], {'CIV-2024-001': 3, 'PEN-2024-002': 1})
+
+    def test_sin_cambios_no_refresca(self):
+        vista = Estadistica.version_cambios()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(Estadistica.refrescar_si_cambio(vista), vista)
+
+    def test_rollback_no_marca(self):
+        antes = Estadistica.version_cambios()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    self.crear_caso('CIV-2024-001', 1)
+                    raise ValueError
+            except ValueError:
+                pass
+            Caso.objects.create(nroCaso='PEN-2024-002', tipoCaso='Penal', fechaInicio=date(2024, 1, 1))
+
+        # El callback de la parte revertida se descartó; la escritura posterior marcó de nuevo
+        self.assertEqual(len(marcas(callbacks)), 1)
+        self.assertEqual(Estadistica.version_cambios(), antes + 1)
+
+    def test_eliminar_refresca(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            caso = self.crear_caso('CIV-2024-001', 2)
+        Estadistica.refrescar_si_cambio()
+        vista = Estadistica.version_cambios()
+        with self.captureOnCommitCallbacks(execute=True):
+            caso.delete()
+        Estadistica.refrescar_si_cambio(vista)
+
+        self.assertEqual(Estadistica.objects.resumen()['casos'][''], 0)
+
+    def test_panel_una_consulta_para_kpis_globales(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.crear_caso('CIV-2024-001', 2)
+            usuario = Usuario.objects.create_user(username='panel', email='panel@test.com', password='x')
+        Estadistica.refrescar()
+        self.client.force_login(usuario)
+
+        # sesión + usuario + estadísticas + actor del usuario + grupos (base.html)
+        with self.assertNumQueries(5):
+            response = self.client.get('/panel/')
+
+        self.assertEqual(response.context['total_casos'], 1)
+        self.assertEqual(response.context['total_documentos'], 2)
+        self.assertEqual(response.context['top_casos_docs'], [{'nroCaso': 'CIV-2024-001', 'num_docs': 2}])
@@ -3,11 +3,11 @@ from django.shortcuts import render
 # Create your views here.
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import TemplateView
-from django.db.models import Count
 from casos.models import Caso
-from documentos.models import Documento, VersionDocumento
+from documentos.models import Documento
 # Si necesitas datos del actor:
 from actores.models import Actor
+from .models import Estadistica
 
 class PanelView(LoginRequiredMixin, TemplateView):
     template_name = "dashboard/panel.html"
@@ -15,10 +15,11 @@ class PanelView(LoginRequiredMixin, TemplateView):
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
-        # KPIs globales básicos
-        ctx["total_casos"] = Caso.objects.count()
-        ctx["total_documentos"] = Documento.objects.count()
-        ctx["total_versiones"] = VersionDocumento.objects.count()
+        # KPIs globales básicos (vista materializada, una sola consulta)
+        resumen = Estadistica.objects.resumen()
+        ctx["total_casos"] = resumen.get("casos", {}).get("", 0)
+        ctx["total_documentos"] = resumen.get("documentos", {}).get("", 0)
+        ctx["total_versiones"] = resumen.get("versiones", {}).get("", 0)
 
         # KPIs del usuario (si tiene Actor):
         actor = getattr(self.request.user, "actor", None)
@@ -33,9 +34,11 @@ class PanelView(LoginRequiredMixin, TemplateView):
             ctx["mis_documentos"] = 0
 
         # Ranking simple (top 5 por # documentos)
-        ctx["top_casos_docs"] = (
-            Caso.objects.annotate(num_docs=Count("expediente__carpetas__documentos"))
-                .order_by("-num_docs")[:5]
-        )
+        ctx["top_casos_docs"] = [
+            {"nroCaso": nro_caso, "num_docs": num_docs}
+            for nro_caso, num_docs in sorted(
+                resumen.get("casos_top_documentos", {}).items(), key=lambda item: -item[1]
+            )
+        ]
         return ctx
 
@@ -7,10 +7,52 @@ import random
 
 User = get_user_model()
 
+TIPOS_DOCUMENTO = [
+    {'nombre': 'Demanda', 'descripcion': 'Documento inicial de demanda'},
+    {'nombre': 'Contestación', 'descripcion': 'Contestación a la demanda'},
+    {'nombre': 'Escrito de Pruebas', 'descripcion': 'Escrito ofreciendo pruebas'},
+    {'nombre': 'Testimonio', 'descripcion': 'Declaración testimonial'},
+    {'nombre': 'Peritaje', 'descripcion': 'Informe pericial'},
+    {'nombre': 'Resolución', 'descripcion': 'Resolución judicial'},
+    {'nombre': 'Contrato', 'descripcion': 'Contrato legal'},
+    {'nombre': 'Poder', 'descripcion': 'Poder notarial'},
+    {'nombre': 'Escritura', 'descripcion': 'Escritura pública'},
+    {'nombre': 'Certificado', 'descripcion': 'Certificado oficial'},
+]
+
+ETAPAS_PROCESALES = [
+    {'nombre': 'Demanda', 'descripcion': 'Etapa inicial del proceso'},
+    {'nombre': 'Contestación', 'descripcion': 'Etapa de contestación'},
+    {'nombre': 'Pruebas', 'descripcion': 'Etapa probatoria'},
+    {'nombre': 'Alegatos', 'descripcion': 'Etapa de alegatos'},
+    {'nombre': 'Sentencia', 'descripcion': 'Etapa de sentencia'},
+    {'nombre': 'Ejecución', 'descripcion': 'Etapa de ejecución'},
+    {'nombre': 'Apelación', 'descripcion': 'Etapa de apelación'},
+    {'nombre': 'Recurso', 'descripcion': 'Etapa de recursos'},
+    {'nombre': 'Conciliación', 'descripcion': 'Etapa de conciliación'},
+    {'nombre': 'Mediación', 'descripcion': 'Etapa de mediación'},
+]
+
+# Corpus sintético (--sinteticos): rutaDocumento lleva este prefijo
+PREFIJO_SINTETICO = '/sinteticos/'
+TEMAS = ['divorcio', 'robo', 'despido', 'contrato', 'sucesión', 'pensión', 'amparo', 'sociedad', 'tránsito',
+         'horas extras', 'predio', 'local', 'registro', 'banco', 'audiencia', 'medida cautelar']
+
 class Command(BaseCommand):
     help = 'Seed data for documentos app'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sinteticos', type=int, default=0,
+            help='En lugar de los datos de ejemplo, completa hasta N documentos sintéticos repartidos en las carpetas existentes'
+        )
+        parser.add_argument('--lote', type=int, default=5000, help='Filas por INSERT del corpus sintético')
+        parser.add_argument('--semilla', type=int, default=42)
+
     def handle(self, *args, **options):
+        if options['sinteticos']:
+            return self._sembrar_sinteticos(options['sinteticos'], options['lote'], options['semilla'])
+
         self.stdout.write('Iniciando seed de datos de documentos...')
         
         # Verificar que existan carpetas
@@ -29,53 +71,7 @@ class Command(BaseCommand):
             )
             return
         
-        # Crear tipos de documentos
-        tipos_documentos_data = [
-            {'nombre': 'Demanda', 'descripcion': 'Documento inicial de demanda'},
-            {'nombre': 'Contestación', 'descripcion': 'Contestación a la demanda'},
-            {'nombre': 'Escrito de Pruebas', 'descripcion': 'Escrito ofreciendo pruebas'},
-            {'nombre': 'Testimonio', 'descripcion': 'Declaración testimonial'},
-            {'nombre': 'Peritaje', 'descripcion': 'Informe pericial'},
-            {'nombre': 'Resolución', 'descripcion': 'Resolución judicial'},
-            {'nombre': 'Contrato', 'descripcion': 'Contrato legal'},
-            {'nombre': 'Poder', 'descripcion': 'Poder notarial'},
-            {'nombre': 'Escritura', 'descripcion': 'Escritura pública'},
-            {'nombre': 'Certificado', 'descripcion': 'Certificado oficial'},
-        ]
-        
-        tipos_documentos = []
-        for tipo_data in tipos_documentos_data:
-            tipo, created = TipoDocumento.objects.get_or_create(
-                nombre=tipo_data['nombre'],
-                defaults={'descripcion': tipo_data['descripcion']}
-            )
-            tipos_documentos.append(tipo)
-            if created:
-                self.stdout.write(f'Creado tipo de documento: {tipo.nombre}')
-        
-        # Crear etapas procesales
-        etapas_data = [
-            {'nombre': 'Demanda', 'descripcion': 'Etapa inicial del proceso'},
-            {'nombre': 'Contestación', 'descripcion': 'Etapa de contestación'},
-            {'nombre': 'Pruebas', 'descripcion': 'Etapa probatoria'},
-            {'nombre': 'Alegatos', 'descripcion': 'Etapa de alegatos'},
-            {'nombre': 'Sentencia', 'descripcion': 'Etapa de sentencia'},
-            {'nombre': 'Ejecución', 'descripcion': 'Etapa de ejecución'},
-            {'nombre': 'Apelación', 'descripcion': 'Etapa de apelación'},
-            {'nombre': 'Recurso', 'descripcion': 'Etapa de recursos'},
-            {'nombre': 'Conciliación', 'descripcion': 'Etapa de conciliación'},
-            {'nombre': 'Mediación', 'descripcion': 'Etapa de mediación'},
-        ]
-        
-        etapas = []
-        for etapa_data in etapas_data:
-            etapa, created = EtapaProcesal.objects.get_or_create(
-                nombre=etapa_data['nombre'],
-                defaults={'descripcion': etapa_data['descripcion']}
-            )
-            etapas.append(etapa)
-            if created:
-                self.stdout.write(f'Creada etapa procesal: {etapa.nombre}')
+        tipos_documentos, etapas = self._catalogos()
         
         # Crear documentos
         documentos_data = [
@@ -149,3 +145,65 @@ class Command(BaseCommand):
         self.stdout.write(
             self.style.SUCCESS('Seed de documentos completado exitosamente!')
         )
+
+    def _catalogos(self):
+        """Tipos de documento y etapas procesales (los crea si faltan)"""
+        tipos_documentos = []
+        for tipo_data in TIPOS_DOCUMENTO:
+            tipo, created = TipoDocumento.objects.get_or_create(
+                nombre=tipo_data['nombre'],
+                defaults={'descripcion': tipo_data['descripcion']}
+            )
+            tipos_documentos.append(tipo)
+            if created:
+                self.stdout.write(f'Creado tipo de documento: {tipo.nombre}')
+        
+        etapas = []
+        for etapa_data in ETAPAS_PROCESALES:
+            etapa, created = EtapaProcesal.objects.get_or_create(
+                nombre=etapa_data['nombre'],
+                defaults={'descripcion': etapa_data['descripcion']}
+            )
+            etapas.append(etapa)
+            if created:
+                self.stdout.write(f'Creada etapa procesal: {etapa.nombre}')
+        return tipos_documentos, etapas
+
+    def _sembrar_sinteticos(self, cantidad, lote, semilla):
+        """
+        Crea documentos sintéticos hasta llegar a `cantidad` (los ya creados se
+        conservan), repartidos al azar entre las carpetas existentes.
+        """
+        existentes = Documento.objects.filter(rutaDocumento__startswith=PREFIJO_SINTETICO).count()
+        if existentes >= cantidad:
+            self.stdout.write(f'Ya existen {existentes} documentos sintéticos')
+            return
+        carpetas = list(Carpeta.objects.values_list('id', flat=True))
+        if not carpetas:
+            self.stdout.write(
+                self.style.ERROR('No hay carpetas en el sistema. Ejecuta primero seed_casos.')
+            )
+            return
+
+        aleatorio = random.Random(semilla + existentes)
+        tipos_documentos, etapas = self._catalogos()
+        hoy = datetime.now().date()
+
+        for inicio in range(existentes, cantidad, lote):
+            documentos = []
+            for n in range(inicio, min(inicio + lote, cantidad)):
+                tipo = aleatorio.choice(tipos_documentos)
+                temas = aleatorio.sample(TEMAS, 2)
+                documentos.append(Documento(
+                    carpeta_id=aleatorio.choice(carpetas), tipoDocumento=tipo,
+                    etapaProcesal=aleatorio.choice(etapas) if aleatorio.random() < 0.5 else None,
+                    nombreDocumento=f'{tipo.nombre} - {temas[0].capitalize()} {n}',
+                    rutaDocumento=f'{PREFIJO_SINTETICO}{n:07d}.pdf',
+                    tamano=round(aleatorio.uniform(0.1, 10), 1), estado='ACTIVO',
+                    palabraClave=' '.join(temas),
+                    fechaDoc=hoy - timedelta(days=aleatorio.randrange(1, 3650)),
+                ))
+            Documento.objects.bulk_create(documentos)
+            self.stdout.write(f'Documentos sintéticos: {inicio + len(documentos)}/{cantidad}')
+
+        self.stdout.write(self.style.SUCCESS(f'{cantidad - existentes} documentos sintéticos creados'))
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:11
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('casos', '0002_caso_search_vector_and_more'),
+        ('documentos', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documento',
+            name='search_vector',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.SearchVector('nombreDocumento', config='spanish_unaccent', weight='A'), '||', django.contrib.postgres.search.SearchVector('palabraClave', config='spanish_unaccent', weight='B'), django.contrib.postgres.search.SearchConfig('spanish_unaccent')), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        migrations.AddIndex(
+            model_name='documento',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='documentos__search__46409f_gin'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:52
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        # Extensión pg_trgm (TrigramExtension)
+        ('actores', '0004_actor_nombrecompleto_actor_actor_nombre_trgm_and_more'),
+        ('casos', '0003_casos_del_usuario'),
+        ('documentos', '0002_documento_search_vector_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='documento',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['nombreDocumento'], name='documento_nombre_trgm', opclasses=['gin_trgm_ops']),
+        ),
+    ]
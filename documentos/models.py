@@ -1,6 +1,9 @@
 from django.db import models
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from casos.models import Carpeta
+from GestDocSi2.busqueda import BusquedaQuerySet, vector_busqueda
 from seguridad.models import Usuario
 
 # Create your models here.
@@ -70,10 +73,22 @@ class Documento(models.Model):
     creadoEn = models.DateTimeField(auto_now_add=True)
     actualizadoEn = models.DateTimeField(auto_now=True)
 
+    # Búsqueda de texto completo (columna generada, ver GestDocSi2/busqueda.py)
+    search_vector = models.GeneratedField(
+        expression=vector_busqueda(("nombreDocumento", "A"), ("palabraClave", "B")),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
+    objects = BusquedaQuerySet.as_manager()
+
     class Meta:
         indexes = [
             models.Index(fields=["carpeta", "estado"]),
             models.Index(fields=["fechaDoc"]),
+            GinIndex(fields=["search_vector"]),
+            # Búsqueda difusa por nombre (BusquedaQuerySet.similares)
+            GinIndex(fields=["nombreDocumento"], name="documento_nombre_trgm", opclasses=["gin_trgm_ops"]),
         ]
 
     def __str__(self):
@@ -3,12 +3,28 @@
 # Run migrations
 python manage.py migrate --no-input
 
+# Tabla de la caché compartida de respuestas del chat (CACHES["respuestas"])
+python manage.py createcachetable
+
+# Particiones mensuales de la auditoría (seguridad/particiones.py)
+python manage.py particionar_bitacora
+
 # Create superuser (will only run once)
 python manage.py create_default_superuser
 
 # Collect static files
 python manage.py collectstatic --no-input
 
+# Embeddings de la búsqueda semántica del chat (solo recalcula lo que cambió)
+python manage.py indexar_embeddings
+
+# Worker de la cola de respuestas del chat (chat/cola.py)
+python manage.py procesar_cola_chat &
+
+# Refresco diferido de las estadísticas del panel (dashboard/models.py)
+python manage.py refrescar_estadisticas --continuo &
+
 # Start the Gunicorn server debe ser el nombre de la carpeta donde está tu archivo wsgi.py.
 # ¡CAMBIO AQUÍ! Ahora enlaza con 0.0.0.0:8080
-gunicorn GestDocSi2.wsgi:application --bind 0.0.0.0:8080
\ No newline at end of file
+# Workers ASGI (uvicorn) para que el chat en streaming no bloquee un worker por mensaje.
+gunicorn GestDocSi2.asgi:application -k uvicorn_worker.UvicornWorker --bind 0.0.0.0:8080
\ No newline at end of file
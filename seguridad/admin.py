@@ -36,16 +36,30 @@ class RolPermisoAdmin(admin.ModelAdmin):
     list_filter = ('estado',)
     ordering = ('rol',)
 
+class SoloLecturaAdmin(admin.ModelAdmin):
+    """La auditoría solo se agrega (append-only): el admin no la crea, edita ni borra"""
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 @admin.register(Bitacora)
-class BitacoraAdmin(admin.ModelAdmin):
+class BitacoraAdmin(SoloLecturaAdmin):
     list_display = ('login', 'idUsuario', 'fecha', 'login_at', 'logout_at')
     search_fields = ('login', 'idUsuario__username')
     list_filter = ('idUsuario',)
-    ordering = ('fecha',)
+    ordering = ('-login_at',)
+    date_hierarchy = 'login_at'  # filtra por la columna de partición
 
 @admin.register(DetalleBitacora)
-class DetalleBitacoraAdmin(admin.ModelAdmin):
+class DetalleBitacoraAdmin(SoloLecturaAdmin):
     list_display = ('accion', 'tabla', 'fecha', 'idBitacora')
     search_fields = ('accion', 'tabla')
     list_filter = ('tabla',)
-    ordering = ('fecha',)
+    ordering = ('-fecha',)
+    date_hierarchy = 'fecha'  # filtra por la columna de partición
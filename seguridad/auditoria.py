@@ -0,0 +1,432 @@
+"""
+Escritura diferida y por lotes de la auditoría (Bitacora y DetalleBitacora).
+
+`registrar(*objetos)` no toca la base de datos: asigna el id a cada objeto y
+lo deja en un búfer en memoria del proceso. Un hilo lo vacía con un
+bulk_create por modelo cuando junta AUDITORIA_LOTE objetos o cada
+AUDITORIA_INTERVALO segundos, lo que ocurra primero; así el login y las
+solicitudes que auditan no esperan un INSERT.
+
+- Ids: se reservan de la secuencia de la tabla en bloques de
+  AUDITORIA_BLOQUE_IDS (una consulta por bloque), así el llamador conoce el id
+  de una Bitacora aún no escrita y puede referirla desde sus DetalleBitacora.
+- Respaldo: si el bulk_create falla (base caída) o el proceso termina, lo
+  pendiente se guarda en AUDITORIA_RESPALDO_DIR como JSON Lines; el siguiente
+  vaciado de cualquier proceso lo reinserta (ON CONFLICT DO NOTHING, así un
+  archivo reinsertado dos veces no duplica filas). Los logouts cuya Bitacora
+  todavía no llegó a la base se respaldan también (`cierres-*.jsonl`) y se
+  aplican como UPDATE después de reinsertar las filas.
+- Lo que esté en el búfer se pierde solo si el proceso muere sin salir
+  normalmente (kill -9): a lo sumo AUDITORIA_INTERVALO segundos de auditoría.
+
+Con AUDITORIA_DIFERIDA = False se escribe en el momento, en la transacción
+del llamador (útil en pruebas y scripts).
+
+Sesión: cada login registra una Bitacora y su id viaja en el claim `bitacora`
+del JWT (o en la sesión de Django); `bitacora_actual` lo lee sin consultar la
+base, así los DetalleBitacora de la solicitud (seguridad/signals.py) quedan
+ligados a la sesión que hizo el cambio. El logout cierra esa misma Bitacora
+(`cerrar_bitacora`, con su login_at del claim `bitacora_login` para ir a la
+partición); si todavía está en el búfer de algún proceso, el escritor
+reintenta el cierre en cada vaciado hasta que aparece y, si el proceso
+termina antes, lo deja en el respaldo.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict, deque
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core import serializers
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Id de la Bitacora de la sesión: claim del JWT o clave de la sesión de Django
+CLAIM_BITACORA = 'bitacora'
+SESION_BITACORA = 'bitacora_id'
+# login_at de la Bitacora (ISO 8601) en el JWT: el UPDATE del logout va a su partición
+CLAIM_LOGIN = 'bitacora_login'
+# Segundos que se reintenta el cierre de una Bitacora que aún no está en la base
+ESPERA_CIERRE = 600
+
+
+def reservar_ids(modelo, cantidad: int) -> List[int]:
+    """Toma `cantidad` valores de la secuencia del id del modelo"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)',
+            [modelo._meta.db_table, modelo._meta.pk.column, cantidad],
+        )
+        return [fila[0] for fila in cursor.fetchall()]
+
+
+def _actualizar_logout(bitacora_id: int, login_at: Optional[datetime], logout_at: datetime) -> int:
+    from .models import Bitacora
+
+    filas = Bitacora.objects.filter(pk=bitacora_id)
+    if login_at is not None:
+        filas = filas.filter(login_at=login_at)
+    return filas.update(logout_at=logout_at)
+
+
+class EscritorAuditoria:
+    """
+    Búfer de objetos de auditoría de un proceso. Con `intervalo` None no se
+    inicia el hilo: solo se vacía al juntar `lote` objetos o llamando a `vaciar`.
+    """
+
+    def __init__(self, lote: int, intervalo: Optional[float], bloque_ids: int, respaldo_dir):
+        self.lote = lote
+        self.intervalo = intervalo
+        self.bloque_ids = bloque_ids
+        self.respaldo_dir = Path(respaldo_dir)
+        self._pendientes = []
+        self._cierres = []  # (bitacora_id, login_at, logout_at, vence)
+        self._ids: Dict[type, deque] = defaultdict(deque)
+        self._lock = threading.Lock()
+        self._despertar = threading.Event()
+        self._detener = threading.Event()
+        self._hilo = None
+
+    # ---- Llamadores ----
+
+    def registrar(self, *objetos):
+        """Encola los objetos (con su id ya asignado) y los devuelve"""
+        for objeto in objetos:
+            if objeto.pk is None:
+                objeto.pk = self._siguiente_id(type(objeto))
+        with self._lock:
+            self._pendientes.extend(objetos)
+            lleno = len(self._pendientes) >= self.lote
+
+        if self.intervalo is None:
+            if lleno:
+                self.vaciar()
+        else:
+            self._iniciar_hilo()
+            if lleno:
+                self._despertar.set()
+        return objetos
+
+    def _siguiente_id(self, modelo) -> int:
+        ids = self._ids[modelo]
+        try:
+            return ids.popleft()
+        except IndexError:
+            pass
+        # Fuera del lock: otro hilo puede reservar un bloque a la vez, solo se gastan ids
+        reservados = reservar_ids(modelo, self.bloque_ids)
+        with self._lock:
+            ids.extend(reservados[1:])
+        return reservados[0]
+
+    def cerrar_bitacora(self, bitacora_id: int, login_at: Optional[datetime], logout_at: datetime):
+        """Cierre de una Bitacora que aún no está en la base: se aplica al vaciar, cuando aparezca"""
+        with self._lock:
+            self._cierres.append((bitacora_id, login_at, logout_at, time.monotonic() + ESPERA_CIERRE))
+        if self.intervalo is not None:
+            self._iniciar_hilo()
+
+    @property
+    def pendientes(self) -> int:
+        return len(self._pendientes)
+
+    # ---- Vaciado ----
+
+    def vaciar(self) -> int:
+        """Escribe lo pendiente (y los respaldos en disco). Devuelve los objetos escritos del búfer"""
+        with self._lock:
+            objetos, self._pendientes = self._pendientes, []
+        if objetos:
+            try:
+                self._insertar(objetos)
+            except Exception:
+                logger.exception('No se pudo escribir la auditoría; %s objeto(s) van al respaldo', len(objetos))
+                self._respaldar(objetos)
+                return 0
+        self._reinsertar_respaldos()
+        self._aplicar_cierres()
+        return len(objetos)
+
+    def _aplicar_cierres(self):
+        with self._lock:
+            cierres, self._cierres = self._cierres, []
+        if not cierres:
+            return
+        ahora = time.monotonic()
+        pendientes = []
+        for cierre in cierres:
+            bitacora_id, login_at, logout_at, vence = cierre
+            try:
+                if _actualizar_logout(bitacora_id, login_at, logout_at):
+                    continue
+            except Exception:
+                logger.exception('No se pudo registrar el logout de la Bitacora %s', bitacora_id)
+            if ahora < vence:
+                pendientes.append(cierre)
+            else:
+                logger.warning('Bitacora %s no encontrada; no se registró su logout', bitacora_id)
+        with self._lock:
+            self._cierres.extend(pendientes)
+
+    def _insertar(self, objetos, ignorar_conflictos=False):
+        por_modelo = defaultdict(list)
+        for objeto in objetos:
+            por_modelo[type(objeto)].append(objeto)
+        # El orden entre modelos no importa: DetalleBitacora no tiene FOREIGN KEY en la base
+        with transaction.atomic():
+            for modelo, lote in por_modelo.items():
+                modelo.objects.bulk_create(lote, batch_size=self.lote, ignore_conflicts=ignorar_conflictos)
+
+    def _respaldar(self, objetos):
+        self._escribir_respaldo('auditoria', serializers.serialize('jsonl', objetos))
+
+    def _respaldar_cierres(self, cierres):
+        # El vencimiento se guarda en hora de reloj: el monotonic no sirve en otro proceso
+        ahora, reloj = timezone.now(), time.monotonic()
+        self._escribir_respaldo('cierres', ''.join(
+            json.dumps({
+                'bitacora': bitacora_id,
+                'login_at': login_at.isoformat() if login_at else None,
+                'logout_at': logout_at.isoformat(),
+                'vence': (ahora + timedelta(seconds=vence - reloj)).isoformat(),
+            }) + '\n'
+            for bitacora_id, login_at, logout_at, vence in cierres
+        ))
+
+    def _escribir_respaldo(self, prefijo: str, contenido: str):
+        self.respaldo_dir.mkdir(parents=True, exist_ok=True)
+        nombre = f'{prefijo}-{os.getpid()}-{uuid.uuid4().hex}.jsonl'
+        temporal = self.respaldo_dir / f'.{nombre}'
+        temporal.write_text(contenido, encoding='utf-8')
+        # El rename es atómico: nunca se lee un respaldo a medio escribir
+        temporal.rename(self.respaldo_dir / nombre)
+
+    def _reinsertar_respaldos(self):
+        if not self.respaldo_dir.is_dir():
+            return
+        # Primero las filas: un cierre puede ser de una Bitacora que está en un respaldo
+        if self._tomar_respaldos('auditoria', self._reinsertar_objetos):
+            self._tomar_respaldos('cierres', self._recuperar_cierres)
+
+    def _tomar_respaldos(self, prefijo: str, aplicar) -> bool:
+        """Aplica cada respaldo con el prefijo y lo borra. False si uno falló (queda para el próximo vaciado)"""
+        for archivo in sorted(self.respaldo_dir.glob(f'{prefijo}-*.jsonl')):
+            tomado = archivo.with_name(f'.{archivo.name}.{os.getpid()}')
+            try:
+                archivo.rename(tomado)  # lo toma este proceso; otro ya no lo ve
+            except FileNotFoundError:
+                continue
+            try:
+                cantidad = aplicar(tomado.read_text(encoding='utf-8'))
+            except Exception:
+                logger.exception('No se pudo reinsertar el respaldo de auditoría %s', archivo.name)
+                tomado.rename(archivo)
+                return False
+            tomado.unlink()
+            logger.info('Respaldo de auditoría %s reinsertado (%s registro(s))', archivo.name, cantidad)
+        return True
+
+    def _reinsertar_objetos(self, contenido: str) -> int:
+        objetos = [deserializado.object for deserializado in serializers.deserialize('jsonl', contenido)]
+        self._insertar(objetos, ignorar_conflictos=True)
+        return len(objetos)
+
+    def _recuperar_cierres(self, contenido: str) -> int:
+        """Suma los cierres respaldados a los del proceso; _aplicar_cierres los aplica como UPDATE"""
+        ahora, reloj = timezone.now(), time.monotonic()
+        cierres = []
+        for linea in contenido.splitlines():
+            cierre = json.loads(linea)
+            cierres.append((
+                cierre['bitacora'],
+                datetime.fromisoformat(cierre['login_at']) if cierre['login_at'] else None,
+                datetime.fromisoformat(cierre['logout_at']),
+                reloj + (datetime.fromisoformat(cierre['vence']) - ahora).total_seconds(),
+            ))
+        with self._lock:
+            self._cierres.extend(cierres)
+        return len(cierres)
+
+    # ---- Hilo ----
+
+    def _iniciar_hilo(self):
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+        with self._lock:
+            if self._hilo is not None and self._hilo.is_alive():
+                return
+            self._detener.clear()
+            self._hilo = threading.Thread(target=self._bucle, name='auditoria', daemon=True)
+            self._hilo.start()
+
+    def _bucle(self):
+        while not self._detener.is_set():
+            self._despertar.wait(self.intervalo)
+            self._despertar.clear()
+            close_old_connections()
+            try:
+                self.vaciar()
+            except Exception:
+                logger.exception('Error al vaciar la auditoría')
+        close_old_connections()
+
+    def cerrar(self):
+        """Detiene el hilo y escribe lo pendiente (objetos y logouts); si no se puede, queda en el respaldo"""
+        self._detener.set()
+        self._despertar.set()
+        if self._hilo is not None:
+            self._hilo.join(timeout=5)
+        try:
+            self.vaciar()
+        except Exception:
+            with self._lock:
+                objetos, self._pendientes = self._pendientes, []
+            if objetos:
+                self._respaldar(objetos)
+        # Logouts de Bitacoras que aún no están en la base: los aplica el próximo vaciado de cualquier proceso
+        with self._lock:
+            cierres, self._cierres = self._cierres, []
+        if cierres:
+            logger.warning('%s logout(s) sin registrar van al respaldo: sus Bitacora aún no están en la base', len(cierres))
+            self._respaldar_cierres(cierres)
+
+
+_escritor: Optional[EscritorAuditoria] = None
+_escritor_lock = threading.Lock()
+
+
+def escritor() -> EscritorAuditoria:
+    """Escritor del proceso, creado con la configuración al primer uso"""
+    global _escritor
+    if _escritor is None:
+        with _escritor_lock:
+            if _escritor is None:
+                _escritor = EscritorAuditoria(
+                    lote=settings.AUDITORIA_LOTE,
+                    intervalo=settings.AUDITORIA_INTERVALO,
+                    bloque_ids=settings.AUDITORIA_BLOQUE_IDS,
+                    respaldo_dir=settings.AUDITORIA_RESPALDO_DIR,
+                )
+                atexit.register(_escritor.cerrar)
+    return _escritor
+
+
+def registrar(*objetos):
+    """
+    Registra objetos de auditoría sin guardarlos (ver el módulo). Devuelve
+    los objetos, ya con su id.
+    """
+    if not settings.AUDITORIA_DIFERIDA:
+        for objeto in objetos:
+            objeto.save(force_insert=True)
+        return objetos
+    return escritor().registrar(*objetos)
+
+
+def nueva_bitacora(request, usuario):
+    """Registra la Bitacora de una sesión que empieza con la solicitud y la devuelve (ya con id)"""
+    from .models import Bitacora
+
+    # IP (X-Forwarded-For si hay proxy; si no, REMOTE_ADDR) y User-Agent como "device"
+    xff = request.META.get('HTTP_X_FORWARDED_FOR')
+    ip = (xff.split(',')[0].strip() if xff else request.META.get('REMOTE_ADDR')) or None
+    device = request.META.get('HTTP_USER_AGENT') or None
+    ahora = timezone.now()
+    bitacora, = registrar(Bitacora(
+        idUsuario=usuario,
+        login=usuario.get_username(),
+        ip=ip,
+        userAgent=device,
+        device=device,
+        fecha=ahora,
+        login_at=ahora,
+    ))
+    return bitacora
+
+
+def cerrar_bitacora(bitacora_id: int, login_at: Optional[datetime] = None):
+    """
+    Registra el logout de la Bitacora. Si todavía no está en la base (sigue en
+    el búfer de este u otro proceso), el escritor lo reintenta al vaciar.
+    """
+    _olvidar_sin_claim(bitacora_id)
+    logout_at = timezone.now()
+    if _actualizar_logout(bitacora_id, login_at, logout_at) or not settings.AUDITORIA_DIFERIDA:
+        return
+    escritor().cerrar_bitacora(bitacora_id, login_at, logout_at)
+
+
+# Bitacora usada por este proceso para cada usuario cuyo token no trae el claim:
+# usuario -> (id, vence). Es una LRU de AUDITORIA_SIN_CLAIM_MAX usuarios y cada
+# entrada se vuelve a buscar pasados AUDITORIA_SIN_CLAIM_SEGUNDOS, así un
+# logout atendido por otro proceso no la deja en uso indefinidamente
+_bitacoras_sin_claim: 'OrderedDict[int, Tuple[int, float]]' = OrderedDict()
+_bitacoras_sin_claim_lock = threading.Lock()
+
+
+def _olvidar_sin_claim(bitacora_id: int):
+    """Quita la Bitacora cerrada del mapa de este proceso"""
+    with _bitacoras_sin_claim_lock:
+        for usuario_id in [u for u, (b, _) in _bitacoras_sin_claim.items() if b == bitacora_id]:
+            del _bitacoras_sin_claim[usuario_id]
+
+
+def bitacora_actual(request) -> Optional[int]:
+    """
+    Id de la Bitacora de la sesión de la solicitud, o None si es anónima. Si
+    el token o la sesión no la traen (tokens emitidos antes de que existiera
+    el claim), usa la que este proceso ya abrió para el usuario, la última
+    abierta en la base o, si no hay, abre una una sola vez por proceso: la
+    recién abierta sigue en el búfer y un SELECT aún no la vería. El logout
+    la quita del mapa del proceso (ver `_bitacoras_sin_claim`).
+    """
+    if hasattr(request, '_bitacora_auditoria'):
+        return request._bitacora_auditoria
+
+    usuario = getattr(request, 'user', None)
+    bitacora_id = None
+    if usuario is not None and usuario.is_authenticated:
+        token = getattr(request, 'auth', None)
+        sesion = getattr(request, 'session', None)
+        if token is not None and hasattr(token, 'get'):
+            bitacora_id = token.get(CLAIM_BITACORA)
+        elif sesion is not None:
+            bitacora_id = sesion.get(SESION_BITACORA)
+
+        if bitacora_id is None:
+            bitacora_id = _bitacora_sin_claim(request, usuario)
+            if token is None and sesion is not None:
+                sesion[SESION_BITACORA] = bitacora_id
+
+    request._bitacora_auditoria = bitacora_id
+    return bitacora_id
+
+
+def _bitacora_sin_claim(request, usuario) -> int:
+    from .models import Bitacora
+
+    ahora = time.monotonic()
+    with _bitacoras_sin_claim_lock:
+        entrada = _bitacoras_sin_claim.get(usuario.pk)
+        if entrada is not None and entrada[1] > ahora:
+            _bitacoras_sin_claim.move_to_end(usuario.pk)
+            return entrada[0]
+        bitacora_id = (
+            Bitacora.objects.filter(idUsuario=usuario, logout_at__isnull=True)
+            .order_by('-login_at').values_list('id', flat=True).first()
+        ) or nueva_bitacora(request, usuario).pk
+        _bitacoras_sin_claim[usuario.pk] = (bitacora_id, ahora + settings.AUDITORIA_SIN_CLAIM_SEGUNDOS)
+        _bitacoras_sin_claim.move_to_end(usuario.pk)
+        while len(_bitacoras_sin_claim) > settings.AUDITORIA_SIN_CLAIM_MAX:
+            _bitacoras_sin_claim.popitem(last=False)
+    return bitacora_id
@@ -0,0 +1,86 @@
+"""
+Filtros de la API de seguridad (django-filter), sobre columnas indexadas.
+Los rangos de fecha usan `<campo>_desde` y `<campo>_hasta` (ISO 8601).
+
+La auditoría (particionada por mes) solo se lista por ventanas de tiempo:
+`?desde=&hasta=` sobre la columna de partición, por defecto los últimos
+AUDITORIA_VENTANA_DIAS días y como máximo AUDITORIA_MAX_VENTANA_DIAS, así cada
+listado lee solo las particiones de esos meses.
+"""
+from datetime import timedelta
+
+import django_filters
+from django import forms
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Bitacora, DetalleBitacora, Permiso, Rol, RolPermiso, Usuario, UsuarioRol
+
+
+class UsuarioFilter(django_filters.FilterSet):
+    class Meta:
+        model = Usuario
+        fields = ['username', 'email']
+
+
+class RolFilter(django_filters.FilterSet):
+    class Meta:
+        model = Rol
+        fields = ['nombre']
+
+
+class PermisoFilter(django_filters.FilterSet):
+    class Meta:
+        model = Permiso
+        fields = ['accion']
+
+
+class UsuarioRolFilter(django_filters.FilterSet):
+    class Meta:
+        model = UsuarioRol
+        fields = ['usuario', 'rol']
+
+
+class RolPermisoFilter(django_filters.FilterSet):
+    class Meta:
+        model = RolPermiso
+        fields = ['rol', 'permiso']
+
+
+class VentanaTiempoForm(forms.Form):
+    """Completa `desde`/`hasta` con la ventana por defecto y rechaza ventanas más largas que el máximo"""
+
+    def clean(self):
+        datos = super().clean()
+        hasta = datos.get('hasta') or timezone.now()
+        desde = datos.get('desde') or hasta - timedelta(days=settings.AUDITORIA_VENTANA_DIAS)
+        if desde > hasta:
+            raise forms.ValidationError('`desde` debe ser anterior a `hasta`')
+        if hasta - desde > timedelta(days=settings.AUDITORIA_MAX_VENTANA_DIAS):
+            raise forms.ValidationError(
+                f'La ventana no puede superar {settings.AUDITORIA_MAX_VENTANA_DIAS} días'
+            )
+        datos['desde'], datos['hasta'] = desde, hasta
+        return datos
+
+
+class BitacoraFilter(django_filters.FilterSet):
+    # Partición por login_at; índices (idUsuario, login_at) y (login, fecha)
+    desde = django_filters.IsoDateTimeFilter(field_name='login_at', lookup_expr='gte')
+    hasta = django_filters.IsoDateTimeFilter(field_name='login_at', lookup_expr='lt')
+
+    class Meta:
+        model = Bitacora
+        form = VentanaTiempoForm
+        fields = ['idUsuario', 'login']
+
+
+class DetalleBitacoraFilter(django_filters.FilterSet):
+    # Partición por fecha; índices (tabla, fecha) y (accion, fecha)
+    desde = django_filters.IsoDateTimeFilter(field_name='fecha', lookup_expr='gte')
+    hasta = django_filters.IsoDateTimeFilter(field_name='fecha', lookup_expr='lt')
+
+    class Meta:
+        model = DetalleBitacora
+        form = VentanaTiempoForm
+        fields = ['idBitacora', 'tabla', 'accion']
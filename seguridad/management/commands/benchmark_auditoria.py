@@ -0,0 +1,106 @@
+import json
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from seguridad import auditoria
+from seguridad.models import Bitacora, DetalleBitacora, Rol
+
+USUARIO = 'benchmark_auditoria'
+PREFIJO_ROL = 'Benchmark auditoría'
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide lo que agrega la auditoría de cambios (seguridad/signals.py) a cada solicitud: repite un PATCH '
+        'sobre un Rol y un listado de --filas roles (cada instancia cargada pasa por post_init) con la auditoría '
+        'apagada y encendida, intercalados, y reporta latencia p50/p95 y consultas SQL'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--solicitudes', type=int, default=300, help='Solicitudes medidas por modo')
+        parser.add_argument('--calentamiento', type=int, default=20, help='Solicitudes sin medir por modo')
+        parser.add_argument('--filas', type=int, default=500, help='Roles por página en el listado')
+        parser.add_argument('--json', action='store_true', help='Imprime el reporte como JSON')
+
+    def handle(self, *args, **options):
+        usuario, creado = get_user_model().objects.get_or_create(
+            username=USUARIO, defaults={'email': f'{USUARIO}@ejemplo.com'}
+        )
+        if creado:
+            usuario.set_unusable_password()
+            usuario.save(update_fields=['password'])
+        bitacora = Bitacora.objects.create(idUsuario=usuario, login=USUARIO)
+        rol, _ = Rol.objects.get_or_create(nombre=PREFIJO_ROL)
+        Rol.objects.bulk_create(
+            [Rol(nombre=f'{PREFIJO_ROL} {i:04d}') for i in range(options['filas'])], ignore_conflicts=True
+        )
+
+        refresh = RefreshToken.for_user(usuario)
+        refresh[auditoria.CLAIM_BITACORA] = bitacora.pk
+        cliente = Client(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        url = f'/seguridad/roles/{rol.pk}/'
+
+        casos = {
+            # Cada solicitud cambia la descripción
+            'edicion': lambda i, activa: cliente.patch(
+                url, json.dumps({'descripcion': f'{activa} {i}'}), content_type='application/json'
+            ),
+            'listado': lambda i, activa: cliente.get('/seguridad/roles/', {'limite': options['filas']}),
+        }
+        reporte = {'solicitudes': options['solicitudes'], 'filas_listado': options['filas']}
+        # Con el escritor diferido de producción
+        with override_settings(AUDITORIA_DIFERIDA=True, API_MAX_POR_PAGINA=max(options['filas'], 1)):
+            for caso, solicitud in casos.items():
+                reporte[caso] = self.medir(solicitud, options['calentamiento'], options['solicitudes'])
+            auditoria.escritor().vaciar()
+        reporte['detalles_escritos'] = DetalleBitacora.objects.filter(idBitacora_id=bitacora.pk).count()
+
+        if options['json']:
+            self.stdout.write(json.dumps(reporte, ensure_ascii=False, indent=2))
+            return
+        for caso in casos:
+            for nombre in ('sin_auditoria', 'con_auditoria'):
+                datos = reporte[caso][nombre]
+                self.stdout.write(
+                    f"{caso:<8} {nombre:<14} p50 {datos['p50_ms']:>8} ms  p95 {datos['p95_ms']:>8} ms  "
+                    f"SQL {datos['consultas_sql']}"
+                )
+        self.stdout.write(self.style.SUCCESS(
+            f"Sobrecosto p50 por solicitud: edición {reporte['edicion']['sobrecosto_p50_us']} µs, "
+            f"listado de {options['filas']} {reporte['listado']['sobrecosto_p50_us']} µs; "
+            f"{reporte['detalles_escritos']} DetalleBitacora escritos por lotes"
+        ))
+
+    def medir(self, solicitud, calentamiento, solicitudes):
+        mediciones = {False: [], True: []}
+        consultas = {False: [], True: []}
+        for i in range(calentamiento + solicitudes):
+            for activa in (False, True):
+                with override_settings(AUDITORIA_CAMBIOS=activa), CaptureQueriesContext(connection) as capturadas:
+                    inicio = time.perf_counter()
+                    response = solicitud(i, activa)
+                    duracion = time.perf_counter() - inicio
+                if response.status_code != 200:
+                    raise CommandError(f'{response.request["PATH_INFO"]}: {response.status_code} {response.content[:200]!r}')
+                if i >= calentamiento:
+                    mediciones[activa].append(duracion)
+                    consultas[activa].append(len(capturadas))
+
+        resultado = {}
+        for activa, nombre in ((False, 'sin_auditoria'), (True, 'con_auditoria')):
+            resultado[nombre] = {
+                'p50_ms': round(statistics.median(mediciones[activa]) * 1000, 3),
+                'p95_ms': round(statistics.quantiles(mediciones[activa], n=20)[-1] * 1000, 3),
+                'consultas_sql': round(statistics.mean(consultas[activa]), 2),
+            }
+        resultado['sobrecosto_p50_us'] = round(
+            (statistics.median(mediciones[True]) - statistics.median(mediciones[False])) * 1e6, 1
+        )
+        return resultado
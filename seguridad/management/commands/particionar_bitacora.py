@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.db import DatabaseError
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from seguridad import particiones
+
+
+class Command(BaseCommand):
+    help = (
+        'Mantiene las particiones mensuales de la auditoría (seguridad/particiones.py): crea los meses siguientes, '
+        'mueve a su mes las filas que quedaron en la partición DEFAULT y separa los meses viejos'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--meses-futuros', type=int, default=settings.AUDITORIA_MESES_FUTUROS,
+            help='Meses a crear por adelantado además del actual',
+        )
+        parser.add_argument(
+            '--retener-meses', type=int, default=settings.AUDITORIA_RETENER_MESES,
+            help='Meses completos conservados además del actual; los anteriores se separan (0 = conservar todos)',
+        )
+        parser.add_argument(
+            '--eliminar', action='store_true',
+            help='Borra las particiones separadas; sin esta opción quedan como tablas sueltas para archivarlas',
+        )
+
+    def handle(self, *args, **options):
+        actual = particiones.inicio_mes(timezone.now())
+        retener = options['retener_meses']
+        limite = particiones.sumar_meses(actual, -retener) if retener > 0 else None
+
+        for tabla in particiones.TABLAS:
+            meses = {particiones.sumar_meses(actual, i) for i in range(options['meses_futuros'] + 1)}
+            meses.update(particiones.meses_en_default(tabla))
+            creadas = []
+            for mes in sorted(meses):
+                if limite is not None and mes < limite:
+                    continue
+                nombre = particiones.nombre_particion(tabla, mes)
+                try:
+                    if particiones.crear_particion(tabla, mes):
+                        creadas.append(nombre)
+                except DatabaseError as e:
+                    # Se revirtió solo ese mes: lo reintenta la próxima ejecución
+                    self.stderr.write(self.style.WARNING(f'{nombre}: no se pudo crear ({e}); se reintentará'))
+
+            separadas = []
+            if limite is not None:
+                separadas = particiones.separar_anteriores(tabla, limite, eliminar=options['eliminar'])
+
+            self.stdout.write(self.style.SUCCESS(
+                f"{tabla}: {len(creadas)} partición(es) creada(s) {creadas}, "
+                f"{len(separadas)} {'borrada(s)' if options['eliminar'] else 'separada(s)'} {separadas}"
+            ))
@@ -0,0 +1,46 @@
+"""
+Solicitud actual para la auditoría de cambios (seguridad/signals.py).
+
+Las señales de los modelos no reciben la solicitud: `AuditoriaMiddleware` la
+deja en una ContextVar mientras se procesa, así quien guarda un modelo no
+tiene que pasarla. Funciona con vistas síncronas y asíncronas (las
+ContextVar viajan a los hilos de sync_to_async). Fuera de una solicitud
+(comandos, shell, workers) no hay solicitud y los cambios no se auditan.
+"""
+from contextvars import ContextVar
+from typing import Optional
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.http import HttpRequest
+
+_solicitud: ContextVar[Optional[HttpRequest]] = ContextVar('solicitud_auditoria', default=None)
+
+
+def solicitud_actual() -> Optional[HttpRequest]:
+    return _solicitud.get()
+
+
+class AuditoriaMiddleware:
+    async_capable = True
+    sync_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _solicitud.set(request)
+        try:
+            return self.get_response(request)
+        finally:
+            _solicitud.reset(token)
+
+    async def __acall__(self, request):
+        token = _solicitud.set(request)
+        try:
+            return await self.get_response(request)
+        finally:
+            _solicitud.reset(token)
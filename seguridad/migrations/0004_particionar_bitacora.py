@@ -0,0 +1,107 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:08
+
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Tabla -> columna de partición (mismo orden que seguridad/particiones.py)
+TABLAS = [('detallebitacora', 'fecha'), ('bitacora', 'login_at')]
+
+
+def _reconstruir(schema_editor, tabla, columna, particionada):
+    """
+    Recrea la tabla (particionada por mes sobre `columna` o normal) con los
+    mismos índices, FOREIGN KEY, identidad y filas.
+    """
+    anterior = f'{tabla}_sin_particionar' if particionada else f'{tabla}_particionada'
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s AND indexname <> %s",
+            [tabla, f'{tabla}_pkey'],
+        )
+        indices = cursor.fetchall()
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+            [tabla],
+        )
+        foraneas = cursor.fetchall()
+
+        cursor.execute(f'ALTER TABLE "{tabla}" DROP CONSTRAINT "{tabla}_pkey"')
+        for nombre, _ in indices:
+            cursor.execute(f'DROP INDEX "{nombre}"')
+        for nombre, _ in foraneas:
+            cursor.execute(f'ALTER TABLE "{tabla}" DROP CONSTRAINT "{nombre}"')
+        cursor.execute(f'ALTER TABLE "{tabla}" RENAME TO "{anterior}"')
+
+        if particionada:
+            cursor.execute(
+                f'CREATE TABLE "{tabla}" (LIKE "{anterior}" INCLUDING DEFAULTS INCLUDING IDENTITY INCLUDING CONSTRAINTS) '
+                f'PARTITION BY RANGE ("{columna}")'
+            )
+            cursor.execute(f'ALTER TABLE "{tabla}" ADD CONSTRAINT "{tabla}_pkey" PRIMARY KEY (id, "{columna}")')
+            # Las particiones mensuales las crea `manage.py particionar_bitacora`
+            cursor.execute(f'CREATE TABLE "{tabla}_default" PARTITION OF "{tabla}" DEFAULT')
+        else:
+            cursor.execute(
+                f'CREATE TABLE "{tabla}" (LIKE "{anterior}" INCLUDING DEFAULTS INCLUDING IDENTITY INCLUDING CONSTRAINTS)'
+            )
+            cursor.execute(f'ALTER TABLE "{tabla}" ADD CONSTRAINT "{tabla}_pkey" PRIMARY KEY (id)')
+        for _, definicion in indices:
+            cursor.execute(definicion)
+        for nombre, definicion in foraneas:
+            cursor.execute(f'ALTER TABLE "{tabla}" ADD CONSTRAINT "{nombre}" {definicion}')
+
+        cursor.execute(f'INSERT INTO "{tabla}" SELECT * FROM "{anterior}"')
+        # La FK a usuario es diferida: se verifica ya, si no, no se pueden crear índices después
+        cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        cursor.execute(f'DROP TABLE "{anterior}"')
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [tabla])
+        secuencia = cursor.fetchone()[0]
+        if secuencia.split('.')[-1].strip('"') != f'{tabla}_id_seq':
+            cursor.execute(f'ALTER SEQUENCE {secuencia} RENAME TO "{tabla}_id_seq"')
+        cursor.execute(
+            f"SELECT setval('\"{tabla}_id_seq\"', COALESCE(MAX(id), 1), MAX(id) IS NOT NULL) FROM \"{tabla}\""
+        )
+
+
+def particionar(apps, schema_editor):
+    for tabla, columna in TABLAS:
+        _reconstruir(schema_editor, tabla, columna, particionada=True)
+
+
+def desparticionar(apps, schema_editor):
+    # Las particiones separadas con DETACH no vuelven: hay que restaurarlas antes
+    for tabla, columna in reversed(TABLAS):
+        _reconstruir(schema_editor, tabla, columna, particionada=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seguridad', '0003_alter_bitacora_fecha_alter_bitacora_login_at_and_more'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='bitacora',
+            name='bitacora_idUsuar_f7f3ad_idx',
+        ),
+        migrations.AlterField(
+            model_name='detallebitacora',
+            name='idBitacora',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='detalles', to='seguridad.bitacora'),
+        ),
+        migrations.RunPython(particionar, desparticionar),
+        migrations.AddIndex(
+            model_name='bitacora',
+            index=models.Index(fields=['idUsuario', 'login_at'], name='bitacora_idUsuar_f975fc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bitacora',
+            index=django.contrib.postgres.indexes.BrinIndex(fields=['login_at'], name='bitacora_login_a_7c1343_brin'),
+        ),
+        migrations.AddIndex(
+            model_name='detallebitacora',
+            index=django.contrib.postgres.indexes.BrinIndex(fields=['fecha'], name='detallebita_fecha_f0fce0_brin'),
+        ),
+    ]
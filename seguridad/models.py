@@ -1,4 +1,5 @@
 from django.db import models
+from django.contrib.postgres.indexes import BrinIndex
 from django.contrib.auth.models import AbstractUser
 from django.conf import settings
 from django.utils import timezone
@@ -107,9 +108,11 @@ class Bitacora(models.Model):
 
     class Meta:
         db_table = "bitacora"                       # opcional: fija el nombre físico
+        # Particionada por mes sobre login_at (seguridad/particiones.py)
         indexes = [
-            models.Index(fields=["idUsuario", "fecha"]),
+            models.Index(fields=["idUsuario", "login_at"]),
             models.Index(fields=["login", "fecha"]),
+            BrinIndex(fields=["login_at"]),
         ]
 
     def __str__(self):
@@ -120,7 +123,10 @@ class DetalleBitacora(models.Model):
     idBitacora = models.ForeignKey(
         Bitacora,
         on_delete=models.CASCADE,
-        related_name="detalles"
+        related_name="detalles",
+        # Bitacora está particionada: su PK en la base es (id, login_at) y no
+        # admite una FOREIGN KEY solo a id. El CASCADE lo resuelve el ORM.
+        db_constraint=False,
     )
     accion = models.CharField(max_length=100)       # mantengo 100 (coherente con compa); si quieres 150, sube a 150
     fecha = models.DateTimeField()
@@ -129,9 +135,11 @@ class DetalleBitacora(models.Model):
 
     class Meta:
         db_table = "detallebitacora"                # opcional: nombre físico
+        # Particionada por mes sobre fecha (seguridad/particiones.py)
         indexes = [
             models.Index(fields=["tabla", "fecha"]),
             models.Index(fields=["accion", "fecha"]),
+            BrinIndex(fields=["fecha"]),
         ]
 
     def __str__(self):
@@ -0,0 +1,137 @@
+"""
+Particionado mensual de la auditoría (Bitacora y DetalleBitacora).
+
+Las dos tablas están particionadas por rango (PostgreSQL) sobre su columna de
+tiempo, una partición por mes (`bitacora_p2025_01`), más una partición DEFAULT
+que recibe lo que no cae en ningún mes creado. La migración 0004 convierte las
+tablas; `manage.py particionar_bitacora` crea los meses siguientes, mueve a su
+mes lo que haya quedado en DEFAULT y separa (DETACH) los meses viejos, que
+quedan como tablas sueltas para archivarlas (pg_dump) o borrarlas.
+
+Como la clave primaria de una tabla particionada debe incluir la columna de
+partición, en la base es (id, columna de tiempo) y DetalleBitacora.idBitacora
+no tiene FOREIGN KEY en la base (db_constraint=False). Las consultas deben
+acotar la columna de tiempo para que PostgreSQL descarte las particiones que
+no necesita, y el índice BRIN de esa columna resuelve los rangos dentro de
+cada mes con muy poco espacio (las filas llegan en orden de tiempo).
+"""
+import re
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Bitacora, DetalleBitacora
+
+# Tabla -> columna de partición
+TABLAS: Dict[str, str] = {
+    Bitacora._meta.db_table: 'login_at',
+    DetalleBitacora._meta.db_table: 'fecha',
+}
+PATRON_MES = re.compile(r'_p(\d{4})_(\d{2})$')
+
+
+def inicio_mes(fecha: datetime) -> datetime:
+    """Comienzo del mes de la fecha, en la zona horaria del proyecto"""
+    local = timezone.localtime(fecha) if timezone.is_aware(fecha) else timezone.make_aware(fecha)
+    return local.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def sumar_meses(mes: datetime, meses: int) -> datetime:
+    total = mes.year * 12 + mes.month - 1 + meses
+    return timezone.make_aware(datetime(total // 12, total % 12 + 1, 1), mes.tzinfo)
+
+
+def nombre_particion(tabla: str, mes: datetime) -> str:
+    return f'{tabla}_p{mes.year:04d}_{mes.month:02d}'
+
+
+def particion_default(tabla: str) -> str:
+    return f'{tabla}_default'
+
+
+def _literal(fecha: datetime) -> str:
+    # Las fechas las genera este módulo: no hay riesgo de inyección
+    return f"'{fecha.isoformat()}'"
+
+
+def particiones(tabla: str) -> List[Tuple[str, datetime]]:
+    """Particiones mensuales de la tabla (nombre, inicio del mes), de la más vieja a la más nueva"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT hija.relname FROM pg_inherits
+            JOIN pg_class hija ON hija.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = %s::regclass
+            """,
+            [tabla],
+        )
+        nombres = [fila[0] for fila in cursor.fetchall()]
+
+    meses = []
+    for nombre in nombres:
+        coincidencia = PATRON_MES.search(nombre)
+        if coincidencia:
+            anio, mes = (int(valor) for valor in coincidencia.groups())
+            meses.append((nombre, timezone.make_aware(datetime(anio, mes, 1))))
+    return sorted(meses, key=lambda particion: particion[1])
+
+
+def crear_particion(tabla: str, mes: datetime) -> bool:
+    """
+    Crea la partición del mes si no existe, moviendo a ella las filas de ese
+    mes que estén en DEFAULT. Devuelve True si la creó.
+
+    DEFAULT se bloquea contra escrituras durante la transacción: un INSERT de
+    ese mes que cayera en DEFAULT entre el DELETE y el ATTACH haría fallar el
+    ATTACH. Los INSERT concurrentes esperan y, ya adjuntada, van a la nueva.
+    """
+    nombre = nombre_particion(tabla, mes)
+    if nombre in dict(particiones(tabla)):
+        return False
+
+    columna = TABLAS[tabla]
+    desde, hasta = _literal(mes), _literal(sumar_meses(mes, 1))
+    default = particion_default(tabla)
+    rango = f'"{columna}" >= {desde} AND "{columna}" < {hasta}'
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE "{default}" IN SHARE ROW EXCLUSIVE MODE')
+        cursor.execute(f'CREATE TABLE "{nombre}" (LIKE "{tabla}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+        cursor.execute(f'INSERT INTO "{nombre}" SELECT * FROM "{default}" WHERE {rango}')
+        cursor.execute(f'DELETE FROM "{default}" WHERE {rango}')
+        # Al adjuntarla se le crean los índices de la tabla (PK, BRIN, etc.)
+        cursor.execute(f'ALTER TABLE "{tabla}" ATTACH PARTITION "{nombre}" FOR VALUES FROM ({desde}) TO ({hasta})')
+    return True
+
+
+def meses_en_default(tabla: str) -> List[datetime]:
+    """Meses que tienen filas en la partición DEFAULT"""
+    columna = TABLAS[tabla]
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT MIN("{columna}"), MAX("{columna}") FROM "{particion_default(tabla)}"')
+        minimo, maximo = cursor.fetchone()
+    if minimo is None:
+        return []
+    meses, mes = [], inicio_mes(minimo)
+    while mes <= maximo:
+        meses.append(mes)
+        mes = sumar_meses(mes, 1)
+    return meses
+
+
+def separar_anteriores(tabla: str, antes_de: datetime, eliminar: bool = False) -> List[str]:
+    """
+    Separa (DETACH) las particiones de los meses que terminan antes de
+    `antes_de`; con `eliminar` además las borra. Devuelve sus nombres.
+    """
+    separadas = []
+    for nombre, mes in particiones(tabla):
+        if sumar_meses(mes, 1) > antes_de:
+            continue
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE "{tabla}" DETACH PARTITION "{nombre}"')
+            if eliminar:
+                cursor.execute(f'DROP TABLE "{nombre}"')
+        separadas.append(nombre)
+    return separadas
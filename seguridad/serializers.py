@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from GestDocSi2.api import CamposSeleccionablesMixin
 from .models import Usuario
 from actores.serializers import ActorSerializer
 
@@ -9,7 +10,7 @@ from django.contrib.auth import get_user_model
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework_simplejwt.tokens import RefreshToken
 #end
-class UsuarioSerializer(serializers.ModelSerializer):
+class UsuarioSerializer(CamposSeleccionablesMixin, serializers.ModelSerializer):
     class Meta:
         model = Usuario
         fields = ['id', 'username', 'email', 'estado', 'estadoCuenta', 'creadoEn', 'actualizadoEn']
@@ -21,7 +22,7 @@ class UsuarioSerializer(serializers.ModelSerializer):
 from rest_framework import serializers
 from .models import Rol
 
-class RolSerializer(serializers.ModelSerializer):
+class RolSerializer(CamposSeleccionablesMixin, serializers.ModelSerializer):
     class Meta:
         model = Rol
         fields = ['id', 'nombre', 'descripcion']
@@ -33,7 +34,7 @@ class RolSerializer(serializers.ModelSerializer):
 from rest_framework import serializers
 from .models import Permiso
 
-class PermisoSerializer(serializers.ModelSerializer):
+class PermisoSerializer(CamposSeleccionablesMixin, serializers.ModelSerializer):
     class Meta:
         model = Permiso
         fields = ['id', 'descripcion', 'accion']
@@ -45,48 +46,56 @@ class PermisoSerializer(serializers.ModelSerializer):
 from rest_framework import serializers
 from .models import UsuarioRol
 
-class UsuarioRolSerializer(serializers.ModelSerializer):
+class UsuarioRolSerializer(CamposSeleccionablesMixin, serializers.ModelSerializer):
     class Meta:
         model = UsuarioRol
         fields = ['id', 'usuario', 'rol', 'fechaAsignacion']
+        select_related = ('usuario', 'rol')  # ver GestDocSi2/api.py
 
     def to_representation(self, instance):
         representation = super().to_representation(instance)
         # Evitamos campos anidados, solo representamos el usuario y el rol como texto
-        representation['usuario'] = instance.usuario.username  # Solo el nombre de usuario
-        representation['rol'] = instance.rol.nombre  # Solo el nombre del rol
+        if 'usuario' in representation:
+            representation['usuario'] = instance.usuario.username  # Solo el nombre de usuario
+        if 'rol' in representation:
+            representation['rol'] = instance.rol.nombre  # Solo el nombre del rol
         return representation
 from rest_framework import serializers
 from .models import RolPermiso
 
-class RolPermisoSerializer(serializers.ModelSerializer):
+class RolPermisoSerializer(CamposSeleccionablesMixin, serializers.ModelSerializer):
     class Meta:
         model = RolPermiso
         fields = ['id', 'rol', 'permiso', 'estado']
+        select_related = ('rol', 'permiso')
 
     def to_representation(self, instance):
         representation = super().to_representation(instance)
         # Evitamos campos anidados, solo representamos el rol y el permiso como texto
-        representation['rol'] = instance.rol.nombre  # Solo el nombre del rol
-        representation['permiso'] = instance.permiso.accion  # Solo la acción del permiso
+        if 'rol' in representation:
+            representation['rol'] = instance.rol.nombre  # Solo el nombre del rol
+        if 'permiso' in representation:
+            representation['permiso'] = instance.permiso.accion  # Solo la acción del permiso
         return representation
 from rest_framework import serializers
 from .models import Bitacora
 
-class BitacoraSerializer(serializers.ModelSerializer):
+class BitacoraSerializer(CamposSeleccionablesMixin, serializers.ModelSerializer):
     class Meta:
         model = Bitacora
         fields = ['id', 'login', 'ip', 'userAgent', 'fecha', 'login_at', 'logout_at', 'device', 'idUsuario']
+        select_related = ('idUsuario',)
 
     def to_representation(self, instance):
         representation = super().to_representation(instance)
         # Evitamos campos anidados, solo representamos el idUsuario como texto
-        representation['idUsuario'] = instance.idUsuario.username  # Solo el nombre de usuario
+        if 'idUsuario' in representation:
+            representation['idUsuario'] = instance.idUsuario.username  # Solo el nombre de usuario
         return representation
 from rest_framework import serializers
 from .models import DetalleBitacora
 
-class DetalleBitacoraSerializer(serializers.ModelSerializer):
+class DetalleBitacoraSerializer(CamposSeleccionablesMixin, serializers.ModelSerializer):
     class Meta:
         model = DetalleBitacora
         fields = ['id', 'idBitacora', 'accion', 'fecha', 'tabla', 'detalle']
@@ -94,7 +103,8 @@ class DetalleBitacoraSerializer(serializers.ModelSerializer):
     def to_representation(self, instance):
         representation = super().to_representation(instance)
         # Evitamos campos anidados, solo representamos el idBitacora como texto
-        representation['idBitacora'] = instance.idBitacora.id  # Solo el ID de la bitácora
+        if 'idBitacora' in representation:
+            representation['idBitacora'] = instance.idBitacora_id  # Solo el ID de la bitácora (sin cargarla)
         return representation
 class MyTokenPairSerializer(TokenObtainPairSerializer):
     def validate(self, attrs):#@
@@ -102,7 +112,6 @@ class MyTokenPairSerializer(TokenObtainPairSerializer):
         password=attrs.get('password')
         User=get_user_model()
         user=User.objects.filter(username=username).first()
-        print(user)
         if not user:
             raise AuthenticationFailed('el usuario no existe')
         if not user.check_password(password):
@@ -116,7 +125,9 @@ class LogoutSerializer(serializers.Serializer):
         self.token = attrs['refresh']
         return attrs
     def save(self, **kwargs):
-        RefreshToken(self.token).blacklist()
+        refresh = RefreshToken(self.token)
+        refresh.blacklist()
+        return refresh
 class UsuarioMeSerializer(serializers.ModelSerializer):
     """
     Serializador exclusivo para el endpoint '/usuarios/me/'.
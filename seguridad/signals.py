@@ -0,0 +1,138 @@
+"""
+Auditoría de cambios en DetalleBitacora.
+
+Cada alta, modificación o baja de un modelo de MODELOS_AUDITADOS hecha dentro
+de una solicitud (seguridad/middleware.py) agrega un DetalleBitacora ligado a
+la Bitacora de la sesión (auditoria.bitacora_actual):
+
+- accion: CREAR, EDITAR o ELIMINAR; tabla: nombre del modelo (`caso`)
+- detalle: JSON compacto `{"id": 5, "cambios": {...}}`; al crear y eliminar,
+  los valores no vacíos; al editar, solo los campos que cambiaron como
+  `{"campo": [antes, después]}`
+
+Los valores anteriores se toman al cargar la instancia (post_init), no con un
+SELECT antes de guardar (`manage.py benchmark_auditoria` mide lo que cuesta en
+una edición y en un listado), y el DetalleBitacora se entrega al escritor por lotes
+(seguridad/auditoria.py) cuando la transacción confirma: la solicitud no
+agrega consultas. Las operaciones masivas (update/bulk_create) no emiten
+señales y no quedan auditadas. AUDITORIA_CAMBIOS = False lo desactiva.
+"""
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.utils import timezone
+
+from actores.models import Abogado, Actor, Asistente, Cliente
+from casos.models import Carpeta, Caso, EquipoCaso, Expediente, ParteProcesal
+from documentos.models import Documento, EtapaProcesal, TipoDocumento, VersionDocumento
+from . import auditoria
+from .middleware import solicitud_actual
+from .models import DetalleBitacora, Permiso, Rol, RolPermiso, Usuario, UsuarioRol
+
+MODELOS_AUDITADOS = (
+    Caso, Expediente, Carpeta, EquipoCaso, ParteProcesal,
+    Documento, TipoDocumento, EtapaProcesal, VersionDocumento,
+    Actor, Abogado, Cliente, Asistente,
+    Usuario, Rol, Permiso, UsuarioRol, RolPermiso,
+)
+
+# Secretos y campos que cambian solos (además de auto_now y las columnas generadas)
+CAMPOS_EXCLUIDOS = {'password', 'last_login'}
+
+_campos_por_modelo = {}
+
+
+class CodificadorAuditoria(DjangoJSONEncoder):
+    def default(self, o):
+        try:
+            return super().default(o)
+        except TypeError:
+            return str(o)
+
+
+def campos_auditados(modelo):
+    """attname de los campos que se registran del modelo"""
+    try:
+        return _campos_por_modelo[modelo]
+    except KeyError:
+        campos = tuple(
+            campo.attname for campo in modelo._meta.concrete_fields
+            if not (campo.primary_key or campo.generated or getattr(campo, 'auto_now', False)
+                    or campo.name in CAMPOS_EXCLUIDOS)
+        )
+        _campos_por_modelo[modelo] = campos
+        return campos
+
+
+def valores(modelo, instancia):
+    # Solo los campos cargados: los diferidos (only/defer) no se leen de la base
+    datos = instancia.__dict__
+    return {campo: datos[campo] for campo in campos_auditados(modelo) if campo in datos}
+
+
+def no_vacios(datos):
+    return {campo: valor for campo, valor in datos.items() if valor not in (None, '')}
+
+
+def guardar_valores(sender, instance, **kwargs):
+    # Corre por cada instancia cargada (también en los listados): solo una copia
+    # superficial, los campos auditados se eligen al guardar
+    if solicitud_actual() is not None and settings.AUDITORIA_CAMBIOS:
+        instance._auditoria_valores = instance.__dict__.copy()
+
+
+def registrar_guardado(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    solicitud = solicitud_actual()
+    if raw or solicitud is None or not settings.AUDITORIA_CAMBIOS:
+        return
+
+    actuales = valores(sender, instance)
+    if update_fields is not None:
+        guardados = {sender._meta.get_field(campo).attname for campo in update_fields}
+        actuales = {campo: valor for campo, valor in actuales.items() if campo in guardados}
+    anteriores = instance.__dict__.setdefault('_auditoria_valores', {})
+
+    if created:
+        accion, cambios = 'CREAR', no_vacios(actuales)
+    else:
+        accion = 'EDITAR'
+        cambios = {
+            campo: [anteriores[campo], valor] for campo, valor in actuales.items()
+            if campo in anteriores and anteriores[campo] != valor
+        }
+    anteriores.update(actuales)
+    if cambios or created:
+        registrar(solicitud, sender, accion, instance.pk, cambios)
+
+
+def registrar_eliminacion(sender, instance, **kwargs):
+    solicitud = solicitud_actual()
+    if solicitud is None or not settings.AUDITORIA_CAMBIOS:
+        return
+    registrar(solicitud, sender, 'ELIMINAR', instance.pk, no_vacios(valores(sender, instance)))
+
+
+def registrar(solicitud, modelo, accion, pk, cambios):
+    bitacora_id = auditoria.bitacora_actual(solicitud)
+    if bitacora_id is None:
+        return
+    detalle = DetalleBitacora(
+        idBitacora_id=bitacora_id,
+        accion=accion,
+        fecha=timezone.now(),
+        tabla=modelo._meta.model_name,
+        detalle=json.dumps(
+            {'id': pk, 'cambios': cambios}, cls=CodificadorAuditoria, ensure_ascii=False, separators=(',', ':')
+        ),
+    )
+    # Solo lo que se confirma; registrar() no escribe en la base
+    transaction.on_commit(lambda: auditoria.registrar(detalle))
+
+
+for modelo in MODELOS_AUDITADOS:
+    post_init.connect(guardar_valores, sender=modelo, dispatch_uid=f'auditoria_{modelo._meta.label}_init')
+    post_save.connect(registrar_guardado, sender=modelo, dispatch_uid=f'auditoria_{modelo._meta.label}_save')
+    post_delete.connect(registrar_eliminacion, sender=modelo, dispatch_uid=f'auditoria_{modelo._meta.label}_delete')
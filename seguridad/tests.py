@@ -1,3 +1,562 @@
-from django.test import TestCase
+import json
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.db.models import QuerySet
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from . import auditoria, particiones
+from .models import Bitacora, DetalleBitacora, Permiso, Rol, RolPermiso, Usuario, UsuarioRol
+from .signals import MODELOS_AUDITADOS
+
+
+class ListadosConsultasConstantesTests(TestCase):
+    """
+    Los listados cargan las relaciones que leen los serializers en la misma
+    consulta (Meta.select_related, ver GestDocSi2/api.py)
+    """
+
+    URLS = [
+        '/seguridad/usuarios/', '/seguridad/roles/', '/seguridad/permisos/', '/seguridad/usuarios_roles/',
+        '/seguridad/roles_permisos/', '/seguridad/bitacoras/', '/seguridad/detalles_bitacora/',
+    ]
+
+    def setUp(self):
+        self.creados = 0
+        self.crear(2)
+        self.client = APIClient()
+        self.client.force_authenticate(Usuario.objects.first())
+
+    def crear(self, cantidad):
+        for _ in range(cantidad):
+            i = self.creados = self.creados + 1
+            usuario = Usuario.objects.create_user(username=f'usuario{i}', email=f'usuario{i}@test.com', password=None)
+            rol = Rol.objects.create(nombre=f'Rol {i}')
+            permiso = Permiso.objects.create(descripcion=f'Permiso {i}', accion=f'accion_{i}')
+            UsuarioRol.objects.create(usuario=usuario, rol=rol)
+            RolPermiso.objects.create(rol=rol, permiso=permiso)
+            bitacora = Bitacora.objects.create(idUsuario=usuario, login=usuario.username, fecha=timezone.now())
+            DetalleBitacora.objects.create(idBitacora=bitacora, accion='CREAR', fecha=timezone.now(), tabla='rol')
+
+    def consultas(self, url):
+        with CaptureQueriesContext(connection) as capturadas:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(capturadas), response.data
+
+    def test_consultas_no_dependen_de_la_cantidad_de_filas(self):
+        antes = {url: self.consultas(url)[0] for url in self.URLS}
+        self.crear(4)
+
+        for url in self.URLS:
+            with self.subTest(url=url):
+                consultas, datos = self.consultas(url)
+                self.assertEqual(consultas, antes[url])
+                self.assertEqual(consultas, 1)
+                self.assertEqual(len(datos['results']), 6)
+
+    def test_consultas_no_dependen_del_tamano_de_pagina(self):
+        self.crear(4)
+        for url in self.URLS:
+            with self.subTest(url=url):
+                chica, _ = self.consultas(f'{url}?limite=2')
+                grande, datos = self.consultas(f'{url}?limite=6')
+                self.assertEqual(chica, grande)
+                self.assertEqual(len(datos['results']), 6)
+
+    def test_representacion_de_las_relaciones(self):
+        usuario_rol = UsuarioRol.objects.select_related('usuario', 'rol').first()
+        detalle = DetalleBitacora.objects.first()
+
+        datos = self.client.get(f'/seguridad/usuarios_roles/{usuario_rol.pk}/').data
+        self.assertEqual(datos['usuario'], usuario_rol.usuario.username)
+        self.assertEqual(datos['rol'], usuario_rol.rol.nombre)
+        self.assertEqual(self.client.get(f'/seguridad/detalles_bitacora/{detalle.pk}/').data['idBitacora'], detalle.idBitacora_id)
+
+
+class PaginacionFiltrosCamposTests(TestCase):
+    """
+    Paginación por cursor, FilterSets y ?fields= (GestDocSi2/api.py)
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ana = Usuario.objects.create_user(username='ana', email='ana@test.com', password=None)
+        cls.luis = Usuario.objects.create_user(username='luis', email='luis@test.com', password=None)
+        ahora = timezone.now()
+        for dias in range(5):
+            momento = ahora - timedelta(days=dias)
+            Bitacora.objects.create(idUsuario=cls.ana, login='ana', fecha=momento, login_at=momento)
+        Bitacora.objects.create(idUsuario=cls.luis, login='luis', fecha=ahora)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.ana)
+
+    def test_recorre_todas_las_paginas_sin_repetir(self):
+        ids = []
+        url = '/seguridad/bitacoras/?limite=4'
+        while url:
+            datos = self.client.get(url).data
+            self.assertLessEqual(len(datos['results']), 4)
+            ids += [fila['id'] for fila in datos['results']]
+            url = datos['next']
+
+        self.assertEqual(ids, list(Bitacora.objects.order_by('-pk').values_list('id', flat=True)))
+
+    @override_settings(API_POR_PAGINA=2, API_MAX_POR_PAGINA=3)
+    def test_tamano_de_pagina_por_defecto_y_maximo(self):
+        self.assertEqual(len(self.client.get('/seguridad/bitacoras/').data['results']), 2)
+        self.assertEqual(len(self.client.get('/seguridad/bitacoras/?limite=100').data['results']), 3)
+
+    def test_filtra_bitacora_por_usuario_y_fecha(self):
+        desde = (timezone.now() - timedelta(days=1, hours=1)).isoformat()
+
+        datos = self.client.get('/seguridad/bitacoras/', {'idUsuario': self.ana.id, 'desde': desde}).data
+
+        self.assertEqual(len(datos['results']), 2)
+        self.assertTrue(all(fila['idUsuario'] == 'ana' for fila in datos['results']))
+
+    def test_campos_seleccionados(self):
+        datos = self.client.get('/seguridad/bitacoras/', {'fields': 'id,login', 'limite': 1}).data
+
+        self.assertEqual(set(datos['results'][0]), {'id', 'login'})
+
+    def test_campos_no_afectan_escrituras(self):
+        response = self.client.post('/seguridad/roles/?fields=id', {'nombre': 'Auditor', 'descripcion': 'Solo lectura'})
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['nombre'], 'Auditor')
+
+
+class AuditoriaParticionadaTests(TestCase):
+    """
+    Bitacora y DetalleBitacora: API de solo lectura por ventanas de tiempo y
+    particiones mensuales (seguridad/particiones.py)
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create_user(username='ana', email='ana@test.com', password=None)
+        ahora = timezone.now()
+        cls.reciente = Bitacora.objects.create(idUsuario=cls.usuario, login='ana', login_at=ahora)
+        cls.vieja = Bitacora.objects.create(idUsuario=cls.usuario, login='ana', login_at=ahora - timedelta(days=100))
+        DetalleBitacora.objects.create(idBitacora=cls.vieja, accion='CREAR', fecha=cls.vieja.login_at, tabla='rol')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuario)
+
+    def ids(self, url, parametros=None):
+        response = self.client.get(url, parametros)
+        self.assertEqual(response.status_code, 200)
+        return [fila['id'] for fila in response.data['results']]
+
+    def particion(self, tabla, pk):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT tableoid::regclass::text FROM "{tabla}" WHERE id = %s', [pk])
+            return cursor.fetchone()[0]
+
+    def test_api_de_solo_lectura(self):
+        self.assertEqual(self.client.post('/seguridad/bitacoras/', {'login': 'x', 'idUsuario': self.usuario.id}).status_code, 405)
+        self.assertEqual(self.client.delete(f'/seguridad/bitacoras/{self.reciente.id}/').status_code, 405)
+        self.assertEqual(self.client.patch(f'/seguridad/detalles_bitacora/{self.reciente.id}/', {}).status_code, 405)
+
+    @override_settings(AUDITORIA_VENTANA_DIAS=30, AUDITORIA_MAX_VENTANA_DIAS=93)
+    def test_ventana_por_defecto_y_maxima(self):
+        hace_90 = (timezone.now() - timedelta(days=90)).isoformat()
+        hace_110 = (timezone.now() - timedelta(days=110)).isoformat()
+
+        self.assertEqual(self.ids('/seguridad/bitacoras/'), [self.reciente.id])
+        self.assertEqual(self.ids('/seguridad/bitacoras/', {'hasta': hace_90, 'desde': hace_110}), [self.vieja.id])
+        self.assertEqual(self.ids('/seguridad/detalles_bitacora/'), [])
+        self.assertEqual(self.client.get('/seguridad/bitacoras/', {'desde': hace_110}).status_code, 400)
+        self.assertEqual(self.client.get('/seguridad/bitacoras/', {'desde': hace_90, 'hasta': hace_110}).status_code, 400)
+        # El detalle no se acota a la ventana
+        self.assertEqual(self.client.get(f'/seguridad/bitacoras/{self.vieja.id}/').status_code, 200)
+
+    def test_crea_particiones_y_separa_las_viejas(self):
+        # Las FK diferidas de las filas de setUpTestData impiden el ALTER TABLE en la misma transacción
+        connection.cursor().execute('SET CONSTRAINTS ALL IMMEDIATE')
+        actual = particiones.inicio_mes(timezone.now())
+        mes_viejo = particiones.inicio_mes(self.vieja.login_at)
+        self.assertEqual(self.particion('bitacora', self.vieja.id), 'bitacora_default')
+
+        call_command('particionar_bitacora', meses_futuros=1, retener_meses=0, stdout=StringIO())
+
+        nombres = dict(particiones.particiones('bitacora'))
+        self.assertIn(particiones.nombre_particion('bitacora', actual), nombres)
+        self.assertIn(particiones.nombre_particion('bitacora', particiones.sumar_meses(actual, 1)), nombres)
+        self.assertEqual(self.particion('bitacora', self.vieja.id), particiones.nombre_particion('bitacora', mes_viejo))
+        self.assertEqual(
+            self.particion('detallebitacora', DetalleBitacora.objects.get().id),
+            particiones.nombre_particion('detallebitacora', mes_viejo),
+        )
+        self.assertEqual(self.particion('bitacora', self.reciente.id), particiones.nombre_particion('bitacora', actual))
+
+        call_command('particionar_bitacora', meses_futuros=1, retener_meses=2, stdout=StringIO())
+
+        # El mes viejo queda fuera de la tabla, como tabla suelta para archivarla
+        self.assertEqual(list(Bitacora.objects.values_list('id', flat=True)), [self.reciente.id])
+        self.assertFalse(DetalleBitacora.objects.exists())
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT id FROM "{particiones.nombre_particion("bitacora", mes_viejo)}"')
+            self.assertEqual(cursor.fetchall(), [(self.vieja.id,)])
+
+    def test_un_mes_que_falla_no_detiene_el_mantenimiento(self):
+        connection.cursor().execute('SET CONSTRAINTS ALL IMMEDIATE')
+        actual = particiones.inicio_mes(timezone.now())
+        crear = particiones.crear_particion
+
+        def crear_particion(tabla, mes):
+            if tabla == 'bitacora' and mes == actual:
+                raise OperationalError('could not attach partition')
+            return crear(tabla, mes)
+
+        errores = StringIO()
+        with mock.patch.object(particiones, 'crear_particion', side_effect=crear_particion):
+            call_command('particionar_bitacora', meses_futuros=1, retener_meses=0, stdout=StringIO(), stderr=errores)
+
+        nombres = dict(particiones.particiones('bitacora'))
+        self.assertNotIn(particiones.nombre_particion('bitacora', actual), nombres)
+        self.assertIn(particiones.nombre_particion('bitacora', particiones.sumar_meses(actual, 1)), nombres)
+        self.assertIn(particiones.nombre_particion('detallebitacora', actual), dict(particiones.particiones('detallebitacora')))
+        self.assertIn('se reintentará', errores.getvalue())
+
+        # La siguiente ejecución crea el mes que faltó
+        call_command('particionar_bitacora', meses_futuros=1, retener_meses=0, stdout=StringIO())
+        self.assertEqual(self.particion('bitacora', self.reciente.id), particiones.nombre_particion('bitacora', actual))
+
+
+class EscritorAuditoriaTests(TestCase):
+    """Búfer de auditoría con vaciado por lotes y respaldo en disco (seguridad/auditoria.py)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create_user(username='ana', email='ana@test.com', password=None)
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.respaldo = Path(directorio.name)
+
+    def crear_escritor(self, lote=100, intervalo=None):
+        return auditoria.EscritorAuditoria(lote=lote, intervalo=intervalo, bloque_ids=10, respaldo_dir=self.respaldo)
+
+    def bitacora(self):
+        return Bitacora(idUsuario=self.usuario, login='ana', login_at=timezone.now())
+
+    def test_escribe_por_lotes(self):
+        escritor = self.crear_escritor(lote=4)
+        bitacora, otra = escritor.registrar(self.bitacora(), self.bitacora())
+        escritor.registrar(DetalleBitacora(idBitacora_id=bitacora.pk, accion='CREAR', fecha=timezone.now(), tabla='rol'))
+
+        self.assertIsNotNone(bitacora.pk)
+        self.assertNotEqual(bitacora.pk, otra.pk)
+        self.assertFalse(Bitacora.objects.exists())
+
+        with CaptureQueriesContext(connection) as capturadas:
+            escritor.registrar(DetalleBitacora(idBitacora_id=otra.pk, accion='BORRAR', fecha=timezone.now(), tabla='rol'))
+
+        inserts = [consulta for consulta in capturadas if consulta['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 2)  # uno por modelo
+        self.assertEqual(escritor.pendientes, 0)
+        self.assertEqual(Bitacora.objects.count(), 2)
+        self.assertEqual(set(bitacora.detalles.values_list('accion', flat=True)), {'CREAR'})
+
+    def test_reserva_ids_por_bloque(self):
+        escritor = self.crear_escritor()
+        with CaptureQueriesContext(connection) as capturadas:
+            objetos = escritor.registrar(*[self.bitacora() for _ in range(10)])
+
+        self.assertEqual(len(capturadas), 1)
+        self.assertEqual(len({objeto.pk for objeto in objetos}), 10)
+
+    def test_respaldo_en_disco_y_reinsercion(self):
+        escritor = self.crear_escritor()
+        bitacora, = escritor.registrar(self.bitacora())
+
+        with mock.patch.object(QuerySet, 'bulk_create', side_effect=OperationalError('sin conexión')):
+            with self.assertLogs('seguridad.auditoria', 'ERROR'):
+                self.assertEqual(escritor.vaciar(), 0)
+        self.assertEqual(len(list(self.respaldo.glob('auditoria-*.jsonl'))), 1)
+        self.assertFalse(Bitacora.objects.exists())
+
+        # El siguiente vaciado, de este u otro proceso, lo reinserta
+        self.crear_escritor().vaciar()
+
+        self.assertEqual(list(Bitacora.objects.values_list('id', 'login')), [(bitacora.pk, 'ana')])
+        self.assertEqual(list(self.respaldo.iterdir()), [])
+
+    def test_cerrar_escribe_lo_pendiente(self):
+        escritor = self.crear_escritor()
+        escritor.registrar(self.bitacora())
+
+        escritor.cerrar()
+
+        self.assertEqual(Bitacora.objects.count(), 1)
+
+    def test_cerrar_respalda_los_logouts_pendientes(self):
+        # La Bitacora sigue en el búfer de otro proceso (o en su respaldo) al cerrar este
+        bitacora = self.bitacora()
+        bitacora.pk = auditoria.reservar_ids(Bitacora, 1)[0]
+        escritor = self.crear_escritor()
+        escritor.cerrar_bitacora(bitacora.pk, bitacora.login_at, timezone.now())
+
+        with self.assertLogs('seguridad.auditoria', 'WARNING'):
+            escritor.cerrar()
+        self.assertEqual(len(list(self.respaldo.glob('cierres-*.jsonl'))), 1)
+
+        # Tras reiniciar, el primer vaciado que ve la Bitacora registra el logout
+        otro = self.crear_escritor()
+        otro.vaciar()
+        otro.registrar(bitacora)
+        otro.vaciar()
+
+        self.assertIsNotNone(Bitacora.objects.get(pk=bitacora.pk).logout_at)
+        self.assertEqual(list(self.respaldo.iterdir()), [])
+
+    def test_hilo_vacia_por_intervalo(self):
+        escritor = self.crear_escritor(intervalo=0.01)
+        with mock.patch.object(auditoria.EscritorAuditoria, '_insertar') as insertar:
+            escritor.registrar(self.bitacora())
+            limite = time.monotonic() + 5
+            while not insertar.called and time.monotonic() < limite:
+                time.sleep(0.01)
+            escritor.cerrar()
+
+        self.assertEqual(len(insertar.call_args_list[0].args[0]), 1)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class LoginLogoutBitacoraTests(TestCase):
+    """El login registra su Bitacora sin INSERT en la solicitud; el logout la cierra"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create_user(username='ana', email='ana@test.com', password='clave-segura')
+
+    def login(self):
+        response = self.client.post('/seguridad/login/', {'username': 'ana', 'password': 'clave-segura'}, REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    @override_settings(AUDITORIA_DIFERIDA=True)
+    def test_login_no_inserta_en_la_solicitud(self):
+        escritor = auditoria.EscritorAuditoria(lote=100, intervalo=None, bloque_ids=10, respaldo_dir='/nonexistent')
+        with mock.patch.object(auditoria, '_escritor', escritor), CaptureQueriesContext(connection) as capturadas:
+            self.login()
+
+        self.assertFalse([consulta for consulta in capturadas if 'INSERT INTO "bitacora"' in consulta['sql']])
+        self.assertEqual(escritor.pendientes, 1)
+        escritor.vaciar()
+        bitacora = Bitacora.objects.get()
+        self.assertEqual((bitacora.login, bitacora.ip, bitacora.idUsuario_id), ('ana', '10.0.0.1', self.usuario.id))
+
+    @override_settings(AUDITORIA_DIFERIDA=False)
+    def test_tokens_llevan_la_bitacora(self):
+        tokens = self.login()
+
+        bitacora = Bitacora.objects.get()
+        self.assertEqual(AccessToken(tokens['access'])[auditoria.CLAIM_BITACORA], bitacora.id)
+        self.assertEqual(RefreshToken(tokens['refresh'])[auditoria.CLAIM_BITACORA], bitacora.id)
+
+    def logout(self, tokens):
+        response = self.client.post(
+            '/seguridad/logout/', {'refresh': tokens['refresh']}, content_type='application/json',
+            HTTP_AUTHORIZATION=f"Bearer {tokens['access']}",
+        )
+        self.assertEqual(response.status_code, 204)
+
+    @override_settings(AUDITORIA_DIFERIDA=False)
+    def test_logout_cierra_la_bitacora_del_token(self):
+        tokens = self.login()
+        otra_sesion = self.login()
+
+        self.logout(tokens)
+
+        bitacora = Bitacora.objects.get(pk=RefreshToken(tokens['refresh'], verify=False)[auditoria.CLAIM_BITACORA])
+        self.assertIsNotNone(bitacora.logout_at)
+        otra = Bitacora.objects.get(pk=RefreshToken(otra_sesion['refresh'], verify=False)[auditoria.CLAIM_BITACORA])
+        self.assertIsNone(otra.logout_at)
+
+    @override_settings(AUDITORIA_DIFERIDA=True)
+    def test_logout_con_la_bitacora_en_el_bufer(self):
+        Bitacora.objects.create(idUsuario=self.usuario, login='ana', login_at=timezone.now() - timedelta(days=1))
+        escritor = auditoria.EscritorAuditoria(lote=100, intervalo=None, bloque_ids=10, respaldo_dir='/nonexistent')
+        with mock.patch.object(auditoria, '_escritor', escritor):
+            tokens = self.login()
+            self.logout(tokens)
+            self.assertEqual(len(escritor._cierres), 1)
+            escritor.vaciar()
+
+        bitacora = Bitacora.objects.get(pk=RefreshToken(tokens['refresh'], verify=False)[auditoria.CLAIM_BITACORA])
+        self.assertIsNotNone(bitacora.logout_at)
+        # La sesión anterior, aún abierta, no se toca
+        self.assertEqual(Bitacora.objects.filter(logout_at__isnull=True).count(), 1)
+        self.assertFalse(escritor._cierres)
+
+
+@override_settings(AUDITORIA_DIFERIDA=False)
+class AuditoriaCambiosTests(TestCase):
+    """Altas, cambios y bajas hechos en solicitudes quedan en DetalleBitacora (seguridad/signals.py)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create_user(username='ana', email='ana@test.com', password=None)
+        cls.bitacora = Bitacora.objects.create(idUsuario=cls.usuario, login='ana')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuario, token={auditoria.CLAIM_BITACORA: self.bitacora.id})
+
+    def solicitud(self, metodo, url, datos=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = getattr(self.client, metodo)(url, datos, format='json')
+        self.assertLess(response.status_code, 300)
+        return response
+
+    def detalles(self):
+        return [
+            (detalle.idBitacora_id, detalle.accion, detalle.tabla, json.loads(detalle.detalle))
+            for detalle in DetalleBitacora.objects.order_by('id')
+        ]
+
+    def test_crear_editar_y_eliminar(self):
+        rol_id = self.solicitud('post', '/seguridad/roles/', {'nombre': 'Auditor', 'descripcion': ''}).data['id']
+        self.solicitud('patch', f'/seguridad/roles/{rol_id}/', {'descripcion': 'Solo lectura'})
+        self.solicitud('delete', f'/seguridad/roles/{rol_id}/')
+
+        self.assertEqual(self.detalles(), [
+            (self.bitacora.id, 'CREAR', 'rol', {'id': rol_id, 'cambios': {'nombre': 'Auditor'}}),
+            (self.bitacora.id, 'EDITAR', 'rol', {'id': rol_id, 'cambios': {'descripcion': ['', 'Solo lectura']}}),
+            (self.bitacora.id, 'ELIMINAR', 'rol', {'id': rol_id, 'cambios': {'nombre': 'Auditor', 'descripcion': 'Solo lectura'}}),
+        ])
+
+    def test_edicion_sin_cambios_no_se_registra(self):
+        rol = Rol.objects.create(nombre='Auditor')
+
+        self.solicitud('patch', f'/seguridad/roles/{rol.id}/', {'nombre': 'Auditor'})
+
+        self.assertEqual(self.detalles(), [])
+
+    def test_excluye_campos_automaticos(self):
+        usuario = Usuario.objects.create_user(username='luis', email='luis@test.com', password=None)
+
+        self.solicitud('patch', f'/seguridad/usuarios/{usuario.id}/', {'estado': 'INACTIVO'})
+
+        # Sin actualizadoEn (auto_now)
+        (_, accion, tabla, detalle), = self.detalles()
+        self.assertEqual((accion, tabla), ('EDITAR', 'usuario'))
+        self.assertEqual(detalle['cambios'], {'estado': ['ACTIVO', 'INACTIVO']})
+
+    def test_fuera_de_una_solicitud_no_se_audita(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Rol.objects.create(nombre='Auditor')
+
+        self.assertEqual(self.detalles(), [])
+
+    def test_sin_claim_usa_la_bitacora_abierta(self):
+        self.client.force_authenticate(self.usuario)
+
+        with mock.patch.dict(auditoria._bitacoras_sin_claim, clear=True):
+            self.solicitud('post', '/seguridad/roles/', {'nombre': 'Auditor'})
+
+        self.assertEqual([detalle[0] for detalle in self.detalles()], [self.bitacora.id])
+
+    @override_settings(AUDITORIA_DIFERIDA=True)
+    def test_sin_claim_abre_una_sola_bitacora(self):
+        # La Bitacora abierta queda en el búfer: las solicitudes siguientes no la ven con un SELECT
+        Bitacora.objects.filter(pk=self.bitacora.pk).update(logout_at=timezone.now())
+        self.client.force_authenticate(self.usuario)
+        escritor = auditoria.EscritorAuditoria(lote=100, intervalo=None, bloque_ids=10, respaldo_dir='/nonexistent')
+
+        with mock.patch.object(auditoria, '_escritor', escritor), \
+                mock.patch.dict(auditoria._bitacoras_sin_claim, clear=True):
+            for nombre in ('Auditor', 'Revisor', 'Lector'):
+                self.solicitud('post', '/seguridad/roles/', {'nombre': nombre})
+            escritor.vaciar()
+
+        abierta = Bitacora.objects.get(logout_at__isnull=True)
+        self.assertEqual([detalle[0] for detalle in self.detalles()], [abierta.id] * 3)
+
+    def test_sin_claim_olvida_la_bitacora_cerrada(self):
+        # Token sin el claim (emitido antes de que existiera)
+        self.client.force_authenticate(self.usuario, token={})
+
+        with mock.patch.dict(auditoria._bitacoras_sin_claim, clear=True):
+            self.solicitud('post', '/seguridad/roles/', {'nombre': 'Auditor'})
+            auditoria.cerrar_bitacora(self.bitacora.id)
+            self.solicitud('post', '/seguridad/roles/', {'nombre': 'Revisor'})
+
+        abierta = Bitacora.objects.get(logout_at__isnull=True)
+        self.assertNotEqual(abierta.id, self.bitacora.id)
+        self.assertEqual([detalle[0] for detalle in self.detalles()], [self.bitacora.id, abierta.id])
+
+    @override_settings(AUDITORIA_SIN_CLAIM_MAX=2, AUDITORIA_SIN_CLAIM_SEGUNDOS=60)
+    def test_sin_claim_acotado(self):
+        usuarios = [self.usuario] + [
+            Usuario.objects.create_user(username=f'u{i}', email=f'u{i}@test.com', password=None) for i in range(2)
+        ]
+        bitacoras = [self.bitacora.id] + [Bitacora.objects.create(idUsuario=u, login=u.username).id for u in usuarios[1:]]
+
+        with mock.patch.dict(auditoria._bitacoras_sin_claim, clear=True), \
+                mock.patch('seguridad.auditoria.time.monotonic', return_value=1000.0):
+            for usuario in usuarios:
+                auditoria._bitacora_sin_claim(None, usuario)
+            # LRU: se descarta el usado hace más tiempo
+            self.assertEqual(list(auditoria._bitacoras_sin_claim), [usuarios[1].pk, usuarios[2].pk])
+            with self.assertNumQueries(0):
+                self.assertEqual(auditoria._bitacora_sin_claim(None, usuarios[1]), bitacoras[1])
+
+            # Vencida: se vuelve a buscar en la base
+            Bitacora.objects.filter(pk=bitacoras[1]).update(logout_at=timezone.now())
+            otra = Bitacora.objects.create(idUsuario=usuarios[1], login=usuarios[1].username)
+            with mock.patch('seguridad.auditoria.time.monotonic', return_value=1060.0):
+                self.assertEqual(auditoria._bitacora_sin_claim(None, usuarios[1]), otra.id)
+
+    @override_settings(AUDITORIA_DIFERIDA=True)
+    def test_no_agrega_consultas_a_la_solicitud(self):
+        rol = Rol.objects.create(nombre='Auditor')
+        escritor = auditoria.EscritorAuditoria(lote=100, intervalo=None, bloque_ids=10, respaldo_dir='/nonexistent')
+        escritor.registrar(DetalleBitacora(idBitacora_id=self.bitacora.id, accion='X', fecha=timezone.now(), tabla='x'))
+
+        consultas = {}
+        for activa in (False, True):
+            with override_settings(AUDITORIA_CAMBIOS=activa), mock.patch.object(auditoria, '_escritor', escritor), \
+                    CaptureQueriesContext(connection) as capturadas:
+                self.solicitud('patch', f'/seguridad/roles/{rol.id}/', {'descripcion': f'Versión {activa}'})
+            consultas[activa] = len(capturadas)
+
+        self.assertEqual(consultas[True], consultas[False])
+        self.assertEqual(escritor.pendientes, 2)
+
+    def test_modelos_de_dominio_auditados(self):
+        from casos.models import Caso, EquipoCaso
+        from documentos.models import Documento
+        from actores.models import Actor
+
+        for modelo in (Caso, Documento, Actor, EquipoCaso):
+            self.assertIn(modelo, MODELOS_AUDITADOS)
+
+    def test_benchmark_auditoria(self):
+        salida = StringIO()
+        with mock.patch.object(auditoria, '_escritor', auditoria.EscritorAuditoria(
+            lote=100, intervalo=None, bloque_ids=10, respaldo_dir='/nonexistent',
+        )):
+            call_command('benchmark_auditoria', solicitudes=3, calentamiento=1, filas=20, json=True, stdout=salida)
+
+        reporte = json.loads(salida.getvalue())
+        self.assertEqual(reporte['solicitudes'], 3)
+        for caso in ('edicion', 'listado'):
+            self.assertEqual(reporte[caso]['con_auditoria']['consultas_sql'], reporte[caso]['sin_auditoria']['consultas_sql'])
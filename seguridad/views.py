@@ -3,16 +3,23 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework import viewsets
 from .models import Usuario
 from .serializers import UsuarioSerializer,LogoutSerializer,MyTokenPairSerializer,UsuarioMeSerializer
-from  django.utils import timezone
+from datetime import datetime
 from rest_framework.parsers import JSONParser
+from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework.decorators import action,permission_classes
+from GestDocSi2.api import OptimizarConsultasMixin
+from . import auditoria
+from .filters import (
+    BitacoraFilter, DetalleBitacoraFilter, PermisoFilter, RolFilter, RolPermisoFilter, UsuarioFilter, UsuarioRolFilter,
+)
 
 
 
-class UsuarioViewSet(viewsets.ModelViewSet):
+class UsuarioViewSet(OptimizarConsultasMixin, viewsets.ModelViewSet):
     queryset = Usuario.objects.all()
     serializer_class = UsuarioSerializer
+    filterset_class = UsuarioFilter
     @action(
         detail=False,
         methods=['get'],
@@ -29,44 +36,63 @@ class UsuarioViewSet(viewsets.ModelViewSet):
 from .models import Rol
 from .serializers import RolSerializer
 
-class RolViewSet(viewsets.ModelViewSet):
+class RolViewSet(OptimizarConsultasMixin, viewsets.ModelViewSet):
     queryset = Rol.objects.all()
     serializer_class = RolSerializer
+    filterset_class = RolFilter
 
 from .models import Permiso
 from .serializers import PermisoSerializer
 
-class PermisoViewSet(viewsets.ModelViewSet):
+class PermisoViewSet(OptimizarConsultasMixin, viewsets.ModelViewSet):
     queryset = Permiso.objects.all()
     serializer_class = PermisoSerializer
+    filterset_class = PermisoFilter
 
 from .models import RolPermiso
 from .serializers import RolPermisoSerializer
 
-class RolPermisoViewSet(viewsets.ModelViewSet):
+class RolPermisoViewSet(OptimizarConsultasMixin, viewsets.ModelViewSet):
     queryset = RolPermiso.objects.all()
     serializer_class = RolPermisoSerializer
+    filterset_class = RolPermisoFilter
 
 from .models import Bitacora
 from .serializers import BitacoraSerializer
 
-class BitacoraViewSet(viewsets.ModelViewSet):
+class AuditoriaViewSet(OptimizarConsultasMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Auditoría de solo lectura (la escribe el sistema, no la API). Los
+    listados se acotan a una ventana de tiempo (filters.VentanaTiempoForm);
+    el detalle se busca por id sin ventana.
+    """
+
+    def filter_queryset(self, queryset):
+        if self.action == 'retrieve':
+            return queryset
+        return super().filter_queryset(queryset)
+
+
+class BitacoraViewSet(AuditoriaViewSet):
     queryset = Bitacora.objects.all()
     serializer_class = BitacoraSerializer
+    filterset_class = BitacoraFilter
 
 from .models import DetalleBitacora
 from .serializers import DetalleBitacoraSerializer
 
-class DetalleBitacoraViewSet(viewsets.ModelViewSet):
+class DetalleBitacoraViewSet(AuditoriaViewSet):
     queryset = DetalleBitacora.objects.all()
     serializer_class = DetalleBitacoraSerializer
+    filterset_class = DetalleBitacoraFilter
 
 from .models import UsuarioRol
 from .serializers import UsuarioRolSerializer
 
-class UsuarioRolViewSet(viewsets.ModelViewSet):
+class UsuarioRolViewSet(OptimizarConsultasMixin, viewsets.ModelViewSet):
     queryset = UsuarioRol.objects.all()
     serializer_class = UsuarioRolSerializer
+    filterset_class = UsuarioRolFilter
 
 from django.contrib.auth import authenticate, login
 from django.middleware.csrf import get_token
@@ -117,23 +143,17 @@ class MyTokenObtainPairView(TokenObtainPairView):
         serializer.is_valid(raise_exception=True)
         user = serializer.user  # ← ESTE es el usuario autenticado
 
-        # IP (X-Forwarded-For si hay proxy; si no, REMOTE_ADDR)
-        xff = request.META.get('HTTP_X_FORWARDED_FOR')
-        ip = (xff.split(',')[0].strip() if xff else request.META.get('REMOTE_ADDR')) or None
-
-        # User-Agent como "device" (o None si vacío)
-        device = request.META.get('HTTP_USER_AGENT') or None
+        # Registrar login en bitácora (escritura diferida, sin INSERT en la solicitud)
+        bitacora = auditoria.nueva_bitacora(request, user)
 
-        # Registrar login en bitácora
-        Bitacora.objects.create(
-            idUsuario=user,
-            login=timezone.now(),
-            ip=ip,
-            device=device
-        )
-        print('el usuario ingreso al perfil',)
+        # El id de la bitácora viaja en los tokens: los cambios de la sesión se ligan a ella
+        datos = serializer.validated_data
+        refresh = RefreshToken(datos['refresh'], verify=False)
+        refresh[auditoria.CLAIM_BITACORA] = bitacora.pk
+        refresh[auditoria.CLAIM_LOGIN] = bitacora.login_at.isoformat()
+        datos['refresh'], datos['access'] = str(refresh), str(refresh.access_token)
 
-        return Response(serializer.validated_data, status=status.HTTP_200_OK)
+        return Response(datos, status=status.HTTP_200_OK)
 class LogoutView(APIView):
     """
     Endpoint de **logout**.
@@ -158,16 +178,13 @@ class LogoutView(APIView):
         # invalidamos el refresh token
         serializer = LogoutSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        refresh = serializer.save()
 
         # ——————— Registro de logout ———————
-        bit = Bitacora.objects.filter(
-            idUsuario=request.user,
-            logout_at__isnull=True
-        ).last()
-        if bit:
-            print('no se esta cerrando seccion ')
-            bit.logout = timezone.now()
-            bit.save()
+        # Se cierra la Bitacora del token (puede seguir en el búfer del escritor); sin claim no se adivina
+        bitacora_id = refresh.get(auditoria.CLAIM_BITACORA)
+        if bitacora_id is not None:
+            login_at = refresh.get(auditoria.CLAIM_LOGIN)
+            auditoria.cerrar_bitacora(bitacora_id, datetime.fromisoformat(login_at) if login_at else None)
 
         return Response(status=status.HTTP_204_NO_CONTENT)
\ No newline at end of file